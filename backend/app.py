@@ -1,10 +1,12 @@
 import asyncio, os, time
-import aiosqlite
+from typing import Optional
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
-from .config import BASE_DIR, DB_PATH
-from .db import init_db
+from .config import BASE_DIR
+from .db import init_db, db_write, db_pool
+from .crud.samples import insert_sample
+from .crud.net import insert_net
 from .middleware import AuthMiddleware
 from .routers import auth as r_auth
 from .routers import users as r_users
@@ -20,8 +22,22 @@ from .routers import alerts as r_alerts
 from .routers import operations as r_ops
 from .routers import audit as r_audit
 from .routers import about as r_about
+from .routers import cgroups as r_cgroups
+from .routers import admin as r_admin
+from .routers import replication as r_replication
 from .utils.system import collect_system_snapshot
-from .utils.system import collect_network_rates
+from .utils.system import collect_network_rates, detect_primary_interface
+from .utils.procio import procio_sampler, procio_worker
+from .utils.cgroups import cgroup_worker
+from .utils.numa import numa_worker
+from .utils.netlink import netlink_worker, topology
+from .utils.inventory import inventory_worker
+from .utils.rollup import rollup_worker
+from .utils.retention import budget_worker, retention_worker
+from .utils.seglog import hf_worker
+from .utils.hotring import hot
+from .migrations import migration_worker
+from .replication import is_standby, log_row, replication_worker
 
 
 app = FastAPI(title="一体机监控系统")
@@ -31,8 +47,25 @@ app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="stat
 @app.on_event("startup")
 async def on_startup():
     await init_db()
-    asyncio.create_task(_sampler())
-    asyncio.create_task(_retention_worker())
+    # 备机的采样数据来自主机复制，不再本机采集
+    if not is_standby():
+        asyncio.create_task(_sampler())
+        asyncio.create_task(procio_worker())
+        asyncio.create_task(cgroup_worker())
+        asyncio.create_task(numa_worker())
+    asyncio.create_task(retention_worker())
+    asyncio.create_task(budget_worker())
+    asyncio.create_task(netlink_worker())
+    asyncio.create_task(inventory_worker())
+    asyncio.create_task(rollup_worker())
+    asyncio.create_task(migration_worker())
+    asyncio.create_task(hf_worker())
+    asyncio.create_task(replication_worker())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await db_pool.close()
 
 
 @app.get("/ping")
@@ -40,20 +73,47 @@ async def ping():
     return {"ok": True}
 
 
+# 默认路由网卡很少变化：netlink 在线时读拓扑缓存；否则缓存结果，拓扑变化或超过 TTL 才在线程中重新探测（会 fork `ip route`）
+PRIMARY_IFACE_TTL = int(os.environ.get("PRIMARY_IFACE_TTL", "300"))
+_primary = {"name": None, "version": None, "ts": 0.0}
+
+
+async def _primary_iface() -> Optional[str]:
+    if topology.source == "netlink":
+        return topology.primary_iface()
+    now = time.monotonic()
+    if _primary["version"] != topology.version or now - _primary["ts"] >= PRIMARY_IFACE_TTL:
+        _primary.update(name=await asyncio.to_thread(detect_primary_interface), version=topology.version, ts=now)
+    return _primary["name"]
+
+
 async def _sampler():
     interval = int(os.environ.get("SAMPLE_INTERVAL", "5"))
+    try:
+        await hot.warm_up()
+    except Exception:
+        pass
     while True:
         try:
             snap = collect_system_snapshot()
-            async with aiosqlite.connect(DB_PATH) as db:
+            async with db_write() as db:
                 ts = int(time.time())
-                await db.execute("INSERT INTO cpu_data(ts,cpu_percent) VALUES(?,?)", (ts, snap["cpu_percent"]))
-                await db.execute("INSERT INTO load_data(ts,load1,load5,load15) VALUES(?,?,?,?)", (ts, snap["load_avg"][0], snap["load_avg"][1], snap["load_avg"][2]))
-                await db.execute("INSERT INTO mem_data(ts,mem_used,mem_total,mem_percent) VALUES(?,?,?,?)", (ts, int(snap["mem"]["used"]), int(snap["mem"]["total"]), float(snap.get("mem_percent") or 0.0)))
-                await db.execute("INSERT INTO proc_data(ts,processes) VALUES(?,?)", (ts, snap["processes"]))
-                await db.execute("INSERT INTO diskio_data(ts,disk_mb_s) VALUES(?,?)", (ts, float(snap.get("disk_mb_s") or 0.0)))
-                await db.execute("INSERT INTO gpu_data(ts,gpu_util_avg,gpu_temp_avg) VALUES(?,?,?)", (ts, float(snap.get("gpu_util_avg") or 0.0), float(snap.get("gpu_temp_avg") or 0.0)))
+                values = {
+                    "cpu_percent": snap["cpu_percent"],
+                    "load1": snap["load_avg"][0], "load5": snap["load_avg"][1], "load15": snap["load_avg"][2],
+                    "mem_used": int(snap["mem"]["used"]), "mem_total": int(snap["mem"]["total"]),
+                    "mem_percent": float(snap.get("mem_percent") or 0.0),
+                    "processes": snap["processes"],
+                    "disk_mb_s": float(snap.get("disk_mb_s") or 0.0),
+                    "gpu_util_avg": float(snap.get("gpu_util_avg") or 0.0),
+                    "gpu_temp_avg": float(snap.get("gpu_temp_avg") or 0.0),
+                    "disk_read_bytes": snap.get("disk_read_bytes"),
+                    "disk_write_bytes": snap.get("disk_write_bytes"),
+                    "interrupts": snap.get("interrupts"),
+                }
+                await insert_sample(db, ts, values)
                 await db.commit()
+            hot.add_sample(ts, values)
 
             # Threshold-based alerts with 10-minute rate limiting per alert title
             try:
@@ -64,12 +124,13 @@ async def _sampler():
 
                 async def maybe_alert(title: str, message: str, level: str = "WARN", min_interval_sec: int = 600):
                     # Only insert if there is no same-title alert in the last min_interval_sec
-                    async with aiosqlite.connect(DB_PATH) as db2:
+                    async with db_write() as db2:
                         sql = f"SELECT id FROM alerts WHERE title=? AND created_at >= datetime('now','-{min_interval_sec} seconds') LIMIT 1"
                         cur = await db2.execute(sql, (title,))
                         row = await cur.fetchone()
                         if not row:
-                            await db2.execute("INSERT INTO alerts (level, title, message) VALUES (?,?,?)", (level, title, message))
+                            cur = await db2.execute("INSERT INTO alerts (level, title, message) VALUES (?,?,?)", (level, title, message))
+                            await log_row(db2, "alerts", cur.lastrowid)
                             await db2.commit()
 
                 # CPU
@@ -98,9 +159,16 @@ async def _sampler():
                 # Disk IO
                 dsk = float(snap.get("disk_mb_s") or 0)
                 if dsk >= DISK_MB_S_HIGH:
+                    msg = f"当前 {dsk:.1f} MB/s ≥ 阈值 {DISK_MB_S_HIGH:.1f} MB/s"
+                    # name the heaviest I/O processes from the per-process sampler
+                    top_io = procio_sampler.snapshot(limit=3).get("items") or []
+                    if top_io:
+                        msg += "；TOP: " + ", ".join(
+                            f"{it['name'] or '?'}({it['pid']}) {it['total_bps']/1048576:.1f} MB/s" for it in top_io
+                        )
                     await maybe_alert(
                         title="磁盘 IO 过高",
-                        message=f"当前 {dsk:.1f} MB/s ≥ 阈值 {DISK_MB_S_HIGH:.1f} MB/s",
+                        message=msg,
                         level="WARN",
                     )
                 # GPU temperature
@@ -118,43 +186,25 @@ async def _sampler():
             try:
                 net = collect_network_rates()
                 ts = int(time.time())
-                async with aiosqlite.connect(DB_PATH) as db:
-                    for name, item in (net.get("ifaces") or {}).items():
-                        await db.execute(
-                            "INSERT INTO net_data(ts,iface,rx_bytes,tx_bytes,errin,errout,rx_kbps,tx_kbps,latency_ms) VALUES(?,?,?,?,?,?,?,?,?)",
-                            (
-                                ts, name,
-                                int(item.get("rx_bytes") or 0), int(item.get("tx_bytes") or 0),
-                                int(item.get("errin") or 0), int(item.get("errout") or 0),
-                                float(item.get("rx_kbps") or 0.0), float(item.get("tx_kbps") or 0.0),
-                                None,
-                            ),
-                        )
-                    # total row with latency
-                    tot = net.get("total") or {}
-                    await db.execute(
-                        "INSERT INTO net_data(ts,iface,rx_bytes,tx_bytes,errin,errout,rx_kbps,tx_kbps,latency_ms) VALUES(?,?,?,?,?,?,?,?,?)",
-                        (
-                            ts, "__total__",
-                            None, None,
-                            int(tot.get("errin") or 0), int(tot.get("errout") or 0),
-                            float(tot.get("rx_kbps") or 0.0), float(tot.get("tx_kbps") or 0.0),
-                            (net.get("latency_ms") if isinstance(net.get("latency_ms"), (int,float)) else None),
-                        ),
-                    )
+                lat = net.get("latency_ms") if isinstance(net.get("latency_ms"), (int, float)) else None
+                primary = await _primary_iface() if lat is not None else None
+                async with db_write() as db:
+                    await insert_net(db, ts, net.get("ifaces") or {}, latency_ms=lat, primary=primary)
                     await db.commit()
+                hot.add_net(ts, net.get("ifaces") or {}, latency_ms=lat)
                 # Network-related alert: high latency on total
                 try:
                     LAT_HIGH = float(os.environ.get("ALERT_LAT_MS", "300"))
                     lt = net.get("latency_ms")
                     if isinstance(lt, (int, float)) and lt >= LAT_HIGH:
-                        async with aiosqlite.connect(DB_PATH) as adb:
+                        async with db_write() as adb:
                             sql = "SELECT id FROM alerts WHERE title=? AND created_at >= datetime('now','-600 seconds') LIMIT 1"
                             ttl = "网络延迟过高"
                             row = await (await adb.execute(sql, (ttl,))).fetchone()
                             if not row:
                                 msg = f"当前延迟 {lt:.0f} ms ≥ 阈值 {LAT_HIGH:.0f} ms"
-                                await adb.execute("INSERT INTO alerts(level,title,message) VALUES(?,?,?)", ("WARN", ttl, msg))
+                                cur = await adb.execute("INSERT INTO alerts(level,title,message) VALUES(?,?,?)", ("WARN", ttl, msg))
+                                await log_row(adb, "alerts", cur.lastrowid)
                                 await adb.commit()
                 except Exception:
                     pass
@@ -165,28 +215,6 @@ async def _sampler():
         await asyncio.sleep(interval)
 
 
-async def _retention_worker():
-    """Periodic deletion of samples older than RETENTION_DAYS (default 14)."""
-    days = int(os.environ.get("RETENTION_DAYS", "14"))
-    batch = int(os.environ.get("RETENTION_DELETE_BATCH", "50000"))
-    # run hourly
-    while True:
-        try:
-            now = int(time.time())
-            cutoff = now - days * 86400
-            async with aiosqlite.connect(DB_PATH) as db:
-                # delete in batches to avoid long locks
-                for table in ("cpu_data","mem_data","load_data","proc_data","diskio_data","gpu_data","net_data","metric_samples"):
-                    await db.execute(
-                        f"DELETE FROM {table} WHERE ts < ? LIMIT ?",
-                        (cutoff, batch)
-                    )
-                await db.commit()
-        except Exception:
-            pass
-        await asyncio.sleep(3600)
-
-
 # middleware and routers
 app.add_middleware(AuthMiddleware)
 app.include_router(r_auth.router)
@@ -203,3 +231,6 @@ app.include_router(r_alerts.router)
 app.include_router(r_ops.router)
 app.include_router(r_audit.router)
 app.include_router(r_about.router)
+app.include_router(r_cgroups.router)
+app.include_router(r_admin.router)
+app.include_router(r_replication.router)
@@ -1,4 +1,9 @@
 # CRUD operations package
 from .gpu_data import GPUDataManager
+from .samples import SAMPLE_COLUMNS, COUNTER_COLUMNS, insert_sample, iter_samples, latest_sample
+from .net import insert_net, iter_net, latest_net, list_ifaces
+from .rates import net_counter_rates, sample_counter_rates
 
-__all__ = ['GPUDataManager']
+__all__ = ['GPUDataManager', 'SAMPLE_COLUMNS', 'COUNTER_COLUMNS', 'insert_sample', 'iter_samples', 'latest_sample',
+           'insert_net', 'iter_net', 'latest_net', 'list_ifaces',
+           'net_counter_rates', 'sample_counter_rates']
@@ -5,9 +5,19 @@ import sqlite3
 import aiosqlite
 import time
 import json
+import gzip
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from contextlib import closing
+from itertools import islice
+from typing import List, Dict, Any, Iterator, Optional
 from backend.config import DB_PATH
+from backend.shards import iter_rows_sync
+from backend.utils.export import EXPORT_CHUNK
+
+
+GPU_COLUMNS = ("ts", "gpu_util_avg", "gpu_temp_avg", "cpu_percent", "mem_percent", "disk_mb_s")
+GPU_EXPORT_FIELDS = ["id", *GPU_COLUMNS]
+MAX_TS = 253402300799   # 9999-12-31：不限结束时间
 
 
 class GPUDataManager:
@@ -24,101 +34,59 @@ class GPUDataManager:
         """获取异步数据库连接"""
         return aiosqlite.connect(self.db_path)
     
+    def _iter_samples(self, start_time: int, end_time: int, gpu_only: bool = False) -> Iterator[Dict[str, Any]]:
+        """按 ts 降序遍历采样（主库 + 行存分片 + 冷分片，见 shards.iter_rows_sync），id 即 ts"""
+        for r in iter_rows_sync("system_samples", GPU_COLUMNS, start_time, end_time, desc=True,
+                                path=self.db_path, chunk=EXPORT_CHUNK):
+            if gpu_only and r[1] is None and r[2] is None:
+                continue
+            yield {"id": r[0], **dict(zip(GPU_COLUMNS, r))}
+    
     # ==================== 查询操作 (SELECT) ====================
     
     def get_gpu_data_by_time_range(self, start_time: int, end_time: int) -> List[Dict[str, Any]]:
         """根据时间范围查询GPU数据"""
-        conn = self.get_connection()
-        try:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute("""
-                SELECT 
-                    g.id, g.ts, g.gpu_util_avg, g.gpu_temp_avg,
-                    c.cpu_percent, m.mem_percent, d.disk_mb_s
-                FROM gpu_data g
-                LEFT JOIN cpu_data c ON g.ts = c.ts
-                LEFT JOIN mem_data m ON g.ts = m.ts  
-                LEFT JOIN diskio_data d ON g.ts = d.ts
-                WHERE g.ts BETWEEN ? AND ? 
-                ORDER BY g.ts DESC
-            """, (start_time, end_time))
-            return [dict(row) for row in cursor.fetchall()]
-        finally:
-            conn.close()
+        return list(self.iter_gpu_data_by_time_range(start_time, end_time))
+    
+    def iter_gpu_data_by_time_range(self, start_time: int, end_time: int) -> Iterator[Dict[str, Any]]:
+        """按时间范围逐条产出GPU数据（分批读取，导出时内存占用与范围无关）"""
+        return self._iter_samples(start_time, end_time)
     
     def get_latest_gpu_data(self, limit: int = 100) -> List[Dict[str, Any]]:
         """获取最新的GPU数据"""
-        conn = self.get_connection()
-        try:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute("""
-                SELECT 
-                    g.id, g.ts, g.gpu_util_avg, g.gpu_temp_avg,
-                    c.cpu_percent, m.mem_percent, d.disk_mb_s
-                FROM gpu_data g
-                LEFT JOIN cpu_data c ON g.ts = c.ts
-                LEFT JOIN mem_data m ON g.ts = m.ts
-                LEFT JOIN diskio_data d ON g.ts = d.ts
-                WHERE g.gpu_util_avg IS NOT NULL OR g.gpu_temp_avg IS NOT NULL
-                ORDER BY g.ts DESC 
-                LIMIT ?
-            """, (limit,))
-            return [dict(row) for row in cursor.fetchall()]
-        finally:
-            conn.close()
+        with closing(self._iter_samples(0, MAX_TS, gpu_only=True)) as rows:
+            return list(islice(rows, max(0, limit)))
     
     def get_gpu_statistics(self, start_time: int, end_time: int) -> Dict[str, Any]:
         """获取GPU统计信息"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT 
-                    COUNT(*) as data_points,
-                    AVG(gpu_util_avg) as avg_utilization,
-                    MAX(gpu_util_avg) as max_utilization,
-                    MIN(gpu_util_avg) as min_utilization,
-                    AVG(gpu_temp_avg) as avg_temperature,
-                    MAX(gpu_temp_avg) as max_temperature,
-                    MIN(gpu_temp_avg) as min_temperature
-                FROM gpu_data 
-                WHERE ts BETWEEN ? AND ? 
-                AND (gpu_util_avg IS NOT NULL OR gpu_temp_avg IS NOT NULL)
-            """, (start_time, end_time))
-            
-            result = cursor.fetchone()
-            if result:
-                return {
-                    'data_points': result[0],
-                    'avg_utilization': result[1] or 0,
-                    'max_utilization': result[2] or 0,
-                    'min_utilization': result[3] or 0,
-                    'avg_temperature': result[4] or 0,
-                    'max_temperature': result[5] or 0,
-                    'min_temperature': result[6] or 0
-                }
-            return {}
-        finally:
-            conn.close()
+        n = 0
+        # 逐行累计 [个数, 和, 最小, 最大]，不保留整段数据
+        acc = {"util": [0, 0.0, None, None], "temp": [0, 0.0, None, None]}
+        for row in self._iter_samples(start_time, end_time, gpu_only=True):
+            n += 1
+            for name, v in (("util", row["gpu_util_avg"]), ("temp", row["gpu_temp_avg"])):
+                if v is None:
+                    continue
+                a = acc[name]
+                a[0] += 1
+                a[1] += v
+                a[2] = v if a[2] is None else min(a[2], v)
+                a[3] = v if a[3] is None else max(a[3], v)
+        util, temp = acc["util"], acc["temp"]
+        return {
+            'data_points': n,
+            'avg_utilization': (util[1] / util[0]) if util[0] else 0,
+            'max_utilization': util[3] or 0,
+            'min_utilization': util[2] or 0,
+            'avg_temperature': (temp[1] / temp[0]) if temp[0] else 0,
+            'max_temperature': temp[3] or 0,
+            'min_temperature': temp[2] or 0
+        }
     
     def get_gpu_data_by_id(self, data_id: int) -> Optional[Dict[str, Any]]:
-        """根据ID查询单条GPU数据"""
-        conn = self.get_connection()
-        try:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute("""
-                SELECT 
-                    g.id, g.ts, g.gpu_util_avg, g.gpu_temp_avg,
-                    c.cpu_percent, m.mem_percent, d.disk_mb_s
-                FROM gpu_data g
-                LEFT JOIN cpu_data c ON g.ts = c.ts
-                LEFT JOIN mem_data m ON g.ts = m.ts
-                LEFT JOIN diskio_data d ON g.ts = d.ts
-                WHERE g.id = ?
-            """, (data_id,))
-            result = cursor.fetchone()
-            return dict(result) if result else None
-        finally:
-            conn.close()
+        """根据ID查询单条GPU数据（id 即 ts）"""
+        with closing(self._iter_samples(data_id, data_id)) as rows:
+            return next(rows, None)
     
     def search_gpu_data(self, 
                        min_utilization: float = None,
@@ -129,61 +97,21 @@ class GPUDataManager:
                        end_time: int = None,
                        limit: int = 100) -> List[Dict[str, Any]]:
         """搜索GPU数据（支持多条件查询）"""
-        conn = self.get_connection()
-        try:
-            conn.row_factory = sqlite3.Row
-            
-            # 构建查询条件
-            conditions = []
-            params = []
-            
-            if min_utilization is not None:
-                conditions.append("g.gpu_util_avg >= ?")
-                params.append(min_utilization)
-            
-            if max_utilization is not None:
-                conditions.append("g.gpu_util_avg <= ?")
-                params.append(max_utilization)
-            
-            if min_temperature is not None:
-                conditions.append("g.gpu_temp_avg >= ?")
-                params.append(min_temperature)
-            
-            if max_temperature is not None:
-                conditions.append("g.gpu_temp_avg <= ?")
-                params.append(max_temperature)
-            
-            if start_time is not None:
-                conditions.append("g.ts >= ?")
-                params.append(start_time)
-            
-            if end_time is not None:
-                conditions.append("g.ts <= ?")
-                params.append(end_time)
-            
-            # 确保有GPU数据
-            conditions.append("(g.gpu_util_avg IS NOT NULL OR g.gpu_temp_avg IS NOT NULL)")
-            
-            where_clause = " AND ".join(conditions) if conditions else "1=1"
-            params.append(limit)
-            
-            query = f"""
-                SELECT 
-                    g.id, g.ts, g.gpu_util_avg, g.gpu_temp_avg,
-                    c.cpu_percent, m.mem_percent, d.disk_mb_s
-                FROM gpu_data g
-                LEFT JOIN cpu_data c ON g.ts = c.ts
-                LEFT JOIN mem_data m ON g.ts = m.ts
-                LEFT JOIN diskio_data d ON g.ts = d.ts
-                WHERE {where_clause}
-                ORDER BY g.ts DESC 
-                LIMIT ?
-            """
-            
-            cursor = conn.execute(query, params)
-            return [dict(row) for row in cursor.fetchall()]
-        finally:
-            conn.close()
+        def match(row: Dict[str, Any]) -> bool:
+            util, temp = row["gpu_util_avg"], row["gpu_temp_avg"]
+            if min_utilization is not None and (util is None or util < min_utilization):
+                return False
+            if max_utilization is not None and (util is None or util > max_utilization):
+                return False
+            if min_temperature is not None and (temp is None or temp < min_temperature):
+                return False
+            if max_temperature is not None and (temp is None or temp > max_temperature):
+                return False
+            return True
+        
+        with closing(self._iter_samples(start_time if start_time is not None else 0,
+                                        end_time if end_time is not None else MAX_TS, gpu_only=True)) as rows:
+            return list(islice(filter(match, rows), max(0, limit)))
     
     # ==================== 插入操作 (INSERT) ====================
     
@@ -393,33 +321,50 @@ class GPUDataManager:
         finally:
             conn.close()
     
+    @staticmethod
+    def _open_export(filename: str, newline: Optional[str] = None):
+        """文件名以 .gz 结尾时写 gzip"""
+        if filename.endswith(".gz"):
+            return gzip.open(filename, 'wt', newline=newline, encoding='utf-8')
+        return open(filename, 'w', newline=newline, encoding='utf-8')
+    
     def export_gpu_data_to_csv(self, start_time: int, end_time: int, filename: str = None) -> str:
-        """导出GPU数据到CSV文件"""
+        """导出GPU数据到CSV文件（边查边写；filename 以 .gz 结尾时压缩）"""
         import csv
         
         if filename is None:
             filename = f"gpu_data_{start_time}_{end_time}.csv"
         
-        data = self.get_gpu_data_by_time_range(start_time, end_time)
-        
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            if data:
-                fieldnames = data[0].keys()
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(data)
+        with self._open_export(filename, newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=GPU_EXPORT_FIELDS)
+            writer.writeheader()
+            for row in self.iter_gpu_data_by_time_range(start_time, end_time):
+                writer.writerow(row)
         
         return filename
     
     def export_gpu_data_to_json(self, start_time: int, end_time: int, filename: str = None) -> str:
-        """导出GPU数据到JSON文件"""
+        """导出GPU数据到JSON文件（JSON 数组，逐条写出，格式与 json.dump(indent=2) 相同）"""
         if filename is None:
             filename = f"gpu_data_{start_time}_{end_time}.json"
         
-        data = self.get_gpu_data_by_time_range(start_time, end_time)
+        with self._open_export(filename) as jsonfile:
+            sep = "[\n  "
+            for row in self.iter_gpu_data_by_time_range(start_time, end_time):
+                jsonfile.write(sep + json.dumps(row, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+                sep = ",\n  "
+            jsonfile.write("[]" if sep.startswith("[") else "\n]")
+        
+        return filename
+    
+    def export_gpu_data_to_ndjson(self, start_time: int, end_time: int, filename: str = None) -> str:
+        """导出GPU数据到NDJSON文件（每行一条）"""
+        if filename is None:
+            filename = f"gpu_data_{start_time}_{end_time}.ndjson"
         
-        with open(filename, 'w', encoding='utf-8') as jsonfile:
-            json.dump(data, jsonfile, indent=2, ensure_ascii=False)
+        with self._open_export(filename) as fp:
+            for row in self.iter_gpu_data_by_time_range(start_time, end_time):
+                fp.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
         
         return filename
 
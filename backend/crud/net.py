@@ -0,0 +1,181 @@
+"""
+网卡采样 net_data 的读写（异步，使用连接池连接；数据按天分片，见 backend/shards.py）
+
+接口名只在主库维度表 net_iface 中存一份（含首次/最近出现时间、是否虚拟网卡），net_data 以 (iface_id, ts) 为主键。
+不再写 "__total__" 伪网卡：总流量由同一时刻各网卡的行求和得到，时延记在主网卡的行上；
+升级前数据中的 "__total__" 行在读取时直接作为该时刻的汇总。
+"""
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+from .. import shards
+from ..replication import log_change
+
+
+TOTAL = "__total__"
+NET_COLUMNS = ("rx_bytes", "tx_bytes", "errin", "errout", "rx_kbps", "tx_kbps", "latency_ms")
+# 汇总时求和的列（latency_ms 取该时刻记录了时延的那一行）
+SUM_COLUMNS = ("rx_bytes", "tx_bytes", "errin", "errout", "rx_kbps", "tx_kbps")
+SEEN_REFRESH = 60   # last_seen 的最小更新间隔（秒）
+
+# name -> (id, 最近一次写入的 last_seen)
+_ids: Dict[str, Tuple[int, int]] = {}
+
+
+def pick_columns(fields: Optional[Iterable[str]]) -> list:
+    """过滤出合法列名，始终以 ts 开头。"""
+    return ["ts"] + [c for c in (fields or NET_COLUMNS) if c in NET_COLUMNS]
+
+
+def is_virtual(name: str) -> bool:
+    """/sys/class/net/<name> 指向 devices/virtual 的是虚拟网卡（lo、bridge、veth、tun 等）。"""
+    if name == "lo":
+        return True
+    try:
+        return "/devices/virtual/" in os.path.realpath(f"/sys/class/net/{name}")
+    except Exception:
+        return False
+
+
+async def upsert_ifaces(db, spans: Dict[str, Tuple[int, int]]) -> None:
+    """登记网卡并扩展其出现区间：name -> (first_seen, last_seen)。调用方负责 commit。"""
+    await db.executemany(
+        "INSERT INTO net_iface(name, first_seen, last_seen, is_virtual) VALUES(?,?,?,?) "
+        "ON CONFLICT(name) DO UPDATE SET first_seen=min(first_seen, excluded.first_seen), "
+        "last_seen=max(last_seen, excluded.last_seen)",
+        [(n, int(lo), int(hi), 1 if (n == TOTAL or is_virtual(n)) else 0) for n, (lo, hi) in spans.items()],
+    )
+
+
+async def iface_ids(db, names: Iterable[str], ts: int) -> Dict[str, int]:
+    """写连接用：名称 -> id，新网卡即时登记；已知网卡的 last_seen 每 SEEN_REFRESH 秒更新一次。"""
+    names = list(names)
+    stale = [n for n in names if n not in _ids or ts - _ids[n][1] >= SEEN_REFRESH]
+    if stale:
+        await upsert_ifaces(db, {n: (ts, ts) for n in stale})
+        rows = await (await db.execute(
+            f"SELECT name, id FROM net_iface WHERE name IN ({','.join('?' * len(stale))})", stale
+        )).fetchall()
+        for name, iid in rows:
+            _ids[name] = (int(iid), ts)
+    return {n: _ids[n][0] for n in names if n in _ids}
+
+
+def _primary(names: Sequence[str], primary: Optional[str]) -> Optional[str]:
+    if primary in names:
+        return primary
+    real = sorted(n for n in names if not is_virtual(n))
+    return real[0] if real else (sorted(names)[0] if names else None)
+
+
+async def insert_net(db, ts: int, ifaces: Dict[str, Dict[str, Any]], latency_ms: Optional[float] = None,
+                     primary: Optional[str] = None) -> None:
+    """写入一个时刻各网卡的采样到当天分片，时延记在 primary（缺省为第一块物理网卡）的行上。
+    调用方负责 commit；须在事务开始前调用（需要 ATTACH）。"""
+    if not ifaces:
+        return
+    table = await shards.writable(db, "net_data", ts)
+    ids = await iface_ids(db, ifaces, ts)
+    # 升级前建的当天分片仍按名称存放，直到次日换新分片
+    by_name = "iface_id" not in shards.columns_of("net_data", ts)
+    lat_on = _primary(list(ifaces), primary)
+    rows = []
+    for name, item in ifaces.items():
+        if not by_name and name not in ids:
+            continue
+        rows.append((
+            ts, name if by_name else ids[name],
+            int(item.get("rx_bytes") or 0), int(item.get("tx_bytes") or 0),
+            int(item.get("errin") or 0), int(item.get("errout") or 0),
+            float(item.get("rx_kbps") or 0.0), float(item.get("tx_kbps") or 0.0),
+            latency_ms if name == lat_on else None,
+        ))
+    await db.executemany(
+        f"INSERT OR REPLACE INTO {table}(ts,{'iface' if by_name else 'iface_id'},{','.join(NET_COLUMNS)}) VALUES(?,?,?,?,?,?,?,?,?)",
+        rows,
+    )
+    await log_change(db, "net", {"ts": ts, "i": {n: {c: it.get(c) for c in SUM_COLUMNS} for n, it in ifaces.items()},
+                                 "l": latency_ms, "p": primary})
+
+
+async def list_ifaces(db, start: Optional[int] = None, end: Optional[int] = None) -> List[Dict[str, Any]]:
+    """[start, end] 内出现过的网卡（按名称），直接读维度表，不扫描采样。"""
+    rows = await (await db.execute(
+        "SELECT name, first_seen, last_seen, is_virtual FROM net_iface WHERE last_seen >= ? AND first_seen <= ? AND name != ? ORDER BY name",
+        (int(start or 0), int(end if end is not None else time.time()), TOTAL),
+    )).fetchall()
+    return [{"name": r[0], "first_seen": r[1], "last_seen": r[2], "is_virtual": bool(r[3])} for r in rows]
+
+
+def totals(rows: Iterable[tuple], cols: Sequence[str]) -> Iterable[tuple]:
+    """输入 (ts, iface, *cols) 且按 ts 排序的行，逐个时刻输出 (ts, *cols) 的汇总行。
+    旧数据中该时刻若有 "__total__" 行则直接使用；否则数值列求和，latency_ms 取非空的那一个。"""
+    cur_ts = None
+    acc: List[Any] = []
+    legacy = None
+    for r in rows:
+        if r[0] != cur_ts:
+            if cur_ts is not None:
+                yield legacy or (cur_ts, *acc)
+            cur_ts, acc, legacy = r[0], [None] * len(cols), None
+        if r[1] == TOTAL:
+            legacy = (r[0], *r[2:])
+            continue
+        for i, (c, v) in enumerate(zip(cols, r[2:])):
+            if v is None:
+                continue
+            if c in SUM_COLUMNS:
+                acc[i] = v if acc[i] is None else acc[i] + v
+            elif acc[i] is None:
+                acc[i] = v
+    if cur_ts is not None:
+        yield legacy or (cur_ts, *acc)
+
+
+async def iter_net(db, cols: Sequence[str], start: int, end: int, iface: str = TOTAL) -> AsyncIterator[tuple]:
+    """按 ts 升序遍历 [start, end] 内某网卡（或汇总）的行，cols 以 ts 开头。"""
+    if iface != TOTAL:
+        it = shards.iter_rows(db, "net_data", cols, start, end, key=iface)
+        try:
+            async for r in it:
+                yield r
+        finally:
+            await it.aclose()   # 调用方提前关闭时随之关闭扫描（DETACH 分片）
+        return
+    vcols = list(cols[1:])
+    buf: List[tuple] = []
+    it = shards.iter_rows(db, "net_data", ["ts", "iface", *vcols], start, end)
+    try:
+        async for r in it:
+            if buf and r[0] != buf[-1][0]:
+                for t in totals(buf, vcols):
+                    yield t
+                buf = []
+            buf.append(r)
+    finally:
+        await it.aclose()
+    for t in totals(buf, vcols):
+        yield t
+
+
+async def latest_net(db, cols: Sequence[str], iface: str = TOTAL) -> Optional[tuple]:
+    """最新一个时刻某网卡（或汇总）的行。只查 net_iface 中登记的出现区间覆盖到的分片：
+    未登记的名称（已改名、拔掉、拼错）直接返回 None，而不是每次都逐天查到最早的分片。"""
+    # last_seen 每 SEEN_REFRESH 秒才更新一次，最新的行可能比它晚不到 SEEN_REFRESH 秒
+    if iface != TOTAL:
+        span = await (await db.execute("SELECT first_seen, last_seen FROM net_iface WHERE name=?", (iface,))).fetchone()
+    else:
+        span = await (await db.execute("SELECT MIN(first_seen), MAX(last_seen) FROM net_iface")).fetchone()
+    if not span or span[1] is None:
+        return None
+    since, until = int(span[0]), int(span[1]) + SEEN_REFRESH
+    if iface != TOTAL:
+        rows = await shards.fetch_latest(db, "net_data", cols, key=iface, since=since, until=until)
+        return rows[0] if rows else None
+    last = await shards.fetch_latest(db, "net_data", ["ts"], since=since, until=until)
+    if not last:
+        return None
+    out = None
+    async for r in iter_net(db, cols, last[0][0], last[0][0]):
+        out = r
+    return out
@@ -0,0 +1,137 @@
+"""
+累计计数器的查询时速率：采样中只存单调递增的原始计数器（网卡字节 / 错误数、磁盘读写字节、中断数），
+增量与速率按请求的窗口和步长现算，不依赖采样间隔，也不受采集端差分出错的影响。
+
+- 相邻两点的增量按时间比例分摊到所跨的桶，桶内 increase 之和等于窗口内的总增量；
+  速率 = 桶内增量 / 桶内有数据覆盖的秒数（缺数据的桶不会被摊薄）；
+- 计数器变小视为重置（重启、网卡重建、驱动重载）：重置后的增量取新值本身；
+  接近 2^32 处变小视为 32 位计数器回绕，按 2^32 补偿；
+- 两点间隔超过 RATE_MAX_GAP 视为缺数据（停机、采样中断），不计增量；
+- 网卡汇总（__total__）为各网卡增量之和，网卡增删不会产生虚假的跳变；
+  升级前只有 "__total__" 行的时段直接用这些行。
+"""
+import os
+from typing import Any, Dict, List, Optional, Sequence
+from .. import shards
+from .net import TOTAL
+from .samples import COUNTER_COLUMNS
+
+
+RATE_MAX_GAP = int(os.environ.get("RATE_MAX_GAP", "300"))   # 秒
+RATE_MAX_BUCKETS = 10000
+NET_COUNTERS = ("rx_bytes", "tx_bytes", "errin", "errout")
+_WRAP32 = 1 << 32
+
+
+def counter_delta(prev: Optional[float], cur: Optional[float]) -> Optional[float]:
+    """两次读数之间的增量；任一为空返回 None。"""
+    if prev is None or cur is None:
+        return None
+    d = cur - prev
+    if d >= 0:
+        return d
+    if _WRAP32 * 3 // 4 <= prev < _WRAP32 and cur < _WRAP32 // 4:
+        return d + _WRAP32   # 32 位回绕
+    return cur               # 重置：从 0 重新计数
+
+
+class CounterRates:
+    """把若干序列（key）的计数器读数累计到 [start, end] 上步长为 step 的桶中；按 ts 升序 add()。"""
+
+    def __init__(self, start: int, end: int, step: int, cols: Sequence[str], max_gap: int = RATE_MAX_GAP):
+        self.start, self.end = int(start), int(end)
+        self.step = max(1, int(step))
+        self.t0 = self.start // self.step * self.step
+        self.n = max(0, (self.end - self.t0) // self.step + 1)
+        self.cols = tuple(cols)
+        self.max_gap = max_gap
+        self.last: Dict[Any, tuple] = {}
+        self.inc: Dict[Any, List[List[float]]] = {}
+        self.cov: Dict[Any, List[float]] = {}
+        self.resets = 0
+        self.gaps = 0
+
+    def add(self, key: Any, ts: int, values: Sequence[Optional[float]]) -> None:
+        prev = self.last.get(key)
+        self.last[key] = (ts, values)
+        if prev is None or ts <= prev[0]:
+            return
+        span = ts - prev[0]
+        if span > self.max_gap:
+            self.gaps += 1
+            return
+        deltas = []
+        for p, c in zip(prev[1], values):
+            deltas.append(counter_delta(p, c))
+            if p is not None and c is not None and c < p:
+                self.resets += 1
+        lo, hi = max(prev[0], self.start), min(ts, self.end + 1)
+        if hi <= lo:
+            return
+        if key not in self.inc:
+            self.inc[key] = [[0.0] * self.n for _ in self.cols]
+            self.cov[key] = [0.0] * self.n
+        inc, cov = self.inc[key], self.cov[key]
+        b = (lo - self.t0) // self.step
+        while lo < hi and b < self.n:
+            seg = min(hi, self.t0 + (b + 1) * self.step) - lo
+            f = seg / span
+            for i, d in enumerate(deltas):
+                if d is not None:
+                    inc[i][b] += d * f
+            cov[b] += seg
+            lo += seg
+            b += 1
+
+    def rows(self, legacy: Any = None) -> List[Dict[str, Any]]:
+        """每桶一行：ts、covered（有数据的秒数）、各列的增量与每秒速率（无数据为 None）。
+        legacy 为旧汇总行的 key：只在没有其他序列覆盖的桶中使用。"""
+        real = [k for k in self.cov if k != legacy]
+        out = []
+        for b in range(self.n):
+            keys = [k for k in real if self.cov[k][b] > 0]
+            if not keys and legacy in self.cov and self.cov[legacy][b] > 0:
+                keys = [legacy]
+            covered = max((self.cov[k][b] for k in keys), default=0.0)
+            row: Dict[str, Any] = {"ts": self.t0 + b * self.step, "covered": covered}
+            for i, c in enumerate(self.cols):
+                total = sum(self.inc[k][i][b] for k in keys) if keys else None
+                row[c] = total
+                row[f"{c}_per_s"] = total / covered if covered else None
+            out.append(row)
+        return out
+
+
+def _check(start: int, end: int, step: int) -> None:
+    if end < start or step <= 0:
+        raise ValueError("invalid window")
+    if (end - start) // step + 1 > RATE_MAX_BUCKETS:
+        raise ValueError(f"too many buckets (max {RATE_MAX_BUCKETS})")
+
+
+async def net_counter_rates(db, start: int, end: int, step: int, cols: Sequence[str] = NET_COUNTERS,
+                            iface: str = TOTAL) -> Dict[str, Any]:
+    """网卡计数器在各桶的增量与速率；iface=__total__ 时为各网卡之和。"""
+    _check(start, end, step)
+    cols = [c for c in cols if c in NET_COUNTERS] or list(NET_COUNTERS)
+    acc = CounterRates(start, end, step, cols)
+    lo = int(start) - acc.max_gap
+    if iface == TOTAL:
+        async for r in shards.iter_rows(db, "net_data", ["ts", "iface", *cols], lo, end):
+            acc.add(r[1], r[0], r[2:])
+    else:
+        async for r in shards.iter_rows(db, "net_data", ["ts", *cols], lo, end, key=iface):
+            acc.add(iface, r[0], r[1:])
+    return {"iface": iface, "step": acc.step, "counters": cols, "resets": acc.resets, "gaps": acc.gaps,
+            "items": acc.rows(legacy=TOTAL if iface == TOTAL else None)}
+
+
+async def sample_counter_rates(db, start: int, end: int, step: int,
+                               cols: Sequence[str] = COUNTER_COLUMNS) -> Dict[str, Any]:
+    """system_samples 中磁盘读写字节、中断数在各桶的增量与速率。"""
+    _check(start, end, step)
+    cols = [c for c in cols if c in COUNTER_COLUMNS] or list(COUNTER_COLUMNS)
+    acc = CounterRates(start, end, step, cols)
+    async for r in shards.iter_rows(db, "system_samples", ["ts", *cols], int(start) - acc.max_gap, end):
+        acc.add(None, r[0], r[1:])
+    return {"step": acc.step, "counters": cols, "resets": acc.resets, "gaps": acc.gaps, "items": acc.rows()}
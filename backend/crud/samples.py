@@ -0,0 +1,49 @@
+"""
+系统采样宽表 system_samples 的读写操作（异步，使用连接池连接；数据按天分片，见 backend/shards.py）
+"""
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Sequence
+from .. import shards
+from ..replication import log_change
+
+
+GAUGE_COLUMNS = (
+    "cpu_percent", "load1", "load5", "load15",
+    "mem_used", "mem_total", "mem_percent",
+    "processes", "disk_mb_s", "gpu_util_avg", "gpu_temp_avg",
+)
+# 单调递增的原始计数器（采集时不做差分），速率与增量在查询时计算，见 crud/rates.py
+COUNTER_COLUMNS = ("disk_read_bytes", "disk_write_bytes", "interrupts")
+SAMPLE_COLUMNS = GAUGE_COLUMNS + COUNTER_COLUMNS
+
+
+def _insert_sql(table: str, cols: Sequence[str]) -> str:
+    return f"INSERT OR REPLACE INTO {table}(ts,{','.join(cols)}) VALUES({','.join('?' * (len(cols) + 1))})"
+
+
+def pick_columns(fields: Optional[Iterable[str]]) -> list:
+    """过滤出合法列名（防止拼接 SQL 时注入），始终以 ts 开头。"""
+    cols = [c for c in (fields or SAMPLE_COLUMNS) if c in SAMPLE_COLUMNS]
+    return ["ts"] + cols
+
+
+async def insert_sample(db, ts: int, values: Dict[str, Any]) -> None:
+    """写入一个采样点（缺失的列记为 NULL）到当天分片，调用方负责 commit；须在事务开始前调用（需要 ATTACH）。"""
+    table = await shards.writable(db, "system_samples", ts)
+    scales = shards.scales_of("system_samples", ts)
+    have = shards.columns_of("system_samples", ts)
+    cols = [c for c in SAMPLE_COLUMNS if c in have] if have else SAMPLE_COLUMNS
+    await db.execute(_insert_sql(table, cols), (ts, *(shards.quantize(values.get(c), scales.get(c)) for c in cols)))
+    await log_change(db, "sample", {"ts": ts, "v": {c: values.get(c) for c in SAMPLE_COLUMNS}})
+
+
+async def iter_samples(db, start: int, end: int, fields: Optional[Sequence[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """按 ts 升序遍历 [start, end] 内的采样点：只附加覆盖到的分片，每个分片一次主键范围扫描。"""
+    cols = pick_columns(fields)
+    async for r in shards.iter_rows(db, "system_samples", cols, start, end):
+        yield dict(zip(cols, r))
+
+
+async def latest_sample(db, fields: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+    cols = pick_columns(fields)
+    rows = await shards.fetch_latest(db, "system_samples", cols)
+    return dict(zip(cols, rows[0])) if rows else None
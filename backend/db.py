@@ -1,13 +1,24 @@
 import os
+import time
+import shutil
+import asyncio
+import logging
 import sqlite3
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 import aiosqlite
 from .config import DB_PATH
 from .crypto import hash_password
 
 
+log = logging.getLogger(__name__)
+
+
+# 基线结构（migrations.py 中的迁移 1）；之后的结构变更以新编号追加到 migrations.MIGRATIONS
 SCHEMA_SQL = '''
-PRAGMA journal_mode=DELETE;
+PRAGMA auto_vacuum=INCREMENTAL;
+PRAGMA journal_mode=WAL;
 CREATE TABLE IF NOT EXISTS users (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   username TEXT UNIQUE NOT NULL,
@@ -25,6 +36,8 @@ CREATE TABLE IF NOT EXISTS audit_logs (
   ua TEXT,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+-- /api/audit 按用户名前缀过滤（LIKE 默认不区分大小写，索引需 NOCASE 才能用于前缀范围）
+CREATE INDEX IF NOT EXISTS idx_audit_logs_username ON audit_logs(username COLLATE NOCASE);
 CREATE TABLE IF NOT EXISTS alerts (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   level TEXT NOT NULL,
@@ -33,60 +46,32 @@ CREATE TABLE IF NOT EXISTS alerts (
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   acknowledged INTEGER DEFAULT 0
 );
+-- 告警去重（title + 最近 N 秒，覆盖索引）、列表筛选（level/acknowledged，rowid 隐含在索引末尾）、按时间查询/清理
+CREATE INDEX IF NOT EXISTS idx_alerts_title_created ON alerts(title, created_at);
+CREATE INDEX IF NOT EXISTS idx_alerts_level_ack ON alerts(level, acknowledged);
+CREATE INDEX IF NOT EXISTS idx_alerts_ack ON alerts(acknowledged);
+CREATE INDEX IF NOT EXISTS idx_alerts_created ON alerts(created_at);
 CREATE TABLE IF NOT EXISTS sys_logs (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   category TEXT NOT NULL,
   message TEXT NOT NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
--- system metrics split into dedicated tables
-CREATE TABLE IF NOT EXISTS cpu_data (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  ts INTEGER NOT NULL,
-  date TEXT GENERATED ALWAYS AS (strftime('%Y-%m-%d', ts, 'unixepoch')) VIRTUAL,
-  cpu_percent REAL
-  , created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-CREATE TABLE IF NOT EXISTS mem_data (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  ts INTEGER NOT NULL,
-  date TEXT GENERATED ALWAYS AS (strftime('%Y-%m-%d', ts, 'unixepoch')) VIRTUAL,
-  mem_used INTEGER,
-  mem_total INTEGER,
-  mem_percent REAL
-  , created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-CREATE TABLE IF NOT EXISTS load_data (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  ts INTEGER NOT NULL,
-  date TEXT GENERATED ALWAYS AS (strftime('%Y-%m-%d', ts, 'unixepoch')) VIRTUAL,
+-- per-tick system scalars: one row per sample, clustered on ts (new rows go to the daily shards in shards.py)
+CREATE TABLE IF NOT EXISTS system_samples (
+  ts INTEGER PRIMARY KEY,
+  cpu_percent REAL,
   load1 REAL,
   load5 REAL,
-  load15 REAL
-  , created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-CREATE TABLE IF NOT EXISTS proc_data (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  ts INTEGER NOT NULL,
-  date TEXT GENERATED ALWAYS AS (strftime('%Y-%m-%d', ts, 'unixepoch')) VIRTUAL,
-  processes INTEGER
-  , created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-CREATE TABLE IF NOT EXISTS diskio_data (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  ts INTEGER NOT NULL,
-  date TEXT GENERATED ALWAYS AS (strftime('%Y-%m-%d', ts, 'unixepoch')) VIRTUAL,
-  disk_mb_s REAL
-  , created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-CREATE TABLE IF NOT EXISTS gpu_data (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  ts INTEGER NOT NULL,
-  date TEXT GENERATED ALWAYS AS (strftime('%Y-%m-%d', ts, 'unixepoch')) VIRTUAL,
+  load15 REAL,
+  mem_used INTEGER,
+  mem_total INTEGER,
+  mem_percent REAL,
+  processes INTEGER,
+  disk_mb_s REAL,
   gpu_util_avg REAL,
   gpu_temp_avg REAL
-  , created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+) WITHOUT ROWID;
 CREATE TABLE IF NOT EXISTS net_data (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   ts INTEGER NOT NULL,
@@ -144,61 +129,133 @@ CREATE TABLE IF NOT EXISTS gpu_statistics (
   gpu_count INTEGER,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+CREATE INDEX IF NOT EXISTS idx_gpu_statistics_period_ts ON gpu_statistics(period, ts);
+
+-- per-tick top-K processes by disk I/O rate (compact: no rowid, no created_at)
+CREATE TABLE IF NOT EXISTS proc_io_top (
+  ts INTEGER NOT NULL,
+  rank INTEGER NOT NULL,
+  pid INTEGER NOT NULL,
+  name TEXT,
+  read_bps REAL,
+  write_bps REAL,
+  PRIMARY KEY (ts, rank)
+) WITHOUT ROWID;
+
+-- per-cgroup (systemd unit / container) usage, bounded to CGROUP_MAX_SERIES rows per tick
+CREATE TABLE IF NOT EXISTS cgroup_data (
+  cgroup TEXT NOT NULL,
+  ts INTEGER NOT NULL,
+  kind TEXT,
+  name TEXT,
+  cpu_pct REAL,
+  mem_bytes INTEGER,
+  io_read_bps REAL,
+  io_write_bps REAL,
+  pids INTEGER,
+  PRIMARY KEY (cgroup, ts)
+) WITHOUT ROWID;
+
+-- per-NUMA-node memory and cross-node access rates (pages/s)
+CREATE TABLE IF NOT EXISTS numa_data (
+  node INTEGER NOT NULL,
+  ts INTEGER NOT NULL,
+  mem_total INTEGER,
+  mem_free INTEGER,
+  mem_used INTEGER,
+  numa_hit_ps REAL,
+  numa_miss_ps REAL,
+  numa_foreign_ps REAL,
+  other_node_ps REAL,
+  PRIMARY KEY (node, ts)
+) WITHOUT ROWID;
+-- multi-resolution rollups (series = metric name, ts = bucket start); maintained by utils/rollup.py
+CREATE TABLE IF NOT EXISTS rollup_1m (
+  series TEXT NOT NULL, ts INTEGER NOT NULL,
+  count INTEGER NOT NULL, sum REAL, min REAL, max REAL, last REAL,
+  PRIMARY KEY (series, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_5m (
+  series TEXT NOT NULL, ts INTEGER NOT NULL,
+  count INTEGER NOT NULL, sum REAL, min REAL, max REAL, last REAL,
+  PRIMARY KEY (series, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_1h (
+  series TEXT NOT NULL, ts INTEGER NOT NULL,
+  count INTEGER NOT NULL, sum REAL, min REAL, max REAL, last REAL,
+  PRIMARY KEY (series, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_1d (
+  series TEXT NOT NULL, ts INTEGER NOT NULL,
+  count INTEGER NOT NULL, sum REAL, min REAL, max REAL, last REAL,
+  PRIMARY KEY (series, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollup_1m_ts ON rollup_1m(ts);
+CREATE INDEX IF NOT EXISTS idx_rollup_5m_ts ON rollup_5m(ts);
+CREATE INDEX IF NOT EXISTS idx_rollup_1h_ts ON rollup_1h(ts);
+CREATE INDEX IF NOT EXISTS idx_rollup_1d_ts ON rollup_1d(ts);
+-- per-resolution watermark: every bucket with ts < watermark is complete
+CREATE TABLE IF NOT EXISTS rollup_state (
+  resolution TEXT PRIMARY KEY,
+  watermark INTEGER NOT NULL
+);
 '''
 
 
-async def ensure_column(db, table: str, col: str, decl: str):
+# 旧库切换 auto_vacuum 需要一次完整 VACUUM（耗时与库大小成正比、需等量空闲磁盘、期间占用写连接）：
+# 启动时只对不超过 VACUUM_INLINE_MAX 的库直接执行，更大的库跳过，由管理员经 /api/admin/vacuum/convert 触发
+VACUUM_INLINE_MAX = int(os.environ.get("VACUUM_INLINE_MAX", str(64 * 1024 * 1024)))
+vacuum_status: Dict[str, Any] = {"state": None}
+
+
+def _vacuum_blocker(path: str) -> Optional[str]:
+    """不能执行 VACUUM 的原因（空闲磁盘不足），可以时返回 None。"""
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    free = shutil.disk_usage(Path(path).parent).free
+    return f"free disk {free} < db size {size}" if free < size else None
+
+
+async def ensure_incremental_vacuum(db, path: str = DB_PATH, force: bool = False) -> str:
+    """旧库（auto_vacuum=NONE）切换为 INCREMENTAL，之后由保留任务分步回收空间；返回 vacuum_status['state']。
+    force=False（启动时）只转换不超过 VACUUM_INLINE_MAX 的库，更大的记为 skipped。"""
+    row = await (await db.execute("PRAGMA auto_vacuum")).fetchone()
+    if row and row[0] == 2:
+        vacuum_status.update(state="incremental")
+        return "incremental"
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    reason = _vacuum_blocker(path)
+    if reason is None and not force and size > VACUUM_INLINE_MAX:
+        reason = f"db size {size} > VACUUM_INLINE_MAX {VACUUM_INLINE_MAX}; run POST /api/admin/vacuum/convert"
+    if reason:
+        vacuum_status.update(state="skipped", reason=reason, db_bytes=size)
+        log.warning("auto_vacuum conversion skipped: %s", reason)
+        return "skipped"
+    t0 = time.time()
+    vacuum_status.update(state="running", started_at=int(t0), db_bytes=size, reason=None)
     try:
-        cur = await db.execute(f"PRAGMA table_info({table})")
-        cols = [r[1] for r in await cur.fetchall()]
-        if col not in cols:
-            await db.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
-    except Exception:
-        # ignore if busy / column exists
-        pass
+        await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await db.execute("VACUUM")
+    except Exception as e:
+        vacuum_status.update(state="failed", reason=str(e))
+        raise
+    vacuum_status.update(state="incremental", converted_at=int(time.time()), duration_s=round(time.time() - t0, 3),
+                         db_bytes=os.path.getsize(path) if os.path.exists(path) else 0)
+    return "incremental"
 
 
-async def init_db():
+async def init_db(path: str = DB_PATH):
     # Ensure DB directory exists (e.g., BASE_DIR/data)
     try:
-        Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
     except Exception:
         # As a fallback, try os.makedirs
         try:
-            os.makedirs(Path(DB_PATH).parent, exist_ok=True)
-        except Exception:
-            pass
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.executescript(SCHEMA_SQL)
-        # indexes for time-range queries
-        try:
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_cpu_data_ts ON cpu_data(ts)")
-        except Exception:
-            pass
-        try:
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_net_data_iface_ts ON net_data(iface, ts)")
-        except Exception:
-            pass
-        # date indexes for quick daily filtering
-        for t in ("cpu_data","mem_data","load_data","proc_data","diskio_data","gpu_data","net_data"):
-            try:
-                await db.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_date ON {t}(date)")
-            except Exception:
-                pass
-        # additional indexes per table
-        for t in ("mem_data","load_data","proc_data","diskio_data","gpu_data"):
-            try:
-                await db.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_ts ON {t}(ts)")
-            except Exception:
-                pass
-        # keep backward-compat columns if old table exists
-        try:
-            await ensure_column(db, "metric_samples", "mem_percent", "REAL")
-            await ensure_column(db, "metric_samples", "disk_mb_s", "REAL")
-            await ensure_column(db, "metric_samples", "gpu_util_avg", "REAL")
-            await ensure_column(db, "metric_samples", "gpu_temp_avg", "REAL")
+            os.makedirs(Path(path).parent, exist_ok=True)
         except Exception:
             pass
+    from .migrations import apply_migrations
+    async with aiosqlite.connect(path) as db:
+        await apply_migrations(db)
         # bootstrap admin user
         async with db.execute("SELECT COUNT(1) FROM users") as cur:
             row = await cur.fetchone()
@@ -209,3 +266,123 @@ async def init_db():
                 ("admin", hash_password("admin123"))
             )
         await db.commit()
+        await ensure_incremental_vacuum(db, path)
+
+
+# ---------------- connection pool ----------------
+# WAL 模式下读写互不阻塞：一个写连接（asyncio.Lock 串行化），N 个读连接轮流借用。
+DB_READERS = int(os.environ.get("DB_READERS", "4"))
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_KB = int(os.environ.get("DB_CACHE_KB", "16384"))
+DB_CACHED_STATEMENTS = int(os.environ.get("DB_CACHED_STATEMENTS", "256"))
+
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA mmap_size={DB_MMAP_SIZE}",
+    f"PRAGMA cache_size=-{DB_CACHE_KB}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+class DBPool:
+    """长连接池：写连接 1 个、读连接最多 size 个，按需懒创建。
+    连接绑定在创建它的事件循环上，循环变化（如测试中多次启动应用）时整体重建。
+    """
+
+    def __init__(self, path: str, size: int = DB_READERS):
+        self.path = path
+        self.size = max(1, size)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wlock: Optional[asyncio.Lock] = None
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._opened: List[aiosqlite.Connection] = []
+        self._nreaders = 0
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._wlock = asyncio.Lock()
+        self._idle = asyncio.Queue()
+        self._writer = None
+        self._opened = []
+        self._nreaders = 0
+
+    async def _open(self, readonly: bool) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.path, cached_statements=DB_CACHED_STATEMENTS)
+        for p in _PRAGMAS:
+            await db.execute(p)
+        if readonly:
+            await db.execute("PRAGMA query_only=1")
+        self._opened.append(db)
+        return db
+
+    @asynccontextmanager
+    async def write(self):
+        """独占写连接；正常退出时提交未提交的事务，异常时回滚。"""
+        self._bind()
+        async with self._wlock:
+            if self._writer is None:
+                self._writer = await self._open(False)
+            db = self._writer
+            try:
+                yield db
+                if db.in_transaction:
+                    await db.commit()
+            except BaseException:
+                if db.in_transaction:
+                    await db.rollback()
+                raise
+            finally:
+                db.row_factory = None
+
+    @asynccontextmanager
+    async def read(self):
+        """借出一个只读连接，用完归还。"""
+        self._bind()
+        idle = self._idle
+        if idle.empty() and self._nreaders < self.size:
+            self._nreaders += 1
+            try:
+                db = await self._open(True)
+            except BaseException:
+                self._nreaders -= 1
+                raise
+        else:
+            db = await idle.get()
+        try:
+            yield db
+        finally:
+            db.row_factory = None
+            # 失败的语句可能留下隐式事务，会阻止后续 ATTACH/DETACH
+            if db.in_transaction:
+                try:
+                    await db.rollback()
+                except Exception:
+                    pass
+            idle.put_nowait(db)
+
+    async def close(self) -> None:
+        if self._loop is not asyncio.get_running_loop():
+            return
+        for db in self._opened:
+            try:
+                await db.close()
+            except Exception:
+                pass
+        self._loop = None
+
+
+db_pool = DBPool(DB_PATH)
+
+
+def db_read():
+    return db_pool.read()
+
+
+def db_write():
+    return db_pool.write()
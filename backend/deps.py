@@ -1,5 +1,6 @@
 from typing import Optional
 from fastapi import Request, HTTPException
+from .db import db_read
 
 
 def require_user(request: Request) -> dict:
@@ -18,3 +19,8 @@ def require_admin():
         raise HTTPException(status_code=403, detail="需要管理员权限")
     return dep
 
+
+async def get_db():
+    """只读数据库连接（连接池借出），请求结束后归还。写操作请使用 db.db_write()。"""
+    async with db_read() as db:
+        yield db
@@ -1,9 +1,10 @@
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import RedirectResponse
-import aiosqlite
-from .config import DB_PATH, APP_SECRET
+from starlette.responses import JSONResponse, RedirectResponse
+from .config import APP_SECRET
+from .db import db_read
 from .crypto import verify_token
+from .replication import is_standby
 
 
 class AuthMiddleware(BaseHTTPMiddleware):
@@ -17,7 +18,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
         if token:
             ok, payload, _ = verify_token(token, APP_SECRET)
             if ok:
-                async with aiosqlite.connect(DB_PATH) as db:
+                async with db_read() as db:
                     row = await (await db.execute(
                         "SELECT token_version, is_admin FROM users WHERE id=?",
                         (payload.get("uid", -1),)
@@ -34,5 +35,8 @@ class AuthMiddleware(BaseHTTPMiddleware):
         }
         if request.url.path in protected and request.state.user is None:
             return RedirectResponse(url="/login", status_code=302)
+        # 备机只读：除登录/登出外拒绝修改类请求（数据以主机为准）
+        if is_standby() and request.method not in ("GET", "HEAD", "OPTIONS") and request.url.path not in ("/api/login", "/api/logout"):
+            return JSONResponse({"detail": "standby is read-only"}, status_code=403)
         return await call_next(request)
 
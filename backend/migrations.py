@@ -0,0 +1,422 @@
+"""
+编号迁移：schema_version 记录已应用的版本，init_db 只执行尚未应用的迁移，失败直接抛出（不再静默忽略）。
+
+- 结构变更写成新的 (版本号, 名称, 函数) 追加到 MIGRATIONS 末尾，已发布的迁移不再修改；
+  除基线外，每个迁移连同版本记录在同一个 BEGIN IMMEDIATE 事务中提交。
+- 大数据量的搬迁不在启动时执行：迁移函数只调用 enqueue() 登记一个 ChunkedMigration，
+  由 migration_worker 在后台按整数键（ts、rowid 或日序号）区间分批复制，每批一个短写事务，采样照常写入；
+  全部复制完后在写锁内的单个事务里补齐尾部并调用 finish() 切换读路径。
+"""
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import shards
+from .db import SCHEMA_SQL, db_read, db_write
+from .crud.net import upsert_ifaces
+
+
+log = logging.getLogger(__name__)
+
+
+MIGRATION_BATCH = int(os.environ.get("MIGRATION_BATCH", "20000"))
+MIGRATION_PAUSE = float(os.environ.get("MIGRATION_PAUSE", "0.05"))
+
+_META_SQL = '''
+CREATE TABLE IF NOT EXISTS schema_version (
+  version INTEGER PRIMARY KEY,
+  name TEXT NOT NULL,
+  applied_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS migration_jobs (
+  name TEXT PRIMARY KEY,
+  state TEXT NOT NULL DEFAULT 'pending',   -- pending / running / done / failed
+  cursor INTEGER,                          -- 下一批的起点（含）
+  hi INTEGER,                              -- 登记时的最大键；之后新增的行在收尾事务中补齐
+  rows INTEGER NOT NULL DEFAULT 0,
+  created_at INTEGER NOT NULL,
+  finished_at INTEGER
+);
+'''
+
+
+class ChunkedMigration:
+    """后台分批迁移。bounds(db) 返回源数据的 (最小键, 最大键) 或 None；copy(db, lo, hi) 复制 lo <= 键 < hi
+    （hi 为 None 表示不设上限）并返回行数；finish(db) 在收尾事务中切换读路径（如删旧表、建同名视图）。"""
+
+    def __init__(self, name: str, bounds: Callable[[Any], Awaitable[Optional[Tuple[int, int]]]],
+                 copy: Callable[[Any, int, Optional[int]], Awaitable[int]], finish: Callable[[Any], Awaitable[None]],
+                 step: int = MIGRATION_BATCH):
+        self.name = name
+        self.bounds = bounds
+        self.copy = copy
+        self.finish = finish
+        self.step = step
+
+
+BACKGROUND: Dict[str, ChunkedMigration] = {}
+
+
+async def enqueue(db, name: str) -> None:
+    """在迁移事务中登记后台任务（重复登记无影响）。"""
+    if name not in BACKGROUND:
+        raise KeyError(f"unknown background migration: {name}")
+    await db.execute("INSERT OR IGNORE INTO migration_jobs(name, created_at) VALUES(?,?)", (name, int(time.time())))
+
+
+async def _kinds(db, names) -> Dict[str, str]:
+    names = list(names)
+    rows = await (await db.execute(
+        f"SELECT name, type FROM sqlite_master WHERE name IN ({','.join('?' * len(names))})", names
+    )).fetchall()
+    return {r[0]: r[1] for r in rows}
+
+
+# ---------------- 旧的六张分表 -> system_samples ----------------
+# 迁移后以同名视图保留兼容（id=ts，date/created_at 由 ts 推导）
+LEGACY_SAMPLE_TABLES = {
+    "cpu_data": ("cpu_percent",),
+    "load_data": ("load1", "load5", "load15"),
+    "mem_data": ("mem_used", "mem_total", "mem_percent"),
+    "proc_data": ("processes",),
+    "diskio_data": ("disk_mb_s",),
+    "gpu_data": ("gpu_util_avg", "gpu_temp_avg"),
+}
+
+
+async def _legacy_view(db, table: str, cols) -> None:
+    await db.execute(
+        f"CREATE VIEW IF NOT EXISTS {table} AS SELECT ts AS id, ts, strftime('%Y-%m-%d', ts, 'unixepoch') AS date, "
+        f"{', '.join(cols)}, datetime(ts, 'unixepoch') AS created_at FROM system_samples "
+        f"WHERE {' OR '.join(c + ' IS NOT NULL' for c in cols)}"
+    )
+
+
+def _legacy_job(table: str, cols) -> ChunkedMigration:
+    """旧分表没有 ts 索引，按 rowid 分批。"""
+    sets = ",".join(f"{c}=excluded.{c}" for c in cols)
+
+    async def bounds(db):
+        row = await (await db.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table}")).fetchone()
+        return (row[0], row[1]) if row and row[0] is not None else None
+
+    async def copy(db, lo, hi):
+        cur = await db.execute(
+            f"INSERT INTO system_samples(ts,{','.join(cols)}) SELECT ts,{','.join(cols)} FROM {table} "
+            f"WHERE rowid >= ? AND rowid < ? ON CONFLICT(ts) DO UPDATE SET {sets}",
+            (lo, hi if hi is not None else 1 << 62),
+        )
+        return cur.rowcount or 0
+
+    async def finish(db):
+        await db.execute(f"DROP TABLE {table}")
+        await _legacy_view(db, table, cols)
+
+    return ChunkedMigration(f"legacy_samples:{table}", bounds, copy, finish)
+
+
+for _t, _c in LEGACY_SAMPLE_TABLES.items():
+    BACKGROUND[f"legacy_samples:{_t}"] = _legacy_job(_t, _c)
+
+
+# ---------------- net_data 按名称 -> 按 iface_id ----------------
+_NET_VALUES = shards.VALUE_COLS["net_data"]
+
+
+async def _net_bounds(db):
+    row = await (await db.execute("SELECT MIN(rowid), MAX(rowid) FROM net_data")).fetchone()
+    return (row[0], row[1]) if row and row[0] is not None else None
+
+
+async def _net_copy(db, lo, hi):
+    args = (lo, hi if hi is not None else 1 << 62)
+    spans = await (await db.execute(
+        "SELECT iface, MIN(ts), MAX(ts) FROM net_data WHERE rowid >= ? AND rowid < ? AND iface IS NOT NULL GROUP BY iface", args
+    )).fetchall()
+    if spans:
+        await upsert_ifaces(db, {r[0]: (r[1], r[2]) for r in spans})
+    cur = await db.execute(
+        f"INSERT OR REPLACE INTO net_data_v2(iface_id,ts,{','.join(_NET_VALUES)}) SELECT f.id,d.ts,{','.join('d.' + c for c in _NET_VALUES)} "
+        "FROM net_data d JOIN net_iface f ON f.name = d.iface WHERE d.rowid >= ? AND d.rowid < ?",
+        args,
+    )
+    return cur.rowcount or 0
+
+
+async def _net_finish(db):
+    await db.execute("DROP TABLE net_data")
+    await db.execute("ALTER TABLE net_data_v2 RENAME TO net_data")
+
+
+BACKGROUND["net_data:iface_id"] = ChunkedMigration("net_data:iface_id", _net_bounds, _net_copy, _net_finish)
+
+
+async def _shard_bounds(db):
+    days = [shards.day_start(d) // shards.DAY for d in shards.list_days()]
+    return (min(days), max(days)) if days else None
+
+
+async def _shard_copy(db, lo, hi):
+    """升级前的分片（行存按名称、冷块以名称为 key）中出现过的网卡登记到 net_iface，每批一天。
+    登记之后新写入的网卡由写入方自己登记，收尾时（hi=None）无需再扫。"""
+    if hi is None:
+        return 0
+    spans: Dict[str, Tuple[int, int]] = {}
+    cat = shards.catalog()
+    for day in sorted(cat):
+        if not lo <= shards.day_start(day) // shards.DAY < hi:
+            continue
+        files = {shards.alias_of(day): shards.shard_path(day)} if cat[day]["hot"] else {}
+        if cat[day]["cold"]:
+            files[shards.alias_of(day, True)] = shards.cold_path(day)
+        await shards._attach(db, files)
+        try:
+            for alias, path in files.items():
+                if alias.startswith("c_"):
+                    sql = f"SELECT key, MIN(ts), MAX(t_last) FROM {alias}.cold_blocks WHERE tbl='net_data' GROUP BY key"
+                elif "iface" in (await shards._cols(db, alias, path)).get("net_data", ()):
+                    sql = f"SELECT iface, MIN(ts), MAX(ts) FROM {alias}.net_data GROUP BY iface"
+                else:
+                    continue
+                for name, first, last in await (await db.execute(sql)).fetchall():
+                    if name is not None:
+                        a, b = spans.get(name, (first, last))
+                        spans[name] = (min(a, first), max(b, last))
+        finally:
+            await shards.detach(db, files)
+    if spans:
+        await upsert_ifaces(db, spans)
+    return len(spans)
+
+
+async def _noop(db):
+    pass
+
+
+BACKGROUND["net_iface:shards"] = ChunkedMigration("net_iface:shards", _shard_bounds, _shard_copy, _noop, step=1)
+
+
+# ---------------- 编号迁移 ----------------
+
+async def _m001_baseline(db):
+    # 全部为 IF NOT EXISTS，可在任何旧库上重放；含 PRAGMA，不能放进事务
+    await db.executescript(SCHEMA_SQL)
+
+
+async def _m002_raw_indexes(db):
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_net_data_iface_ts ON net_data(iface, ts)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_net_data_date ON net_data(date)")
+    # ts-only indexes used by the rollup worker's and retention's range scans
+    for t in ("net_data", "gpu_detailed_data", "gpu_process_data", "cgroup_data", "numa_data"):
+        await db.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_ts ON {t}(ts)")
+
+
+async def _m003_metric_samples_columns(db):
+    """旧版 metric_samples 补列（表不存在则跳过）。"""
+    cols = [r[1] for r in await (await db.execute("PRAGMA table_info(metric_samples)")).fetchall()]
+    if not cols:
+        return
+    for col in ("mem_percent", "disk_mb_s", "gpu_util_avg", "gpu_temp_avg"):
+        if col not in cols:
+            await db.execute(f"ALTER TABLE metric_samples ADD COLUMN {col} REAL")
+
+
+async def _m004_legacy_samples(db):
+    kinds = await _kinds(db, LEGACY_SAMPLE_TABLES)
+    for table, cols in LEGACY_SAMPLE_TABLES.items():
+        if kinds.get(table) == "table":
+            await enqueue(db, f"legacy_samples:{table}")
+        elif kinds.get(table) is None:
+            await _legacy_view(db, table, cols)
+
+
+async def _m005_net_iface(db):
+    await db.execute(
+        "CREATE TABLE IF NOT EXISTS net_iface (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, "
+        "first_seen INTEGER NOT NULL, last_seen INTEGER NOT NULL, is_virtual INTEGER NOT NULL DEFAULT 0)"
+    )
+    cols = [r[1] for r in await (await db.execute("PRAGMA table_info(net_data)")).fetchall()]
+    if "iface" in cols:
+        if await (await db.execute("SELECT 1 FROM net_data LIMIT 1")).fetchone():
+            # 旧行按 rowid 分批转入 net_data_v2，收尾时改名替换
+            target = "net_data_v2"
+            await enqueue(db, "net_data:iface_id")
+        else:
+            await db.execute("DROP TABLE net_data")
+            target = "net_data"
+        for stmt in shards.NET_DATA_SQL.format(name=target).split(";"):
+            if stmt.strip():
+                await db.execute(stmt)
+    if shards.list_days():
+        await enqueue(db, "net_iface:shards")
+
+
+async def _m006_segment_log(db):
+    await db.execute(
+        "CREATE TABLE IF NOT EXISTS segment_log (name TEXT PRIMARY KEY, first_ts INTEGER NOT NULL, last_ts INTEGER NOT NULL, "
+        "records INTEGER NOT NULL, compacted_at INTEGER NOT NULL)"
+    )
+
+
+async def _m007_repl_log(db):
+    await db.execute(
+        "CREATE TABLE IF NOT EXISTS repl_log (seq INTEGER PRIMARY KEY AUTOINCREMENT, ts INTEGER NOT NULL, "
+        "kind TEXT NOT NULL, data TEXT NOT NULL)"
+    )
+    await db.execute("CREATE TABLE IF NOT EXISTS repl_state (key TEXT PRIMARY KEY, value INTEGER)")
+
+
+# 迁移 8 补的列（固定在这里，之后 COUNTER_COLUMNS 再变也不影响本迁移）
+_COUNTER_COLS = ("disk_read_bytes", "disk_write_bytes", "interrupts")
+
+
+async def _m008_sample_counters(db):
+    """system_samples 增加原始累计计数器列：主库旧表与已有的行存分片都补列（冷分片按列存块，无需改动）。"""
+    cols = [r[1] for r in await (await db.execute("PRAGMA table_info(system_samples)")).fetchall()]
+    for c in _COUNTER_COLS:
+        if cols and c not in cols:
+            await db.execute(f"ALTER TABLE system_samples ADD COLUMN {c} INTEGER")
+    for day, kinds in sorted(shards.catalog().items()):
+        if kinds["hot"]:
+            await asyncio.to_thread(_add_shard_columns, shards.shard_path(day))
+    shards.forget_layout()
+
+
+def _add_shard_columns(path) -> None:
+    conn = sqlite3.connect(str(path), timeout=5)
+    try:
+        cols = [r[1] for r in conn.execute("PRAGMA table_info(system_samples)")]
+        for c in _COUNTER_COLS:
+            if cols and c not in cols:
+                conn.execute(f"ALTER TABLE system_samples ADD COLUMN {c} INTEGER")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def _m009_job_errors(db):
+    """migration_jobs 记录后台任务最近一次失败的原因与时间（见 /api/admin/migrations）。"""
+    cols = [r[1] for r in await (await db.execute("PRAGMA table_info(migration_jobs)")).fetchall()]
+    for c, t in (("last_error", "TEXT"), ("failed_at", "INTEGER")):
+        if c not in cols:
+            await db.execute(f"ALTER TABLE migration_jobs ADD COLUMN {c} {t}")
+
+
+BASELINE = 1
+MIGRATIONS: List[Tuple[int, str, Callable[[Any], Awaitable[None]]]] = [
+    (1, "baseline schema", _m001_baseline),
+    (2, "raw table ts indexes", _m002_raw_indexes),
+    (3, "metric_samples legacy columns", _m003_metric_samples_columns),
+    (4, "legacy sample tables -> system_samples", _m004_legacy_samples),
+    (5, "net_iface dimension, net_data keyed by iface_id", _m005_net_iface),
+    (6, "segment_log for compacted high-frequency segments", _m006_segment_log),
+    (7, "repl_log change stream for standby replication", _m007_repl_log),
+    (8, "raw disk / interrupt counters in system_samples", _m008_sample_counters),
+    (9, "migration_jobs last_error / failed_at", _m009_job_errors),
+]
+
+
+async def current_version(db) -> int:
+    row = await (await db.execute("SELECT MAX(version) FROM schema_version")).fetchone()
+    return int(row[0] or 0) if row else 0
+
+
+async def apply_migrations(db) -> List[int]:
+    """按版本号顺序执行未应用的迁移，返回本次应用的版本列表。"""
+    await db.executescript(_META_SQL)
+    done = await current_version(db)
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        if version <= done:
+            continue
+        if version > BASELINE:
+            await db.execute("BEGIN IMMEDIATE")
+        try:
+            await fn(db)
+            await db.execute("INSERT INTO schema_version(version, name, applied_at) VALUES(?,?,?)", (version, name, int(time.time())))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise RuntimeError(f"schema migration {version} ({name}) failed: {e}") from e
+        applied.append(version)
+    return applied
+
+
+# ---------------- 后台分批任务 ----------------
+
+async def _run_job(name: str) -> None:
+    job = BACKGROUND[name]
+    async with db_read() as db:
+        row = await (await db.execute("SELECT cursor, hi, rows FROM migration_jobs WHERE name=?", (name,))).fetchone()
+    cursor, hi, rows = row
+    if cursor is None:
+        async with db_read() as db:
+            b = await job.bounds(db)
+        cursor, hi = b if b else (0, -1)
+        async with db_write() as db:
+            await db.execute("UPDATE migration_jobs SET state='running', cursor=?, hi=? WHERE name=?", (cursor, hi, name))
+            await db.commit()
+    while cursor <= hi:
+        nxt = cursor + job.step
+        async with db_write() as db:
+            rows += await job.copy(db, cursor, nxt)
+            await db.execute("UPDATE migration_jobs SET state='running', cursor=?, rows=? WHERE name=?", (nxt, rows, name))
+            await db.commit()
+        cursor = nxt
+        await asyncio.sleep(MIGRATION_PAUSE)
+    # 收尾：补齐登记后新写入的行并切换读路径，写锁内一个事务完成，读者只会看到切换前或切换后
+    async with db_write() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            rows += await job.copy(db, cursor, None)
+            await job.finish(db)
+            await db.execute(
+                "UPDATE migration_jobs SET state='done', rows=?, finished_at=?, last_error=NULL WHERE name=?",
+                (rows, int(time.time()), name),
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    shards.forget_layout()   # finish() 可能替换了表结构
+
+
+async def migration_worker():
+    """启动后执行登记的后台迁移；单个任务失败不影响其他任务，下次启动从已提交的位置继续。"""
+    async with db_read() as db:
+        names = [r[0] for r in await (await db.execute("SELECT name FROM migration_jobs WHERE state != 'done' ORDER BY created_at, name")).fetchall()]
+    for name in names:
+        if name not in BACKGROUND:
+            continue
+        try:
+            await _run_job(name)
+        except Exception as e:
+            # 记入 migration_jobs（/api/admin/migrations 可见）；已提交的批次保留，下次启动继续
+            log.warning("background migration %s failed: %s", name, e)
+            try:
+                async with db_write() as db:
+                    await db.execute(
+                        "UPDATE migration_jobs SET state='failed', last_error=?, failed_at=? WHERE name=?",
+                        (f"{type(e).__name__}: {e}"[:1000], int(time.time()), name),
+                    )
+                    await db.commit()
+            except Exception:
+                pass
+
+
+async def migration_status() -> Dict[str, Any]:
+    async with db_read() as db:
+        rows = await (await db.execute("SELECT version, name, applied_at FROM schema_version ORDER BY version")).fetchall()
+        jobs = await (await db.execute(
+            "SELECT name, state, cursor, hi, rows, created_at, finished_at, last_error, failed_at FROM migration_jobs ORDER BY created_at, name"
+        )).fetchall()
+    return {
+        "version": rows[-1][0] if rows else 0,
+        "latest": MIGRATIONS[-1][0],
+        "applied": [{"version": r[0], "name": r[1], "applied_at": r[2]} for r in rows],
+        "jobs": [dict(zip(("name", "state", "cursor", "hi", "rows", "created_at", "finished_at", "last_error", "failed_at"), r))
+                 for r in jobs],
+    }
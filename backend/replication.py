@@ -0,0 +1,283 @@
+"""
+主备复制：主机（REPL_ROLE=primary）把采样、告警、用户等写入按顺序记入 repl_log（与数据本身同一事务），
+备机（REPL_ROLE=standby）通过 HTTP 按 seq 分批拉取（gzip 压缩）并重放，备机可承担只读查询。
+
+- 日志项 (seq, kind, data)：sample / net 为一次采样（备机用同样的 crud 函数写入自己的分片），
+  row / del 为主库表的整行镜像或按主键删除，rows 为一批原始行；重放均为 INSERT OR REPLACE，可重复执行；
+- 备机的进度（已应用到的 seq）记在 repl_state，和重放的数据同一事务提交，断点续传；
+  首次启动若库是主机备份（/api/admin/backup）恢复的，从备份里 repl_log 的最大 seq 接着拉；
+- 主机按 REPL_KEEP_HOURS 截断日志；备机落后超过保留范围时报 gap，需要先用备份重新初始化；
+- 汇总（rollup）等派生数据由备机自己计算，不复制。
+"""
+import os
+import gzip
+import hmac
+import json
+import time
+import asyncio
+import urllib.request
+from typing import Any, Dict, List, Optional, Sequence
+from .db import db_read, db_write
+
+
+REPL_ROLE = os.environ.get("REPL_ROLE", "").lower()          # primary / standby，空为不复制
+REPL_TOKEN = os.environ.get("REPL_TOKEN", "")
+REPL_PRIMARY = os.environ.get("REPL_PRIMARY", "").rstrip("/")  # 备机用：主机地址，如 http://10.0.0.1:8000
+REPL_BATCH = int(os.environ.get("REPL_BATCH", "5000"))
+REPL_POLL = float(os.environ.get("REPL_POLL", "2"))
+REPL_KEEP_HOURS = float(os.environ.get("REPL_KEEP_HOURS", "48"))
+REPL_TIMEOUT = 30
+_TRIM_CHUNK = 20000
+# 分成两个子查询，各自走主键取首/尾
+_RANGE_SQL = "SELECT (SELECT max(seq) FROM repl_log), (SELECT min(seq) FROM repl_log)"
+
+# 允许以 row / del / rows 方式复制的主库表
+REPL_TABLES = frozenset({"alerts", "users", "proc_io_top", "cgroup_data", "numa_data"})
+
+# 备机状态（/api/admin/replication）
+status: Dict[str, Any] = {"role": REPL_ROLE or None}
+
+
+def is_primary() -> bool:
+    return REPL_ROLE == "primary"
+
+
+def is_standby() -> bool:
+    return REPL_ROLE == "standby"
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+# ---------------- 主机：记录 ----------------
+
+async def log_change(db, kind: str, data: Any) -> None:
+    """在调用方的写事务中追加一条日志（非主机时不记录）。"""
+    if REPL_ROLE != "primary":
+        return
+    await db.execute("INSERT INTO repl_log(ts, kind, data) VALUES(?,?,?)", (int(time.time()), kind, _dumps(data)))
+
+
+async def log_row(db, table: str, row_id: Optional[int]) -> None:
+    """记录主库表中一行（按 id）的当前内容；行已不存在时记为删除。"""
+    if REPL_ROLE != "primary" or row_id is None:
+        return
+    cur = await db.execute(f"SELECT * FROM {table} WHERE id=?", (row_id,))
+    row = await cur.fetchone()
+    if row is None:
+        await log_change(db, "del", {"t": table, "k": {"id": row_id}})
+    else:
+        await log_change(db, "row", {"t": table, "r": dict(zip([d[0] for d in cur.description], row))})
+
+
+async def log_rows(db, table: str, cols: Sequence[str], rows: Sequence[tuple]) -> None:
+    if REPL_ROLE != "primary" or not rows:
+        return
+    await log_change(db, "rows", {"t": table, "c": list(cols), "v": [list(r) for r in rows]})
+
+
+async def read_changes(after: int, limit: int) -> bytes:
+    """seq > after 的至多 limit 条日志，拼成 JSON（data 已是 JSON 文本，不再解析）。"""
+    async with db_read() as db:
+        rows = await (await db.execute(
+            "SELECT seq, kind, data FROM repl_log WHERE seq > ? ORDER BY seq LIMIT ?", (int(after), int(limit))
+        )).fetchall()
+        head, oldest = await (await db.execute(_RANGE_SQL)).fetchone()
+    items = ",".join(f'[{s},"{k}",{d}]' for s, k, d in rows)
+    return f'{{"head":{head or 0},"oldest":{oldest or 0},"changes":[{items}]}}'.encode()
+
+
+def check_token(token: Optional[str]) -> bool:
+    return bool(REPL_TOKEN) and hmac.compare_digest((token or "").encode(), REPL_TOKEN.encode())
+
+
+async def trim_log(now: Optional[int] = None) -> int:
+    """按 seq 分块删除早于 REPL_KEEP_HOURS 的日志（seq 与 ts 同序），返回删除条数。"""
+    cutoff = int((now or time.time()) - REPL_KEEP_HOURS * 3600)
+    total = 0
+    while True:
+        async with db_write() as db:
+            lo = (await (await db.execute("SELECT min(seq) FROM repl_log")).fetchone())[0]
+            if lo is None:
+                return total
+            keep = await (await db.execute(
+                "SELECT seq FROM repl_log WHERE seq >= ? AND seq < ? AND ts >= ? ORDER BY seq LIMIT 1",
+                (lo, lo + _TRIM_CHUNK, cutoff),
+            )).fetchone()
+            cur = await db.execute("DELETE FROM repl_log WHERE seq < ?", (keep[0] if keep else lo + _TRIM_CHUNK,))
+            await db.commit()
+        total += cur.rowcount or 0
+        if keep:
+            return total
+        await asyncio.sleep(0.05)
+
+
+# ---------------- 备机：拉取与重放 ----------------
+
+def _fetch(after: int) -> Dict[str, Any]:
+    req = urllib.request.Request(
+        f"{REPL_PRIMARY}/api/repl/changes?after={after}&limit={REPL_BATCH}",
+        headers={"X-Repl-Token": REPL_TOKEN, "Accept-Encoding": "gzip"},
+    )
+    with urllib.request.urlopen(req, timeout=REPL_TIMEOUT) as resp:
+        body = resp.read()
+        if resp.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+    return json.loads(body)
+
+
+def _day_key(kind: str, data: Dict[str, Any]) -> Optional[str]:
+    from . import shards
+    return shards.day_of(data["ts"]) if kind in ("sample", "net") else None
+
+
+_local_cols: Dict[str, frozenset] = {}
+
+
+async def _table_cols(db, table: str) -> frozenset:
+    """本地表的列名（PRAGMA table_info，按表缓存）；远端日志中的列名须在其中才会拼进 SQL。"""
+    if table not in _local_cols:
+        rows = await (await db.execute(f"PRAGMA table_info({table})")).fetchall()
+        _local_cols[table] = frozenset(r[1] for r in rows)
+    return _local_cols[table]
+
+
+async def _apply_one(db, kind: str, data: Dict[str, Any]) -> None:
+    from .crud.samples import insert_sample
+    from .crud.net import insert_net
+    if kind == "sample":
+        await insert_sample(db, data["ts"], data["v"])
+    elif kind == "net":
+        await insert_net(db, data["ts"], data["i"], latency_ms=data.get("l"), primary=data.get("p"))
+    elif data.get("t") not in REPL_TABLES:
+        return
+    elif kind == "row":
+        # 本地没有的列（主机版本较新）丢弃
+        local = await _table_cols(db, data["t"])
+        cols = [c for c in data["r"] if c in local]
+        if not cols:
+            return
+        await db.execute(
+            f"INSERT OR REPLACE INTO {data['t']}({','.join(cols)}) VALUES({','.join('?' * len(cols))})",
+            [data["r"][c] for c in cols],
+        )
+    elif kind == "del":
+        await db.execute(f"DELETE FROM {data['t']} WHERE id=?", (data["k"]["id"],))
+    elif kind == "rows":
+        local = await _table_cols(db, data["t"])
+        keep = [i for i, c in enumerate(data["c"]) if c in local]
+        if not keep:
+            return
+        cols = [data["c"][i] for i in keep]
+        rows = data["v"] if len(keep) == len(data["c"]) else [[r[i] for i in keep] for r in data["v"]]
+        await db.executemany(
+            f"INSERT OR REPLACE INTO {data['t']}({','.join(cols)}) VALUES({','.join('?' * len(cols))})", rows
+        )
+
+
+async def apply_changes(changes: List[list]) -> int:
+    """按顺序重放一批日志并推进 repl_state.applied；分片写入需在事务外 ATTACH，跨天时分段提交。"""
+    from . import shards
+    i, n = 0, len(changes)
+    while i < n:
+        # 本段：同一天的采样（或不涉及分片的行）连续的一段
+        day = None
+        j = i
+        while j < n:
+            d = _day_key(changes[j][1], changes[j][2])
+            if d is not None:
+                if day is not None and d != day:
+                    break
+                day = d
+            j += 1
+        async with db_write() as db:
+            if day is not None:
+                for table in ("system_samples", "net_data"):
+                    await shards.writable(db, table, shards.day_start(day))
+            try:
+                for seq, kind, data in changes[i:j]:
+                    await _apply_one(db, kind, data)
+                await db.execute(
+                    "INSERT OR REPLACE INTO repl_state(key, value) VALUES('applied', ?)", (changes[j - 1][0],)
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        i = j
+    return n
+
+
+async def _applied() -> int:
+    async with db_read() as db:
+        row = await (await db.execute("SELECT value FROM repl_state WHERE key='applied'")).fetchone()
+        if row:
+            return int(row[0])
+        # 由主机备份恢复的库：从备份时刻的日志位置接着拉
+        row = await (await db.execute("SELECT max(seq) FROM repl_log")).fetchone()
+        return int(row[0] or 0)
+
+
+async def _standby_loop() -> None:
+    after = await _applied()
+    status.update(applied=after, primary=REPL_PRIMARY)
+    pending = asyncio.ensure_future(asyncio.to_thread(_fetch, after))
+    while True:
+        try:
+            batch = await pending
+        except Exception as e:
+            status.update(error=str(e), error_at=int(time.time()))
+            await asyncio.sleep(REPL_POLL)
+            pending = asyncio.ensure_future(asyncio.to_thread(_fetch, after))
+            continue
+        changes = batch.get("changes") or []
+        if batch.get("oldest") and after + 1 < batch["oldest"]:
+            status.update(state="gap", error=f"主机日志已截断到 seq {batch['oldest']}，需用备份重新初始化备机")
+            await asyncio.sleep(max(REPL_POLL, 30))
+            pending = asyncio.ensure_future(asyncio.to_thread(_fetch, after))
+            continue
+        if changes:
+            # 追赶时边重放当前批边拉下一批
+            nxt = changes[-1][0]
+            pending = asyncio.ensure_future(asyncio.to_thread(_fetch, nxt))
+            t0 = time.perf_counter()
+            await apply_changes(changes)
+            dt = time.perf_counter() - t0
+            after = nxt
+            status.update(state="catching_up" if after < batch["head"] else "streaming", applied=after, head=batch["head"],
+                          lag=batch["head"] - after, last_batch=len(changes),
+                          apply_rate=round(len(changes) / dt) if dt > 0 else None, applied_at=int(time.time()), error=None)
+        else:
+            status.update(state="streaming", head=batch["head"], lag=max(0, batch["head"] - after), error=None)
+            await asyncio.sleep(REPL_POLL)
+            pending = asyncio.ensure_future(asyncio.to_thread(_fetch, after))
+
+
+async def replication_worker():
+    """主机：定期截断过期日志；备机：持续拉取并重放。"""
+    if is_standby():
+        if not REPL_PRIMARY or not REPL_TOKEN:
+            status.update(state="disabled", error="REPL_PRIMARY / REPL_TOKEN 未配置")
+            return
+        while True:
+            try:
+                await _standby_loop()
+            except Exception as e:
+                status.update(state="error", error=str(e), error_at=int(time.time()))
+                await asyncio.sleep(max(REPL_POLL, 5))
+    elif is_primary():
+        while True:
+            try:
+                status["trimmed"] = status.get("trimmed", 0) + await trim_log()
+            except Exception:
+                pass
+            await asyncio.sleep(600)
+
+
+async def replication_status() -> Dict[str, Any]:
+    out = dict(status)
+    async with db_read() as db:
+        head, oldest = await (await db.execute(_RANGE_SQL)).fetchone()
+    out.update(log_head=head, log_oldest=oldest)
+    return out
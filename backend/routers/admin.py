@@ -0,0 +1,171 @@
+import io
+import gzip
+import asyncio
+import tempfile
+from typing import Optional
+import time
+from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from ..deps import require_admin
+from ..utils.audit import audit_log
+from ..db import db_read, vacuum_status
+from ..utils.retention import retention_stats, run_retention, policy, budget_stats, storage_usage, tier_history, storage_series, convert_auto_vacuum
+from ..utils.rollup import resolve, fetch_rows
+from ..utils.importer import FORMATS, import_file
+from ..utils.seglog import segment_stats
+from ..utils.hotring import hot
+from ..utils.backup import backup_status, stream_backup
+from ..migrations import migration_status
+
+
+router = APIRouter()
+_import_lock = asyncio.Lock()
+_backup_lock = asyncio.Lock()
+_vacuum_task: Optional[asyncio.Task] = None
+
+
+@router.get("/api/admin/retention")
+async def api_admin_retention(user: dict = Depends(require_admin())):
+    """分层保留策略与最近一轮执行情况（各表删除行数、积压秒数、空闲页/库文件大小）。"""
+    return {"policy": policy(), "stats": retention_stats}
+
+
+@router.post("/api/admin/retention/run")
+async def api_admin_retention_run(request: Request, user: dict = Depends(require_admin())):
+    stats = await run_retention()
+    await audit_log(user["username"], "retention_run", f"deleted={sum(t.get('deleted', 0) for t in stats['tables'].values())}", request)
+    return {"policy": policy(), "stats": stats}
+
+
+@router.get("/api/admin/vacuum")
+async def api_admin_vacuum(user: dict = Depends(require_admin())):
+    """旧库切换 auto_vacuum=INCREMENTAL 的状态（启动时库过大会跳过，记为 skipped 及原因）。"""
+    return vacuum_status
+
+
+@router.post("/api/admin/vacuum/convert")
+async def api_admin_vacuum_convert(request: Request, user: dict = Depends(require_admin())):
+    """后台执行一次完整 VACUUM 完成切换（耗时与库大小成正比，期间写入排队），立即返回；进度见 GET /api/admin/vacuum。"""
+    global _vacuum_task
+    if vacuum_status.get("state") == "incremental":
+        return vacuum_status
+    if _vacuum_task is not None and not _vacuum_task.done():
+        raise HTTPException(status_code=409, detail="conversion already running")
+    await audit_log(user["username"], "vacuum_convert", f"db_bytes={vacuum_status.get('db_bytes')}", request)
+    _vacuum_task = asyncio.create_task(convert_auto_vacuum())
+    _vacuum_task.add_done_callback(lambda t: t.cancelled() or t.exception())   # 失败已记入 vacuum_status
+    return {**vacuum_status, "state": "running"}
+
+
+@router.get("/api/admin/storage")
+async def api_admin_storage(user: dict = Depends(require_admin())):
+    """存储预算：当前各部分占用、各层保存的历史天数，以及最近一次超预算清理的动作。"""
+    return {**budget_stats, "usage": await asyncio.to_thread(storage_usage), "tiers": await tier_history()}
+
+
+@router.get("/api/admin/storage/history")
+async def api_admin_storage_history(start: int | None = None, end: int | None = None, points: int | None = None,
+                                    resolution: str | None = None, user: dict = Depends(require_admin())):
+    """各层保存的历史天数随时间的变化（"storage:<层>" 汇总序列，默认最近 7 天），用于观察预算清理的效果。"""
+    e = int(end or time.time())
+    s = int(start or (e - 7 * 86400))
+    res, _ = resolve(s, e, points, resolution)
+    if res == "raw":
+        res = "1m"          # 这些序列只写在 rollup 表里
+    series = storage_series()
+    async with db_read() as db:
+        rows = await fetch_rows(db, series, s, e, res)
+    return {"resolution": res, "series": series, "rows": rows}
+
+
+@router.get("/api/admin/migrations")
+async def api_admin_migrations(user: dict = Depends(require_admin())):
+    """结构版本（已应用的编号迁移）与后台分批迁移进度。"""
+    return await migration_status()
+
+
+@router.get("/api/admin/segments")
+async def api_admin_segments(user: dict = Depends(require_admin())):
+    """高频采样段日志：各段条数、是否封口、时间范围与文件大小。"""
+    return await asyncio.to_thread(segment_stats)
+
+
+@router.get("/api/admin/hot")
+async def api_admin_hot(user: dict = Depends(require_admin())):
+    """内存热层：各环的容量、已用条数、覆盖时间范围、固定占用字节数与命中次数。"""
+    return hot.stats()
+
+
+@router.post("/api/admin/import")
+async def api_admin_import(request: Request, format: Optional[str] = None, iface: Optional[str] = None,
+                           user: dict = Depends(require_admin())):
+    """批量导入历史指标：请求体为 CSV / NDJSON / JSON 文件内容（可 gzip 压缩，格式默认按内容判断），同一时间只允许一个导入任务。"""
+    if format is not None and format not in FORMATS:
+        raise HTTPException(status_code=400, detail="unknown format")
+    if _import_lock.locked():
+        raise HTTPException(status_code=409, detail="import already running")
+    async with _import_lock:
+        # 请求体先落到临时文件（超过 8 MiB 写盘），再流式解析
+        with tempfile.SpooledTemporaryFile(max_size=8 << 20) as raw:
+            async for chunk in request.stream():
+                raw.write(chunk)
+            raw.seek(0)
+            gz = raw.read(2) == b"\x1f\x8b"     # 导出时 gzip=1 的文件
+            raw.seek(0)
+            fp = io.TextIOWrapper(gzip.GzipFile(fileobj=raw) if gz else raw, encoding="utf-8-sig", newline="")
+            try:
+                stats = await import_file(fp, format, iface)
+            except (ValueError, KeyError) as e:
+                raise HTTPException(status_code=400, detail=f"import failed: {e}")
+            finally:
+                fp.detach()
+    await audit_log(user["username"], "metrics_import", f"rows={stats['rows']} skipped={stats['skipped']}", request)
+    return stats
+
+
+class _LockedStream(StreamingResponse):
+    """持有 lock 的流式响应：__call__ 结束时先关闭数据源（停止备份线程）再释放锁。
+    客户端在首块之前断开（Starlette 取消发送任务）或发送响应头失败时生成器根本不会开始，
+    不能只靠生成器的 finally 释放。"""
+
+    def __init__(self, lock: asyncio.Lock, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = lock
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                if self._lock is not None:
+                    self._lock, lock = None, self._lock
+                    lock.release()
+
+
+@router.get("/api/admin/backup")
+async def api_admin_backup(request: Request, rollups_only: bool = False, shards: bool = True, plain: bool = False,
+                           user: dict = Depends(require_admin())):
+    """在线备份并直接下载：默认 tar.gz（主库 + 分片），plain=1 时为未压缩的主库文件；同一时间只允许一个备份。"""
+    # 返回响应前就占住锁，并发的第二个请求直接 409；锁由响应对象在发送结束（含断开、发送失败）时释放
+    # （锁空闲时 acquire() 不让出事件循环，检查与占用之间不会插入其他请求）
+    if _backup_lock.locked():
+        raise HTTPException(status_code=409, detail="backup already running")
+    await _backup_lock.acquire()
+    try:
+        await audit_log(user["username"], "backup", f"rollups_only={int(rollups_only)} shards={int(shards)} plain={int(plain)}", request)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = f"app-{stamp}.db" if plain else f"backup-{stamp}{'-rollups' if rollups_only else ''}.tar.gz"
+        return _LockedStream(_backup_lock, stream_backup(rollups_only=rollups_only, with_shards=shards, plain=plain),
+                             media_type="application/octet-stream" if plain else "application/gzip",
+                             headers={"Content-Disposition": f'attachment; filename="{name}"'})
+    except BaseException:
+        _backup_lock.release()
+        raise
+
+
+@router.get("/api/admin/backup/status")
+async def api_admin_backup_status(user: dict = Depends(require_admin())):
+    """当前或最近一次备份的进度（文件数、当前文件的页进度、已输出字节数）。"""
+    return backup_status
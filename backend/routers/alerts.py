@@ -1,10 +1,10 @@
 from typing import Optional
 import sqlite3
-import aiosqlite
 from fastapi import APIRouter, Depends, Request, HTTPException
 from fastapi.responses import HTMLResponse
 from ..deps import require_user, require_admin
-from ..config import DB_PATH
+from ..db import db_read, db_write
+from ..replication import log_row
 from ..web import render
 
 
@@ -23,7 +23,7 @@ async def api_alerts_list(limit: int = 100, page: int = 1, level: Optional[str]
     if ack is not None: where.append("acknowledged=?"); params.append(1 if ack else 0)
     where_sql = (" WHERE " + " AND ".join(where)) if where else ""
     offset = max(page-1,0)*limit
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_read() as db:
         db.row_factory = sqlite3.Row
         cur = await db.execute(f"SELECT * FROM alerts{where_sql} ORDER BY id DESC LIMIT ? OFFSET ?", (*params, limit, offset))
         rows = await cur.fetchall()
@@ -36,24 +36,27 @@ async def api_alerts_create(payload: dict, user: dict = Depends(require_admin())
     level = (payload or {}).get("level"); title = (payload or {}).get("title"); message = (payload or {}).get("message", "")
     if not level or not title:
         raise HTTPException(status_code=400, detail="缺少参数")
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("INSERT INTO alerts (level, title, message) VALUES (?,?,?)", (level, title, message))
+    async with db_write() as db:
+        cur = await db.execute("INSERT INTO alerts (level, title, message) VALUES (?,?,?)", (level, title, message))
+        await log_row(db, "alerts", cur.lastrowid)
         await db.commit()
     return {"ok": True}
 
 
 @router.post("/api/alerts/{aid}/ack")
 async def api_alerts_ack(aid: int, user: dict = Depends(require_admin())):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_write() as db:
         await db.execute("UPDATE alerts SET acknowledged=1 WHERE id=?", (aid,))
+        await log_row(db, "alerts", aid)
         await db.commit()
     return {"ok": True}
 
 
 @router.delete("/api/alerts/{aid}")
 async def api_alerts_delete(aid: int, user: dict = Depends(require_admin())):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_write() as db:
         await db.execute("DELETE FROM alerts WHERE id=?", (aid,))
+        await log_row(db, "alerts", aid)
         await db.commit()
     return {"ok": True}
 
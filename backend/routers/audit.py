@@ -1,10 +1,8 @@
 import sqlite3
-import aiosqlite
 from typing import Optional
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
-from ..deps import require_admin
-from ..config import DB_PATH
+from ..deps import require_admin, get_db
 from ..web import render
 
 
@@ -17,13 +15,13 @@ async def audit_page(request: Request):
 
 
 @router.get("/api/audit")
-async def api_audit(user_like: Optional[str] = None, user: dict = Depends(require_admin())):
+async def api_audit(user_like: Optional[str] = None, user: dict = Depends(require_admin()), db=Depends(get_db)):
     where, params = [], []
     if user_like:
-        where.append("username LIKE ?")
-        params.append(f"%{user_like}%")
+        # 子串匹配（输入中的 % _ 按字面匹配）；审计表不大，按 id 倒序扫描到 200 条即止
+        where.append("username LIKE ? ESCAPE '\\'")
+        params.append("%" + user_like.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
     where_sql = (" WHERE " + " AND ".join(where)) if where else ""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = sqlite3.Row
-        rows = await (await db.execute(f"SELECT * FROM audit_logs{where_sql} ORDER BY id DESC LIMIT 200", tuple(params))).fetchall()
-        return {"items": [dict(r) for r in rows]}
+    db.row_factory = sqlite3.Row
+    rows = await (await db.execute(f"SELECT * FROM audit_logs{where_sql} ORDER BY id DESC LIMIT 200", tuple(params))).fetchall()
+    return {"items": [dict(r) for r in rows]}
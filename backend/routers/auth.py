@@ -1,10 +1,10 @@
 from typing import Optional
 import sqlite3
-import aiosqlite
 from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from pydantic import BaseModel
-from ..config import DB_PATH, APP_SECRET
+from ..config import APP_SECRET
+from ..db import db_read
 from ..crypto import verify_password, sign_token
 from ..deps import require_user
 from ..utils.audit import audit_log
@@ -26,7 +26,7 @@ async def login_page(request: Request):
 
 @router.post("/api/login")
 async def api_login(request: Request, form: LoginForm):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_read() as db:
         row = await (await db.execute(
             "SELECT id, username, password_hash, is_admin, token_version FROM users WHERE username=?",
             (form.username,),
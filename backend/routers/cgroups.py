@@ -0,0 +1,32 @@
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends
+from ..deps import require_user, get_db
+from ..utils.cgroups import cgroup_collector
+
+
+router = APIRouter()
+
+
+@router.get("/api/cgroups")
+async def api_cgroups(kind: Optional[str] = None, user: dict = Depends(require_user)):
+    """按 systemd unit / 容器汇总的资源占用（最近一次采集结果）。kind: unit/container/pod/cgroup"""
+    return cgroup_collector.snapshot(kind=kind)
+
+
+@router.get("/api/cgroups/history")
+async def api_cgroups_history(
+    cgroup: str,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    user: dict = Depends(require_user),
+    db=Depends(get_db),
+):
+    e = int(end or time.time())
+    s = int(start or (e - 3600))
+    cols = ["ts", "cpu_pct", "mem_bytes", "io_read_bps", "io_write_bps", "pids"]
+    rows = await (await db.execute(
+        f"SELECT {','.join(cols)} FROM cgroup_data WHERE cgroup=? AND ts BETWEEN ? AND ? ORDER BY ts",
+        (cgroup, s, e),
+    )).fetchall()
+    return {"cgroup": cgroup, "items": [dict(zip(cols, r)) for r in rows], "fields": cols}
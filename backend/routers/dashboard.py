@@ -1,10 +1,21 @@
+import json
 import asyncio
-from fastapi import APIRouter, Depends, Request
+import sqlite3
+from fastapi import APIRouter, Depends, Request, HTTPException, Query
 import aiosqlite, os, time
-from ..config import DB_PATH
+from ..db import db_read
+from .. import shards
+from ..crud.samples import COUNTER_COLUMNS, latest_sample
+from ..crud.rates import sample_counter_rates
+from ..crud.net import TOTAL, iter_net
+from ..utils.rollup import resolve, fetch_rows
 from fastapi.responses import HTMLResponse, StreamingResponse
 from ..deps import require_user
 from ..utils.system import collect_system_snapshot
+from ..utils.procio import procio_sampler
+from ..utils import seglog
+from ..utils.hotring import hot
+from ..utils.downsample import DEFAULT_MODE, MAX_POINTS, MODE_PATTERN, downsample, downsample_stream
 from ..web import render
 
 
@@ -48,6 +59,35 @@ async def api_process_top(duration: int = 30, limit: int = 10, user: dict = Depe
     return {"items": out[:limit]}
 
 
+@router.get("/api/process/top_io")
+async def api_process_top_io(limit: int = 10, user: dict = Depends(require_user)):
+    """按磁盘 I/O 速率排序的进程 TOP，直接返回后台采样器最近一次结果（无需等待采样）。"""
+    return procio_sampler.snapshot(limit=limit)
+
+
+@router.get("/api/process/top_io/history")
+async def api_process_top_io_history(
+    start: int | None = None,
+    end: int | None = None,
+    limit: int = 10,
+    user: dict = Depends(require_user),
+):
+    """历史 I/O TOP：按 ts 分组返回每个采样点的前 limit 名。"""
+    e = int(end or time.time())
+    s = int(start or (e - 3600))
+    items: list[dict] = []
+    async with db_read() as db:
+        async with db.execute(
+            "SELECT ts,rank,pid,name,read_bps,write_bps FROM proc_io_top WHERE ts BETWEEN ? AND ? AND rank < ? ORDER BY ts, rank",
+            (s, e, max(1, int(limit))),
+        ) as cur:
+            async for r in cur:
+                if not items or items[-1]["ts"] != r[0]:
+                    items.append({"ts": r[0], "items": []})
+                items[-1]["items"].append({"pid": r[2], "name": r[3], "read_bps": r[4], "write_bps": r[5]})
+    return {"items": items}
+
+
 async def sse_event(data: dict, event: str | None = None) -> bytes:
     buf = ""
     if event:
@@ -69,41 +109,25 @@ async def sse_metrics(request: Request, user: dict = Depends(require_user)):
             if await request.is_disconnected():
                 break
             try:
-                async with aiosqlite.connect(DB_PATH) as db:
-                    # latest ts across cpu_data as anchor
-                    async with db.execute("SELECT ts,cpu_percent FROM cpu_data ORDER BY ts DESC LIMIT 1") as cur:
-                        crow = await cur.fetchone()
-                    if crow:
-                        ts = int(crow[0])
-                        if ts != last_ts:
-                            last_ts = ts
-                            # fetch other components at same ts (best-effort)
-                            async with db.execute("SELECT load1,load5,load15 FROM load_data WHERE ts=?", (ts,)) as c2:
-                                lrow = await c2.fetchone()
-                            # 内存数据优先取同一 ts；若缺失，回退到 <= ts 的最近一条，避免前端出现 NaN
-                            async with db.execute("SELECT mem_used,mem_total,mem_percent FROM mem_data WHERE ts=?", (ts,)) as c3:
-                                mrow = await c3.fetchone()
-                            if not mrow:
-                                async with db.execute("SELECT mem_used,mem_total,mem_percent FROM mem_data WHERE ts<=? ORDER BY ts DESC LIMIT 1", (ts,)) as c3b:
-                                    mrow = await c3b.fetchone()
-                            async with db.execute("SELECT processes FROM proc_data WHERE ts=?", (ts,)) as c4:
-                                prow = await c4.fetchone()
-                            async with db.execute("SELECT disk_mb_s FROM diskio_data WHERE ts=?", (ts,)) as c5:
-                                drow = await c5.fetchone()
-                            async with db.execute("SELECT gpu_util_avg,gpu_temp_avg FROM gpu_data WHERE ts=?", (ts,)) as c6:
-                                grow = await c6.fetchone()
-                            snap = {
-                                "time": ts,
-                                "cpu_percent": crow[1],
-                                "load_avg": (lrow[0], lrow[1], lrow[2]) if lrow else (None, None, None),
-                                "mem": {"used": mrow[0] if mrow else 0, "total": mrow[1] if mrow else 0},
-                                "processes": (prow[0] if prow else None),
-                                "mem_percent": (mrow[2] if mrow and mrow[2] is not None else ( (mrow[0]/mrow[1]*100.0) if mrow and mrow[1] else 0.0 )),
-                                "disk_mb_s": (drow[0] if drow else None),
-                                "gpu_util_avg": (grow[0] if grow else None),
-                                "gpu_temp_avg": (grow[1] if grow else None),
-                            }
-                            yield await sse_event(snap, event="metrics")
+                row = hot.latest()
+                if row is None:
+                    async with db_read() as db:
+                        row = await latest_sample(db)
+                if row and int(row["ts"]) != last_ts:
+                    ts = last_ts = int(row["ts"])
+                    mem_used, mem_total = row["mem_used"], row["mem_total"]
+                    snap = {
+                        "time": ts,
+                        "cpu_percent": row["cpu_percent"],
+                        "load_avg": (row["load1"], row["load5"], row["load15"]),
+                        "mem": {"used": mem_used or 0, "total": mem_total or 0},
+                        "processes": row["processes"],
+                        "mem_percent": (row["mem_percent"] if row["mem_percent"] is not None else ((mem_used/mem_total*100.0) if mem_total else 0.0)),
+                        "disk_mb_s": row["disk_mb_s"],
+                        "gpu_util_avg": row["gpu_util_avg"],
+                        "gpu_temp_avg": row["gpu_temp_avg"],
+                    }
+                    yield await sse_event(snap, event="metrics")
             except Exception:
                 pass
             await asyncio.sleep(1.0)
@@ -117,15 +141,21 @@ async def api_metrics_system(
     end: int | None = None,
     date: str | None = None,
     fields: str | None = None,
+    points: int | None = None,
+    resolution: str | None = None,
+    max_points: int | None = Query(None, ge=3, le=MAX_POINTS),
+    mode: str = Query(DEFAULT_MODE, pattern=MODE_PATTERN),
     user: dict = Depends(require_user)
 ):
-    """返回系统指标历史：优先读新分表，若窗口内数据不足则合并旧表 metric_samples，避免前段缺失。
-    支持 start/end（秒）或 date=YYYY-MM-DD。
+    """返回系统指标历史：读 system_samples，并合并旧表 metric_samples 中的时刻，避免前段缺失。
+    支持 start/end（秒）或 date=YYYY-MM-DD。窗口较长时按 points（默认 720）自动改读 rollup 汇总表，
+    也可用 resolution=raw/1m/5m/1h/1d 指定；原始数据按 fields 只读用到的列，边查询边流式输出。
+    给出 max_points 时降采样到不超过该点数（mode=lttb/minmax/avg，见 utils/downsample.py）。
     """
     cols_all = ["ts","cpu_percent","load1","load5","load15","mem_used","mem_total","processes","mem_percent","disk_mb_s","gpu_util_avg","gpu_temp_avg"]
     cols = [c for c in (fields.split(",") if fields else cols_all) if c in cols_all]
-    if "ts" not in cols:
-        cols = ["ts"] + cols
+    # ts 固定在第一列：归并、热层判断与 rollup 都按 cols[0] 为 ts
+    cols = ["ts"] + list(dict.fromkeys(c for c in cols if c != "ts"))
 
     # 统一窗口 [s, e]
     now = int(time.time())
@@ -141,95 +171,161 @@ async def api_metrics_system(
         e = int(end or now)
         s = int(start or (e - 3600))
 
-    rows_by_ts: dict[int, dict] = {}
-    async with aiosqlite.connect(DB_PATH) as db:
-        # 新分表（锚定 cpu_data）
-        async with db.execute("SELECT ts,cpu_percent FROM cpu_data WHERE ts BETWEEN ? AND ? ORDER BY ts ASC", (s, e)) as cur:
-            async for crow in cur:
-                ts, cpu = int(crow[0]), crow[1]
-                row = {"ts": ts, "cpu_percent": cpu}
-                async with db.execute("SELECT load1,load5,load15 FROM load_data WHERE ts=?", (ts,)) as c2:
-                    l = await c2.fetchone()
-                if l: row.update({"load1": l[0], "load5": l[1], "load15": l[2]})
-                async with db.execute("SELECT mem_used,mem_total,mem_percent FROM mem_data WHERE ts=?", (ts,)) as c3:
-                    m = await c3.fetchone()
-                if m:
-                    row.update({"mem_used": m[0], "mem_total": m[1], "mem_percent": (m[2] if m[2] is not None else ((float(m[0])/m[1]*100.0) if m[1] else 0.0))})
-                async with db.execute("SELECT processes FROM proc_data WHERE ts=?", (ts,)) as c4:
-                    p = await c4.fetchone()
-                if p: row.update({"processes": p[0]})
-                async with db.execute("SELECT disk_mb_s FROM diskio_data WHERE ts=?", (ts,)) as c5:
-                    d = await c5.fetchone()
-                if d: row.update({"disk_mb_s": d[0]})
-                async with db.execute("SELECT gpu_util_avg,gpu_temp_avg FROM gpu_data WHERE ts=?", (ts,)) as c6:
-                    g = await c6.fetchone()
-                if g: row.update({"gpu_util_avg": g[0], "gpu_temp_avg": g[1]})
-                rows_by_ts[ts] = row
-
-        # 兼容：合并旧表 metric_samples，补齐窗口前段
+    res, _ = resolve(s, e, points, resolution)
+    if res != "raw":
+        async with db_read() as db:
+            items = await fetch_rows(db, [c for c in cols if c != "ts"], s, e, res, extremes=bool(max_points) and mode == "minmax")
+        return {"items": downsample(items, max_points, mode), "fields": cols, "resolution": res}
+    if hot.covers(cols[1:], s):
+        if max_points:
+            items = await downsample_stream(hot.iter_rows(cols, s, e), max_points, mode, s, e, cols[1:])
+            return {"items": items, "fields": cols, "resolution": "raw"}
+        return {"items": hot.rows(cols, s, e), "fields": cols, "resolution": "raw"}
+    if max_points:
+        # 边扫描边分桶，内存只与 max_points 有关
+        rows = _system_rows(s, e, cols)
         try:
-            async with db.execute(
-                "SELECT ts,cpu_percent,load1,load5,load15,mem_used,mem_total,processes,mem_percent,disk_mb_s,gpu_util_avg,gpu_temp_avg"
-                " FROM metric_samples WHERE ts BETWEEN ? AND ? ORDER BY ts ASC",
-                (s, e),
-            ) as cur:
-                async for r in cur:
-                    ts = int(r[0])
-                    if ts in rows_by_ts:
-                        continue
-                    rows_by_ts[ts] = {
-                        "ts": ts,
-                        "cpu_percent": r[1],
-                        "load1": r[2],
-                        "load5": r[3],
-                        "load15": r[4],
-                        "mem_used": r[5],
-                        "mem_total": r[6],
-                        "processes": r[7],
-                        "mem_percent": r[8] if r[8] is not None else ((float(r[5])/r[6]*100.0) if r[6] else 0.0),
-                        "disk_mb_s": r[9],
-                        "gpu_util_avg": r[10],
-                        "gpu_temp_avg": r[11],
-                    }
-        except Exception:
-            pass
+            items = await downsample_stream(rows, max_points, mode, s, e, cols[1:])
+        finally:
+            await rows.aclose()
+        return {"items": items, "fields": cols, "resolution": "raw"}
+
+    tail = json.dumps({"fields": cols, "resolution": "raw"}, ensure_ascii=False)[1:]
+    return StreamingResponse(_stream_items(_system_rows(s, e, cols), tail), media_type="application/json")
+
+
+_LEGACY_COLS = ("cpu_percent", "load1", "load5", "load15", "mem_used", "mem_total", "processes", "mem_percent",
+                "disk_mb_s", "gpu_util_avg", "gpu_temp_avg")
+_STREAM_BATCH = 500
+
+
+async def _legacy_rows(db, cols: list, s: int, e: int):
+    """旧表 metric_samples 的行（表不存在时为空）。"""
+    try:
+        cur = await db.execute(f"SELECT {','.join(cols)} FROM metric_samples WHERE ts BETWEEN ? AND ? ORDER BY ts ASC", (s, e))
+    except sqlite3.OperationalError:
+        return
+    try:
+        while batch := await cur.fetchmany(_STREAM_BATCH):
+            for r in batch:
+                yield r
+    finally:
+        await cur.close()
+
 
-    items_all = [rows_by_ts[k] for k in sorted(rows_by_ts.keys())]
-    items = [{k: v for k, v in row.items() if k in cols} for row in items_all]
-    return {"items": items, "fields": cols}
+async def _system_rows(s: int, e: int, cols: list):
+    """system_samples 与旧表 metric_samples 各一次 ts 范围扫描，按 ts 归并（同一时刻以 system_samples 为准），
+    逐行产出；只读 fields 涉及的列（mem_percent 为空时由 mem_used/mem_total 补算）。"""
+    read = list(cols)
+    if "mem_percent" in cols:
+        read += [c for c in ("mem_used", "mem_total") if c not in read]
+    mp = read.index("mem_percent") if "mem_percent" in read else None
+    legacy_read = ["ts"] + [c for c in read[1:] if c in _LEGACY_COLS]
+
+    def out(r, names):
+        row = dict(zip(names, r))
+        if mp is not None and row.get("mem_percent") is None:
+            row["mem_percent"] = (float(row["mem_used"]) / row["mem_total"] * 100.0) if row.get("mem_total") else 0.0
+        return {c: row.get(c) for c in cols}
+
+    async with db_read() as db:
+        cur = shards.iter_rows(db, "system_samples", read, s, e)
+        old = _legacy_rows(db, legacy_read, s, e)
+        try:
+            a = await anext(cur, None)
+            b = await anext(old, None)
+            while a is not None or b is not None:
+                if b is None or (a is not None and a[0] <= b[0]):
+                    if b is not None and b[0] == a[0]:
+                        b = await anext(old, None)
+                    yield out(a, read)
+                    a = await anext(cur, None)
+                else:
+                    yield out(b, legacy_read)
+                    b = await anext(old, None)
+        finally:
+            # 提前断开时也要关闭两个游标（iter_rows 在关闭时 DETACH 分片），再归还连接
+            await old.aclose()
+            await cur.aclose()
+
+
+async def _stream_items(rows, tail: str):
+    """{"items":[...], <tail>：items 边产生边输出，每 _STREAM_BATCH 行一块。"""
+    yield '{"items":['
+    buf, first = [], True
+    async for row in rows:
+        buf.append(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+        if len(buf) >= _STREAM_BATCH:
+            yield ("" if first else ",") + ",".join(buf)
+            buf, first = [], False
+    if buf:
+        yield ("" if first else ",") + ",".join(buf)
+    yield "]," + tail
+
+
+@router.get("/api/metrics/hf")
+async def api_metrics_hf(series: str = "cpu_percent", seconds: int = 60, user: dict = Depends(require_user)):
+    """段日志中的高频原始采样（HF_INTERVAL > 0 时才有数据），series 逗号分隔，最多取最近 SEGMENT_RETAIN 秒。"""
+    names = [s for s in series.split(",") if s]
+    end = time.time()
+    start = end - max(1, min(int(seconds), seglog.SEG_RETAIN))
+    points = await asyncio.to_thread(seglog.read_points, names, start, end)
+    return {"start": start, "end": end, "series": {k: [[round(t, 3), v] for t, v in pts] for k, pts in points.items()}}
+
+
+@router.get("/api/metrics/rates")
+async def api_metrics_rates(
+    start: int | None = None,
+    end: int | None = None,
+    step: int | None = None,
+    fields: str | None = None,
+    user: dict = Depends(require_user)
+):
+    """磁盘读写字节、中断数等累计计数器在任意窗口、步长上的增量与每秒速率（查询时计算，正确处理计数器重置）。"""
+    end = int(end or time.time())
+    start = int(start if start is not None else end - 3600)
+    step = int(step or max(1, -(-(end - start) // 120)))
+    cols = [c for c in (fields or "").split(",") if c] or COUNTER_COLUMNS
+    try:
+        async with db_read() as db:
+            return await sample_counter_rates(db, start, end, step, cols)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/api/metrics/network")
 async def api_metrics_network(
     request: Request,
-    iface: str = "__total__",
+    iface: str = TOTAL,
     start: int | None = None,
     end: int | None = None,
     date: str | None = None,
     fields: str | None = None,
+    max_points: int | None = Query(None, ge=3, le=MAX_POINTS),
+    mode: str = Query(DEFAULT_MODE, pattern=MODE_PATTERN),
     user: dict = Depends(require_user)
 ):
     cols_all = ["ts","iface","rx_bytes","tx_bytes","errin","errout","rx_kbps","tx_kbps","latency_ms"]
     cols = [c for c in (fields.split(",") if fields else cols_all) if c in cols_all]
-    if "ts" not in cols:
-        cols = ["ts"] + cols
+    # ts 固定在第一列：归并、热层判断与 rollup 都按 cols[0] 为 ts
+    cols = ["ts"] + list(dict.fromkeys(c for c in cols if c != "ts"))
     now = int(time.time())
     if date:
-        placeholders = ", ".join(cols)
-        sql = f"SELECT {placeholders} FROM net_data WHERE iface = ? AND date = ? ORDER BY ts ASC"
-        args = (iface, date)
+        # date 按 UTC 日期（与分片及旧 date 列一致）
+        try:
+            start = shards.day_start(date)
+        except Exception:
+            start = now - 3600
+        end = start + shards.DAY - 1
     else:
         if end is None:
             end = now
         if start is None:
             start = end - 3600
-        placeholders = ", ".join(cols)
-        sql = f"SELECT {placeholders} FROM net_data WHERE iface = ? AND ts BETWEEN ? AND ? ORDER BY ts ASC"
-        args = (iface, int(start), int(end))
     items = []
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(sql, args) as cur:
-            async for row in cur:
-                obj = {cols[i]: row[i] for i in range(len(cols))}
-                items.append(obj)
-    return {"items": items, "fields": cols, "iface": iface}
+    vcols = ["ts"] + [c for c in cols if c not in ("ts", "iface")]
+    async with db_read() as db:
+        async for row in iter_net(db, vcols, int(start), int(end), iface):
+            item = dict(zip(vcols, row), iface=iface)
+            items.append({c: item[c] for c in cols})
+    return {"items": downsample(items, max_points, mode), "fields": cols, "iface": iface}
@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, Request, Query
 from fastapi.responses import HTMLResponse
 from ..deps import require_user
-from ..utils.gpu_monitor import get_detailed_gpu_info, get_gpu_utilization_history, calculate_gpu_statistics, get_gpu_realtime_data
+from ..utils.gpu_monitor import (
+    get_detailed_gpu_info, get_gpu_utilization_history, get_gpu_history_statistics, get_gpu_realtime_data,
+    get_gpu_utilization_trend, get_gpu_temperature_trend, get_gpu_processes_history, get_gpu_statistics,
+)
+from ..utils.inventory import inventory
+from ..utils.downsample import DEFAULT_MODE, MAX_POINTS, MODE_PATTERN, downsample
 from ..web import render
 import time
 
@@ -26,6 +31,12 @@ async def api_gpu_info(request: Request, user: dict = Depends(require_user)):
     return get_detailed_gpu_info()
 
 
+@router.get("/api/gpu/topology")
+async def api_gpu_topology(request: Request, user: dict = Depends(require_user)):
+    """GPU 的 PCI 位置、NUMA 节点与 PCIe 链路（来自 sysfs 清单缓存，无需调用 nvidia-smi）"""
+    return {"version": inventory.version, "items": inventory.gpus()}
+
+
 @router.get("/api/gpu/realtime")
 async def api_gpu_realtime(request: Request, user: dict = Depends(require_user)):
     """获取GPU实时数据"""
@@ -36,6 +47,9 @@ async def api_gpu_realtime(request: Request, user: dict = Depends(require_user))
 async def api_gpu_history(
     request: Request,
     period: str = Query("1h", description="时间周期: 1h, 6h, 1d, 7d, 30d"),
+    points: int | None = Query(None, description="期望的最少点数，长周期据此选择汇总分辨率"),
+    max_points: int | None = Query(None, ge=3, le=MAX_POINTS, description="返回点数上限（服务端降采样）"),
+    mode: str = Query(DEFAULT_MODE, pattern=MODE_PATTERN, description="降采样方式: lttb, minmax, avg"),
     user: dict = Depends(require_user)
 ):
     """获取GPU历史数据"""
@@ -56,16 +70,16 @@ async def api_gpu_history(
     since = now - period_map[period]
     
     # 获取历史数据
-    history_data = await get_gpu_utilization_history(since, now)
+    history_data = await get_gpu_utilization_history(since, now, points)
     
     # 计算统计信息
-    stats = calculate_gpu_statistics(history_data)
+    stats = await get_gpu_history_statistics(since, now)
     
     return {
         'period': period,
         'since': since,
         'until': now,
-        'data': history_data,
+        'data': downsample(history_data, max_points, mode),
         'statistics': stats,
         'data_points': len(history_data)
     }
@@ -79,14 +93,13 @@ async def api_gpu_statistics(
     user: dict = Depends(require_user)
 ):
     """获取指定时间段的GPU统计信息"""
-    history_data = await get_gpu_utilization_history(since, until)
-    stats = calculate_gpu_statistics(history_data)
+    stats = await get_gpu_history_statistics(since, until)
     
     return {
         'since': since,
         'until': until,
         'statistics': stats,
-        'data_points': len(history_data)
+        'data_points': stats['data_points']
     }
 
 
@@ -112,6 +125,8 @@ async def api_gpu_processes(request: Request, user: dict = Depends(require_user)
 async def api_gpu_utilization_trend(
     request: Request,
     period: str = Query("1h", description="时间周期: 1h, 6h, 1d, 7d, 30d"),
+    max_points: int | None = Query(None, ge=3, le=MAX_POINTS, description="每块 GPU 返回点数上限（服务端降采样）"),
+    mode: str = Query(DEFAULT_MODE, pattern=MODE_PATTERN, description="降采样方式: lttb, minmax, avg"),
     user: dict = Depends(require_user)
 ):
     """获取GPU利用率趋势数据"""
@@ -123,6 +138,8 @@ async def api_gpu_utilization_trend(
     since = now - period_map.get(period, 3600)
     
     trend_data = await get_gpu_utilization_trend(since, now)
+    for g in trend_data:
+        g['data_points'] = downsample(g['data_points'], max_points, mode)
     return {
         'period': period,
         'since': since,
@@ -135,6 +152,8 @@ async def api_gpu_utilization_trend(
 async def api_gpu_temperature_trend(
     request: Request,
     period: str = Query("1h", description="时间周期: 1h, 6h, 1d, 7d, 30d"),
+    max_points: int | None = Query(None, ge=3, le=MAX_POINTS, description="每块 GPU 返回点数上限（服务端降采样）"),
+    mode: str = Query(DEFAULT_MODE, pattern=MODE_PATTERN, description="降采样方式: lttb, minmax, avg"),
     user: dict = Depends(require_user)
 ):
     """获取GPU温度趋势数据"""
@@ -146,6 +165,8 @@ async def api_gpu_temperature_trend(
     since = now - period_map.get(period, 3600)
     
     trend_data = await get_gpu_temperature_trend(since, now)
+    for g in trend_data:
+        g['data_points'] = downsample(g['data_points'], max_points, mode)
     return {
         'period': period,
         'since': since,
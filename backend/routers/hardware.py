@@ -1,9 +1,11 @@
-import platform
+import platform, time
 import psutil
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
-from ..deps import require_user
+from ..deps import require_user, get_db
 from ..utils.system import _cpu_model, get_machine_serial
+from ..utils.numa import numa_collector, device_affinity
+from ..utils.inventory import inventory
 from ..web import render
 
 
@@ -56,3 +58,30 @@ async def api_system_summary(request: Request, user: dict = Depends(require_user
 async def api_system_serial(user: dict = Depends(require_user)):
     """Return best-effort machine serial number."""
     return {"serial": get_machine_serial()}
+
+
+@router.get("/api/system/pci")
+async def api_system_pci(user: dict = Depends(require_user)):
+    """PCI 设备清单（sysfs 缓存，含 NUMA 节点与 PCIe 链路速率/宽度）。"""
+    inventory.ensure()
+    return {"version": inventory.version, "updated_at": int(inventory.updated_at), "items": inventory.pci}
+
+
+@router.get("/api/system/numa")
+async def api_system_numa(user: dict = Depends(require_user)):
+    """各 NUMA 节点内存/跨节点访问速率，以及 GPU、网卡所在节点。"""
+    snap = numa_collector.snapshot()
+    snap["devices"] = device_affinity()
+    return snap
+
+
+@router.get("/api/system/numa/history")
+async def api_system_numa_history(node: int = 0, start: int | None = None, end: int | None = None, user: dict = Depends(require_user), db=Depends(get_db)):
+    e = int(end or time.time())
+    s = int(start or (e - 3600))
+    cols = ["ts", "mem_total", "mem_free", "mem_used", "numa_hit_ps", "numa_miss_ps", "numa_foreign_ps", "other_node_ps"]
+    rows = await (await db.execute(
+        f"SELECT {','.join(cols)} FROM numa_data WHERE node=? AND ts BETWEEN ? AND ? ORDER BY ts",
+        (int(node), s, e),
+    )).fetchall()
+    return {"node": node, "items": [dict(zip(cols, r)) for r in rows], "fields": cols}
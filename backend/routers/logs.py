@@ -1,15 +1,18 @@
-from typing import Optional, List, Dict, Any
-import sqlite3, platform, shutil, subprocess, json, time, datetime, re
-import aiosqlite
-from fastapi import APIRouter, Depends, Request, HTTPException
-from fastapi.responses import HTMLResponse, PlainTextResponse
+from typing import Optional, List, Dict, Any, Iterator
+import sqlite3, platform, shutil, subprocess, json, time, datetime, re, collections, threading
+from fastapi import APIRouter, Depends, Request, HTTPException, Query
+from fastapi.responses import HTMLResponse
 from ..deps import require_user, require_admin
-from ..config import DB_PATH
+from ..db import db_write
+from ..utils.export import EXPORT_PATTERN, export_response
 from ..web import render
 
 
 router = APIRouter()
 
+OSLOG_EXPORT_MAX = 100000
+OSLOG_EXPORT_TIMEOUT = 30     # 秒
+
 
 @router.get("/logs", response_class=HTMLResponse)
 async def logs_page(request: Request):
@@ -45,9 +48,7 @@ def _fmt_dt(ts: int) -> str:
         return ""
 
 
-def _linux_journal(limit: int, since: Optional[int], until: Optional[int], level: Optional[str], unit: Optional[str], kernel: bool, q: Optional[str]) -> List[Dict[str, Any]]:
-    if not shutil.which("journalctl"):
-        return _linux_logfiles(limit, q)
+def _journal_args(since: Optional[int], until: Optional[int], level: Optional[str], unit: Optional[str], kernel: bool) -> List[str]:
     args = ["journalctl", "--no-pager", "--output=short-iso"]
     # time range
     if since:
@@ -66,6 +67,30 @@ def _linux_journal(limit: int, since: Optional[int], until: Optional[int], level
         args += ["-u", unit]
     if kernel:
         args += ["-k"]
+    return args
+
+
+def _parse_journal_line(ln: str, level: Optional[str]) -> Dict[str, Any]:
+    # sample: 2025-09-15 10:10:12 host systemd[1]: Started ...
+    # crude parse
+    m = re.match(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})[^:]*:\s*(.*)$", ln)
+    tstr = m.group(1) if m else ""
+    rest = m.group(2) if m else ln
+    # try source like 'systemd[1]:'
+    src = None
+    m2 = re.match(r"^([^:]+?):\s*(.*)$", rest)
+    if m2:
+        src = m2.group(1)
+        msg = m2.group(2)
+    else:
+        msg = rest
+    return {"time": tstr, "level": level or "", "source": src or "", "message": msg}
+
+
+def _linux_journal(limit: int, since: Optional[int], until: Optional[int], level: Optional[str], unit: Optional[str], kernel: bool, q: Optional[str]) -> List[Dict[str, Any]]:
+    if not shutil.which("journalctl"):
+        return _linux_logfiles(limit, q)
+    args = _journal_args(since, until, level, unit, kernel)
     # limit: we'll slice after reading to keep ordering
     try:
         out = subprocess.check_output(args, stderr=subprocess.STDOUT, timeout=8).decode(errors="ignore")
@@ -73,28 +98,49 @@ def _linux_journal(limit: int, since: Optional[int], until: Optional[int], level
         return [{"time": "", "level": "", "source": "journalctl", "message": str(e)}]
     lines = out.splitlines()
     items: List[Dict[str, Any]] = []
-    # sample: 2025-09-15 10:10:12 host systemd[1]: Started ...
     for ln in lines[-max(0, min(limit, 2000)):] if not (since or until) else lines:
         if q and q.lower() not in ln.lower():
             continue
-        # crude parse
-        m = re.match(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})[^:]*:\s*(.*)$", ln)
-        tstr = m.group(1) if m else ""
-        rest = m.group(2) if m else ln
-        # try source like 'systemd[1]:'
-        src = None
-        m2 = re.match(r"^([^:]+?):\s*(.*)$", rest)
-        if m2:
-            src = m2.group(1)
-            msg = m2.group(2)
-        else:
-            msg = rest
-        items.append({"time": tstr, "level": level or "", "source": src or "", "message": msg})
+        items.append(_parse_journal_line(ln, level))
         if len(items) >= limit:
             break
     return items[-limit:]
 
 
+def _iter_journal(limit: int, since: Optional[int], until: Optional[int], level: Optional[str], unit: Optional[str], kernel: bool, q: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """导出用：逐行读取 journalctl 的输出，不整体载入；未指定时间范围时取最近 limit 行。"""
+    args = _journal_args(since, until, level, unit, kernel)
+    if not (since or until):
+        args += ["-n", str(limit)]
+    try:
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except Exception as e:
+        yield {"time": "", "level": "", "source": "journalctl", "message": str(e)}
+        return
+    # 总耗时上限：q 匹配不到时 journalctl 可能扫完整个日志，到时结束子进程，读取随之结束
+    timer = threading.Timer(OSLOG_EXPORT_TIMEOUT, proc.kill)
+    timer.start()
+    try:
+        n = 0
+        for raw in proc.stdout:
+            ln = raw.decode(errors="ignore").rstrip("\r\n")
+            if q and q.lower() not in ln.lower():
+                continue
+            yield _parse_journal_line(ln, level)
+            n += 1
+            if n >= limit:
+                break
+        else:
+            if not timer.is_alive():
+                yield {"time": "", "level": "", "source": "journalctl", "message": f"timeout after {OSLOG_EXPORT_TIMEOUT}s"}
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+
+
 def _linux_logfiles(limit: int, q: Optional[str]) -> List[Dict[str, Any]]:
     candidates = [
         "/var/log/syslog",
@@ -106,7 +152,7 @@ def _linux_logfiles(limit: int, q: Optional[str]) -> List[Dict[str, Any]]:
     for p in candidates:
         try:
             with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                lines = f.readlines()[-limit:]
+                lines = collections.deque(f, maxlen=limit)
                 for ln in lines:
                     if q and q.lower() not in ln.lower():
                         continue
@@ -193,15 +239,24 @@ async def api_oslogs_csv(
     kernel: bool = False,
     logname: Optional[str] = None,
     q: Optional[str] = None,
+    format: str = Query("csv", pattern=EXPORT_PATTERN),
+    gzip: bool = False,
     user: dict = Depends(require_user),
 ):
-    r = await api_oslogs(request, limit, start, end, level, unit, kernel, logname, q, user)  # type: ignore
-    import csv, io
-    sio = io.StringIO(); w = csv.writer(sio)
-    w.writerow(["time","level","source","message"])
-    for it in r.get("items", []):
-        w.writerow([it.get("time",""), it.get("level",""), it.get("source",""), (it.get("message","") or "").replace("\r"," ").replace("\n"," ")])
-    return PlainTextResponse(sio.getvalue(), media_type="text/csv")
+    """流式导出（format=csv|ndjson，gzip=1 时为 .gz 文件）；Linux 上逐行读取 journalctl，上限 OSLOG_EXPORT_MAX 行。"""
+    limit = max(1, min(int(limit or 500), OSLOG_EXPORT_MAX))
+    since = _parse_time(start)
+    until = _parse_time(end)
+    if platform.system() == "Linux" and shutil.which("journalctl"):
+        items = _iter_journal(limit, since, until, level, unit, bool(kernel), q)
+    else:
+        items = (await api_oslogs(request, limit, start, end, level, unit, kernel, logname, q, user))["items"]  # type: ignore
+
+    def rows():
+        for it in items:
+            yield [it.get("time",""), it.get("level",""), it.get("source",""), (it.get("message","") or "").replace("\r"," ").replace("\n"," ")]
+
+    return export_response(rows(), ["time","level","source","message"], format, gzip, "oslogs")
 
 
 @router.post("/api/logs")
@@ -209,7 +264,7 @@ async def api_logs_create(payload: dict, user: dict = Depends(require_admin())):
     category = (payload or {}).get("category"); message = (payload or {}).get("message")
     if not category or not message:
         raise HTTPException(status_code=400, detail="缺少参数")
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_write() as db:
         await db.execute("INSERT INTO sys_logs (category, message) VALUES (?,?)", (category, message))
         await db.commit()
     return {"ok": True}
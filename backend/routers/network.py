@@ -1,12 +1,14 @@
-import time, math, sqlite3, asyncio
+import time, sqlite3, asyncio
 from typing import Optional, Dict
-from fastapi import APIRouter, Depends, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
-import aiosqlite, psutil
+from fastapi import APIRouter, Depends, Request, HTTPException, Query
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response
 from ..deps import require_user
-from ..config import DB_PATH
+from ..db import db_read
+from ..crud.net import TOTAL, iter_net, latest_net, list_ifaces
+from ..crud.rates import NET_COUNTERS, net_counter_rates
 from ..web import render
-from ..utils.system import detect_primary_interface
+from ..utils.netlink import ensure_topology
+from ..utils.downsample import DEFAULT_MODE, MAX_POINTS, MODE_PATTERN, downsample
 
 
 router = APIRouter()
@@ -17,108 +19,96 @@ async def network_page(request: Request):
     return render(request, "network.html")
 
 
+def _topology_response(request: Request, body) -> Response:
+    """拓扑数据来自内存缓存；带版本化 ETag，未变化时返回 304。"""
+    topo = ensure_topology()
+    etag = topo.etag()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body(topo.view()), headers=headers)
+
+
 @router.get("/api/system/network")
 async def api_system_network(request: Request, user: dict = Depends(require_user)):
-    stats = psutil.net_if_stats()
-    addrs = psutil.net_if_addrs()
-    out = {}
-    for name, st in stats.items():
-        o = {"isup": st.isup, "duplex": getattr(st, "duplex", None), "speed": getattr(st, "speed", None), "mtu": st.mtu, "addrs": []}
-        for a in addrs.get(name, []):
-            o["addrs"].append({"family": str(a.family).split(".")[-1], "address": a.address, "netmask": a.netmask, "broadcast": a.broadcast, "ptp": a.ptp})
-        out[name] = o
-    return out
+    return _topology_response(request, lambda v: v["ifaces"])
 
 
 @router.get("/api/network/meta")
-async def api_network_meta(user: dict = Depends(require_user)):
-    # Gather interface info similar to /api/system/network
-    stats = psutil.net_if_stats()
-    addrs = psutil.net_if_addrs()
-    out: Dict[str, Dict] = {}
-    for name, st in stats.items():
-        o = {"isup": st.isup, "duplex": getattr(st, "duplex", None), "speed": getattr(st, "speed", None), "mtu": st.mtu, "addrs": []}
-        for a in addrs.get(name, []):
-            o["addrs"].append({"family": str(a.family).split(".")[-1], "address": a.address, "netmask": a.netmask, "broadcast": a.broadcast, "ptp": a.ptp})
-        out[name] = o
-    primary = detect_primary_interface()
-    up_ifaces = [k for k,v in out.items() if v.get("isup")]
-    return {"primary_iface": primary, "ifaces": out, "up_ifaces": up_ifaces}
+async def api_network_meta(request: Request, user: dict = Depends(require_user)):
+    return _topology_response(request, lambda v: v)
+
+
+@router.get("/api/network/ifaces")
+async def api_network_ifaces(hours: Optional[int] = None, user: dict = Depends(require_user)):
+    """有采样记录的网卡（来自 net_iface 维度表）；hours 限定最近出现时间。"""
+    since = int(time.time()) - hours * 3600 if hours else None
+    async with db_read() as db:
+        return {"items": await list_ifaces(db, since)}
 
 
 @router.get("/api/network/speeds")
-async def api_network_speeds(iface: str = "__total__", minutes: int = 60, user: dict = Depends(require_user)):
+async def api_network_speeds(
+    iface: str = TOTAL,
+    minutes: int = 60,
+    max_points: int = Query(720, ge=3, le=MAX_POINTS),
+    mode: str = Query(DEFAULT_MODE, pattern=MODE_PATTERN),
+    user: dict = Depends(require_user),
+):
     since = int(time.time()) - max(1, minutes) * 60
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = sqlite3.Row
-        rows = await (await db.execute(
-            "SELECT ts, rx_kbps, tx_kbps, latency_ms FROM net_samples WHERE iface=? AND ts>=? ORDER BY ts",
-            (iface, since),
-        )).fetchall()
-    items = [dict(r) for r in rows]
-    if len(items) > 720:
-        step = math.ceil(len(items)/720)
-        items = items[::step]
+    cols = ("ts", "rx_kbps", "tx_kbps", "latency_ms")
+    async with db_read() as db:
+        items = [dict(zip(cols, r)) async for r in iter_net(db, cols, since, int(time.time()), iface)]
+    # 平均值按全部原始点计算，再降采样
     rx_avg = sum((x.get("rx_kbps") or 0.0) for x in items)/len(items) if items else 0.0
     tx_avg = sum((x.get("tx_kbps") or 0.0) for x in items)/len(items) if items else 0.0
     have_lat = [x.get('latency_ms') for x in items if x.get('latency_ms') is not None]
     lat_avg = (sum(have_lat)/len(have_lat)) if have_lat else 0.0
-    return {"items": items, "summary": {"rx_avg": rx_avg, "tx_avg": tx_avg, "latency_avg": lat_avg}}
+    return {"items": downsample(items, max_points, mode), "summary": {"rx_avg": rx_avg, "tx_avg": tx_avg, "latency_avg": lat_avg}}
 
 
-@router.get("/api/network/errors_hourly")
-async def api_network_errors_hourly(iface: str = "__total__", hours: int = 24, user: dict = Depends(require_user)):
-    since = int(time.time()) - max(1, hours) * 3600
-    async with aiosqlite.connect(DB_PATH) as db:
-        rows = await (await db.execute(
-            "SELECT ts, errin, errout FROM net_samples WHERE iface=? AND ts>=? ORDER BY ts",
-            (iface, since),
-        )).fetchall()
-    buckets: Dict[int, Dict[str,int]] = {}
-    prev = None
-    for (ts, errin, errout) in rows:
-        if prev is not None:
-            di = max(0, int((errin or 0) - (prev[1] or 0)))
-            do = max(0, int((errout or 0) - (prev[2] or 0)))
-            hour = (ts // 3600) * 3600
-            b = buckets.setdefault(hour, {"errin":0, "errout":0})
-            b["errin"] += di; b["errout"] += do
-        prev = (ts, errin or 0, errout or 0)
+async def _error_buckets(iface: str, step: int, count: int) -> dict:
+    """最近 count 个 step 秒桶内的错误包增量（查询时由原始计数器计算，网卡重置 / 增删不产生负值或跳变）。"""
     now = int(time.time())
+    start = (now // step) * step - (max(1, count) - 1) * step
+    async with db_read() as db:
+        res = await net_counter_rates(db, start, now, step, ("errin", "errout"), iface)
     out_items = []
-    for i in range(hours-1, -1, -1):
-        h = ((now // 3600) * 3600) - i*3600
-        bi = buckets.get(h, {"errin":0, "errout":0})
-        out_items.append({"ts": h, "errin": bi["errin"], "errout": bi["errout"], "err_total": bi["errin"]+bi["errout"]})
+    for r in res["items"]:
+        ei, eo = int(round(r["errin"] or 0)), int(round(r["errout"] or 0))
+        out_items.append({"ts": r["ts"], "errin": ei, "errout": eo, "err_total": ei + eo})
     return {"items": out_items}
 
 
+@router.get("/api/network/errors_hourly")
+async def api_network_errors_hourly(iface: str = TOTAL, hours: int = 24, user: dict = Depends(require_user)):
+    return await _error_buckets(iface, 3600, min(hours, 24 * 90))
+
+
 @router.get("/api/network/errors_minutely")
-async def api_network_errors_minutely(iface: str = "__total__", minutes: int = 60, user: dict = Depends(require_user)):
-    since = int(time.time()) - max(1, minutes) * 60
-    async with aiosqlite.connect(DB_PATH) as db:
-        rows = await (await db.execute(
-            "SELECT ts, errin, errout FROM net_samples WHERE iface=? AND ts>=? ORDER BY ts",
-            (iface, since),
-        )).fetchall()
-    # Aggregate per-minute increments based on deltas between consecutive samples
-    buckets: Dict[int, Dict[str,int]] = {}
-    prev = None
-    for (ts, errin, errout) in rows:
-        if prev is not None:
-            di = max(0, int((errin or 0) - (prev[1] or 0)))
-            do = max(0, int((errout or 0) - (prev[2] or 0)))
-            minute = (ts // 60) * 60
-            b = buckets.setdefault(minute, {"errin":0, "errout":0})
-            b["errin"] += di; b["errout"] += do
-        prev = (ts, errin or 0, errout or 0)
-    now = int(time.time())
-    out_items = []
-    for i in range(minutes-1, -1, -1):
-        m = ((now // 60) * 60) - i*60
-        bi = buckets.get(m, {"errin":0, "errout":0})
-        out_items.append({"ts": m, "errin": bi["errin"], "errout": bi["errout"], "err_total": bi["errin"]+bi["errout"]})
-    return {"items": out_items}
+async def api_network_errors_minutely(iface: str = TOTAL, minutes: int = 60, user: dict = Depends(require_user)):
+    return await _error_buckets(iface, 60, min(minutes, 24 * 60))
+
+
+@router.get("/api/network/rates")
+async def api_network_rates(
+    iface: str = TOTAL,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    step: Optional[int] = None,
+    fields: Optional[str] = None,
+    user: dict = Depends(require_user),
+):
+    """网卡计数器（rx_bytes/tx_bytes/errin/errout）在任意窗口、步长上的增量与每秒速率，默认最近 1 小时、约 120 个桶。"""
+    end = int(end or time.time())
+    start = int(start if start is not None else end - 3600)
+    step = int(step or max(1, -(-(end - start) // 120)))
+    cols = [c for c in (fields or "").split(",") if c] or NET_COUNTERS
+    try:
+        async with db_read() as db:
+            return await net_counter_rates(db, start, end, step, cols, iface)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 # SSE: stream latest per-interface network sample for realtime charts
@@ -133,19 +123,15 @@ async def _sse_event(data: dict) -> bytes:
 
 
 @router.get("/sse/network")
-async def sse_network(request: Request, iface: str = "__total__", user: dict = Depends(require_user)):
+async def sse_network(request: Request, iface: str = TOTAL, user: dict = Depends(require_user)):
     async def event_gen():
         last_ts = 0
         while True:
             if await request.is_disconnected():
                 break
             try:
-                async with aiosqlite.connect(DB_PATH) as db:
-                    async with db.execute(
-                        "SELECT ts, rx_kbps, tx_kbps, latency_ms, errin, errout FROM net_data WHERE iface=? ORDER BY ts DESC LIMIT 1",
-                        (iface,),
-                    ) as cur:
-                        row = await cur.fetchone()
+                async with db_read() as db:
+                    row = await latest_net(db, ("ts", "rx_kbps", "tx_kbps", "latency_ms", "errin", "errout"), iface)
                     if row:
                         ts = int(row[0])
                         if ts != last_ts:
@@ -4,6 +4,7 @@ from fastapi.responses import HTMLResponse
 from ..deps import require_admin
 from ..web import render
 from ..utils.audit import audit_log
+from ..utils.inventory import inventory
 
 
 router = APIRouter()
@@ -57,6 +58,9 @@ async def api_ops_run(cmd: str, user: dict = Depends(require_admin())):
     key = (cmd or "").strip()
     if key not in ALLOWED_CMDS:
         raise HTTPException(status_code=400, detail="命令不在白名单内")
+    if key == "lspci" and not shutil.which("lspci"):
+        # 未安装 pciutils 时由 sysfs 清单缓存生成
+        return {"output": inventory.lspci_text()}
     try:
         out = subprocess.check_output(
             ALLOWED_CMDS[key], stderr=subprocess.STDOUT, timeout=8
@@ -0,0 +1,27 @@
+import gzip
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import Response
+from ..deps import require_admin
+from .. import replication
+
+
+router = APIRouter()
+
+
+@router.get("/api/repl/changes")
+async def api_repl_changes(after: int = 0, limit: int = replication.REPL_BATCH,
+                           x_repl_token: Optional[str] = Header(default=None)):
+    """备机拉取 seq > after 的变更（按 X-Repl-Token 认证，不走登录）；响应 gzip 压缩。"""
+    if not replication.is_primary():
+        raise HTTPException(status_code=404)
+    if not replication.check_token(x_repl_token):
+        raise HTTPException(status_code=403)
+    body = await replication.read_changes(after, max(1, min(int(limit), 50000)))
+    return Response(gzip.compress(body, 5), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+
+@router.get("/api/admin/replication")
+async def api_admin_replication(user: dict = Depends(require_admin())):
+    """复制状态：角色、日志范围；备机另有已应用的 seq、落后条数与重放速度。"""
+    return await replication.replication_status()
@@ -1,9 +1,14 @@
-﻿import io, csv, sqlite3, time, datetime
-import aiosqlite
-from fastapi import APIRouter, Depends, Request, HTTPException
-from fastapi.responses import HTMLResponse, PlainTextResponse
+﻿import sqlite3, time, datetime
+from fastapi import APIRouter, Depends, Request, HTTPException, Query
+from fastapi.responses import HTMLResponse
 from ..deps import require_admin
-from ..config import DB_PATH
+from ..db import db_read
+from .. import shards
+from ..crud.samples import GAUGE_COLUMNS, iter_samples
+from ..crud.net import TOTAL, iter_net, list_ifaces
+from ..utils.rollup import resolve, fetch_rows
+from ..utils.downsample import DEFAULT_MODE, MAX_POINTS, MODE_PATTERN, downsample
+from ..utils.export import EXPORT_PATTERN, export_response
 from ..web import render
 
 
@@ -65,36 +70,52 @@ def _get_range(request: Request) -> tuple[int, int]:
     return since, until
 
 
+# 报表分组 -> system_samples 列
+_SAMPLE_GROUPS = {
+    "cpu": ["ts", "cpu_percent"],
+    "load": ["ts", "load1", "load5", "load15"],
+    "mem": ["ts", "mem_percent", "mem_used", "mem_total"],
+    "proc": ["ts", "processes"],
+    "diskio": ["ts", "disk_mb_s"],
+    "gpu": ["ts", "gpu_util_avg", "gpu_temp_avg"],
+}
+
+
 @router.get("/api/reports/series")
-async def api_reports_series(request: Request, user: dict = Depends(require_admin())):
+async def api_reports_series(request: Request,
+                             max_points: int | None = Query(None, ge=3, le=MAX_POINTS),
+                             mode: str = Query(DEFAULT_MODE, pattern=MODE_PATTERN),
+                             user: dict = Depends(require_admin())):
     since, until = _get_range(request)
-    out: dict = {"range": {"since": since, "until": until}}
-    async with aiosqlite.connect(DB_PATH) as db:
+    qp = request.query_params
+    points = int(qp["points"]) if (qp.get("points") or "").isdigit() else None
+    res, _ = resolve(since, until, points, qp.get("resolution"))
+    out: dict = {"range": {"since": since, "until": until}, "resolution": res}
+    async with db_read() as db:
+        for k in _SAMPLE_GROUPS:
+            out[k] = []
+        if res != "raw":
+            # 长窗口：读 rollup 汇总（桶内平均值）
+            net_cols = ["rx_kbps", "tx_kbps", "latency_ms"]
+            series = list(GAUGE_COLUMNS) + [f"net:{TOTAL}:{c}" for c in net_cols]
+            out["net_total"] = []
+            for r in await fetch_rows(db, series, since, until, res):
+                for k, cols in _SAMPLE_GROUPS.items():
+                    if any(r.get(c) is not None for c in cols[1:]):
+                        out[k].append({c: r.get(c) for c in cols})
+                if any(f"net:{TOTAL}:{c}" in r for c in net_cols):
+                    out["net_total"].append({"ts": r["ts"], **{c: r.get(f"net:{TOTAL}:{c}") for c in net_cols}})
         db.row_factory = sqlite3.Row
-        # CPU
-        rows = await (await db.execute("SELECT ts,cpu_percent FROM cpu_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        out["cpu"] = [dict(r) for r in rows]
-        # Load
-        rows = await (await db.execute("SELECT ts,load1,load5,load15 FROM load_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        out["load"] = [dict(r) for r in rows]
-        # Memory
-        rows = await (await db.execute("SELECT ts,mem_percent,mem_used,mem_total FROM mem_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        out["mem"] = [dict(r) for r in rows]
-        # Processes
-        rows = await (await db.execute("SELECT ts,processes FROM proc_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        out["proc"] = [dict(r) for r in rows]
-        # Disk IO
-        rows = await (await db.execute("SELECT ts,disk_mb_s FROM diskio_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        out["diskio"] = [dict(r) for r in rows]
-        # GPU
-        rows = await (await db.execute("SELECT ts,gpu_util_avg,gpu_temp_avg FROM gpu_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        out["gpu"] = [dict(r) for r in rows]
-        # Network total
-        rows = await (await db.execute("SELECT ts,rx_kbps,tx_kbps,latency_ms FROM net_data WHERE iface='__total__' AND ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        out["net_total"] = [dict(r) for r in rows]
-        # Network interfaces (names only)
-        ifaces = await (await db.execute("SELECT DISTINCT iface FROM net_data WHERE iface!='__total__' ORDER BY iface")).fetchall()
-        out["net_ifaces"] = [r[0] for r in ifaces]
+        if res == "raw":
+            # 系统指标：system_samples 一次范围扫描，按分组拆分
+            async for r in iter_samples(db, since, until):
+                for k, cols in _SAMPLE_GROUPS.items():
+                    out[k].append({c: r[c] for c in cols})
+            # Network total
+            net_cols = ("ts", "rx_kbps", "tx_kbps", "latency_ms")
+            out["net_total"] = [dict(zip(net_cols, r)) async for r in iter_net(db, net_cols, since, until)]
+        # Network interfaces (names only, seen within the range)
+        out["net_ifaces"] = [i["name"] for i in await list_ifaces(db, since, until)]
     # simple summary
     def avg(vals):
         return (sum(vals)/len(vals)) if vals else 0.0
@@ -109,52 +130,43 @@ async def api_reports_series(request: Request, user: dict = Depends(require_admi
         "net_tx_avg": avg([float(x.get("tx_kbps") or 0) for x in out.get("net_total") or []]),
         "latency_avg": avg([float(x.get("latency_ms") or 0) for x in out.get("net_total") or []]),
     }
+    # 汇总按全部点计算，各曲线再降采样
+    for k in [*_SAMPLE_GROUPS, "net_total"]:
+        out[k] = downsample(out.get(k) or [], max_points, mode)
     return out
 
 
 @router.get("/api/reports/export.csv")
-async def api_reports_export_csv(request: Request, metric: str, iface: str | None = None, user: dict = Depends(require_admin())):
+async def api_reports_export_csv(request: Request, metric: str, iface: str | None = None,
+                                 format: str = Query("csv", pattern=EXPORT_PATTERN), gzip: bool = False,
+                                 user: dict = Depends(require_admin())):
+    """按游标分块流式导出（format=csv|ndjson，gzip=1 时为 .gz 文件），内存占用与时间范围无关。"""
     since, until = _get_range(request)
     metric = (metric or "").strip().lower()
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = sqlite3.Row
-        hdr: list[str] = []
-        rows: list[sqlite3.Row] = []
-        if metric == "cpu":
-            hdr = ["ts","cpu_percent"]
-            rows = await (await db.execute("SELECT ts,cpu_percent FROM cpu_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        elif metric == "load":
-            hdr = ["ts","load1","load5","load15"]
-            rows = await (await db.execute("SELECT ts,load1,load5,load15 FROM load_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        elif metric == "mem":
-            hdr = ["ts","mem_used","mem_total","mem_percent"]
-            rows = await (await db.execute("SELECT ts,mem_used,mem_total,mem_percent FROM mem_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        elif metric == "proc":
-            hdr = ["ts","processes"]
-            rows = await (await db.execute("SELECT ts,processes FROM proc_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        elif metric == "diskio":
-            hdr = ["ts","disk_mb_s"]
-            rows = await (await db.execute("SELECT ts,disk_mb_s FROM diskio_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        elif metric == "gpu":
-            hdr = ["ts","gpu_util_avg","gpu_temp_avg"]
-            rows = await (await db.execute("SELECT ts,gpu_util_avg,gpu_temp_avg FROM gpu_data WHERE ts BETWEEN ? AND ? ORDER BY ts", (since, until))).fetchall()
-        elif metric in ("net","net_total"):
-            if metric == "net_total":
-                q = "SELECT ts,rx_kbps,tx_kbps,latency_ms FROM net_data WHERE iface='__total__' AND ts BETWEEN ? AND ? ORDER BY ts"
-                hdr = ["ts","rx_kbps","tx_kbps","latency_ms"]
-                rows = await (await db.execute(q, (since, until))).fetchall()
-            else:
-                iface = iface or ""
-                if not iface:
-                    raise HTTPException(status_code=400, detail="missing iface")
-                q = "SELECT ts,rx_kbps,tx_kbps,errin,errout FROM net_data WHERE iface=? AND ts BETWEEN ? AND ? ORDER BY ts"
-                hdr = ["ts","rx_kbps","tx_kbps","errin","errout"]
-                rows = await (await db.execute(q, (iface, since, until))).fetchall()
-        else:
-            raise HTTPException(status_code=400, detail="unknown metric")
-    sio = io.StringIO(); w = csv.writer(sio)
-    w.writerow(hdr)
-    for r in rows:
-        w.writerow([r[k] for k in hdr])
-    return PlainTextResponse(sio.getvalue(), media_type="text/csv")
+    if metric in _SAMPLE_GROUPS:
+        hdr = _SAMPLE_GROUPS[metric]
+        scan = lambda db: shards.iter_rows(db, "system_samples", hdr, since, until)
+    elif metric == "net_total":
+        hdr = ["ts","rx_kbps","tx_kbps","latency_ms"]
+        scan = lambda db: iter_net(db, hdr, since, until)
+    elif metric == "net":
+        if not iface:
+            raise HTTPException(status_code=400, detail="missing iface")
+        hdr = ["ts","rx_kbps","tx_kbps","errin","errout"]
+        scan = lambda db: iter_net(db, hdr, since, until, iface)
+    else:
+        raise HTTPException(status_code=400, detail="unknown metric")
+
+    async def rows():
+        # 读连接在整个下载期间持有；客户端中途断开时也要关闭扫描（DETACH 分片）
+        async with db_read() as db:
+            it = scan(db)
+            try:
+                async for r in it:
+                    yield r
+            finally:
+                await it.aclose()
+
+    name = f"{metric}{'-' + iface if metric == 'net' else ''}-{since}-{until}"
+    return export_response(rows(), hdr, format, gzip, name)
 
@@ -1,9 +1,9 @@
 import sqlite3
-import aiosqlite
 from fastapi import APIRouter, Depends, Request, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from ..config import DB_PATH
+from ..db import db_read, db_write
+from ..replication import log_row
 from ..crypto import hash_password
 from ..deps import require_admin
 from ..utils.audit import audit_log
@@ -25,7 +25,7 @@ class UserUpdate(BaseModel):
 
 @router.get("/api/users")
 async def api_users_list(request: Request, user: dict = Depends(require_admin())):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_read() as db:
         db.row_factory = sqlite3.Row
         cur = await db.execute("SELECT id, username, is_admin, created_at FROM users ORDER BY id DESC")
         rows = await cur.fetchall()
@@ -34,12 +34,13 @@ async def api_users_list(request: Request, user: dict = Depends(require_admin())
 
 @router.post("/api/users")
 async def api_users_create(payload: UserCreate, request: Request, user: dict = Depends(require_admin())):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_write() as db:
         try:
-            await db.execute(
+            cur = await db.execute(
                 "INSERT INTO users (username, password_hash, is_admin) VALUES (?,?,?)",
                 (payload.username, hash_password(payload.password), 1 if payload.is_admin else 0),
             )
+            await log_row(db, "users", cur.lastrowid)
             await db.commit()
         except sqlite3.IntegrityError:
             raise HTTPException(400, "用户名已存在")
@@ -57,8 +58,9 @@ async def api_users_update(uid: int, payload: UserUpdate, request: Request, user
     if not sets:
         return {"ok": True}
     params.append(uid)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_write() as db:
         await db.execute(f"UPDATE users SET {', '.join(sets)} WHERE id=?", tuple(params))
+        await log_row(db, "users", uid)
         await db.commit()
     await audit_log(user["username"], "user_update", f"id={uid}", request)
     return {"ok": True}
@@ -66,8 +68,9 @@ async def api_users_update(uid: int, payload: UserUpdate, request: Request, user
 
 @router.delete("/api/users/{uid}")
 async def api_users_delete(uid: int, request: Request, user: dict = Depends(require_admin())):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_write() as db:
         await db.execute("DELETE FROM users WHERE id=?", (uid,))
+        await log_row(db, "users", uid)
         await db.commit()
     await audit_log(user["username"], "user_delete", f"id={uid}", request)
     return {"ok": True}
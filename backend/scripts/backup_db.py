@@ -0,0 +1,56 @@
+"""
+在线备份主库与分片（不停服务，不影响采样写入），详见 backend/utils/backup.py。
+
+用法: python -m backend.scripts.backup_db OUTPUT [--rollups-only] [--no-shards]
+OUTPUT 为 .tar.gz 归档（- 表示标准输出）；以 .db 结尾时只输出主库文件，可直接替换 data/app.db 恢复。
+恢复归档：停服务后解压到数据目录（app.db 与 samples/）。
+"""
+import os
+import sys
+import time
+import argparse
+
+from ..utils.backup import write_backup
+
+
+def main():
+    ap = argparse.ArgumentParser(description="在线备份数据库")
+    ap.add_argument("output", help="目标文件（.tar.gz / .db），- 表示标准输出")
+    ap.add_argument("--rollups-only", action="store_true", help="原始采样只保留表结构，不备份分片")
+    ap.add_argument("--no-shards", dest="shards", action="store_false", help="不备份按天分片")
+    ap.add_argument("-q", "--quiet", action="store_true", help="不输出进度")
+    args = ap.parse_args()
+
+    last = [0.0]
+
+    def progress(st):
+        now = time.monotonic()
+        if args.quiet or now - last[0] < 1:
+            return
+        last[0] = now
+        pages = f"{st.get('pages_done')}/{st.get('pages_total')}" if st.get("pages_total") else "-"
+        print(f"[{st['files_done']}/{st['files_total']}] {st.get('file')} {pages}, 已输出 {st['bytes_out'] >> 20} MiB",
+              file=sys.stderr)
+
+    plain = args.output.endswith(".db")
+    to_stdout = args.output == "-"
+    tmp = None if to_stdout else args.output + ".part"
+    try:
+        with (open(tmp, "wb") if tmp else os.fdopen(sys.stdout.fileno(), "wb", closefd=False)) as out:
+            st = write_backup(out, rollups_only=args.rollups_only, with_shards=args.shards, plain=plain, progress=progress)
+        if tmp:
+            os.replace(tmp, args.output)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"备份失败: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if tmp and os.path.exists(tmp):
+            os.unlink(tmp)
+    if not args.quiet:
+        print(f"完成: {st['files_done']} 个文件, {st['bytes_out']} 字节, {st['seconds']}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
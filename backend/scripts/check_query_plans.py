@@ -0,0 +1,206 @@
+"""
+查询计划回归检查：在合成数据库上对线上 SQL 逐条执行 EXPLAIN QUERY PLAN，
+任何语句退化为整表扫描（SCAN <表>，且不在该语句的允许列表中）即失败（退出码 1）。
+
+新增/修改 SQL 时同步更新 QUERIES。用法: python -m backend.scripts.check_query_plans [-v]
+"""
+import re
+import sys
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+from ..db import init_db
+from .. import shards
+from ..utils.retention import TIERS
+from ..utils.rollup import RESOLUTIONS, KEYED_SOURCES
+
+
+# (名称, SQL, 参数, 允许整表扫描的表及原因)；{s}/{c} 为附加的行存/冷分片别名
+Query = Tuple[str, str, tuple, Dict[str, str]]
+
+_NOW = 1_750_000_000
+_RANGE = (_NOW - 3600, _NOW)
+_PAGE = "按 rowid 倒序 + LIMIT，只读取一页"
+# net_data 以 iface_id 存放网卡，按名称查询/返回时经主库 net_iface 换算（见 shards._select / _key_cond）
+_IFACE = "(SELECT name FROM main.net_iface WHERE id=iface_id) AS iface"
+_IFACE_ID = " AND iface_id=(SELECT id FROM main.net_iface WHERE name=?)"
+
+QUERIES: List[Query] = [
+    ("auth.login", "SELECT id, username, password_hash, is_admin, token_version FROM users WHERE username=?", ("admin",), {}),
+    ("middleware.token", "SELECT token_version, is_admin FROM users WHERE id=?", (1,), {}),
+    ("users.list", "SELECT id, username, is_admin, created_at FROM users ORDER BY id DESC", (), {"users": "用户表很小"}),
+    ("app.maybe_alert", "SELECT id FROM alerts WHERE title=? AND created_at >= datetime('now','-600 seconds') LIMIT 1", ("CPU 使用率过高",), {}),
+    ("alerts.list", "SELECT * FROM alerts ORDER BY id DESC LIMIT ? OFFSET ?", (100, 0), {"alerts": _PAGE}),
+    ("alerts.list.level", "SELECT * FROM alerts WHERE level=? ORDER BY id DESC LIMIT ? OFFSET ?", ("WARN", 100, 0), {}),
+    ("alerts.list.ack", "SELECT * FROM alerts WHERE acknowledged=? ORDER BY id DESC LIMIT ? OFFSET ?", (0, 100, 0), {}),
+    ("alerts.list.level_ack", "SELECT * FROM alerts WHERE level=? AND acknowledged=? ORDER BY id DESC LIMIT ? OFFSET ?", ("WARN", 0, 100, 0), {}),
+    ("alerts.count", "SELECT COUNT(1) FROM alerts", (), {"alerts": "无条件计数，走最小的覆盖索引"}),
+    ("alerts.count.level", "SELECT COUNT(1) FROM alerts WHERE level=?", ("WARN",), {}),
+    ("alerts.count.ack", "SELECT COUNT(1) FROM alerts WHERE acknowledged=?", (0,), {}),
+    ("alerts.count.level_ack", "SELECT COUNT(1) FROM alerts WHERE level=? AND acknowledged=?", ("WARN", 0), {}),
+    ("alerts.ack", "UPDATE alerts SET acknowledged=1 WHERE id=?", (1,), {}),
+    ("alerts.delete", "DELETE FROM alerts WHERE id=?", (1,), {}),
+    ("alert_manager.recent", "SELECT * FROM alerts WHERE created_at >= datetime('now', '-24 hours') ORDER BY created_at DESC LIMIT ?", (100,), {}),
+    ("alert_manager.critical", "SELECT * FROM alerts WHERE level IN ('CRITICAL', 'ERROR', 'SEVERE', 'FATAL') "
+     "AND created_at >= datetime('now', '-24 hours') ORDER BY created_at DESC", (), {}),
+    ("alert_manager.cleanup", "DELETE FROM alerts WHERE created_at < datetime('now', '-30 days')", (), {}),
+    ("audit.list", "SELECT * FROM audit_logs ORDER BY id DESC LIMIT 200", (), {"audit_logs": _PAGE}),
+    ("audit.user_like", "SELECT * FROM audit_logs WHERE username LIKE ? ESCAPE '\\' ORDER BY id DESC LIMIT 200", ("%dm%",), {"audit_logs": _PAGE}),
+    ("dashboard.io_top", "SELECT ts,rank,pid,name,read_bps,write_bps FROM proc_io_top WHERE ts BETWEEN ? AND ? AND rank < ? ORDER BY ts, rank", (*_RANGE, 10), {}),
+    ("dashboard.metric_samples", "SELECT ts,cpu_percent FROM metric_samples WHERE ts BETWEEN ? AND ? ORDER BY ts ASC", _RANGE, {}),
+    ("cgroups.history", "SELECT ts,cpu_pct,mem_bytes FROM cgroup_data WHERE cgroup=? AND ts BETWEEN ? AND ? ORDER BY ts", ("system.slice", *_RANGE), {}),
+    ("numa.history", "SELECT ts,mem_total,mem_free FROM numa_data WHERE node=? AND ts BETWEEN ? AND ? ORDER BY ts", (0, *_RANGE), {}),
+    ("gpu.util_trend", "SELECT ts, gpu_index, gpu_name, utilization, temperature FROM gpu_detailed_data WHERE ts BETWEEN ? AND ? ORDER BY ts, gpu_index", _RANGE, {}),
+    ("gpu.processes", "SELECT ts, gpu_index, pid, process_name, memory_used FROM gpu_process_data WHERE ts BETWEEN ? AND ? "
+     "ORDER BY ts DESC, gpu_index, memory_used DESC", _RANGE, {}),
+    ("gpu.indexes", "SELECT DISTINCT gpu_index FROM gpu_detailed_data WHERE ts BETWEEN ? AND ?", _RANGE, {}),
+    ("gpu.process_counts", "SELECT COUNT(DISTINCT pid), COUNT(DISTINCT gpu_index) FROM gpu_process_data WHERE ts BETWEEN ? AND ?", _RANGE, {}),
+    ("gpu.statistics", "SELECT * FROM gpu_statistics WHERE period = ? AND ts BETWEEN ? AND ? ORDER BY ts DESC LIMIT 1", ("1h", *_RANGE), {}),
+    ("rollup.state", "SELECT resolution, watermark FROM rollup_state", (), {"rollup_state": "每个分辨率一行"}),
+    # 分片读写（shards.py）
+    ("shards.system_range", "SELECT ts,cpu_percent FROM {s}.system_samples WHERE ts BETWEEN ? AND ?", _RANGE, {}),
+    ("shards.net_range", "SELECT ts," + _IFACE + ",rx_kbps FROM {s}.net_data WHERE ts BETWEEN ? AND ?", _RANGE, {}),
+    ("shards.net_range.iface", "SELECT ts,rx_kbps FROM {s}.net_data WHERE ts BETWEEN ? AND ?" + _IFACE_ID, (*_RANGE, "eth0"), {}),
+    ("shards.main_net_range.iface", "SELECT ts,rx_kbps FROM main.net_data WHERE ts BETWEEN ? AND ?" + _IFACE_ID, (*_RANGE, "eth0"), {}),
+    ("shards.latest", "SELECT ts,cpu_percent FROM {s}.system_samples WHERE true ORDER BY ts DESC LIMIT ?", (1,), {"system_samples": "主键倒序 + LIMIT"}),
+    ("shards.latest.net", "SELECT ts,rx_kbps FROM {s}.net_data WHERE true" + _IFACE_ID + " ORDER BY ts DESC LIMIT ?", ("eth0", 1), {}),
+    ("shards.cold_blocks", "SELECT key,col,ts,count,tsdata,vdata FROM {c}.cold_blocks WHERE tbl=? AND col IN (?,?) AND ts <= ? AND t_last >= ?",
+     ("net_data", "rx_kbps", "tx_kbps", _RANGE[1], _RANGE[0]), {}),
+    ("net.list_ifaces", "SELECT name, first_seen, last_seen, is_virtual FROM net_iface WHERE last_seen >= ? AND first_seen <= ? AND name != ? "
+     "ORDER BY name", (*_RANGE, "__total__"), {"net_iface": "网卡维度表，每块网卡一行"}),
+    ("net.iface_ids", "SELECT name, id FROM net_iface WHERE name IN (?,?)", ("eth0", "eth1"), {}),
+    ("seglog.compacted", "SELECT name FROM segment_log", (), {"segment_log": "每个已汇总的段文件一行，段保留期过后删除"}),
+    ("repl.changes", "SELECT seq, kind, data FROM repl_log WHERE seq > ? ORDER BY seq LIMIT ?", (0, 5000), {}),
+    ("repl.range", "SELECT (SELECT max(seq) FROM repl_log), (SELECT min(seq) FROM repl_log)", (), {}),
+    ("repl.trim_keep", "SELECT seq FROM repl_log WHERE seq >= ? AND seq < ? AND ts >= ? ORDER BY seq LIMIT 1", (0, 20000, _RANGE[0]), {}),
+    ("repl.trim", "DELETE FROM repl_log WHERE seq < ?", (20000,), {}),
+    ("shards.min_ts.cold", "SELECT MIN(ts) FROM {c}.cold_blocks WHERE tbl=?", ("net_data",), {}),
+]
+# rollup.py：逐级汇总与按序列取数
+for _name, _ in RESOLUTIONS:
+    QUERIES.append((f"rollup.read_{_name}", f"SELECT series,ts,count,sum,min,max,last FROM rollup_{_name} WHERE ts >= ? AND ts < ?", _RANGE, {}))
+    QUERIES.append((f"rollup.series_{_name}", f"SELECT series,ts,count,sum,min,max,last FROM rollup_{_name} WHERE series IN (?,?) AND ts >= ? AND ts < ?",
+                    ("cpu_percent", "mem_percent", *_RANGE), {}))
+for _table, _key, _cols in KEYED_SOURCES.values():
+    if _table in shards.SHARDED_TABLES:
+        continue   # 经 shards.iter_rows 读取，见上面的 shards.* 语句
+    QUERIES.append((f"rollup.raw_{_table}", f"SELECT ts,{_key},{','.join(_cols)} FROM {_table} WHERE ts >= ? AND ts < ?", _RANGE, {}))
+# retention.py：各层按 ts 分块删除
+for _tier, _days, _tables in TIERS:
+    for _table in _tables:
+        QUERIES.append((f"retention.min_{_table}", f"SELECT MIN(ts) FROM {_table}", (), {}))
+        QUERIES.append((f"retention.delete_{_table}",
+                        f"DELETE FROM {_table} WHERE ts <= (SELECT MAX(ts) FROM (SELECT ts FROM {_table} WHERE ts < ? ORDER BY ts LIMIT ?))",
+                        (_NOW, 20000), {}))
+
+
+def _fill(conn: sqlite3.Connection, rows: int) -> None:
+    """按线上比例灌入合成数据（每 5 秒一个采样点）。"""
+    rnd = random.Random(7)
+    tss = [_NOW - (rows - i) * 5 for i in range(rows)]
+    names = ["admin", "ops", "alice", "bob", "carol", "dave", "eve", "mallory"]
+    conn.executemany("INSERT OR IGNORE INTO users(username,password_hash) VALUES(?, 'x')", [(n,) for n in names])
+    conn.executemany("INSERT INTO audit_logs(username,action,detail,created_at) VALUES(?,?,?,datetime(?, 'unixepoch'))",
+                     [(rnd.choice(names), "login", "", t) for t in tss])
+    titles = ["CPU 使用率过高", "内存占用过高", "磁盘 IO 过高", "GPU 温度过高", "网络延迟过高"] + [f"服务异常 {i}" for i in range(50)]
+    conn.executemany("INSERT INTO alerts(level,title,message,acknowledged,created_at) VALUES(?,?,?,?,datetime(?, 'unixepoch'))",
+                     [(rnd.choice(["WARN", "ERROR", "CRITICAL"]), rnd.choice(titles), "", rnd.random() < 0.8, t) for t in tss])
+    conn.executemany("INSERT INTO system_samples(ts,cpu_percent,mem_percent) VALUES(?,?,?)", [(t, rnd.random() * 100, 40.0) for t in tss])
+    conn.executemany("INSERT INTO net_iface(name,first_seen,last_seen) VALUES(?,?,?)", [(n, tss[0], tss[-1]) for n in ("eth0", "eth1", "lo")])
+    conn.executemany("INSERT INTO net_data(ts,iface_id,rx_kbps,tx_kbps) VALUES(?,?,?,?)", [(t, i, 1.0, 2.0) for t in tss for i in (1, 2, 3)])
+    conn.executemany("INSERT INTO proc_io_top(ts,rank,pid,name) VALUES(?,?,?,'p')", [(t, r, 100 + r) for t in tss for r in range(5)])
+    conn.executemany("INSERT INTO cgroup_data(cgroup,ts,cpu_pct) VALUES(?,?,1.0)", [(g, t) for t in tss for g in ("system.slice", "user.slice")])
+    conn.executemany("INSERT INTO numa_data(node,ts,mem_total) VALUES(?,?,1)", [(n, t) for t in tss for n in (0, 1)])
+    conn.executemany("INSERT INTO gpu_detailed_data(ts,gpu_index,utilization,temperature) VALUES(?,?,50,60)", [(t, g) for t in tss for g in (0, 1)])
+    conn.executemany("INSERT INTO gpu_process_data(ts,gpu_index,pid,memory_used) VALUES(?,?,?,1)", [(t, 0, 4242) for t in tss])
+    conn.executemany("INSERT INTO gpu_statistics(ts,period) VALUES(?,?)", [(t, p) for t in tss[::60] for p in ("1h", "1d")])
+    for name, step in RESOLUTIONS:
+        conn.executemany(f"INSERT OR IGNORE INTO rollup_{name}(series,ts,count,sum) VALUES(?,?,1,1)",
+                         [(s, t // step * step) for t in tss for s in ("cpu_percent", "mem_percent", "net:eth0:rx_kbps")])
+        conn.execute("INSERT OR REPLACE INTO rollup_state(resolution, watermark) VALUES(?,?)", (name, _NOW))
+    conn.commit()
+
+
+def _shard(path: Path, schema: str, rows: int) -> None:
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(schema)
+        tss = [_NOW - (rows - i) * 5 for i in range(rows)]
+        if schema is shards.COLD_SCHEMA:
+            conn.executemany("INSERT INTO cold_blocks(tbl,key,col,ts,t_last,count,tsdata,vdata) VALUES(?,?,?,?,?,720,x'',x'')",
+                             [("net_data", k, c, t, t + 3599) for t in tss[::720] for k in ("eth0", "eth1") for c in shards.VALUE_COLS["net_data"]])
+        else:
+            conn.executemany("INSERT INTO system_samples(ts,cpu_percent) VALUES(?,1)", [(t,) for t in tss])
+            conn.executemany("INSERT INTO net_data(iface_id,ts,rx_kbps) VALUES(?,?,1)", [(i, t) for t in tss for i in (1, 2, 3)])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _full_scans(conn: sqlite3.Connection, plan: Sequence[tuple], tables: set) -> List[str]:
+    out = []
+    for row in plan:
+        m = re.match(r"SCAN (\w+)", row[3])
+        if m and m.group(1) in tables:
+            out.append(m.group(1))
+    return out
+
+
+def check(rows: int = 20000, verbose: bool = False) -> int:
+    with tempfile.TemporaryDirectory(prefix="qplan_") as tmp:
+        path = str(Path(tmp) / "app.db")
+        asyncio.run(init_db(path))
+        conn = sqlite3.connect(path)
+        t0 = time.time()
+        _fill(conn, rows)
+        _shard(Path(tmp) / "hot.db", shards.SHARD_SCHEMA, rows)
+        _shard(Path(tmp) / "cold.db", shards.COLD_SCHEMA, rows)
+        conn.execute("ATTACH DATABASE ? AS s_x", (str(Path(tmp) / "hot.db"),))
+        conn.execute("ATTACH DATABASE ? AS c_x", (str(Path(tmp) / "cold.db"),))
+        tables = set()
+        for schema in ("main", "s_x", "c_x"):
+            tables.update(r[0] for r in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type='table'"))
+        print(f"合成数据 {rows} 个采样点，用时 {time.time() - t0:.1f}s；检查 {len(QUERIES)} 条语句")
+        failed = skipped = 0
+        for name, sql, params, allow in QUERIES:
+            sql = sql.format(s="s_x", c="c_x")
+            try:
+                plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                if "no such table" in str(e):
+                    skipped += 1
+                    print(f"SKIP {name}: {e}")
+                    continue
+                failed += 1
+                print(f"FAIL {name}: {e}")
+                continue
+            bad = [t for t in _full_scans(conn, plan, tables) if t not in allow]
+            if bad:
+                failed += 1
+                print(f"FAIL {name}: 整表扫描 {', '.join(bad)}")
+            elif verbose:
+                print(f"ok   {name}")
+            if bad or verbose:
+                for r in plan:
+                    print(f"       {r[3]}")
+        conn.close()
+    print(f"{len(QUERIES) - failed - skipped} 通过, {failed} 失败, {skipped} 跳过")
+    return 1 if failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN 回归检查")
+    ap.add_argument("-v", "--verbose", action="store_true", help="打印每条语句的执行计划")
+    ap.add_argument("--rows", type=int, default=20000, help="合成采样点数")
+    args = ap.parse_args()
+    sys.exit(check(args.rows, args.verbose))
+
+
+if __name__ == "__main__":
+    main()
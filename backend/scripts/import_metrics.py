@@ -0,0 +1,66 @@
+"""
+批量导入历史指标（迁移机器、从其他监控工具恢复）：CSV / NDJSON / JSON 数组（可为 .gz），格式见 backend/utils/importer.py。
+
+用法: python -m backend.scripts.import_metrics FILE [FILE ...] [--format csv|ndjson|json] [--iface eth0] [--no-rollup]
+FILE 为 - 时从标准输入读取。
+"""
+import sys
+import gzip
+import json
+import asyncio
+import argparse
+
+from ..db import init_db, db_pool
+from ..utils import importer
+from ..utils.rollup import rebuild_range
+
+
+async def run(args) -> int:
+    await init_db()
+    failed = 0
+    try:
+        for path in args.files:
+            if path == "-":
+                fp = sys.stdin
+            else:
+                # 导出时 gzip=1 得到的 .gz 文件直接读取
+                fp = (gzip.open if path.endswith(".gz") else open)(path, "rt", encoding="utf-8-sig", newline="")
+            try:
+                # 多个文件时只在最后一个之后重算一次 rollup（覆盖全部文件的时间范围）
+                stats = await importer.import_file(fp, args.format, args.iface, rebuild_rollups=False)
+            except Exception as e:
+                failed += 1
+                print(f"{path}: 导入失败: {e}")
+                continue
+            finally:
+                if fp is not sys.stdin:
+                    fp.close()
+            print(f"{path}: {stats['rows']} 行, system_samples {stats['system_samples']}, net_data {stats['net_data']}, "
+                  f"跳过 {stats['skipped']}, {stats['write_seconds']}s, {stats['rows_per_s']} rows/s")
+            if stats["start"] is not None:
+                args.start = stats["start"] if args.start is None else min(args.start, stats["start"])
+                args.end = stats["end"] if args.end is None else max(args.end, stats["end"])
+            if args.json:
+                print(json.dumps(stats, ensure_ascii=False))
+        if args.rollup and args.start is not None:
+            n = await rebuild_range(args.start, args.end)
+            print(f"rollup: 重算 {n} 个桶（{args.start} .. {args.end}）")
+    finally:
+        await db_pool.close()
+    return 1 if failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="批量导入历史指标")
+    ap.add_argument("files", nargs="+", help="CSV / NDJSON / JSON 文件，- 表示标准输入")
+    ap.add_argument("--format", choices=importer.FORMATS, help="默认按文件内容判断")
+    ap.add_argument("--iface", help="网卡 CSV（/api/reports/export.csv?metric=net）没有 iface 列时指定网卡名")
+    ap.add_argument("--no-rollup", dest="rollup", action="store_false", help="不重算 rollup")
+    ap.add_argument("--json", action="store_true", help="同时输出 JSON 统计")
+    args = ap.parse_args()
+    args.start = args.end = None
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
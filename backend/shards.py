@@ -0,0 +1,582 @@
+"""
+按天分片的原始采样库：data/samples/YYYY-MM-DD.db（UTC 日期，与各表 date 列一致）
+
+- 写入：写连接 ATTACH 当天分片，插入 <别名>.<表>；
+- 查询：只 ATTACH 时间范围覆盖到的分片，跨分片用 UNION ALL，查询结束即 DETACH；
+- 冷数据：过了 COLD_AFTER_DAYS 的分片压缩为 YYYY-MM-DD.cold.db（Gorilla 块，见 utils/coldstore.py），
+  查询时透明解码；
+- 保留：过期数据按整天删除文件，不再产生大范围 DELETE。
+用户、告警、审计、汇总表等仍在主库；主库中分片前写入的旧行照常参与查询，由保留任务逐块清理。
+"""
+import os
+import re
+import time
+import asyncio
+import sqlite3
+import calendar
+import aiosqlite
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+from .config import DB_PATH
+from .utils.gorilla import decode_ts, decode_values
+
+
+SHARD_DIR = Path(os.environ.get("SHARD_DIR") or (Path(DB_PATH).parent / "samples"))
+# SQLite 默认最多附加 10 个库；跨更多天的查询按批依次执行
+SHARD_MAX_ATTACH = int(os.environ.get("SHARD_MAX_ATTACH", "8"))
+DAY = 86400
+
+# 网卡采样：接口名存在主库维度表 net_iface，这里只存 iface_id（主库旧表迁移后也是同样结构）
+NET_DATA_SQL = '''
+CREATE TABLE IF NOT EXISTS {name} (
+  iface_id INTEGER NOT NULL,
+  ts INTEGER NOT NULL,
+  rx_bytes INTEGER,
+  tx_bytes INTEGER,
+  errin INTEGER,
+  errout INTEGER,
+  rx_kbps REAL,
+  tx_kbps REAL,
+  latency_ms REAL,
+  PRIMARY KEY (iface_id, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_{name}_ts ON {name}(ts);
+'''
+
+# 分片内的表结构（只含原始采样；写入用 INSERT OR REPLACE，主键即去重键）
+SHARD_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS system_samples (
+  ts INTEGER PRIMARY KEY,
+  cpu_percent REAL,
+  load1 REAL,
+  load5 REAL,
+  load15 REAL,
+  mem_used INTEGER,
+  mem_total INTEGER,
+  mem_percent REAL,
+  processes INTEGER,
+  disk_mb_s REAL,
+  gpu_util_avg REAL,
+  gpu_temp_avg REAL,
+  disk_read_bytes INTEGER,
+  disk_write_bytes INTEGER,
+  interrupts INTEGER
+) WITHOUT ROWID;
+''' + NET_DATA_SQL.format(name="net_data") + '''
+-- 定点存储的列：库中存 round(值 * scale) 的整数，读出时除以 scale
+CREATE TABLE IF NOT EXISTS metric_meta (
+  tbl TEXT NOT NULL,
+  col TEXT NOT NULL,
+  scale INTEGER NOT NULL,
+  PRIMARY KEY (tbl, col)
+) WITHOUT ROWID;
+'''
+SHARDED_TABLES = ("system_samples", "net_data")
+# 各分片表的维度列（冷块按 (表, 维度值, 列) 分序列存放）与数值列
+SHARD_KEYS: Dict[str, Optional[str]] = {"system_samples": None, "net_data": "iface"}
+# 维度列在行存中以 id 存放：表 -> (id 列, 主库维度表)；对外仍按名称查询与返回，冷块直接以名称为 key
+DIM_KEYS: Dict[str, Tuple[str, str]] = {"net_data": ("iface_id", "net_iface")}
+VALUE_COLS: Dict[str, Tuple[str, ...]] = {
+    "system_samples": ("cpu_percent", "load1", "load5", "load15", "mem_used", "mem_total", "mem_percent",
+                       "processes", "disk_mb_s", "gpu_util_avg", "gpu_temp_avg",
+                       "disk_read_bytes", "disk_write_bytes", "interrupts"),
+    "net_data": ("rx_bytes", "tx_bytes", "errin", "errout", "rx_kbps", "tx_kbps", "latency_ms"),
+}
+INT_COLS = frozenset({"mem_used", "mem_total", "processes", "rx_bytes", "tx_bytes", "errin", "errout",
+                      "disk_read_bytes", "disk_write_bytes", "interrupts"})
+# 有界指标（0–100%、温度）只需 0.1 精度：新分片中按 值×scale 存为小整数（2 字节而非 8 字节 REAL），
+# 冷块中整数的 XOR 也更短。倍数写入每个分片自己的 metric_meta，改配置不影响已有分片。SAMPLE_QUANTIZE=0 关闭。
+QUANT_SCALES: Dict[str, Dict[str, int]] = {
+    "system_samples": {"cpu_percent": 10, "mem_percent": 10, "gpu_util_avg": 10, "gpu_temp_avg": 10},
+} if os.environ.get("SAMPLE_QUANTIZE", "1") != "0" else {}
+
+# 冷分片：每个序列每小时一块；ts = 块内首个采样时间，t_last = 末个采样时间
+COLD_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cold_blocks (
+  tbl TEXT NOT NULL,
+  key TEXT NOT NULL,
+  col TEXT NOT NULL,
+  ts INTEGER NOT NULL,
+  t_last INTEGER NOT NULL,
+  count INTEGER NOT NULL,
+  tsdata BLOB NOT NULL,
+  vdata BLOB NOT NULL,
+  PRIMARY KEY (tbl, key, col, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS metric_meta (
+  tbl TEXT NOT NULL,
+  col TEXT NOT NULL,
+  scale INTEGER NOT NULL,
+  PRIMARY KEY (tbl, col)
+) WITHOUT ROWID;
+'''
+
+_DAY_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})(\.cold)?\.db$")
+
+
+def day_of(ts: int) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(int(ts)))
+
+
+def day_start(day: str) -> int:
+    return calendar.timegm(time.strptime(day, "%Y-%m-%d"))
+
+
+def shard_path(day: str) -> Path:
+    return SHARD_DIR / f"{day}.db"
+
+
+def cold_path(day: str) -> Path:
+    return SHARD_DIR / f"{day}.cold.db"
+
+
+def alias_of(day: str, cold: bool = False) -> str:
+    return ("c_" if cold else "s_") + day.replace("-", "")
+
+
+def ro_uri(path: Path) -> str:
+    # 只读打开：文件已被删除/替换时报错，而不是建出一个空库
+    return f"file:{quote(str(path))}?mode=ro"
+
+
+def catalog() -> Dict[str, Dict[str, bool]]:
+    """日期 -> {"hot": 有行存分片, "cold": 有压缩分片}。"""
+    out: Dict[str, Dict[str, bool]] = {}
+    try:
+        names = os.listdir(SHARD_DIR)
+    except Exception:
+        return out
+    for m in map(_DAY_RE.match, names):
+        if m:
+            out.setdefault(m.group(1), {"hot": False, "cold": False})["cold" if m.group(2) else "hot"] = True
+    return out
+
+
+def list_days() -> List[str]:
+    """已存在的分片日期（升序）。"""
+    return sorted(catalog())
+
+
+def days_for(start: int, end: int) -> List[str]:
+    """时间范围 [start, end] 覆盖到的已有分片。"""
+    lo, hi = day_of(max(0, int(start))), day_of(max(0, int(end)))
+    return [d for d in list_days() if lo <= d <= hi]
+
+
+def _create(day: str) -> None:
+    """先在临时文件里建好表再改名，读连接永远不会看到没有表的分片。"""
+    path = shard_path(day)
+    if path.exists():
+        return
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SHARD_SCHEMA)
+        write_meta(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+
+
+def write_meta(conn: sqlite3.Connection) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO metric_meta(tbl,col,scale) VALUES(?,?,?)",
+        [(t, c, sc) for t, cols in QUANT_SCALES.items() for c, sc in cols.items()],
+    )
+
+
+def quantize(value: Any, scale: Optional[int]) -> Any:
+    return value if (value is None or not scale) else int(round(float(value) * scale))
+
+
+# 各分片文件的 metric_meta：(路径, inode) -> {(表, 列): scale}；文件被替换后 inode 变化，自动失效
+_meta_cache: Dict[Tuple[str, int], Dict[Tuple[str, str], int]] = {}
+
+
+async def _meta(db, alias: str, path: Path) -> Dict[Tuple[str, str], int]:
+    try:
+        ck = (str(path), os.stat(path).st_ino)
+    except FileNotFoundError:
+        return {}
+    meta = _meta_cache.get(ck)
+    if meta is None:
+        try:
+            rows = await (await db.execute(f"SELECT tbl,col,scale FROM {alias}.metric_meta")).fetchall()
+        except Exception:
+            rows = []   # 定点存储之前建的分片
+        meta = _meta_cache[ck] = {(r[0], r[1]): int(r[2]) for r in rows if r[2] and int(r[2]) != 1}
+    return meta
+
+
+# 各库文件中表的实际列：(路径, inode) -> {表: 列集合}；升级前建的分片中 net_data 仍以名称存 iface
+_cols_cache: Dict[Tuple[str, int], Dict[str, frozenset]] = {}
+
+
+def _table_cols(rows) -> Dict[str, frozenset]:
+    out: Dict[str, set] = {}
+    for t, c in rows:
+        out.setdefault(t, set()).add(c)
+    return {t: frozenset(c) for t, c in out.items()}
+
+
+_COLS_SQL = "SELECT m.name, p.name FROM {a}.sqlite_master m, pragma_table_info(m.name, '{a}') p WHERE m.type='table'"
+
+
+async def _cols(db, alias: str, path: Path) -> Dict[str, frozenset]:
+    try:
+        ck = (str(path), os.stat(path).st_ino)
+    except FileNotFoundError:
+        return {}
+    cols = _cols_cache.get(ck)
+    if cols is None:
+        cols = _cols_cache[ck] = _table_cols(await (await db.execute(_COLS_SQL.format(a=alias))).fetchall())
+    return cols
+
+
+async def _main_cols(db) -> Dict[str, frozenset]:
+    cols = _cols_cache.get(("main", 0))
+    if cols is None:
+        cols = _cols_cache[("main", 0)] = _table_cols(await (await db.execute(_COLS_SQL.format(a="main"))).fetchall())
+    return cols
+
+
+def forget_layout(path: Optional[Path] = None) -> None:
+    """表结构变化后（如迁移切换了主库的 net_data）丢弃缓存。"""
+    for ck in [k for k in _cols_cache if path is None or k[0] == str(path)]:
+        _cols_cache.pop(ck, None)
+
+
+def _select(table: str, cols: Sequence[str], meta: Dict[Tuple[str, str], int],
+            have: Optional[frozenset] = None, dims: str = "main") -> str:
+    """按分片的 metric_meta 还原定点列（cpu_percent -> cpu_percent/10.0 AS cpu_percent）；
+    have 为该表的实际列：以 id 存放的维度列经 dims 库中的维度表换回名称，其余缺少的列返回 NULL。"""
+    dim = DIM_KEYS.get(table)
+    out = []
+    for c in cols:
+        if have is not None and c not in have:
+            if dim and c == SHARD_KEYS.get(table) and dim[0] in have:
+                out.append(f"(SELECT name FROM {dims}.{dim[1]} WHERE id={dim[0]}) AS {c}")
+            else:
+                out.append(f"NULL AS {c}")
+        elif (table, c) in meta:
+            out.append(f"{c}/{meta[(table, c)]}.0 AS {c}")
+        else:
+            out.append(c)
+    return ",".join(out)
+
+
+async def _attached(db) -> dict:
+    rows = await (await db.execute("PRAGMA database_list")).fetchall()
+    return {r[1]: r[2] for r in rows if r[1][:2] in ("s_", "c_")}
+
+
+async def _attach(db, files: Dict[str, Path], readonly: bool = True) -> None:
+    """确保恰好附加 files（别名 -> 路径），多余的先 DETACH。不能在事务中调用。"""
+    cur = await _attached(db)
+    for alias in cur:
+        if alias not in files:
+            try:
+                await db.execute(f"DETACH DATABASE {alias}")
+            except Exception:
+                pass
+    for alias, path in files.items():
+        if alias not in cur:
+            await db.execute(f"ATTACH DATABASE ? AS {alias}", (ro_uri(path) if readonly else str(path),))
+
+
+async def attach(db, days: Sequence[str]) -> List[str]:
+    """只读附加 days 对应的行存分片，返回别名列表。"""
+    await _attach(db, {alias_of(d): shard_path(d) for d in days})
+    return [alias_of(d) for d in days]
+
+
+async def detach(db, aliases: Iterable[str]) -> None:
+    for alias in aliases:
+        try:
+            await db.execute(f"DETACH DATABASE {alias}")
+        except Exception:
+            pass
+
+
+async def writable(db, table: str, ts: int) -> str:
+    """写连接用：返回 ts 所在分片中该表的限定名（如 s_20250101.system_samples），按需建分片并附加。
+    已压缩的日期再写入时落在新的行存分片里，由下一轮压缩合并。"""
+    day = day_of(ts)
+    alias = alias_of(day)
+    if alias not in await _attached(db):
+        if not shard_path(day).exists():
+            await asyncio.to_thread(_create, day)
+        await _attach(db, {alias: shard_path(day)}, readonly=False)
+        await db.execute(f"PRAGMA {alias}.synchronous=NORMAL")
+        meta = await _meta(db, alias, shard_path(day))
+        _write_scales[alias] = dict(meta)
+        _write_cols[alias] = await _cols(db, alias, shard_path(day))
+    return f"{alias}.{table}"
+
+
+_write_scales: Dict[str, Dict[Tuple[str, str], int]] = {}
+_write_cols: Dict[str, Dict[str, frozenset]] = {}
+
+
+def columns_of(table: str, ts: int) -> frozenset:
+    """ts 所在（已由 writable 附加的）分片中该表的实际列，用于判断维度列是按 id 还是按名称存放。"""
+    return _write_cols.get(alias_of(day_of(ts)), {}).get(table, frozenset())
+
+
+def scales_of(table: str, ts: int) -> Dict[str, int]:
+    """ts 所在（已由 writable 附加的）分片中该表各定点列的 scale，写入前用 quantize() 换算。"""
+    return {c: sc for (t, c), sc in _write_scales.get(alias_of(day_of(ts)), {}).items() if t == table}
+
+
+def _key_cond(table: str, key: Optional[str], have: Optional[frozenset] = None) -> Tuple[str, tuple]:
+    kc = SHARD_KEYS.get(table)
+    if not kc or key is None:
+        return "", ()
+    dim = DIM_KEYS.get(table)
+    if dim and have is not None and kc not in have and dim[0] in have:
+        # 标量子查询只求值一次，仍按 (iface_id, ts) 主键查找
+        return f" AND {dim[0]}=(SELECT id FROM main.{dim[1]} WHERE name=?)", (key,)
+    return f" AND {kc}=?", (key,)
+
+
+async def _arm(db, alias: str, path: Optional[Path], table: str, cols: Sequence[str], key: Optional[str]) -> Tuple[str, tuple]:
+    """一个库（主库或行存分片）上 [start, end] 的查询片段及其维度参数。"""
+    if path is None:
+        meta, have = {}, await _main_cols(db)
+    else:
+        meta, have = await _meta(db, alias, path), await _cols(db, alias, path)
+    kcond, kargs = _key_cond(table, key, have.get(table))
+    return f"SELECT {_select(table, cols, meta, have.get(table))} FROM {alias}.{table} WHERE ts BETWEEN ? AND ?{kcond}", kargs
+
+
+async def _cold_rows(db, alias: str, path: Path, table: str, cols: Sequence[str], start: int, end: int, key: Optional[str]) -> List[tuple]:
+    """解码冷分片中与 [start, end] 相交的块，拼回与行存查询相同形状的行（ts 升序）。
+    同一块的各列共享时间戳流，只解码一次；数值列整块解码后按下标取值。"""
+    kc = SHARD_KEYS.get(table)
+    vcols = [c for c in cols if c not in ("ts", kc)] or [VALUE_COLS[table][0]]
+    sql = (f"SELECT key,col,ts,count,tsdata,vdata FROM {alias}.cold_blocks "
+           f"WHERE tbl=? AND col IN ({','.join('?' * len(vcols))}) AND ts <= ? AND t_last >= ?")
+    args: tuple = (table, *vcols, int(end), int(start))
+    if kc and key is not None:
+        sql += " AND key=?"
+        args += (key,)
+    meta = await _meta(db, alias, path)
+    blocks: Dict[Tuple[str, int], Dict[str, tuple]] = {}
+    for k, c, t0, n, tsdata, vdata in await (await db.execute(sql, args)).fetchall():
+        blocks.setdefault((k, t0), {})[c] = (n, tsdata, vdata)
+    ts_cache: Dict[bytes, List[int]] = {}
+    out: List[tuple] = []
+    for (k, _t0), cmap in blocks.items():
+        n, tsdata, _ = next(iter(cmap.values()))
+        tss = ts_cache.get(tsdata)
+        if tss is None:
+            tss = ts_cache[tsdata] = decode_ts(tsdata, n)
+        values: Dict[str, list] = {}
+        for c, (cn, _, vdata) in cmap.items():
+            vals = decode_values(vdata, cn)
+            sc = meta.get((table, c))
+            if sc:
+                vals = [None if v is None else v / sc for v in vals]
+            values[c] = [None if v is None else int(v) for v in vals] if c in INT_COLS else vals
+        getters = [("ts", None) if c == "ts" else ("key", None) if c == kc else ("val", values.get(c)) for c in cols]
+        for i, t in enumerate(tss):
+            if start <= t <= end:
+                out.append(tuple(t if g == "ts" else k if g == "key" else (v[i] if v is not None else None) for g, v in getters))
+    ti = list(cols).index("ts")
+    out.sort(key=lambda r: r[ti])
+    return out
+
+
+async def _day_rows(db, day: str, kinds: Dict[str, bool], table: str, cols: Sequence[str], start: int, end: int, key: Optional[str]) -> List[tuple]:
+    """读取一天的数据（含冷分片；同一天若还有后写入的行存分片则一并合并）。"""
+    files = {alias_of(day, True): cold_path(day)} if kinds.get("cold") else {}
+    if kinds.get("hot"):
+        files[alias_of(day)] = shard_path(day)
+    await _attach(db, files)
+    try:
+        rows = await _cold_rows(db, alias_of(day, True), cold_path(day), table, cols, start, end, key) if kinds.get("cold") else []
+        if kinds.get("hot"):
+            sql, kargs = await _arm(db, alias_of(day), shard_path(day), table, cols, key)
+            rows += await (await db.execute(sql, (int(start), int(end), *kargs))).fetchall()
+            ti = list(cols).index("ts")
+            rows.sort(key=lambda r: r[ti])
+    finally:
+        await detach(db, files)
+    return rows
+
+
+async def iter_rows(
+    db, table: str, cols: Sequence[str], start: int, end: int,
+    key: Optional[str] = None, desc: bool = False,
+) -> AsyncIterator[tuple]:
+    """按 ts 顺序遍历 [start, end] 内的行：主库旧行 + 覆盖到的分片。
+    连续的行存分片（连同主库）每批 UNION ALL 一次查询；冷分片逐天解码。
+    key 过滤维度列（如 net_data 的 iface），cols 需包含 ts。须完整遍历，以便查询结束后及时 DETACH。
+    """
+    cat = catalog()
+    lo, hi = day_of(max(0, int(start))), day_of(max(0, int(end)))
+    # 旧数据都早于分片：升序时排在最前，降序时排在最后
+    order: List[Optional[str]] = [None] + [d for d in sorted(cat) if lo <= d <= hi]
+    if desc:
+        order.reverse()
+    i = 0
+    while i < len(order):
+        day = order[i]
+        if day is not None and cat[day]["cold"]:
+            rows = await _day_rows(db, day, cat[day], table, cols, start, end, key)
+            for r in (reversed(rows) if desc else rows):
+                yield r
+            i += 1
+            continue
+        batch: List[Optional[str]] = []
+        while i < len(order) and len(batch) < SHARD_MAX_ATTACH and (order[i] is None or not cat[order[i]]["cold"]):
+            batch.append(order[i])
+            i += 1
+        days = [d for d in batch if d is not None]
+        aliases = await attach(db, days)
+        try:
+            arms = [await _arm(db, "main", None, table, cols, key)] if None in batch else []
+            for d, a in zip(days, aliases):
+                arms.append(await _arm(db, a, shard_path(d), table, cols, key))
+            sql = " UNION ALL ".join(a[0] for a in arms)
+            sql += " ORDER BY ts DESC" if desc else " ORDER BY ts"
+            args = tuple(v for _, kargs in arms for v in (int(start), int(end), *kargs))
+            async with db.execute(sql, args) as cur:
+                async for r in cur:
+                    yield r
+        finally:
+            await detach(db, aliases)
+
+
+def iter_rows_sync(
+    table: str, cols: Sequence[str], start: int, end: int,
+    key: Optional[str] = None, desc: bool = False, path: str = DB_PATH, chunk: int = 1000,
+) -> Iterator[tuple]:
+    """iter_rows 的同步版本（供 sqlite3 工具类使用）：在私有事件循环中每次取 chunk 行，
+    与异步查询走同一条路径（主库 + 行存分片 + 冷分片）。不能在事件循环线程中调用。"""
+    loop = asyncio.new_event_loop()
+    db = loop.run_until_complete(aiosqlite.connect(path))
+    it = iter_rows(db, table, cols, start, end, key, desc)
+
+    async def take() -> List[tuple]:
+        out: List[tuple] = []
+        async for r in it:
+            out.append(r)
+            if len(out) >= chunk:
+                break
+        return out
+
+    try:
+        while True:
+            rows = loop.run_until_complete(take())
+            if not rows:
+                break
+            yield from rows
+    finally:
+        try:
+            loop.run_until_complete(it.aclose())
+            loop.run_until_complete(db.close())
+        finally:
+            loop.close()
+
+
+async def fetch_latest(db, table: str, cols: Sequence[str], limit: int = 1, key: Optional[str] = None,
+                       since: Optional[int] = None, until: Optional[int] = None) -> List[tuple]:
+    """最新的 limit 行（ts 降序）：从最新分片往前逐天查找，够数即停。
+    已知数据所在的时间区间时（如 net_iface 的 first_seen / last_seen）用 since / until 限定查找的日期，
+    避免对没有数据的维度值逐天 ATTACH 到最早的分片。"""
+    out: List[tuple] = []
+    cat = catalog()
+    lo = day_of(max(0, int(since))) if since is not None else ""
+    hi = day_of(max(0, int(until))) if until is not None else "9999"
+    for day in [d for d in sorted(cat, reverse=True) if lo <= d <= hi] + [None]:
+        if day is not None and cat[day]["cold"]:
+            rows = list(reversed(await _day_rows(db, day, cat[day], table, cols, 0, day_start(day) + DAY, key)))
+        else:
+            aliases = await attach(db, [day]) if day else []
+            try:
+                sql, kargs = await _arm(db, aliases[0] if day else "main", shard_path(day) if day else None, table, cols, key)
+                rows = await (await db.execute(
+                    sql.replace(" WHERE ts BETWEEN ? AND ?", " WHERE true") + " ORDER BY ts DESC LIMIT ?", (*kargs, limit - len(out)),
+                )).fetchall()
+            finally:
+                await detach(db, aliases)
+        out.extend(rows[:limit - len(out)])
+        if len(out) >= limit:
+            break
+    return out
+
+
+async def min_ts(db, table: str) -> Optional[int]:
+    """最早一行的 ts（主库旧行或最早的非空分片）。"""
+    row = await (await db.execute(f"SELECT MIN(ts) FROM main.{table}")).fetchone()
+    if row and row[0] is not None:
+        return int(row[0])
+    cat = catalog()
+    for day in sorted(cat):
+        files = {alias_of(day): shard_path(day)} if cat[day]["hot"] else {}
+        if cat[day]["cold"]:
+            files[alias_of(day, True)] = cold_path(day)
+        await _attach(db, files)
+        try:
+            firsts = []
+            for alias in files:
+                if alias.startswith("c_"):
+                    sql, args = f"SELECT MIN(ts) FROM {alias}.cold_blocks WHERE tbl=?", (table,)
+                else:
+                    sql, args = f"SELECT MIN(ts) FROM {alias}.{table}", ()
+                r = await (await db.execute(sql, args)).fetchone()
+                if r and r[0] is not None:
+                    firsts.append(int(r[0]))
+        finally:
+            await detach(db, files)
+        if firsts:
+            return min(firsts)
+    return None
+
+
+def unlink_db(base: Path) -> int:
+    freed = 0
+    for p in (base, Path(f"{base}-wal"), Path(f"{base}-shm")):
+        try:
+            freed += p.stat().st_size
+            p.unlink()
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+async def drop_before(db, cutoff: int) -> Tuple[List[str], int]:
+    """删除整天都早于 cutoff 的分片文件（写连接上先 DETACH）。返回 (删除的日期, 释放字节数)。"""
+    dropped: List[str] = []
+    freed = 0
+    for day in list_days():
+        if day_start(day) + DAY > cutoff:
+            break
+        await detach(db, [alias_of(day), alias_of(day, True)])
+        freed += unlink_db(shard_path(day)) + unlink_db(cold_path(day))
+        dropped.append(day)
+    return dropped, freed
+
+
+def disk_usage() -> dict:
+    cat = catalog()
+    days = sorted(cat)
+    hot = cold = 0
+    for d in days:
+        for path, kind in ((shard_path(d), "hot"), (cold_path(d), "cold")):
+            try:
+                size = path.stat().st_size if cat[d][kind] else 0
+            except Exception:
+                size = 0
+            if kind == "hot":
+                hot += size
+            else:
+                cold += size
+    return {"dir": str(SHARD_DIR), "days": len(days), "cold_days": sum(1 for d in days if cat[d]["cold"]),
+            "oldest": days[0] if days else None, "newest": days[-1] if days else None,
+            "bytes": hot + cold, "hot_bytes": hot, "cold_bytes": cold}
@@ -2,6 +2,8 @@ import asyncio
 import aiosqlite
 from typing import List, Dict, Any
 from ..config import DB_PATH
+from ..db import db_read, db_write
+from ..replication import log_row
 
 
 class AlertManager:
@@ -12,17 +14,18 @@ class AlertManager:
     
     async def create_alert(self, level: str, title: str, message: str) -> int:
         """创建新告警"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with db_write() as db:
             cursor = await db.execute(
                 "INSERT INTO alerts (level, title, message) VALUES (?, ?, ?)",
                 (level, title, message)
             )
+            await log_row(db, "alerts", cursor.lastrowid)
             await db.commit()
             return cursor.lastrowid
     
     async def get_recent_alerts(self, hours: int = 24, limit: int = 100) -> List[Dict[str, Any]]:
         """获取最近的告警"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with db_read() as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 """SELECT * FROM alerts 
@@ -36,7 +39,7 @@ class AlertManager:
     
     async def get_critical_alerts(self, hours: int = 24) -> List[Dict[str, Any]]:
         """获取严重告警"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with db_read() as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 """SELECT * FROM alerts 
@@ -49,30 +52,36 @@ class AlertManager:
     
     async def acknowledge_alert(self, alert_id: int) -> bool:
         """确认告警"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with db_write() as db:
             cursor = await db.execute(
                 "UPDATE alerts SET acknowledged = 1 WHERE id = ?",
                 (alert_id,)
             )
+            await log_row(db, "alerts", alert_id)
             await db.commit()
             return cursor.rowcount > 0
     
     async def delete_alert(self, alert_id: int) -> bool:
         """删除告警"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with db_write() as db:
             cursor = await db.execute(
                 "DELETE FROM alerts WHERE id = ?",
                 (alert_id,)
             )
+            if cursor.rowcount:
+                await log_row(db, "alerts", alert_id)
             await db.commit()
             return cursor.rowcount > 0
     
     async def cleanup_old_alerts(self, days: int = 30) -> int:
         """清理旧告警"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "DELETE FROM alerts WHERE created_at < datetime('now', '-{} days')".format(days)
-            )
+        async with db_write() as db:
+            where = "created_at < datetime('now', '-{} days')".format(days)
+            ids = [r[0] for r in await (await db.execute(f"SELECT id FROM alerts WHERE {where}")).fetchall()]
+            cursor = await db.execute(f"DELETE FROM alerts WHERE {where}")
+            # 备机按主键逐条删除（行已不存在，log_row 记为 del）
+            for aid in ids:
+                await log_row(db, "alerts", aid)
             await db.commit()
             return cursor.rowcount
 
@@ -1,10 +1,9 @@
-import aiosqlite
 from fastapi import Request
-from ..config import DB_PATH
+from ..db import db_write
 
 
 async def audit_log(username: str, action: str, detail: str, request: Request):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_write() as db:
         await db.execute(
             "INSERT INTO audit_logs (username, action, detail, ip, ua) VALUES (?,?,?,?,?)",
             (
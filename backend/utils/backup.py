@@ -0,0 +1,245 @@
+"""
+在线备份：用 SQLite 的 backup API 按页分步复制主库和各天分片，步间暂停，采样写入不受影响。
+
+- 源连接先开一个读事务固定快照：WAL 模式下读不阻塞写，复制过程中有新写入也不会让 backup 从头重来；
+  代价是备份期间 WAL 无法回卷，会暂时变大；
+- 结果为 tar.gz（app.db + samples/*.db），可流式下载或写到指定路径；目标以 .db 结尾时只输出主库本身；
+- rollups_only：原始表只保留结构不复制数据（分片全部跳过），只留汇总、用户、告警等；
+- 主库与各分片分别取快照，彼此之间不是同一时刻。
+"""
+import io
+import os
+import time
+import gzip
+import queue
+import sqlite3
+import tarfile
+import asyncio
+import tempfile
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, IO, List, Optional, Tuple
+from ..config import DB_PATH
+from .. import shards
+from .retention import TIERS
+
+
+BACKUP_PAGES = int(os.environ.get("BACKUP_PAGES", "256"))          # 每步复制的页数
+BACKUP_PAUSE = float(os.environ.get("BACKUP_PAUSE", "0.005"))      # 步间暂停（秒）
+BACKUP_ROWS = int(os.environ.get("BACKUP_ROWS", "5000"))           # rollups_only 时逐表复制的批大小
+BACKUP_GZIP_LEVEL = int(os.environ.get("BACKUP_GZIP_LEVEL", "3"))
+RAW_TABLES = frozenset(t for tier, _days, tables in TIERS if tier == "raw" for t in tables)
+_CHUNK = 256 << 10
+
+# 当前（或最近一次）备份的进度
+backup_status: Dict[str, Any] = {}
+_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+
+
+def _report(**kw) -> None:
+    backup_status.update(kw)
+    if _callback:
+        _callback(backup_status)
+
+
+def _open_source(path: Path) -> sqlite3.Connection:
+    src = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+    src.execute("PRAGMA busy_timeout=5000")
+    src.execute("PRAGMA query_only=1")
+    # 开读事务并实际读一次，之后各步都在这个快照上进行
+    src.execute("BEGIN")
+    src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+    return src
+
+
+def _copy_schema_only_raw(src: sqlite3.Connection, dst: sqlite3.Connection) -> None:
+    """逐表复制，原始表只建结构；索引、视图、触发器在数据写完后再建。"""
+    objs = src.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+        "ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END, rowid"
+    ).fetchall()
+    tables = [(n, sql) for t, n, sql in objs if t == "table"]
+    total = sum(1 for n, _ in tables if n not in RAW_TABLES)
+    for name, sql in tables:
+        dst.execute(sql)
+    done = 0
+    for name, _sql in tables:
+        if name in RAW_TABLES:
+            continue
+        # 生成列（hidden 2/3）不能写入
+        cols = [r[1] for r in src.execute(f'PRAGMA table_xinfo("{name}")') if r[6] == 0]
+        collist = ",".join(f'"{c}"' for c in cols)
+        cur = src.execute(f'SELECT {collist} FROM "{name}"')
+        ins = f'INSERT INTO "{name}"({collist}) VALUES({",".join("?" * len(cols))})'
+        while True:
+            rows = cur.fetchmany(BACKUP_ROWS)
+            if not rows:
+                break
+            dst.executemany(ins, rows)
+            dst.commit()
+            time.sleep(BACKUP_PAUSE)
+        done += 1
+        _report(pages_done=done, pages_total=total)
+    try:
+        seq = src.execute("SELECT name, seq FROM sqlite_sequence").fetchall()
+        dst.executemany("INSERT INTO sqlite_sequence(name, seq) VALUES(?,?)", [r for r in seq if r[0] not in RAW_TABLES])
+    except sqlite3.OperationalError:
+        pass   # 没有 AUTOINCREMENT 表
+    for t, _n, sql in objs:
+        if t != "table":
+            dst.execute(sql)
+    dst.commit()
+
+
+def copy_db(src_path: Path, dst_path: Path, raw: bool = True) -> int:
+    """把 src_path 的一致快照复制到 dst_path，返回目标文件字节数。raw=False 时原始表只复制结构。"""
+    src = _open_source(src_path)
+    dst = sqlite3.connect(str(dst_path))
+    try:
+        if raw:
+            def progress(_status, remaining, total):
+                _report(pages_done=total - remaining, pages_total=total)
+                time.sleep(BACKUP_PAUSE)
+            src.backup(dst, pages=BACKUP_PAGES, progress=progress)
+        else:
+            _copy_schema_only_raw(src, dst)
+        # 备份文件不需要 WAL，恢复时直接复制即可
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.execute("ROLLBACK")
+        src.close()
+    return dst_path.stat().st_size
+
+
+def _sources(rollups_only: bool, with_shards: bool) -> List[Tuple[Path, str]]:
+    out = [(Path(DB_PATH), "app.db")]
+    if with_shards and not rollups_only:
+        for day, kinds in sorted(shards.catalog().items()):
+            for cold in (False, True):
+                if kinds["cold" if cold else "hot"]:
+                    path = shards.cold_path(day) if cold else shards.shard_path(day)
+                    out.append((path, f"samples/{path.name}"))
+    return out
+
+
+def write_backup(out: IO[bytes], rollups_only: bool = False, with_shards: bool = True, plain: bool = False,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """同步执行一次备份，结果写入 out（tar.gz；plain 时为主库文件本身）。快照先落在数据目录下的临时目录。"""
+    global _callback
+    sources = _sources(rollups_only, with_shards and not plain)
+    _callback = progress
+    backup_status.clear()
+    backup_status.update(running=True, started_at=int(time.time()), rollups_only=rollups_only,
+                         files_total=len(sources), files_done=0, bytes_out=0, error=None)
+    t0 = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory(prefix="backup-", dir=Path(DB_PATH).parent) as tmp:
+            if plain:
+                snap = Path(tmp) / "app.db"
+                _report(file="app.db", pages_done=0, pages_total=None)
+                copy_db(sources[0][0], snap, raw=not rollups_only)
+                with open(snap, "rb") as f:
+                    while chunk := f.read(_CHUNK):
+                        out.write(chunk)
+                        _report(bytes_out=backup_status["bytes_out"] + len(chunk))
+                _report(files_done=1)
+            else:
+                counter = _Counting(out)
+                with gzip.GzipFile(fileobj=counter, mode="wb", compresslevel=BACKUP_GZIP_LEVEL, mtime=0) as gz, \
+                        tarfile.open(fileobj=gz, mode="w|") as tar:
+                    for i, (src, arcname) in enumerate(sources):
+                        if not src.exists():
+                            continue
+                        snap = Path(tmp) / f"{i}.db"
+                        _report(file=arcname, pages_done=0, pages_total=None)
+                        copy_db(src, snap, raw=not rollups_only or arcname != "app.db")
+                        tar.add(str(snap), arcname=arcname)
+                        snap.unlink()
+                        _report(files_done=i + 1)
+        _report(running=False, finished_at=int(time.time()), seconds=round(time.perf_counter() - t0, 3))
+    except BaseException as e:
+        _report(running=False, finished_at=int(time.time()), error=str(e) or type(e).__name__)
+        raise
+    finally:
+        _callback = None
+    return dict(backup_status)
+
+
+class _Counting(io.RawIOBase):
+    """统计输出字节数（压缩后）。"""
+
+    def __init__(self, out: IO[bytes]):
+        self.out = out
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        n = self.out.write(b)
+        n = len(b) if n is None else n
+        backup_status["bytes_out"] = backup_status.get("bytes_out", 0) + n
+        return n
+
+
+class _Pipe(io.RawIOBase):
+    """备份线程写、事件循环读的有界管道；读端放弃后写端抛出 BrokenPipeError 以终止备份。"""
+
+    def __init__(self):
+        self.q: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=16)
+        self.buf = bytearray()
+        self.abort = False
+
+    def writable(self) -> bool:
+        return True
+
+    def _put(self, item: Optional[bytes]) -> None:
+        while True:
+            if self.abort:
+                raise BrokenPipeError("backup download aborted")
+            try:
+                self.q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, b) -> int:
+        self.buf += b
+        if len(self.buf) >= _CHUNK:
+            self._put(bytes(self.buf))
+            self.buf.clear()
+        return len(b)
+
+    def finish(self) -> None:
+        if self.buf:
+            self._put(bytes(self.buf))
+            self.buf.clear()
+
+
+async def stream_backup(rollups_only: bool = False, with_shards: bool = True, plain: bool = False) -> AsyncIterator[bytes]:
+    """边备份边产出压缩后的数据块（供 StreamingResponse）。"""
+    pipe = _Pipe()
+
+    def produce():
+        try:
+            write_backup(pipe, rollups_only=rollups_only, with_shards=with_shards, plain=plain)
+            pipe.finish()
+        finally:
+            try:
+                pipe._put(None)
+            except BrokenPipeError:
+                pass
+
+    task = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while True:
+            chunk = await asyncio.to_thread(pipe.q.get)
+            if chunk is None:
+                break
+            yield chunk
+        await task
+    finally:
+        # 客户端断开：备份线程在下一次写入时退出，错误已记录在 backup_status 中
+        pipe.abort = True
+        await asyncio.wait([task])
+        if not task.cancelled():
+            task.exception()
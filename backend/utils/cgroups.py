@@ -0,0 +1,219 @@
+import os, re, json, time, heapq, asyncio
+from typing import Dict, Any, List, Optional, Tuple
+from ..db import db_write
+from ..replication import log_rows
+from . import procfs
+
+
+MAX_DEPTH = 8
+
+_RE_CONTAINER_ID = re.compile(r"(?:docker|libpod|cri-containerd|crio)-([0-9a-f]{12,64})\.scope$")
+_RE_BARE_ID = re.compile(r"^[0-9a-f]{64}$")
+_RE_POD = re.compile(r"pod([0-9a-f_\-]{36})")
+
+
+def _detect_root() -> str:
+    # 纯 v2 挂载在 /sys/fs/cgroup；hybrid 模式下 v2 层级位于 /sys/fs/cgroup/unified
+    for p in (os.environ.get("CGROUP_ROOT"), "/sys/fs/cgroup", "/sys/fs/cgroup/unified"):
+        if p and os.path.exists(os.path.join(p, "cgroup.controllers")):
+            return p
+    return "/sys/fs/cgroup"
+
+
+CGROUP_ROOT = _detect_root()
+
+
+def supported() -> bool:
+    """cgroup v2（统一层级）才支持；纯 v1/非 Linux 返回 False。"""
+    return os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers"))
+
+
+class CgroupResolver:
+    """把 cgroup 路径映射为 (kind, name)：systemd unit / 容器名 / k8s pod。结果按路径缓存。"""
+
+    def __init__(self):
+        self._cache: Dict[str, Tuple[str, str]] = {}
+
+    def _container_name(self, cid: str) -> str:
+        for p in (
+            f"/var/lib/docker/containers/{cid}/config.v2.json",
+            f"/var/lib/containers/storage/overlay-containers/{cid}/userdata/config.json",
+        ):
+            txt = procfs.read_text(p)
+            if not txt:
+                continue
+            try:
+                data = json.loads(txt)
+            except ValueError:
+                continue
+            name = data.get("Name") or (data.get("annotations") or {}).get("io.podman.annotations.name")
+            if name:
+                return str(name).lstrip("/")
+        return cid[:12]
+
+    def resolve(self, rel: str) -> Tuple[str, str]:
+        hit = self._cache.get(rel)
+        if hit is not None:
+            return hit
+        leaf = rel.rsplit("/", 1)[-1]
+        m = _RE_CONTAINER_ID.search(leaf)
+        if m or _RE_BARE_ID.match(leaf):
+            cid = m.group(1) if m else leaf
+            res = ("container", self._container_name(cid))
+        elif "kubepods" in rel and _RE_POD.search(rel):
+            res = ("pod", _RE_POD.search(rel).group(1).replace("_", "-"))
+        elif leaf.endswith((".service", ".scope", ".slice", ".socket", ".mount")):
+            res = ("unit", leaf)
+        else:
+            res = ("cgroup", rel)
+        self._cache[rel] = res
+        return res
+
+    def forget_missing(self, alive) -> None:
+        self._cache = {k: v for k, v in self._cache.items() if k in alive}
+
+
+def _handle_cap(ceiling: int = 2048) -> int:
+    """缓存句柄上限：RLIMIT_NOFILE 软限制的 1/4（其余留给 sqlite、套接字与分片 ATTACH），最多 ceiling。"""
+    try:
+        import resource
+        soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    except Exception:
+        return 256
+    if soft == resource.RLIM_INFINITY or soft <= 0:
+        return ceiling
+    return max(16, min(ceiling, soft // 4))
+
+
+class CgroupCollector:
+    """每个 tick 遍历一次 /sys/fs/cgroup，读取叶子 cgroup 的
+    cpu.stat usage_usec / memory.current / io.stat / pids.current，
+    与上一轮计数做差得到 CPU% 与 I/O 速率。
+    """
+
+    def __init__(self, max_series: int = 50):
+        self.max_series = max_series
+        self.reader = procfs.CachedReader(max_handles=_handle_cap())
+        self.resolver = CgroupResolver()
+        self._prev: Dict[str, Tuple[float, int, int, int]] = {}
+        self.items: List[Dict[str, Any]] = []
+        self.ts: int = 0
+        self.ready = False
+
+    def _leaves(self) -> List[str]:
+        out: List[str] = []
+        stack = [(CGROUP_ROOT, 0)]
+        while stack:
+            path, depth = stack.pop()
+            try:
+                subdirs = [e.path for e in os.scandir(path) if e.is_dir(follow_symlinks=False)]
+            except OSError:
+                continue
+            if not subdirs and path != CGROUP_ROOT:
+                out.append(path)
+            elif depth < MAX_DEPTH:
+                stack.extend((p, depth + 1) for p in subdirs)
+        return out
+
+    def _io_bytes(self, path: str) -> Tuple[int, int]:
+        rb = wb = 0
+        txt = self.reader.read(path + "/io.stat")
+        if txt:
+            for ln in txt.splitlines():
+                for tok in ln.split()[1:]:
+                    k, _, v = tok.partition("=")
+                    if k == "rbytes":
+                        rb += int(v)
+                    elif k == "wbytes":
+                        wb += int(v)
+        return rb, wb
+
+    def sample(self) -> List[Dict[str, Any]]:
+        if not supported():
+            return []
+        now_t = time.time()
+        ncpu = os.cpu_count() or 1
+        cur: Dict[str, Tuple[float, int, int, int]] = {}
+        rows: List[Dict[str, Any]] = []
+        files_alive = set()
+        for path in self._leaves():
+            usage = procfs.parse_kv(self.reader.read(path + "/cpu.stat"), sep=" ").get("usage_usec")
+            if usage is None:
+                continue
+            rb, wb = self._io_bytes(path)
+            mem = self.reader.read_int(path + "/memory.current")
+            pids = self.reader.read_int(path + "/pids.current")
+            for f in ("/cpu.stat", "/io.stat", "/memory.current", "/pids.current"):
+                files_alive.add(path + f)
+            rel = path[len(CGROUP_ROOT):] or "/"
+            cur[rel] = (now_t, usage, rb, wb)
+            prev = self._prev.get(rel)
+            cpu_pct = rbps = wbps = 0.0
+            if prev:
+                dt = max(0.001, now_t - prev[0])
+                cpu_pct = max(0.0, (usage - prev[1]) / dt / 1e6 * 100.0)
+                rbps = max(0.0, (rb - prev[2]) / dt)
+                wbps = max(0.0, (wb - prev[3]) / dt)
+            kind, name = self.resolver.resolve(rel)
+            rows.append({
+                "cgroup": rel, "kind": kind, "name": name,
+                "cpu_pct": cpu_pct, "cpu_host_pct": cpu_pct / ncpu,
+                "mem_bytes": mem or 0, "io_read_bps": rbps, "io_write_bps": wbps,
+                "pids": pids or 0,
+            })
+        self.ready = bool(self._prev)
+        self._prev = cur
+        self.reader.close_missing(files_alive)
+        self.resolver.forget_missing(cur)
+        self.items = self._bound(rows)
+        self.ts = int(now_t)
+        return self.items
+
+    def _bound(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """限制序列基数：CPU / 内存 / I/O 三个维度各取 Top，其余合并为 __other__。"""
+        if len(rows) <= self.max_series:
+            return sorted(rows, key=lambda r: r["cpu_pct"], reverse=True)
+        per = max(1, self.max_series // 3)
+        keep = {id(r) for r in heapq.nlargest(per, rows, key=lambda r: r["cpu_pct"])}
+        keep |= {id(r) for r in heapq.nlargest(per, rows, key=lambda r: r["mem_bytes"])}
+        keep |= {id(r) for r in heapq.nlargest(per, rows, key=lambda r: r["io_read_bps"] + r["io_write_bps"])}
+        kept = [r for r in rows if id(r) in keep]
+        other = {"cgroup": "__other__", "kind": "other", "name": f"其他 {len(rows) - len(kept)} 个",
+                 "cpu_pct": 0.0, "cpu_host_pct": 0.0, "mem_bytes": 0, "io_read_bps": 0.0, "io_write_bps": 0.0, "pids": 0}
+        for r in rows:
+            if id(r) in keep:
+                continue
+            for k in ("cpu_pct", "cpu_host_pct", "mem_bytes", "io_read_bps", "io_write_bps", "pids"):
+                other[k] += r[k]
+        kept.sort(key=lambda r: r["cpu_pct"], reverse=True)
+        return kept + [other]
+
+    def snapshot(self, kind: Optional[str] = None) -> Dict[str, Any]:
+        items = self.items if not kind else [r for r in self.items if r["kind"] == kind]
+        return {"ts": self.ts, "supported": supported(), "items": items}
+
+
+# 全局采集器实例
+cgroup_collector = CgroupCollector(max_series=int(os.environ.get("CGROUP_MAX_SERIES", "50")))
+
+
+async def cgroup_worker():
+    """后台采集 cgroup 资源并写入 cgroup_data。"""
+    interval = int(os.environ.get("CGROUP_INTERVAL", os.environ.get("SAMPLE_INTERVAL", "5")))
+    if not supported():
+        return
+    while True:
+        try:
+            items = await asyncio.to_thread(cgroup_collector.sample)
+            ts = cgroup_collector.ts
+            if items and ts and cgroup_collector.ready:
+                rows = [(r["cgroup"], ts, r["kind"], r["name"], r["cpu_pct"], r["mem_bytes"], r["io_read_bps"], r["io_write_bps"], r["pids"]) for r in items]
+                async with db_write() as db:
+                    await db.executemany(
+                        "INSERT OR REPLACE INTO cgroup_data(cgroup,ts,kind,name,cpu_pct,mem_bytes,io_read_bps,io_write_bps,pids) VALUES(?,?,?,?,?,?,?,?,?)", rows,
+                    )
+                    await log_rows(db, "cgroup_data", ("cgroup", "ts", "kind", "name", "cpu_pct", "mem_bytes", "io_read_bps", "io_write_bps", "pids"), rows)
+                    await db.commit()
+        except Exception:
+            pass
+        await asyncio.sleep(interval)
@@ -0,0 +1,179 @@
+"""
+冷数据压缩：把结束超过 COLD_AFTER_DAYS 天的日分片转换为 Gorilla 块（data/samples/YYYY-MM-DD.cold.db）。
+每个序列（表, 维度值, 列）每小时一块，时间戳 delta-of-delta、数值 XOR 编码；由保留任务调用，
+查询时由 backend/shards.py 透明解码。转换先写临时文件并逐点校验，再原子替换，失败则保留原分片。
+"""
+import os
+import time
+import asyncio
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from .. import shards
+from ..config import DB_PATH
+from ..db import db_write
+from .gorilla import encode_ts, encode_values, decode_ts, decode_values
+
+
+COLD_AFTER_DAYS = int(os.environ.get("COLD_AFTER_DAYS", "2"))   # <= 0 表示不压缩
+BLOCK_SECONDS = 3600
+
+cold_stats: Dict[str, Any] = {"runs": 0, "last_run": None, "compacted": [], "cold_days": 0, "hot_bytes": 0, "cold_bytes": 0}
+
+
+def _file_sig(day: str) -> Tuple:
+    """分片是否被写过的指纹：主文件大小/修改时间 + WAL 大小（只读打开也可能新建空的 -wal）。"""
+    base = shards.shard_path(day)
+    try:
+        st = os.stat(base)
+    except FileNotFoundError:
+        return (None,)
+    try:
+        wal = os.stat(f"{base}-wal").st_size
+    except FileNotFoundError:
+        wal = 0
+    return (st.st_size, st.st_mtime_ns, wal)
+
+
+def _file_meta(conn: sqlite3.Connection) -> Dict[Tuple[str, str], int]:
+    try:
+        return {(r[0], r[1]): int(r[2]) for r in conn.execute("SELECT tbl,col,scale FROM metric_meta") if r[2]}
+    except sqlite3.Error:
+        return {}
+
+
+def _load(day: str) -> Dict[Tuple[str, str], Dict[int, Dict[str, Any]]]:
+    """(表, 维度值) -> {ts: {列: 值}}：先读已有冷块，再叠加行存分片（同一 ts 以行存为准）。定点列还原为实际值。"""
+    data: Dict[Tuple[str, str], Dict[int, Dict[str, Any]]] = {}
+    cold, hot = shards.cold_path(day), shards.shard_path(day)
+    if cold.exists():
+        conn = sqlite3.connect(shards.ro_uri(cold), uri=True)
+        try:
+            meta = _file_meta(conn)
+            for tbl, key, col, n, tsdata, vdata in conn.execute("SELECT tbl,key,col,count,tsdata,vdata FROM cold_blocks"):
+                rows = data.setdefault((tbl, key), {})
+                sc = meta.get((tbl, col))
+                for t, v in zip(decode_ts(tsdata, n), decode_values(vdata, n)):
+                    rows.setdefault(t, {})[col] = v / sc if (sc and v is not None) else v
+        finally:
+            conn.close()
+    if hot.exists():
+        conn = sqlite3.connect(shards.ro_uri(hot), uri=True)
+        try:
+            meta = _file_meta(conn)
+            have = shards._table_cols(conn.execute(shards._COLS_SQL.format(a="main")))
+            # 维度列按 id 存放的表：附加主库解析名称（冷块以名称为 key）；表为空则跳过
+            by_id = [t for t, dim in shards.DIM_KEYS.items()
+                     if dim[0] in have.get(t, ()) and conn.execute(f"SELECT 1 FROM {t} LIMIT 1").fetchone()]
+            if by_id:
+                conn.execute("ATTACH DATABASE ? AS app", (shards.ro_uri(Path(DB_PATH)),))
+            for table in shards.SHARDED_TABLES:
+                if table in shards.DIM_KEYS and shards.DIM_KEYS[table][0] in have.get(table, ()) and table not in by_id:
+                    continue
+                kc = shards.SHARD_KEYS.get(table)
+                vcols = shards.VALUE_COLS[table]
+                sel = shards._select(table, ["ts", *vcols], meta, have.get(table), dims="app")
+                if kc:
+                    sel += "," + shards._select(table, [kc], {}, have.get(table), dims="app")
+                for r in conn.execute(f"SELECT {sel} FROM {table}"):
+                    data.setdefault((table, r[-1] if kc else ""), {})[r[0]] = dict(zip(vcols, r[1:]))
+        finally:
+            conn.close()
+    return data
+
+
+def _stored(table: str, col: str, value: Any) -> Any:
+    """写入冷块的值：按当前 QUANT_SCALES 定点化（与新建冷文件的 metric_meta 一致）。"""
+    return shards.quantize(value, shards.QUANT_SCALES.get(table, {}).get(col))
+
+
+def _encode(data) -> List[tuple]:
+    blocks = []
+    for (table, key), rows in data.items():
+        tss = sorted(rows)
+        i = 0
+        while i < len(tss):
+            hour = tss[i] // BLOCK_SECONDS
+            j = i
+            while j < len(tss) and tss[j] // BLOCK_SECONDS == hour:
+                j += 1
+            part = tss[i:j]
+            tsdata = encode_ts(part)
+            for col in shards.VALUE_COLS[table]:
+                vdata = encode_values([_stored(table, col, rows[t].get(col)) for t in part])
+                blocks.append((table, key, col, part[0], part[-1], len(part), tsdata, vdata))
+            i = j
+    return blocks
+
+
+def _verify(blocks: List[tuple], data) -> None:
+    for table, key, col, _t0, _t1, n, tsdata, vdata in blocks:
+        rows = data[(table, key)]
+        for t, v in zip(decode_ts(tsdata, n), decode_values(vdata, n)):
+            src = _stored(table, col, rows[t].get(col))
+            if src is None or v is None:
+                ok = src is None and v is None
+            else:
+                ok = float(src) == v or (src != src and v != v)
+            if not ok:
+                raise ValueError(f"cold block mismatch {table}/{key}/{col}@{t}")
+
+
+def compact_day(day: str) -> Optional[Dict[str, Any]]:
+    """同步执行：生成 <day>.cold.tmp 并校验，返回统计（无数据时返回 None）。替换文件由调用方在写锁内完成。"""
+    data = _load(day)
+    if not data:
+        return None
+    blocks = _encode(data)
+    _verify(blocks, data)
+    tmp = shards.cold_path(day).with_suffix(".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(shards.COLD_SCHEMA)
+        shards.write_meta(conn)
+        conn.executemany("INSERT INTO cold_blocks(tbl,key,col,ts,t_last,count,tsdata,vdata) VALUES(?,?,?,?,?,?,?,?)", blocks)
+        conn.commit()
+    finally:
+        conn.close()
+    return {"day": day, "tmp": str(tmp), "rows": sum(len(r) for r in data.values()), "blocks": len(blocks)}
+
+
+async def compact_once(now: Optional[int] = None) -> Dict[str, Any]:
+    """压缩所有已过冷却期、仍有行存分片的日期（含压缩后又写入的补录数据）。"""
+    now = int(now or time.time())
+    done: List[Dict[str, Any]] = []
+    if COLD_AFTER_DAYS > 0:
+        limit = now - COLD_AFTER_DAYS * shards.DAY
+        for day, kinds in sorted(shards.catalog().items()):
+            if not kinds["hot"] or shards.day_start(day) + shards.DAY > limit:
+                continue
+            sig = _file_sig(day)
+            hot_bytes = (sig[0] or 0) + (sig[2] if len(sig) > 2 else 0)
+            try:
+                res = await asyncio.to_thread(compact_day, day)
+            except Exception:
+                continue
+            async with db_write() as db:
+                # 读取期间若有补录写入，放弃本次结果，下一轮重做
+                if _file_sig(day) != sig:
+                    if res:
+                        os.unlink(res["tmp"])
+                    continue
+                await shards.detach(db, [shards.alias_of(day), shards.alias_of(day, True)])
+                if res:
+                    os.replace(res["tmp"], shards.cold_path(day))
+                shards.unlink_db(shards.shard_path(day))
+            if res:
+                res.pop("tmp")
+                res.update(hot_bytes=hot_bytes, cold_bytes=shards.cold_path(day).stat().st_size)
+                done.append(res)
+    cold_stats["runs"] += 1
+    cold_stats["last_run"] = now
+    cold_stats["compacted"] = done
+    usage = shards.disk_usage()
+    cold_stats["cold_days"] = usage["cold_days"]
+    cold_stats["hot_bytes"] = usage["hot_bytes"]
+    cold_stats["cold_bytes"] = usage["cold_bytes"]
+    return cold_stats
@@ -0,0 +1,217 @@
+"""
+历史接口共用的服务端降采样：行（dict，含 ts）按 max_points 压缩后再返回，前端 MiniLine 只需画几百个点。
+
+- lttb：Largest-Triangle-Three-Buckets，从原始行中挑点（多列时按各列归一化后的三角形面积之和挑选），
+  形状与峰值保留较好，返回的都是原始行；
+- minmax：按时间等宽分桶，每桶输出两行（桶内首、末时刻），每列的最小、最大值按出现先后放入这两行，
+  任何尖峰都不会丢失；
+- avg：按时间等宽分桶取平均（与 rollup 汇总相同的语义，会削平尖峰）。
+分桶用 bisect 定位边界，桶内的 sum/min/max/index 直接作用于列切片（C 层完成），不逐点做 Python 运算。
+
+downsample_stream 用于边查询边降采样的原始数据：窗口 [start, end] 事先已知，按时间等宽分桶逐行累计，
+内存只与 max_points 有关；lttb 先按 LTTB_PRESAMPLE 倍的点数做 minmax 预聚合，再对结果做 LTTB
+（此时与 minmax 一样，多列的行可能由桶内不同时刻的值组成）。
+"""
+import bisect
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+
+MODES = ("lttb", "minmax", "avg")
+DEFAULT_MODE = "lttb"
+MAX_POINTS = 10000
+MODE_PATTERN = "^(" + "|".join(MODES) + ")$"
+LTTB_PRESAMPLE = 4
+
+
+def value_fields(rows: Sequence[Dict[str, Any]], x: str = "ts") -> List[str]:
+    """数值列（前若干行中出现过 int/float 的列）；名称等其他列原样随行返回。"""
+    head = rows[:64]
+    return [k for k in rows[0] if k != x and any(isinstance(r.get(k), (int, float)) and not isinstance(r.get(k), bool) for r in head)]
+
+
+def _time_buckets(xs: List[float], n: int) -> List[Tuple[int, int]]:
+    """按时间把 xs 等宽分成 n 桶，返回非空桶的下标区间 [i, j)。"""
+    t0, span = xs[0], (xs[-1] - xs[0]) or 1
+    out = []
+    i = 0
+    for b in range(1, n + 1):
+        j = len(xs) if b == n else bisect.bisect_left(xs, t0 + span * b / n, i)
+        if j > i:
+            out.append((i, j))
+            i = j
+    return out
+
+
+def _avg(rows, xs, cols, x, n) -> List[Dict[str, Any]]:
+    out = []
+    for i, j in _time_buckets(xs, n):
+        row = dict(rows[i])
+        for f, col in cols.items():
+            sl = col[i:j]
+            if None in sl:
+                sl = [v for v in sl if v is not None]
+            row[f] = sum(sl) / len(sl) if sl else None
+        out.append(row)
+    return out
+
+
+def _minmax(rows, xs, cols, x, n) -> List[Dict[str, Any]]:
+    out = []
+    for i, j in _time_buckets(xs, max(1, n // 2)):
+        if j - i <= 2:
+            out.extend(rows[i:j])
+            continue
+        a, b = dict(rows[i]), dict(rows[j - 1])
+        for f, col in cols.items():
+            sl = col[i:j]
+            if None in sl:
+                live = [(v, k) for k, v in enumerate(sl) if v is not None]
+                if not live:
+                    a[f] = b[f] = None
+                    continue
+                (lo, plo), (hi, phi) = min(live), max(live)
+            else:
+                lo, hi = min(sl), max(sl)
+                plo, phi = sl.index(lo), sl.index(hi)
+            a[f], b[f] = (lo, hi) if plo <= phi else (hi, lo)
+        out.extend((a, b))
+    return out
+
+
+def _lttb(rows, xs, cols, x, n) -> List[Dict[str, Any]]:
+    N = len(rows)
+    # 各列归一化到 [0, 1]，多列的面积可以相加；空值不参与该列的面积
+    ys = []
+    for col in cols.values():
+        live = [v for v in col if v is not None]
+        if not live:
+            continue
+        lo, rng = min(live), (max(live) - min(live)) or 1.0
+        ys.append([None if v is None else (v - lo) / rng for v in col])
+    if not ys:
+        return [rows[int(k * (N - 1) / (n - 1))] for k in range(n)]
+    out = [rows[0]]
+    every = (N - 2) / (n - 2)
+    a = 0
+    for b in range(n - 2):
+        s, e = int(b * every) + 1, int((b + 1) * every) + 1
+        ns, ne = e, min(int((b + 2) * every) + 1, N)
+        cx = sum(xs[ns:ne]) / (ne - ns)
+        cys = []
+        for y in ys:
+            nxt = [v for v in y[ns:ne] if v is not None]
+            cys.append(sum(nxt) / len(nxt) if nxt else None)
+        xa = xs[a]
+        best, best_k = -1.0, s
+        for k in range(s, e):
+            dx_c, dx_b = xa - cx, xa - xs[k]
+            area = 0.0
+            for y, cy in zip(ys, cys):
+                ya, yb = y[a], y[k]
+                if ya is None or yb is None or cy is None:
+                    continue
+                area += abs(dx_c * (yb - ya) - dx_b * (cy - ya))
+            if area > best:
+                best, best_k = area, k
+        out.append(rows[best_k])
+        a = best_k
+    out.append(rows[-1])
+    return out
+
+
+def downsample(rows: List[Dict[str, Any]], max_points: Optional[int], mode: str = DEFAULT_MODE,
+               x: str = "ts", fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """行数超过 max_points 时降采样（rows 需按 x 升序）；max_points 为空或行数不多时原样返回。"""
+    if not max_points or len(rows) <= max_points:
+        return rows
+    if mode not in MODES:
+        raise ValueError(f"unknown mode: {mode}")
+    n = max(3, min(int(max_points), MAX_POINTS))
+    xs = [r[x] for r in rows]
+    cols = {f: [r.get(f) for r in rows] for f in (fields or value_fields(rows, x))}
+    return {"lttb": _lttb, "minmax": _minmax, "avg": _avg}[mode](rows, xs, cols, x, n)
+
+
+class _Bucket:
+    """流式分桶的一个桶：首末行、各列的和 / 个数，以及最小、最大值及其先后位置。"""
+
+    __slots__ = ("first", "last", "count", "sums", "nums", "ext")
+
+    def __init__(self, row: Dict[str, Any], fields: Sequence[str]):
+        self.first, self.last, self.count = row, row, 0
+        self.sums = dict.fromkeys(fields, 0.0)
+        self.nums = dict.fromkeys(fields, 0)
+        self.ext: Dict[str, list] = {}      # 列 -> [lo, lo_pos, hi, hi_pos]
+
+    def add(self, row: Dict[str, Any]) -> None:
+        k = self.count
+        self.last = row
+        self.count += 1
+        for f in self.sums:
+            v = row.get(f)
+            if v is None:
+                continue
+            self.sums[f] += v
+            self.nums[f] += 1
+            e = self.ext.get(f)
+            if e is None:
+                self.ext[f] = [v, k, v, k]
+            else:
+                if v < e[0]:
+                    e[0], e[1] = v, k
+                if v > e[2]:
+                    e[2], e[3] = v, k
+
+    def avg(self) -> List[Dict[str, Any]]:
+        row = dict(self.first)
+        for f in self.sums:
+            row[f] = self.sums[f] / self.nums[f] if self.nums[f] else None
+        return [row]
+
+    def minmax(self) -> List[Dict[str, Any]]:
+        if self.count == 1:
+            return [self.first]
+        if self.count == 2:
+            return [self.first, self.last]
+        a, b = dict(self.first), dict(self.last)
+        for f in self.sums:
+            e = self.ext.get(f)
+            if e is None:
+                a[f] = b[f] = None
+            else:
+                a[f], b[f] = (e[0], e[2]) if e[1] <= e[3] else (e[2], e[0])
+        return [a, b]
+
+
+async def downsample_stream(rows: Union[AsyncIterator[Dict[str, Any]], Iterable[Dict[str, Any]]], max_points: int,
+                            mode: str, start: float, end: float, fields: Sequence[str], x: str = "ts") -> List[Dict[str, Any]]:
+    """rows 按 x 升序逐行到达，落在 [start, end] 上等宽的时间桶中，只保留当前桶的累计值。"""
+    if mode not in MODES:
+        raise ValueError(f"unknown mode: {mode}")
+    n = max(3, min(int(max_points), MAX_POINTS))
+    nb = {"avg": n, "minmax": max(1, n // 2), "lttb": n * LTTB_PRESAMPLE}[mode]
+    span = (end - start) or 1
+    out: List[Dict[str, Any]] = []
+    cur: List[Any] = [None, -1]     # 当前桶、桶序号
+
+    def add(row: Dict[str, Any]) -> None:
+        b = min(nb - 1, max(0, int((row[x] - start) * nb / span)))
+        if b != cur[1]:
+            flush()
+            cur[:] = [_Bucket(row, fields), b]
+        cur[0].add(row)
+
+    def flush() -> None:
+        if cur[0] is not None:
+            out.extend(cur[0].avg() if mode == "avg" else cur[0].minmax())
+
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            add(row)
+    else:
+        for row in rows:
+            add(row)
+    flush()
+    if mode == "lttb":
+        return downsample(out, n, "lttb", x, fields)
+    return out
@@ -0,0 +1,85 @@
+"""
+流式导出：行按 EXPORT_CHUNK 条一批编码成 CSV / NDJSON，可选 gzip，经 StreamingResponse 边查边发，
+内存占用与导出范围无关。行来源可以是异步迭代器（数据库游标），也可以是同步迭代器（在线程池中读取）。
+"""
+import io
+import contextlib
+import csv
+import json
+import zlib
+import os
+import re
+from typing import Any, AsyncIterator, Iterable, Optional, Sequence, Union
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_PATTERN = "^(" + "|".join(EXPORT_FORMATS) + ")$"
+EXPORT_CHUNK = int(os.environ.get("EXPORT_CHUNK", "1000"))
+EXPORT_GZIP_LEVEL = 6
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]")
+_MEDIA = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+Rows = Union[AsyncIterator[Sequence[Any]], Iterable[Sequence[Any]]]
+
+
+async def _aiter(rows: Rows) -> AsyncIterator[Sequence[Any]]:
+    if hasattr(rows, "__aiter__"):
+        async for r in rows:
+            yield r
+    else:
+        it = iter(rows)
+        try:
+            async for r in iterate_in_threadpool(it):
+                yield r
+        finally:
+            # 提前断开时关闭同步生成器（如结束 journalctl 子进程）；仍在线程中执行时交给回收
+            with contextlib.suppress(ValueError):
+                getattr(it, "close", lambda: None)()
+
+
+async def encode_rows(rows: Rows, header: Sequence[str], fmt: str = "csv") -> AsyncIterator[bytes]:
+    """把行编码成 CSV（首行为表头）或 NDJSON（每行一个对象），每 EXPORT_CHUNK 行产出一块。"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown format: {fmt}")
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    if fmt == "csv":
+        w.writerow(header)
+    n = 0
+    async for r in _aiter(rows):
+        if fmt == "csv":
+            w.writerow(r)
+        else:
+            buf.write(json.dumps(dict(zip(header, r)), ensure_ascii=False, separators=(",", ":")))
+            buf.write("\n")
+        n += 1
+        if n >= EXPORT_CHUNK:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            n = 0
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = EXPORT_GZIP_LEVEL) -> AsyncIterator[bytes]:
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)   # wbits=31：gzip 格式
+    async for c in chunks:
+        out = z.compress(c)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def export_response(rows: Rows, header: Sequence[str], fmt: str = "csv", gzip: bool = False,
+                    filename: Optional[str] = None) -> StreamingResponse:
+    """流式下载响应；gzip 时为 .gz 文件（application/gzip），而不是依赖客户端解压的 Content-Encoding。"""
+    body = encode_rows(rows, header, fmt)
+    # 文件名可能含请求参数（如网卡名）：只保留安全字符，避免非 latin-1 / 引号 / 换行破坏响应头
+    name = f"{_UNSAFE.sub('_', filename or '') or 'export'}.{fmt}"
+    media = _MEDIA[fmt]
+    if gzip:
+        body, name, media = gzip_chunks(body), name + ".gz", "application/gzip"
+    return StreamingResponse(body, media_type=media, headers={"Content-Disposition": f'attachment; filename="{name}"'})
@@ -0,0 +1,159 @@
+"""
+Gorilla 风格的时间序列块编码（纯 Python，无第三方依赖）
+
+- 时间戳：首个 64 位原值，之后按 delta-of-delta 变长编码（规则采样时每点约 1 bit）；
+- 数值：首个 64 位原值，之后与前值 XOR，只存有效位（取值不变时每点 1 bit）；
+- NULL 以专用 NaN 位型存放，解码还原为 None。
+解码按整块进行：一次性把 BLOB 展开为位串再逐段切片，浮点数经 array 批量转换。
+"""
+from array import array
+from typing import List, Optional, Sequence
+
+
+NULL_BITS = 0x7FF8_0000_0000_0001   # 专用 NaN，表示 NULL
+_MASK64 = (1 << 64) - 1
+
+# delta-of-delta 分档：(前缀, 取值位数, 偏移)；超出时用 '1111' + 64 位补码
+_DOD_BUCKETS = (("10", 7, 63), ("110", 9, 255), ("1110", 12, 2047))
+
+
+class _BitWriter:
+    __slots__ = ("acc", "n")
+
+    def __init__(self):
+        self.acc = 0
+        self.n = 0
+
+    def write(self, value: int, nbits: int) -> None:
+        self.acc = (self.acc << nbits) | value
+        self.n += nbits
+
+    def bits(self, s: str) -> None:
+        self.write(int(s, 2), len(s))
+
+    def getvalue(self) -> bytes:
+        pad = (-self.n) % 8
+        return ((self.acc << pad)).to_bytes((self.n + pad) // 8, "big")
+
+
+def _bitstring(data: bytes) -> str:
+    return format(int.from_bytes(data, "big"), f"0{len(data) * 8}b") if data else ""
+
+
+def encode_ts(ts: Sequence[int]) -> bytes:
+    w = _BitWriter()
+    if not ts:
+        return b""
+    w.write(int(ts[0]) & _MASK64, 64)
+    prev, delta = int(ts[0]), 0
+    for t in ts[1:]:
+        t = int(t)
+        d = t - prev
+        dod = d - delta
+        prev, delta = t, d
+        if dod == 0:
+            w.write(0, 1)
+            continue
+        for prefix, width, off in _DOD_BUCKETS:
+            if -off <= dod <= off + 1:
+                w.bits(prefix)
+                w.write(dod + off, width)
+                break
+        else:
+            w.bits("1111")
+            w.write(dod & _MASK64, 64)
+    return w.getvalue()
+
+
+def decode_ts(data: bytes, count: int) -> List[int]:
+    if not count:
+        return []
+    bits = _bitstring(data)
+    t = int(bits[:64], 2)
+    out = [t]
+    pos, delta = 64, 0
+    append = out.append
+    for _ in range(count - 1):
+        if bits[pos] == "0":
+            pos += 1
+        else:
+            if bits[pos + 1] == "0":
+                dod = int(bits[pos + 2:pos + 9], 2) - 63
+                pos += 9
+            elif bits[pos + 2] == "0":
+                dod = int(bits[pos + 3:pos + 12], 2) - 255
+                pos += 12
+            elif bits[pos + 3] == "0":
+                dod = int(bits[pos + 4:pos + 16], 2) - 2047
+                pos += 16
+            else:
+                dod = int(bits[pos + 4:pos + 68], 2)
+                if dod >> 63:
+                    dod -= 1 << 64
+                pos += 68
+            delta += dod
+        t += delta
+        append(t)
+    return out
+
+
+def encode_values(values: Sequence[Optional[float]]) -> bytes:
+    w = _BitWriter()
+    if not values:
+        return b""
+    nan = float("nan")
+    raw = array("Q", array("d", [nan if v is None else float(v) for v in values]).tobytes())
+    for i, v in enumerate(values):
+        if v is None:
+            raw[i] = NULL_BITS
+    prev = raw[0]
+    w.write(prev, 64)
+    lead = trail = -1
+    for cur in raw[1:]:
+        x = cur ^ prev
+        prev = cur
+        if x == 0:
+            w.write(0, 1)
+            continue
+        lz = min(31, 64 - x.bit_length())
+        tz = (x & -x).bit_length() - 1
+        if lead >= 0 and lz >= lead and tz >= trail:
+            w.write(0b10, 2)
+            w.write(x >> trail, 64 - lead - trail)
+        else:
+            lead, trail = lz, tz
+            m = 64 - lz - tz
+            w.write(0b11, 2)
+            w.write(lz, 5)
+            w.write(m & 63, 6)   # 64 记为 0
+            w.write(x >> tz, m)
+    return w.getvalue()
+
+
+def decode_values(data: bytes, count: int) -> List[Optional[float]]:
+    if not count:
+        return []
+    bits = _bitstring(data)
+    cur = int(bits[:64], 2)
+    raw = array("Q", [cur])
+    append = raw.append
+    pos = 64
+    trail = width = 0
+    for _ in range(count - 1):
+        if bits[pos] == "0":
+            pos += 1
+        else:
+            if bits[pos + 1] == "1":
+                lead = int(bits[pos + 2:pos + 7], 2)
+                width = int(bits[pos + 7:pos + 13], 2) or 64
+                trail = 64 - lead - width
+                pos += 13
+            else:
+                pos += 2
+            cur ^= int(bits[pos:pos + width], 2) << trail
+            pos += width
+        append(cur)
+    floats = array("d", raw.tobytes()).tolist()
+    if NULL_BITS in raw:
+        return [None if b == NULL_BITS else f for b, f in zip(raw, floats)]
+    return floats
@@ -2,7 +2,10 @@ import os, time, json, subprocess, shutil, platform
 from typing import Dict, Any, List, Optional
 import psutil
 import aiosqlite
-from ..config import DB_PATH
+from ..db import db_read, db_write
+from ..crud.samples import iter_samples
+from .rollup import resolve, fetch_rows, summarize
+from .hotring import hot
 
 
 def get_detailed_gpu_info() -> Dict[str, Any]:
@@ -160,16 +163,16 @@ def get_detailed_gpu_info() -> Dict[str, Any]:
     }
 
 
-async def get_gpu_utilization_history(since: int, until: int) -> List[Dict[str, Any]]:
-    """获取GPU利用率历史数据"""
+async def get_gpu_utilization_history(since: int, until: int, points: Optional[int] = None) -> List[Dict[str, Any]]:
+    """获取GPU利用率历史数据（长周期自动改读 rollup 汇总表）"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            db.row_factory = aiosqlite.Row
-            rows = await (await db.execute(
-                "SELECT ts, gpu_util_avg, gpu_temp_avg FROM gpu_data WHERE ts BETWEEN ? AND ? ORDER BY ts",
-                (since, until)
-            )).fetchall()
-            return [dict(row) for row in rows]
+        res, _ = resolve(since, until, points)
+        if res == "raw" and hot.covers(["gpu_util_avg", "gpu_temp_avg"], since):
+            return hot.rows(["ts", "gpu_util_avg", "gpu_temp_avg"], since, until)
+        async with db_read() as db:
+            if res != "raw":
+                return await fetch_rows(db, ["gpu_util_avg", "gpu_temp_avg"], since, until, res)
+            return [row async for row in iter_samples(db, since, until, ("gpu_util_avg", "gpu_temp_avg"))]
     except Exception as e:
         print(f"Error getting GPU history: {e}")
         return []
@@ -202,6 +205,23 @@ def calculate_gpu_statistics(gpu_data: List[Dict[str, Any]]) -> Dict[str, Any]:
     }
 
 
+async def get_gpu_history_statistics(since: int, until: int) -> Dict[str, Any]:
+    """与 calculate_gpu_statistics 相同的结构，但基于 rollup 汇总计算（不受返回点数抽稀影响）"""
+    async with db_read() as db:
+        sm = await summarize(db, ["gpu_util_avg", "gpu_temp_avg"], since, until)
+    u = sm.get("gpu_util_avg") or {}
+    t = sm.get("gpu_temp_avg") or {}
+    return {
+        'avg_utilization': u.get("avg") or 0,
+        'max_utilization': u.get("max") or 0,
+        'min_utilization': u.get("min") or 0,
+        'avg_temperature': t.get("avg") or 0,
+        'max_temperature': t.get("max") or 0,
+        'min_temperature': t.get("min") or 0,
+        'data_points': max(u.get("count") or 0, t.get("count") or 0)
+    }
+
+
 async def get_gpu_realtime_data() -> Dict[str, Any]:
     """获取GPU实时数据"""
     gpu_info = get_detailed_gpu_info()
@@ -221,7 +241,7 @@ async def get_gpu_realtime_data() -> Dict[str, Any]:
 async def store_gpu_detailed_data(gpu_data: Dict[str, Any]) -> None:
     """存储详细的GPU数据到数据库"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with db_write() as db:
             ts = int(time.time())
             
             for gpu in gpu_data.get('gpus', []):
@@ -255,7 +275,7 @@ async def store_gpu_detailed_data(gpu_data: Dict[str, Any]) -> None:
 async def get_gpu_utilization_trend(since: int, until: int) -> List[Dict[str, Any]]:
     """获取GPU利用率趋势数据"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with db_read() as db:
             db.row_factory = aiosqlite.Row
             rows = await (await db.execute("""
                 SELECT ts, gpu_index, gpu_name, utilization, temperature
@@ -289,7 +309,7 @@ async def get_gpu_utilization_trend(since: int, until: int) -> List[Dict[str, An
 async def get_gpu_temperature_trend(since: int, until: int) -> List[Dict[str, Any]]:
     """获取GPU温度趋势数据"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with db_read() as db:
             db.row_factory = aiosqlite.Row
             rows = await (await db.execute("""
                 SELECT ts, gpu_index, gpu_name, temperature, power_draw
@@ -323,7 +343,7 @@ async def get_gpu_temperature_trend(since: int, until: int) -> List[Dict[str, An
 async def get_gpu_processes_history(since: int, until: int) -> List[Dict[str, Any]]:
     """获取GPU进程历史数据"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with db_read() as db:
             db.row_factory = aiosqlite.Row
             rows = await (await db.execute("""
                 SELECT ts, gpu_index, pid, process_name, memory_used
@@ -342,20 +362,16 @@ async def calculate_and_store_gpu_statistics(period: str, since: int, until: int
     """计算并存储GPU统计信息"""
     try:
         # 获取详细数据
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with db_write() as db:
             db.row_factory = aiosqlite.Row
             
-            # 获取利用率数据
-            util_rows = await (await db.execute("""
-                SELECT utilization FROM gpu_detailed_data 
-                WHERE ts BETWEEN ? AND ?
-            """, (since, until))).fetchall()
-            
-            # 获取温度数据
-            temp_rows = await (await db.execute("""
-                SELECT temperature FROM gpu_detailed_data 
-                WHERE ts BETWEEN ? AND ?
-            """, (since, until))).fetchall()
+            # 利用率/温度：读 rollup 汇总（按 GPU 分序列），无需扫描 gpu_detailed_data 原始行
+            idx_rows = await (await db.execute(
+                "SELECT DISTINCT gpu_index FROM gpu_detailed_data WHERE ts BETWEEN ? AND ?",
+                (max(since, until - 3600), until)
+            )).fetchall()
+            series = [f"gpu:{r['gpu_index']}:{c}" for r in idx_rows for c in ("utilization", "temperature")]
+            sm = await summarize(db, series, since, until) if series else {}
             
             # 获取进程数据
             process_rows = await (await db.execute("""
@@ -364,17 +380,24 @@ async def calculate_and_store_gpu_statistics(period: str, since: int, until: int
                 WHERE ts BETWEEN ? AND ?
             """, (since, until))).fetchone()
             
-            # 计算统计信息
-            utilizations = [row['utilization'] for row in util_rows if row['utilization'] is not None]
-            temperatures = [row['temperature'] for row in temp_rows if row['temperature'] is not None]
+            # 合并各 GPU 的汇总
+            def merged(col):
+                parts = [v for k, v in sm.items() if k.endswith(":" + col) and v.get("count")]
+                cnt = sum(p["count"] for p in parts)
+                return {
+                    'avg': (sum(p["avg"] * p["count"] for p in parts) / cnt) if cnt else 0,
+                    'max': max((p["max"] for p in parts), default=0),
+                    'min': min((p["min"] for p in parts), default=0),
+                }
+            util, temp = merged("utilization"), merged("temperature")
             
             stats = {
-                'avg_utilization': sum(utilizations) / len(utilizations) if utilizations else 0,
-                'max_utilization': max(utilizations) if utilizations else 0,
-                'min_utilization': min(utilizations) if utilizations else 0,
-                'avg_temperature': sum(temperatures) / len(temperatures) if temperatures else 0,
-                'max_temperature': max(temperatures) if temperatures else 0,
-                'min_temperature': min(temperatures) if temperatures else 0,
+                'avg_utilization': util['avg'],
+                'max_utilization': util['max'],
+                'min_utilization': util['min'],
+                'avg_temperature': temp['avg'],
+                'max_temperature': temp['max'],
+                'min_temperature': temp['min'],
                 'total_processes': process_rows['process_count'] if process_rows else 0,
                 'gpu_count': process_rows['gpu_count'] if process_rows else 0
             }
@@ -402,7 +425,7 @@ async def calculate_and_store_gpu_statistics(period: str, since: int, until: int
 async def get_gpu_statistics(period: str, since: int, until: int) -> Dict[str, Any]:
     """获取GPU统计信息"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with db_read() as db:
             db.row_factory = aiosqlite.Row
             
             # 先尝试从统计表获取
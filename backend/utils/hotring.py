@@ -0,0 +1,240 @@
+"""
+最近 HOT_SECONDS（默认 24 小时）的内存热层：每个序列一个预分配的 array('d') 环形缓冲，原始分辨率，
+由采样任务直接写入；仪表盘的范围查询、区间汇总、降采样在覆盖范围内不再读 SQLite，更早的部分照常读盘。
+
+- 两个环：system（system_samples 的非计数器列）与 net（网卡汇总 net:__total__:*），各自一条时间戳数组，
+  两者的采样时刻不同；空值存 NaN；
+- 每个值写两份（i 与 i+容量），最近任意条数总在一段连续切片里：按 ts 二分定位后直接切片，
+  sum/min/max 在 C 层完成；
+- 容量在启动时按 HOT_SECONDS / SAMPLE_INTERVAL 预留余量一次分配，内存占用固定，见 /api/admin/hot；
+- 启动时从磁盘回填最近 HOT_SECONDS 的数据；since 之后的数据保证完整，查询起点早于 since 时整体改读磁盘；
+  导入历史数据落在热层范围内、或时钟回拨后采样早于环中最后一条（环里放不下）时，把 since 推到其后；
+- 只在本机采样时启用（备机的数据来自复制，不经过采样任务）。
+"""
+import os
+import time
+import bisect
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from .. import shards
+from ..db import db_read
+from ..crud.samples import GAUGE_COLUMNS
+from ..crud.net import TOTAL, iter_net
+
+
+HOT_SECONDS = int(os.environ.get("HOT_SECONDS", str(24 * 3600)))
+SAMPLE_INTERVAL = int(os.environ.get("SAMPLE_INTERVAL", "5"))
+HOT_HEADROOM = 1.25        # 采样间隔抖动、补采等的余量
+NET_SERIES = ("rx_kbps", "tx_kbps", "latency_ms")
+_NAN = float("nan")
+
+
+class Ring:
+    """固定容量的列式环形缓冲：一条 int64 时间戳 + 每列一条 float64，值写两份以保证切片连续。"""
+
+    def __init__(self, cols: Sequence[str], capacity: int, ints: Iterable[str] = ()):
+        self.cols = tuple(cols)
+        self.cap = max(2, int(capacity))
+        self.ints = frozenset(ints)
+        self.ts = array("q", bytes(16 * self.cap))
+        self.vals: Dict[str, array] = {c: array("d", [_NAN]) * (2 * self.cap) for c in self.cols}
+        self.nans: Dict[str, int] = {c: 0 for c in self.cols}   # 缓冲内 NaN 个数，为 0 时 min/max 走快路径
+        self.n = 0          # 累计写入条数
+
+    @property
+    def size(self) -> int:
+        return min(self.n, self.cap)
+
+    def _window(self) -> Tuple[int, int]:
+        """最近 size 条所在的切片 [lo, hi)。"""
+        w = (self.n - 1) % self.cap
+        return w + self.cap - self.size + 1, w + self.cap + 1
+
+    def first_ts(self) -> Optional[int]:
+        return self.ts[self._window()[0]] if self.n else None
+
+    def last_ts(self) -> Optional[int]:
+        return self.ts[self._window()[1] - 1] if self.n else None
+
+    def append(self, ts: int, values: Dict[str, Any]) -> bool:
+        """按时间顺序追加；与最后一条同一时刻则覆盖，更早的丢弃。"""
+        last = self.last_ts()
+        if last is not None and ts < last:
+            return False
+        if last is None or ts > last:
+            self.n += 1
+        # 覆盖的是仍在窗口内的旧值（同一时刻重写，或环已写满）时，扣掉它的 NaN 计数
+        live = ts == last or self.n > self.cap
+        w = (self.n - 1) % self.cap
+        self.ts[w] = self.ts[w + self.cap] = ts
+        for c in self.cols:
+            v = values.get(c)
+            v = _NAN if v is None else float(v)
+            old = self.vals[c][w]
+            self.nans[c] += (v != v) - (live and old != old)
+            self.vals[c][w] = self.vals[c][w + self.cap] = v
+        return True
+
+    def _range(self, start: float, end: float) -> Tuple[int, int]:
+        """ts 落在 [start, end) 内的切片。"""
+        lo, hi = self._window()
+        return bisect.bisect_left(self.ts, start, lo, hi), bisect.bisect_left(self.ts, end, lo, hi)
+
+    def rows(self, cols: Sequence[str], start: int, end: int) -> List[Dict[str, Any]]:
+        return list(self.iter_rows(cols, start, end))
+
+    def iter_rows(self, cols: Sequence[str], start: int, end: int) -> Iterator[Dict[str, Any]]:
+        """ts 落在 [start, end] 内的行，逐行产出。"""
+        i, j = self._range(start, end + 1)
+        cols = [c for c in cols if c in self.vals]
+        for k in range(i, j):
+            row: Dict[str, Any] = {"ts": self.ts[k]}
+            for c in cols:
+                v = self.vals[c][k]
+                row[c] = None if v != v else (int(v) if c in self.ints else v)
+            yield row
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        if not self.n:
+            return None
+        last = self.last_ts()
+        return self.rows(self.cols, last, last)[0]
+
+    def buckets(self, cols: Sequence[str], start: int, end: int, step: int,
+                names: Optional[Dict[str, str]] = None) -> Dict[Tuple[str, int], list]:
+        """与 rollup.fetch_buckets 相同的结构：(序列, 桶起点) -> [count, sum, min, max, last, last_ts]，范围 [start, end)。"""
+        acc: Dict[Tuple[str, int], list] = {}
+        i, j = self._range(start, end)
+        ts = self.ts
+        arrs = [((names or {}).get(c, c), self.vals[c], self.nans[c] > 0) for c in cols]
+        while i < j:
+            b = ts[i] // step * step
+            k = bisect.bisect_left(ts, b + step, i, j)
+            for name, arr, has_nan in arrs:
+                vals = arr[i:k]
+                last_ts = ts[k - 1]
+                if has_nan:
+                    live = [p for p, v in enumerate(vals) if v == v]
+                    if not live:
+                        continue
+                    last_ts = ts[i + live[-1]]
+                    vals = [vals[p] for p in live]
+                acc[(name, b)] = [len(vals), sum(vals), min(vals), max(vals), vals[-1], last_ts]
+            i = k
+        return acc
+
+    def nbytes(self) -> int:
+        return self.ts.itemsize * len(self.ts) + sum(a.itemsize * len(a) for a in self.vals.values())
+
+
+class HotTier:
+    def __init__(self, seconds: int = HOT_SECONDS, interval: int = SAMPLE_INTERVAL):
+        self.seconds = seconds
+        capacity = int(seconds / max(1, interval) * HOT_HEADROOM) + 1
+        self.scales = shards.QUANT_SCALES.get("system_samples", {})
+        self.system = Ring(GAUGE_COLUMNS, capacity, ints=shards.INT_COLS)
+        self.net = Ring(NET_SERIES, capacity)
+        self.net_names = {c: f"net:{TOTAL}:{c}" for c in NET_SERIES}
+        self.enabled = False
+        self.since: Optional[int] = None    # 此后的数据在热层中完整
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- 写入 ----------
+
+    def add_sample(self, ts: int, values: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        # 与落盘的定点精度一致，热层与磁盘返回相同的值
+        v = {c: (values.get(c) if not self.scales.get(c) or values.get(c) is None
+                 else shards.quantize(values[c], self.scales[c]) / self.scales[c]) for c in GAUGE_COLUMNS}
+        if not self.system.append(int(ts), v):
+            self.invalidate_before(int(ts))
+        self._advance()
+
+    def add_net(self, ts: int, ifaces: Dict[str, Dict[str, Any]], latency_ms: Optional[float] = None) -> None:
+        if not self.enabled:
+            return
+        tot: Dict[str, Any] = {"latency_ms": latency_ms}
+        for c in ("rx_kbps", "tx_kbps"):
+            vals = [m.get(c) for m in ifaces.values() if m.get(c) is not None]
+            tot[c] = sum(vals) if vals else None
+        if not self.net.append(int(ts), tot):
+            self.invalidate_before(int(ts))
+        self._advance()
+
+    def _advance(self) -> None:
+        """环写满后，最早的数据被覆盖，since 跟着前移。"""
+        for ring in (self.system, self.net):
+            if ring.n > ring.cap:
+                self.since = max(self.since or 0, ring.first_ts())
+
+    def invalidate_before(self, ts: int) -> None:
+        """ts 之前的数据在磁盘上有热层里没有的变化（如导入，或时钟回拨后早于最后一条、环里放不下的采样）：
+        不再用热层回答早于 ts 的查询。"""
+        if self.since is not None and ts >= self.since:
+            self.since = int(ts) + 1
+
+    async def warm_up(self, now: Optional[int] = None) -> int:
+        """从磁盘回填最近 seconds 秒，返回条数；之后由采样任务追加。"""
+        now = int(now or time.time())
+        start = now - self.seconds
+        n = 0
+        async with db_read() as db:
+            cols = ["ts", *GAUGE_COLUMNS]
+            async for r in shards.iter_rows(db, "system_samples", cols, start, now):
+                self.system.append(r[0], dict(zip(GAUGE_COLUMNS, r[1:])))
+                n += 1
+            async for r in iter_net(db, ["ts", *NET_SERIES], start, now):
+                self.net.append(r[0], dict(zip(NET_SERIES, r[1:])))
+        self.since = start
+        self.enabled = True
+        self._advance()
+        return n
+
+    # ---------- 查询 ----------
+
+    def _ring_of(self, series: Sequence[str]) -> Optional[Tuple[Ring, List[str]]]:
+        if all(s in self.system.vals for s in series):
+            return self.system, list(series)
+        rev = {v: k for k, v in self.net_names.items()}
+        if all(s in rev for s in series):
+            return self.net, [rev[s] for s in series]
+        return None
+
+    def covers(self, series: Sequence[str], start: int) -> bool:
+        ok = (self.enabled and self.since is not None and int(start) >= self.since
+              and bool(series) and self._ring_of(series) is not None)
+        if self.enabled:
+            if ok:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return ok
+
+    def rows(self, cols: Sequence[str], start: int, end: int) -> List[Dict[str, Any]]:
+        """system_samples 形式的原始行（调用方先用 covers 判断）。"""
+        return self.system.rows(cols, int(start), int(end))
+
+    def iter_rows(self, cols: Sequence[str], start: int, end: int) -> Iterator[Dict[str, Any]]:
+        return self.system.iter_rows(cols, int(start), int(end))
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self.system.latest() if self.enabled else None
+
+    def buckets(self, series: Sequence[str], start: int, end: int, step: int) -> Dict[Tuple[str, int], list]:
+        ring, cols = self._ring_of(series)
+        names = self.net_names if ring is self.net else None
+        return ring.buckets(cols, int(start), int(end), int(step), names)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"enabled": self.enabled, "seconds": self.seconds, "since": self.since,
+                               "hits": self.hits, "misses": self.misses, "bytes": 0, "rings": {}}
+        for name, ring in (("system", self.system), ("net", self.net)):
+            out["rings"][name] = {"series": len(ring.cols), "capacity": ring.cap, "size": ring.size,
+                                  "first_ts": ring.first_ts(), "last_ts": ring.last_ts(), "bytes": ring.nbytes()}
+            out["bytes"] += ring.nbytes()
+        return out
+
+
+hot = HotTier()
@@ -0,0 +1,239 @@
+"""
+历史指标批量导入：流式读取 CSV / NDJSON / JSON 数组（export_gpu_data_to_csv/_json、/api/reports/export.csv 的格式），
+写入按天分片的 system_samples / net_data，完成后重算受影响区间的 rollup。
+
+- 每 IMPORT_BATCH 行按 (表, 日期, 列集合) 分组，每组一个写事务（executemany），同一时刻已有的行按列合并（空值不覆盖）；
+- 写入当天以外的分片前先删除其 ts 二级索引，全部写完（或出错）后重建；
+- 各报表导出的 CSV 只含一组列（cpu、mem ...），按 ts 合并到同一行；网卡数据需带 iface 列或指定 iface，
+  汇总（net_total）不再单独存储，无网卡名的网卡行计入 skipped。
+"""
+import io
+import csv
+import json
+import os
+import time
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+from .. import shards
+from ..db import db_write
+from ..crud.samples import SAMPLE_COLUMNS
+from ..crud.net import NET_COLUMNS, TOTAL, iface_ids, upsert_ifaces
+from .rollup import rebuild_range
+from .hotring import hot
+
+
+IMPORT_BATCH = int(os.environ.get("IMPORT_BATCH", "50000"))
+FORMATS = ("csv", "ndjson", "json")
+# 分片中可在批量写入期间删除、写完重建的二级索引：(表, 索引名, 列)
+_SHARD_INDEXES = (("net_data", "idx_net_data_ts", "ts"),)
+
+
+def sniff(head: str) -> str:
+    """按文件开头判断格式：'[' 为 JSON 数组，'{' 为 NDJSON，否则按 CSV。"""
+    s = head.lstrip("\ufeff \t\r\n")
+    if s.startswith("["):
+        return "json"
+    if s.startswith("{"):
+        return "ndjson"
+    return "csv"
+
+
+def read_records(fp: IO[str], fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """逐条产出记录（dict）。CSV / NDJSON 流式读取；JSON 数组（export_gpu_data_to_json 的格式）整体解析。"""
+    if fmt is None:
+        head = fp.read(4096)
+        fmt = sniff(head)
+        fp = _Rewound(head, fp)
+    if fmt == "csv":
+        yield from csv.DictReader(fp)
+    elif fmt == "ndjson":
+        for line in fp:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    elif fmt == "json":
+        data = json.load(fp)
+        yield from (data if isinstance(data, list) else data.get("items") or [])
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+
+
+class _Rewound(io.TextIOBase):
+    """把已读出的开头放回流前面（格式探测用）。"""
+
+    def __init__(self, head: str, rest: IO[str]):
+        self._head = io.StringIO(head)
+        self._rest = rest
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        out = self._head.read(size)
+        if size < 0:
+            return out + self._rest.read()
+        if len(out) < size:
+            out += self._rest.read(size - len(out))
+        return out
+
+    def readline(self, size: int = -1) -> str:
+        line = self._head.readline()
+        if line.endswith("\n") or size == 0:
+            return line
+        return line + self._rest.readline()
+
+
+def _num(v: Any, integer: bool = False) -> Any:
+    if v is None or v == "":
+        return None
+    if isinstance(v, str):
+        v = float(v)
+    return int(v) if integer else float(v)
+
+
+class _Batch:
+    """待写入的行：(表, 日期, 列) -> [行]。"""
+
+    def __init__(self):
+        self.groups: Dict[Tuple[str, str, Tuple[str, ...]], List[tuple]] = {}
+        self.size = 0
+
+    def add(self, table: str, ts: int, cols: Tuple[str, ...], row: tuple) -> None:
+        self.groups.setdefault((table, shards.day_of(ts), cols), []).append(row)
+        self.size += 1
+
+
+class Importer:
+    """一次导入任务：feed() 记录，finish() 刷写、重建索引并重算 rollup。"""
+
+    def __init__(self, iface: Optional[str] = None, rebuild_rollups: bool = True):
+        self.iface = iface
+        self.rebuild_rollups = rebuild_rollups
+        self.batch = _Batch()
+        self.stats: Dict[str, Any] = {"rows": 0, "system_samples": 0, "net_data": 0, "skipped": 0,
+                                      "start": None, "end": None, "rollup_buckets": 0}
+        self._today = shards.day_of(time.time())
+        self._unindexed: Dict[str, List[str]] = {}   # 日期 -> 已删除的索引
+        self._t0 = time.perf_counter()
+
+    def _record(self, rec: Dict[str, Any]) -> None:
+        self.stats["rows"] += 1
+        sys_cols = tuple(c for c in SAMPLE_COLUMNS if c in rec)
+        net_cols = tuple(c for c in NET_COLUMNS if c in rec)
+        iface = rec.get("iface") or self.iface
+        use_net = bool(net_cols and iface and iface != TOTAL)
+        # 先转换整条记录，时间戳或任一数值无法解析时整条跳过（不中断导入）
+        try:
+            ts = int(_num(rec.get("ts")))
+            sys_row = (ts, *(_num(rec[c], c in shards.INT_COLS) for c in sys_cols))
+            net_row = (ts, str(iface), *(_num(rec[c], c in shards.INT_COLS) for c in net_cols)) if use_net else None
+        except Exception:
+            self.stats["skipped"] += 1
+            return
+        used = False
+        if sys_cols:
+            self.batch.add("system_samples", ts, sys_cols, sys_row)
+            used = True
+        if use_net:
+            self.batch.add("net_data", ts, net_cols, net_row)
+            used = True
+        if not used:
+            self.stats["skipped"] += 1
+            return
+        self.stats["start"] = ts if self.stats["start"] is None else min(self.stats["start"], ts)
+        self.stats["end"] = ts if self.stats["end"] is None else max(self.stats["end"], ts)
+
+    async def feed(self, records: Iterable[Dict[str, Any]]) -> None:
+        for rec in records:
+            self._record(rec)
+            if self.batch.size >= IMPORT_BATCH:
+                await self.flush()
+
+    async def _drop_indexes(self, db, day: str) -> None:
+        if day == self._today or day in self._unindexed:
+            return
+        alias = shards.alias_of(day)
+        dropped = []
+        for _table, name, _col in _SHARD_INDEXES:
+            await db.execute(f"DROP INDEX IF EXISTS {alias}.{name}")
+            dropped.append(name)
+        self._unindexed[day] = dropped
+
+    async def _write(self, db, table: str, day: str, cols: Tuple[str, ...], rows: List[tuple]) -> int:
+        ts0 = rows[0][0]
+        target = await shards.writable(db, table, ts0)
+        await self._drop_indexes(db, day)
+        sets = ",".join(f"{c}=coalesce(excluded.{c},{c})" for c in cols)   # 空值不覆盖已有数据
+        if table == "system_samples":
+            scales = shards.scales_of(table, ts0)
+            if scales:
+                q = [scales.get(c) for c in cols]
+                rows = [(r[0], *(shards.quantize(v, sc) for v, sc in zip(r[1:], q))) for r in rows]
+            sql = f"INSERT INTO {target}(ts,{','.join(cols)}) VALUES({','.join('?' * (len(cols) + 1))}) ON CONFLICT(ts) DO UPDATE SET {sets}"
+        else:
+            spans: Dict[str, Tuple[int, int]] = {}
+            for r in rows:
+                lo, hi = spans.get(r[1], (r[0], r[0]))
+                spans[r[1]] = (min(lo, r[0]), max(hi, r[0]))
+            await upsert_ifaces(db, spans)
+            if "iface_id" in shards.columns_of(table, ts0):
+                ids = await iface_ids(db, spans, max(s[1] for s in spans.values()))
+                rows = [(r[0], ids[r[1]], *r[2:]) for r in rows]
+                key = "iface_id"
+            else:
+                key = "iface"
+            sql = (f"INSERT INTO {target}(ts,{key},{','.join(cols)}) VALUES({','.join('?' * (len(cols) + 2))}) "
+                   f"ON CONFLICT({key},ts) DO UPDATE SET {sets}")
+        await db.executemany(sql, rows)
+        return len(rows)
+
+    async def flush(self) -> None:
+        groups, self.batch = self.batch.groups, _Batch()
+        for (table, day, cols), rows in sorted(groups.items()):
+            async with db_write() as db:
+                try:
+                    self.stats[table] += await self._write(db, table, day, cols, rows)
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+
+    async def _rebuild_indexes(self) -> None:
+        for day, names in sorted(self._unindexed.items()):
+            async with db_write() as db:
+                await shards.writable(db, "net_data", shards.day_start(day))
+                alias = shards.alias_of(day)
+                for table, name, col in _SHARD_INDEXES:
+                    if name in names:
+                        await db.execute(f"CREATE INDEX IF NOT EXISTS {alias}.{name} ON {table}({col})")
+                await db.commit()
+        self._unindexed.clear()
+
+    async def finish(self) -> Dict[str, Any]:
+        try:
+            await self.flush()
+        finally:
+            await self._rebuild_indexes()
+        write_s = time.perf_counter() - self._t0
+        if self.stats["end"] is not None:
+            hot.invalidate_before(self.stats["end"])   # 热层中没有导入的行
+        if self.rebuild_rollups and self.stats["start"] is not None:
+            self.stats["rollup_buckets"] = await rebuild_range(self.stats["start"], self.stats["end"])
+        total_s = time.perf_counter() - self._t0
+        written = self.stats["system_samples"] + self.stats["net_data"]
+        self.stats.update(
+            write_seconds=round(write_s, 3), seconds=round(total_s, 3),
+            rows_per_s=round(self.stats["rows"] / write_s) if write_s > 0 else None,
+            written_per_s=round(written / write_s) if write_s > 0 else None,
+        )
+        return self.stats
+
+
+async def import_file(fp: IO[str], fmt: Optional[str] = None, iface: Optional[str] = None,
+                      rebuild_rollups: bool = True) -> Dict[str, Any]:
+    """从文本流导入，返回统计（行数、各表写入数、跳过数、时间范围、rows/s）。"""
+    imp = Importer(iface=iface, rebuild_rollups=rebuild_rollups)
+    try:
+        await imp.feed(read_records(fp, fmt))
+    finally:
+        stats = await imp.finish()
+    return stats
@@ -0,0 +1,315 @@
+import os, time, socket, asyncio
+from typing import Dict, Any, List, Optional
+from . import procfs
+
+
+PCI_ROOT = "/sys/bus/pci/devices"
+BLOCK_ROOT = "/sys/block"
+UDEV_DATA = "/run/udev/data"
+PCI_IDS_PATHS = ("/usr/share/hwdata/pci.ids", "/usr/share/misc/pci.ids", "/usr/share/pci.ids")
+NETLINK_KOBJECT_UEVENT = 15
+
+# PCI 基础类（class 高 8 位），与 lspci 的分类名一致
+_PCI_CLASS = {
+    0x01: "Mass storage controller", 0x02: "Network controller", 0x03: "Display controller",
+    0x04: "Multimedia controller", 0x05: "Memory controller", 0x06: "Bridge",
+    0x07: "Communication controller", 0x08: "Generic system peripheral", 0x0c: "Serial bus controller",
+    0x0d: "Wireless controller", 0x12: "Processing accelerators",
+}
+_PCI_SUBCLASS = {
+    0x0100: "SCSI storage controller", 0x0101: "IDE interface", 0x0104: "RAID bus controller",
+    0x0106: "SATA controller", 0x0107: "Serial Attached SCSI controller", 0x0108: "Non-Volatile memory controller",
+    0x0200: "Ethernet controller", 0x0207: "Infiniband controller", 0x0280: "Network controller",
+    0x0300: "VGA compatible controller", 0x0302: "3D controller", 0x0600: "Host bridge",
+    0x0601: "ISA bridge", 0x0604: "PCI bridge", 0x0c03: "USB controller", 0x1200: "Processing accelerators",
+}
+_SKIP_BLOCK = ("loop", "ram", "zram", "fd", "sr")
+
+
+def _rd(path: str) -> Optional[str]:
+    v = procfs.read_text(path)
+    return v.strip() if v is not None else None
+
+
+def _human_size(n: int) -> str:
+    """lsblk 风格的容量字符串（1024 进制，如 931.5G / 1.8T / 8G）。"""
+    units = "BKMGTP"
+    v = float(n)
+    i = 0
+    while v >= 1024 and i < len(units) - 1:
+        v /= 1024.0
+        i += 1
+    s = f"{v:.1f}".rstrip("0").rstrip(".")
+    return s + (units[i] if i else "B")
+
+
+class PciIds:
+    """懒加载 pci.ids，提供厂商/设备名；文件不存在时返回空。"""
+
+    def __init__(self):
+        self._vendors: Optional[Dict[str, str]] = None
+        self._devices: Dict[str, str] = {}
+
+    def _load(self) -> None:
+        self._vendors = {}
+        for p in PCI_IDS_PATHS:
+            try:
+                f = open(p, "r", encoding="utf-8", errors="ignore")
+            except OSError:
+                continue
+            with f:
+                vendor = None
+                for ln in f:
+                    if not ln.strip() or ln.startswith("#"):
+                        continue
+                    if ln.startswith("C "):
+                        break  # 设备类定义段，之后不再有厂商
+                    if not ln.startswith("\t"):
+                        vendor = ln[:4].lower()
+                        self._vendors[vendor] = ln[4:].strip()
+                    elif not ln.startswith("\t\t") and vendor:
+                        self._devices[vendor + ":" + ln[1:5].lower()] = ln[5:].strip()
+            return
+
+    def vendor(self, vid: str) -> str:
+        if self._vendors is None:
+            self._load()
+        return (self._vendors or {}).get(vid, "")
+
+    def device(self, vid: str, did: str) -> str:
+        if self._vendors is None:
+            self._load()
+        return self._devices.get(vid + ":" + did, "")
+
+
+class Inventory:
+    """硬件清单缓存：启动时遍历一次 /sys/bus/pci/devices 与 /sys/block，
+    之后只在 uevent（PCI/块设备增删）或慢定时器触发时重建。页面请求直接读缓存。
+    """
+
+    def __init__(self):
+        self.pci: List[Dict[str, Any]] = []
+        self.block: List[Dict[str, Any]] = []
+        self.version = 0
+        self.updated_at = 0.0
+        self.ids = PciIds()
+        self._stat = procfs.CachedReader(max_handles=128)
+        self._prev_stat: Dict[str, tuple] = {}
+
+    # ---------- PCI ----------
+    def _scan_pci(self) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        try:
+            addrs = sorted(os.listdir(PCI_ROOT))
+        except OSError:
+            return out
+        for addr in addrs:
+            d = os.path.join(PCI_ROOT, addr)
+            vid = (_rd(d + "/vendor") or "0x0000")[2:].lower()
+            did = (_rd(d + "/device") or "0x0000")[2:].lower()
+            try:
+                cls = int(_rd(d + "/class") or "0", 16)
+            except ValueError:
+                cls = 0
+            numa = procfs.read_int(d + "/numa_node")
+            drv = os.path.join(d, "driver")
+            out.append({
+                "slot": addr,
+                "vendor_id": vid,
+                "device_id": did,
+                "vendor": self.ids.vendor(vid),
+                "device": self.ids.device(vid, did),
+                "class_id": f"{cls >> 8:04x}",
+                "class": _PCI_SUBCLASS.get(cls >> 8) or _PCI_CLASS.get(cls >> 16, f"Class {cls >> 8:04x}"),
+                "numa_node": numa if numa is not None and numa >= 0 else None,
+                "link_speed": _rd(d + "/current_link_speed"),
+                "link_width": _rd(d + "/current_link_width"),
+                "max_link_speed": _rd(d + "/max_link_speed"),
+                "max_link_width": _rd(d + "/max_link_width"),
+                "driver": os.path.basename(os.path.realpath(drv)) if os.path.exists(drv) else None,
+                "revision": _rd(d + "/revision"),
+            })
+        return out
+
+    # ---------- block ----------
+    @staticmethod
+    def _udev(devnum: Optional[str]) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        if not devnum:
+            return out
+        txt = procfs.read_text(f"{UDEV_DATA}/b{devnum}") or ""
+        for ln in txt.splitlines():
+            if ln.startswith("E:"):
+                k, _, v = ln[2:].partition("=")
+                out[k] = v
+        return out
+
+    def _block_item(self, name: str, base: str, parent: Optional[str]) -> Dict[str, Any]:
+        devnum = _rd(base + "/dev")
+        udev = self._udev(devnum)
+        sectors = procfs.read_int(base + "/size", 0) or 0
+        devlink = os.path.realpath(base)
+        if parent:
+            typ = "part"
+        elif name.startswith("dm-"):
+            typ = "lvm" if (udev.get("DM_LV_NAME") or "") else (_rd(base + "/dm/uuid") or "dm").split("-", 1)[0].lower()
+        elif name.startswith("md"):
+            typ = (_rd(base + "/md/level") or "raid").lower()
+        else:
+            typ = "disk"
+        tran = udev.get("ID_BUS")
+        if not tran and not parent:
+            tran = "nvme" if name.startswith("nvme") else ("virtio" if "/virtio" in devlink else ("usb" if "/usb" in devlink else None))
+        rota = procfs.read_int((base if not parent else os.path.dirname(base)) + "/queue/rotational")
+        return {
+            "name": name,
+            "path": f"/dev/{udev.get('DM_NAME') and 'mapper/' + udev['DM_NAME'] or name}",
+            "type": typ,
+            "size": _human_size(sectors * 512),
+            "size_bytes": sectors * 512,
+            "model": _rd(base + "/device/model") or udev.get("ID_MODEL"),
+            "serial": _rd(base + "/device/serial") or udev.get("ID_SERIAL_SHORT"),
+            "rota": bool(rota) if rota is not None else None,
+            "tran": tran,
+            "fstype": udev.get("ID_FS_TYPE") or None,
+            "kname": name,
+            "pkname": parent,
+            "devnum": devnum,
+        }
+
+    def _scan_block(self) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        try:
+            names = sorted(os.listdir(BLOCK_ROOT))
+        except OSError:
+            return out
+        for name in names:
+            if name.startswith(_SKIP_BLOCK):
+                continue
+            base = os.path.join(BLOCK_ROOT, name)
+            out.append(self._block_item(name, base, None))
+            try:
+                parts = sorted(p for p in os.listdir(base) if os.path.exists(os.path.join(base, p, "partition")))
+            except OSError:
+                parts = []
+            for p in parts:
+                out.append(self._block_item(p, os.path.join(base, p), name))
+        return out
+
+    def refresh(self) -> "Inventory":
+        self.pci = self._scan_pci()
+        self.block = self._scan_block()
+        self.version += 1
+        self.updated_at = time.time()
+        return self
+
+    def ensure(self) -> "Inventory":
+        if not self.version:
+            self.refresh()
+        return self
+
+    # ---------- views ----------
+    def gpus(self) -> List[Dict[str, Any]]:
+        return [d for d in self.ensure().pci if d["class_id"] in ("0300", "0302", "1200")]
+
+    def nics(self) -> List[Dict[str, Any]]:
+        return [d for d in self.ensure().pci if d["class_id"][:2] == "02"]
+
+    def block_devices(self) -> List[Dict[str, Any]]:
+        """块设备清单 + 实时挂载点（/proc/self/mounts）+ 吞吐/利用率（/sys/block/*/stat 差分）。"""
+        mounts: Dict[str, tuple] = {}
+        for ln in (procfs.read_text("/proc/self/mounts") or "").splitlines():
+            f = ln.split()
+            if len(f) >= 3 and f[0].startswith("/dev/"):
+                mounts.setdefault(os.path.basename(os.path.realpath(f[0])), (f[1].replace("\\040", " "), f[2]))
+        now_t = time.time()
+        out = []
+        for item in self.ensure().block:
+            it = dict(item)
+            mp = mounts.get(it["kname"])
+            it["mountpoint"] = mp[0] if mp else None
+            if mp and not it["fstype"]:
+                it["fstype"] = mp[1]
+            stat_path = f"{BLOCK_ROOT}/{it['pkname'] + '/' if it['pkname'] else ''}{it['kname']}/stat"
+            st = (self._stat.read(stat_path) or "").split()
+            if len(st) >= 11:
+                rs, ws, inflight, ioticks = int(st[2]), int(st[6]), int(st[8]), int(st[9])
+                prev = self._prev_stat.get(it["kname"])
+                self._prev_stat[it["kname"]] = (now_t, rs, ws, ioticks)
+                it["queue"] = inflight
+                if prev and now_t - prev[0] > 0.05:
+                    dt = now_t - prev[0]
+                    it["rmbs"] = max(0, rs - prev[1]) * 512 / dt / 1048576
+                    it["wmbs"] = max(0, ws - prev[2]) * 512 / dt / 1048576
+                    it["util_pct"] = min(100.0, max(0, ioticks - prev[3]) / (dt * 1000) * 100)
+            out.append(it)
+        return out
+
+    def lspci_text(self) -> str:
+        """与 `lspci` 相近的纯文本输出（运维页面用，无需 fork）。"""
+        lines = []
+        for d in self.ensure().pci:
+            slot = d["slot"][5:] if d["slot"].startswith("0000:") else d["slot"]
+            vendor = d["vendor"] or f"Device {d['vendor_id']}"
+            dev = d["device"] or f"Device {d['device_id']}"
+            rev = f" (rev {d['revision'][2:]})" if d.get("revision") else ""
+            lines.append(f"{slot} {d['class']}: {vendor} {dev}{rev}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def snapshot(self) -> Dict[str, Any]:
+        self.ensure()
+        return {"version": self.version, "updated_at": int(self.updated_at), "pci": self.pci, "block": self.block_devices()}
+
+
+inventory = Inventory()
+
+
+def _open_uevent_socket() -> socket.socket:
+    s = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+    s.bind((0, 1))  # group 1: kernel uevents
+    s.setblocking(False)
+    return s
+
+
+async def inventory_worker():
+    """启动时建立清单；之后在 pci/block 子系统的 uevent 到来（1s 去抖）或 INVENTORY_REFRESH 超时后重建。"""
+    slow = int(os.environ.get("INVENTORY_REFRESH", "3600"))
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.to_thread(inventory.refresh)
+    except Exception:
+        pass
+    wake = asyncio.Event()
+    sock = None
+    try:
+        sock = _open_uevent_socket()
+
+        def on_uevent():
+            while True:
+                try:
+                    buf = sock.recv(1 << 16)
+                except (BlockingIOError, OSError):
+                    break
+                # "add@/devices/...\0ACTION=add\0SUBSYSTEM=block\0..."
+                if b"SUBSYSTEM=block" in buf or b"SUBSYSTEM=pci" in buf:
+                    wake.set()
+
+        loop.add_reader(sock.fileno(), on_uevent)
+    except (OSError, AttributeError):
+        sock = None
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=slow)
+                await asyncio.sleep(1.0)  # 去抖：热插拔通常一次产生多条 uevent
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            try:
+                await asyncio.to_thread(inventory.refresh)
+            except Exception:
+                pass
+    finally:
+        if sock is not None:
+            loop.remove_reader(sock.fileno())
+            sock.close()
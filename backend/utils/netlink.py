@@ -0,0 +1,394 @@
+import os, time, socket, struct, asyncio, ipaddress
+from typing import Dict, Any, List, Optional, Tuple
+import psutil
+from ..db import db_write
+from . import procfs
+
+
+# rtnetlink constants (linux/rtnetlink.h, linux/if_link.h, linux/if_addr.h)
+NETLINK_ROUTE = 0
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+NLM_F_REQUEST, NLM_F_DUMP = 0x1, 0x300
+RTM_NEWLINK, RTM_DELLINK, RTM_GETLINK = 16, 17, 18
+RTM_NEWADDR, RTM_DELADDR, RTM_GETADDR = 20, 21, 22
+RTM_NEWROUTE, RTM_DELROUTE, RTM_GETROUTE = 24, 25, 26
+RTMGRP_LINK, RTMGRP_IPV4_IFADDR, RTMGRP_IPV4_ROUTE = 0x1, 0x10, 0x40
+RTMGRP_IPV6_IFADDR, RTMGRP_IPV6_ROUTE = 0x100, 0x400
+IFLA_ADDRESS, IFLA_IFNAME, IFLA_MTU = 1, 3, 4
+IFA_ADDRESS, IFA_LOCAL, IFA_LABEL, IFA_BROADCAST = 1, 2, 3, 4
+RTA_DST, RTA_OIF, RTA_GATEWAY, RTA_PRIORITY, RTA_TABLE = 1, 4, 5, 6, 15
+RT_TABLE_MAIN = 254
+IFF_UP, IFF_RUNNING, IFF_POINTOPOINT = 0x1, 0x40, 0x10
+
+_NLMSGHDR = struct.Struct("=LHHLL")
+_IFINFOMSG = struct.Struct("=BxHiII")
+_IFADDRMSG = struct.Struct("=BBBBI")
+_RTMSG = struct.Struct("=BBBBBBBBI")
+_RTATTR = struct.Struct("=HH")
+
+_FAMILY_NAME = {socket.AF_INET: "AF_INET", socket.AF_INET6: "AF_INET6"}
+_DUPLEX = {"full": 2, "half": 1}
+
+
+def _attrs(buf: bytes, off: int) -> Dict[int, bytes]:
+    out: Dict[int, bytes] = {}
+    n = len(buf)
+    while off + 4 <= n:
+        ln, typ = _RTATTR.unpack_from(buf, off)
+        if ln < 4:
+            break
+        out[typ & 0x3FFF] = buf[off + 4: off + ln]
+        off += (ln + 3) & ~3
+    return out
+
+
+def _iter_msgs(buf: bytes):
+    off = 0
+    while off + 16 <= len(buf):
+        ln, typ, flags, seq, pid = _NLMSGHDR.unpack_from(buf, off)
+        if ln < 16:
+            break
+        yield typ, seq, buf[off + 16: off + ln]
+        off += (ln + 3) & ~3
+
+
+def _cstr(b: Optional[bytes]) -> str:
+    return (b or b"").split(b"\0", 1)[0].decode("utf-8", "replace")
+
+
+def _mac(b: Optional[bytes]) -> Optional[str]:
+    return ":".join(f"{x:02x}" for x in b) if b else None
+
+
+def _ip(family: int, b: Optional[bytes]) -> Optional[str]:
+    if not b:
+        return None
+    try:
+        return socket.inet_ntop(family, b)
+    except (OSError, ValueError):
+        return None
+
+
+def _netmask(family: int, prefixlen: int) -> Optional[str]:
+    try:
+        net = ipaddress.ip_network(f"{'0.0.0.0' if family == socket.AF_INET else '::'}/{prefixlen}")
+        return str(net.netmask)
+    except ValueError:
+        return None
+
+
+class NetTopology:
+    """内存中的网络拓扑缓存：网卡、地址、默认路由、主网卡。
+    由 netlink 事件增量维护（或在无 netlink 时按慢定时器从 psutil 刷新），
+    接口直接返回预先渲染好的结果，version 每次变化 +1，用作 ETag。
+    """
+
+    def __init__(self):
+        self.links: Dict[int, Dict[str, Any]] = {}
+        self.addrs: Dict[int, Dict[Tuple[int, str], Dict[str, Any]]] = {}
+        self.routes: Dict[Tuple, Dict[str, Any]] = {}
+        self.version = 0
+        self.source = "none"
+        self.updated_at = 0.0
+        self._epoch = int(time.time())
+        self._view: Optional[Dict[str, Any]] = None
+        self._psutil_view: Optional[Dict[str, Any]] = None
+        self.pending_events: List[Tuple[int, str, str]] = []
+
+    # ---------- netlink message handlers ----------
+    def apply(self, typ: int, payload: bytes) -> bool:
+        if typ in (RTM_NEWLINK, RTM_DELLINK) and len(payload) >= _IFINFOMSG.size:
+            return self._apply_link(typ, payload)
+        if typ in (RTM_NEWADDR, RTM_DELADDR) and len(payload) >= _IFADDRMSG.size:
+            return self._apply_addr(typ, payload)
+        if typ in (RTM_NEWROUTE, RTM_DELROUTE) and len(payload) >= _RTMSG.size:
+            return self._apply_route(typ, payload)
+        return False
+
+    def _apply_link(self, typ: int, payload: bytes) -> bool:
+        family, iftype, index, flags, change = _IFINFOMSG.unpack_from(payload, 0)
+        old = self.links.get(index)
+        if typ == RTM_DELLINK:
+            if old is None:
+                return False
+            self.links.pop(index, None)
+            self.addrs.pop(index, None)
+            self.pending_events.append((int(time.time()), old["name"], "removed"))
+            return True
+        a = _attrs(payload, _IFINFOMSG.size)
+        name = _cstr(a.get(IFLA_IFNAME)) or (old or {}).get("name") or str(index)
+        mtu = struct.unpack("=I", a[IFLA_MTU])[0] if len(a.get(IFLA_MTU, b"")) == 4 else (old or {}).get("mtu", 0)
+        isup = bool(flags & IFF_UP) and bool(flags & IFF_RUNNING)
+        speed, duplex = self._link_speed(name) if isup else (0, 0)
+        new = {"name": name, "flags": flags, "isup": isup, "mtu": mtu, "mac": _mac(a.get(IFLA_ADDRESS)) or (old or {}).get("mac"),
+               "speed": speed, "duplex": duplex}
+        if old == new:
+            return False
+        if old is not None and old.get("isup") != isup:
+            self.pending_events.append((int(time.time()), name, "up" if isup else "down"))
+        self.links[index] = new
+        return True
+
+    def _apply_addr(self, typ: int, payload: bytes) -> bool:
+        family, prefixlen, flags, scope, index = _IFADDRMSG.unpack_from(payload, 0)
+        if family not in _FAMILY_NAME:
+            return False
+        a = _attrs(payload, _IFADDRMSG.size)
+        # IPv4: IFA_LOCAL 是本机地址，IFA_ADDRESS 在点对点链路上是对端地址
+        local = _ip(family, a.get(IFA_LOCAL)) or _ip(family, a.get(IFA_ADDRESS))
+        if not local:
+            return False
+        key = (family, local)
+        bucket = self.addrs.setdefault(index, {})
+        if typ == RTM_DELADDR:
+            return bucket.pop(key, None) is not None
+        peer = _ip(family, a.get(IFA_ADDRESS))
+        ptp = peer if peer and peer != local else None
+        name = (self.links.get(index) or {}).get("name")
+        if family == socket.AF_INET6 and local.startswith("fe80") and name:
+            local = f"{local}%{name}"  # 与 psutil 一致，链路本地地址带 scope
+        item = {"family": _FAMILY_NAME[family], "address": local, "netmask": _netmask(family, prefixlen),
+                "broadcast": _ip(family, a.get(IFA_BROADCAST)), "ptp": ptp, "prefixlen": prefixlen}
+        if bucket.get(key) == item:
+            return False
+        bucket[key] = item
+        return True
+
+    def _apply_route(self, typ: int, payload: bytes) -> bool:
+        family, dst_len, src_len, tos, table, proto, scope, rtype, flags = _RTMSG.unpack_from(payload, 0)
+        a = _attrs(payload, _RTMSG.size)
+        if len(a.get(RTA_TABLE, b"")) == 4:
+            table = struct.unpack("=I", a[RTA_TABLE])[0]
+        # 只关心 main 表的默认路由
+        if dst_len != 0 or table != RT_TABLE_MAIN or family not in _FAMILY_NAME:
+            return False
+        oif = struct.unpack("=i", a[RTA_OIF])[0] if len(a.get(RTA_OIF, b"")) == 4 else None
+        metric = struct.unpack("=I", a[RTA_PRIORITY])[0] if len(a.get(RTA_PRIORITY, b"")) == 4 else 0
+        gw = _ip(family, a.get(RTA_GATEWAY))
+        key = (family, oif, gw, metric)
+        if typ == RTM_DELROUTE:
+            return self.routes.pop(key, None) is not None
+        if key in self.routes:
+            return False
+        self.routes[key] = {"family": _FAMILY_NAME[family], "oif": oif, "gateway": gw, "metric": metric}
+        return True
+
+    @staticmethod
+    def _link_speed(name: str) -> Tuple[int, int]:
+        # 速率/双工不在 netlink 消息里；仅在链路变化时读一次 sysfs
+        speed = procfs.read_int(f"/sys/class/net/{name}/speed", 0) or 0
+        duplex = _DUPLEX.get((procfs.read_text(f"/sys/class/net/{name}/duplex") or "").strip(), 0)
+        return max(0, speed), duplex
+
+    def replace(self, fresh: "NetTopology") -> None:
+        """用全量 dump 的结果替换当前状态（在事件循环线程调用），并补记期间漏掉的 up/down。"""
+        now = int(time.time())
+        for index, link in fresh.links.items():
+            old = self.links.get(index)
+            if old is not None and old.get("isup") != link.get("isup"):
+                self.pending_events.append((now, link["name"], "up" if link["isup"] else "down"))
+        self.links, self.addrs, self.routes = fresh.links, fresh.addrs, fresh.routes
+        self.source = "netlink"
+        self._psutil_view = None
+        self.changed()
+
+    def changed(self) -> None:
+        self.version += 1
+        self.updated_at = time.time()
+        self._view = None
+
+    # ---------- rendered views ----------
+    def primary_iface(self) -> Optional[str]:
+        best = None
+        for r in self.routes.values():
+            link = self.links.get(r["oif"]) if r["oif"] is not None else None
+            if not link:
+                continue
+            rank = (0 if r["family"] == "AF_INET" else 1, r["metric"])
+            if best is None or rank < best[0]:
+                best = (rank, link["name"])
+        return best[1] if best else None
+
+    def view(self) -> Dict[str, Any]:
+        if self._psutil_view is not None and self.source == "psutil":
+            return self._psutil_view
+        v = self._view
+        if v is not None:
+            return v
+        ifaces: Dict[str, Dict[str, Any]] = {}
+        for index, link in sorted(self.links.items()):
+            addrs = []
+            if link.get("mac"):
+                addrs.append({"family": "AF_PACKET", "address": link["mac"], "netmask": None, "broadcast": None, "ptp": None})
+            for item in (self.addrs.get(index) or {}).values():
+                addrs.append({k: item[k] for k in ("family", "address", "netmask", "broadcast", "ptp")})
+            ifaces[link["name"]] = {"isup": link["isup"], "duplex": link["duplex"], "speed": link["speed"], "mtu": link["mtu"], "addrs": addrs}
+        v = {
+            "primary_iface": self.primary_iface(),
+            "ifaces": ifaces,
+            "up_ifaces": [k for k, x in ifaces.items() if x.get("isup")],
+            "default_routes": sorted(self.routes.values(), key=lambda r: (r["family"], r["metric"])),
+            "version": self.version,
+        }
+        self._view = v
+        return v
+
+    def etag(self) -> str:
+        return f'W/"topo-{self._epoch}-{self.version}"'
+
+    # ---------- fallback (no netlink: non-Linux or restricted sandbox) ----------
+    def refresh_from_psutil(self) -> bool:
+        from .system import detect_primary_interface
+        stats = psutil.net_if_stats()
+        addrs = psutil.net_if_addrs()
+        ifaces: Dict[str, Dict[str, Any]] = {}
+        for name, st in stats.items():
+            o = {"isup": st.isup, "duplex": getattr(st, "duplex", None), "speed": getattr(st, "speed", None), "mtu": st.mtu, "addrs": []}
+            for a in addrs.get(name, []):
+                o["addrs"].append({"family": str(a.family).split(".")[-1], "address": a.address, "netmask": a.netmask, "broadcast": a.broadcast, "ptp": a.ptp})
+            ifaces[name] = o
+        old = self._psutil_view or {}
+        for name, o in ifaces.items():
+            prev = (old.get("ifaces") or {}).get(name)
+            if prev is not None and bool(prev.get("isup")) != bool(o["isup"]):
+                self.pending_events.append((int(time.time()), name, "up" if o["isup"] else "down"))
+        primary = detect_primary_interface()
+        if old.get("ifaces") == ifaces and old.get("primary_iface") == primary:
+            return False
+        self.source = "psutil"
+        self.changed()
+        self._psutil_view = {
+            "primary_iface": primary,
+            "ifaces": ifaces,
+            "up_ifaces": [k for k, v in ifaces.items() if v.get("isup")],
+            "default_routes": [],
+            "version": self.version,
+        }
+        return True
+
+
+topology = NetTopology()
+
+
+def _open_socket(groups: int = 0) -> socket.socket:
+    s = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    s.bind((0, groups))
+    return s
+
+
+def _dump(sock: socket.socket) -> NetTopology:
+    """同步拉取全量 link/addr/route（启动与 ENOBUFS 后重同步时使用），结果放在新对象里。"""
+    requests = (
+        (RTM_GETLINK, _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)),
+        (RTM_GETADDR, _IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)),
+        (RTM_GETROUTE, _RTMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0, 0, 0, 0, 0)),
+    )
+    fresh = NetTopology()
+    for seq, (typ, body) in enumerate(requests, start=1):
+        sock.send(_NLMSGHDR.pack(16 + len(body), typ, NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + body)
+        done = False
+        while not done:
+            buf = sock.recv(1 << 16)
+            for mtyp, mseq, payload in _iter_msgs(buf):
+                if mseq != seq:
+                    continue
+                if mtyp in (NLMSG_DONE, NLMSG_ERROR):
+                    done = True
+                    break
+                fresh.apply(mtyp, payload)
+    return fresh
+
+
+def ensure_topology() -> NetTopology:
+    """接口在后台任务就绪前被调用时，先用 psutil 填充一次。"""
+    if topology.version == 0:
+        try:
+            topology.refresh_from_psutil()
+        except Exception:
+            pass
+    return topology
+
+
+async def _record_events(topo: NetTopology) -> None:
+    if not topo.pending_events:
+        return
+    events, topo.pending_events = topo.pending_events, []
+    try:
+        async with db_write() as db:
+            await db.executemany(
+                "INSERT INTO sys_logs(category,message,created_at) VALUES('net_link',?,datetime(?,'unixepoch'))",
+                [(f"{name} link {state}", ts) for ts, name, state in events],
+            )
+            await db.commit()
+    except Exception:
+        pass
+
+
+async def netlink_worker():
+    """订阅 rtnetlink 的 link/addr/route 组播，增量维护 topology；不可用时退化为 psutil 慢轮询。"""
+    resync = int(os.environ.get("NETTOPO_RESYNC", "600"))
+    poll = int(os.environ.get("NETTOPO_POLL", "30"))
+    loop = asyncio.get_running_loop()
+    groups = RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_ROUTE
+    try:
+        events = _open_socket(groups)
+        events.setblocking(False)
+        dump_sock = _open_socket(0)
+    except (OSError, AttributeError):
+        # AF_NETLINK 不可用（非 Linux / 受限容器）
+        while True:
+            try:
+                await asyncio.to_thread(topology.refresh_from_psutil)
+                await _record_events(topology)
+            except Exception:
+                pass
+            await asyncio.sleep(poll)
+
+    wake = asyncio.Event()
+    need_resync = False
+
+    def on_readable():
+        nonlocal need_resync
+        changed = False
+        while True:
+            try:
+                buf = events.recv(1 << 16)
+            except BlockingIOError:
+                break
+            except OSError:
+                # ENOBUFS：内核队列溢出，事件丢失，需要全量重同步
+                need_resync = True
+                break
+            for typ, seq, payload in _iter_msgs(buf):
+                changed |= topology.apply(typ, payload)
+        if changed:
+            topology.changed()
+        if changed or need_resync:
+            wake.set()
+
+    try:
+        topology.replace(await asyncio.to_thread(_dump, dump_sock))
+    except Exception:
+        pass
+    loop.add_reader(events.fileno(), on_readable)
+    last_sync = time.time()
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=resync)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            if need_resync or time.time() - last_sync >= resync:
+                need_resync = False
+                try:
+                    topology.replace(await asyncio.to_thread(_dump, dump_sock))
+                except Exception:
+                    pass
+                last_sync = time.time()
+            await _record_events(topology)
+    finally:
+        loop.remove_reader(events.fileno())
+        events.close()
+        dump_sock.close()
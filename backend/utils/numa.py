@@ -0,0 +1,137 @@
+import os, re, time, asyncio
+from typing import Dict, Any, List, Optional, Tuple
+from ..db import db_write
+from ..replication import log_rows
+from . import procfs
+
+
+NODE_ROOT = "/sys/devices/system/node"
+NET_ROOT = "/sys/class/net"
+
+_RE_NODE = re.compile(r"^node(\d+)$")
+_RE_MEMINFO = re.compile(r"^Node\s+\d+\s+(\w+):\s+(\d+)")
+_GPU_VENDORS = {"0x10de": "NVIDIA", "0x1002": "AMD", "0x8086": "Intel"}
+_NUMASTAT_KEYS = ("numa_hit", "numa_miss", "numa_foreign", "interleave_hit", "local_node", "other_node")
+
+
+def supported() -> bool:
+    return os.path.isdir(NODE_ROOT)
+
+
+def list_nodes() -> List[int]:
+    try:
+        return sorted(int(m.group(1)) for m in (_RE_NODE.match(n) for n in os.listdir(NODE_ROOT)) if m)
+    except OSError:
+        return []
+
+
+def _numa_node_of(sysdev: str) -> Optional[int]:
+    v = procfs.read_int(os.path.join(sysdev, "numa_node"))
+    # -1 = 单节点机器或固件未上报
+    return v if v is not None and v >= 0 else None
+
+
+def device_affinity() -> Dict[str, List[Dict[str, Any]]]:
+    """GPU / 网卡到 NUMA 节点的映射（PCI 部分来自 inventory 缓存）。"""
+    from .inventory import inventory
+    gpus = [{"pci": d["slot"], "vendor": _GPU_VENDORS.get("0x" + d["vendor_id"], d["vendor"] or d["vendor_id"]), "numa_node": d["numa_node"]}
+            for d in inventory.gpus() if d["class_id"] in ("0300", "0302")]
+    nics: List[Dict[str, Any]] = []
+    try:
+        for name in sorted(os.listdir(NET_ROOT)):
+            dev = os.path.join(NET_ROOT, name, "device")
+            if not os.path.exists(dev):
+                continue  # 虚拟网卡（lo/veth/bridge）没有 PCI 设备
+            nics.append({
+                "iface": name,
+                "pci": os.path.basename(os.path.realpath(dev)),
+                "numa_node": _numa_node_of(dev),
+            })
+    except OSError:
+        pass
+    return {"gpus": gpus, "nics": nics}
+
+
+class NumaCollector:
+    """按 NUMA 节点采集内存占用与 numastat 计数，计算 numa_miss/numa_foreign 等速率。
+    meminfo/numastat 句柄常驻（procfs.CachedReader），每个 tick 只做 pread。
+    """
+
+    def __init__(self):
+        self.reader = procfs.CachedReader(max_handles=64)
+        self._prev: Dict[int, Tuple[float, Dict[str, int]]] = {}
+        self._cpulists: Dict[int, str] = {}
+        self.items: List[Dict[str, Any]] = []
+        self.ts: int = 0
+
+    def _meminfo(self, node: int) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        txt = self.reader.read(f"{NODE_ROOT}/node{node}/meminfo") or ""
+        for ln in txt.splitlines():
+            m = _RE_MEMINFO.match(ln)
+            if m:
+                out[m.group(1)] = int(m.group(2)) * 1024
+        return out
+
+    def cpulist(self, node: int) -> str:
+        c = self._cpulists.get(node)
+        if c is None:
+            c = (procfs.read_text(f"{NODE_ROOT}/node{node}/cpulist") or "").strip()
+            self._cpulists[node] = c
+        return c
+
+    def sample(self) -> List[Dict[str, Any]]:
+        if not supported():
+            return []
+        now_t = time.time()
+        items: List[Dict[str, Any]] = []
+        for node in list_nodes():
+            mi = self._meminfo(node)
+            ns = procfs.parse_kv(self.reader.read(f"{NODE_ROOT}/node{node}/numastat"), sep=" ")
+            prev = self._prev.get(node)
+            self._prev[node] = (now_t, ns)
+            item: Dict[str, Any] = {
+                "node": node,
+                "cpus": self.cpulist(node),
+                "mem_total": mi.get("MemTotal", 0),
+                "mem_free": mi.get("MemFree", 0),
+                "mem_used": mi.get("MemUsed", max(0, mi.get("MemTotal", 0) - mi.get("MemFree", 0))),
+            }
+            dt = max(0.001, now_t - prev[0]) if prev else 0
+            for k in _NUMASTAT_KEYS:
+                # 计数单位是页；给出每秒页数
+                item[k + "_ps"] = (max(0, ns.get(k, 0) - prev[1].get(k, 0)) / dt) if prev else 0.0
+            items.append(item)
+        self.items = items
+        self.ts = int(now_t)
+        return items
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"ts": self.ts, "supported": supported(), "nodes": self.items}
+
+
+numa_collector = NumaCollector()
+
+
+async def numa_worker():
+    """后台采集各 NUMA 节点内存与跨节点访问速率，写入 numa_data。单节点机器也照常记录。"""
+    interval = int(os.environ.get("NUMA_INTERVAL", os.environ.get("SAMPLE_INTERVAL", "5")))
+    if not supported():
+        return
+    warm = False
+    while True:
+        try:
+            items = await asyncio.to_thread(numa_collector.sample)
+            if items and warm:
+                ts = numa_collector.ts
+                rows = [(it["node"], ts, it["mem_total"], it["mem_free"], it["mem_used"], it["numa_hit_ps"], it["numa_miss_ps"], it["numa_foreign_ps"], it["other_node_ps"]) for it in items]
+                async with db_write() as db:
+                    await db.executemany(
+                        "INSERT OR REPLACE INTO numa_data(node,ts,mem_total,mem_free,mem_used,numa_hit_ps,numa_miss_ps,numa_foreign_ps,other_node_ps) VALUES(?,?,?,?,?,?,?,?,?)", rows,
+                    )
+                    await log_rows(db, "numa_data", ("node", "ts", "mem_total", "mem_free", "mem_used", "numa_hit_ps", "numa_miss_ps", "numa_foreign_ps", "other_node_ps"), rows)
+                    await db.commit()
+            warm = True
+        except Exception:
+            pass
+        await asyncio.sleep(interval)
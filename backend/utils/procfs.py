@@ -0,0 +1,115 @@
+import os
+from typing import Dict, Optional
+
+
+PROC_ROOT = "/proc"
+SYS_ROOT = "/sys"
+
+
+def available() -> bool:
+    """True when a Linux-style /proc is mounted (fast path usable)."""
+    return os.path.isdir(os.path.join(PROC_ROOT, "self"))
+
+
+def read_text(path: str, default: Optional[str] = None) -> Optional[str]:
+    """One-shot read of a small procfs/sysfs file without the open()/TextIOWrapper overhead."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return default
+    try:
+        return os.read(fd, 65536).decode("utf-8", "replace")
+    except OSError:
+        return default
+    finally:
+        os.close(fd)
+
+
+def read_int(path: str, default: Optional[int] = None) -> Optional[int]:
+    s = read_text(path)
+    if s is None:
+        return default
+    try:
+        return int(s.strip())
+    except ValueError:
+        return default
+
+
+def parse_kv(text: Optional[str], sep: str = ":") -> Dict[str, int]:
+    """Parse 'key: 123 [kB]' style lines (/proc/<pid>/io, meminfo, numastat) into ints."""
+    out: Dict[str, int] = {}
+    if not text:
+        return out
+    for ln in text.splitlines():
+        if sep == " ":
+            parts = ln.split()
+            if len(parts) < 2:
+                continue
+            k, v = parts[0], parts[1]
+        else:
+            k, _, rest = ln.partition(sep)
+            if not _:
+                continue
+            v = rest.split()[0] if rest.split() else ""
+        try:
+            out[k.strip()] = int(v)
+        except ValueError:
+            continue
+    return out
+
+
+class CachedReader:
+    """Keeps file descriptors of frequently polled procfs/sysfs files open and re-reads
+    them with pread(…, 0), which regenerates the content on every call. Saves the
+    path lookup + open/close per read on files sampled every tick.
+    """
+
+    def __init__(self, max_handles: int = 256):
+        self.max_handles = max_handles
+        self._fds: Dict[str, int] = {}
+
+    def read(self, path: str, default: Optional[str] = None) -> Optional[str]:
+        fd = self._fds.get(path)
+        if fd is None:
+            if len(self._fds) >= self.max_handles:
+                return read_text(path, default)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                return default
+            self._fds[path] = fd
+        try:
+            return os.pread(fd, 65536, 0).decode("utf-8", "replace")
+        except OSError:
+            # file went away (device removed, pid exited): drop the handle
+            self.close(path)
+            return default
+
+    def read_int(self, path: str, default: Optional[int] = None) -> Optional[int]:
+        s = self.read(path)
+        if s is None:
+            return default
+        try:
+            return int(s.strip())
+        except ValueError:
+            return default
+
+    def close(self, path: str) -> None:
+        fd = self._fds.pop(path, None)
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def close_missing(self, keep) -> None:
+        """Close every cached handle whose path is not in `keep`."""
+        for p in [p for p in self._fds if p not in keep]:
+            self.close(p)
+
+    def close_all(self) -> None:
+        for p in list(self._fds):
+            self.close(p)
+
+    def __len__(self) -> int:
+        return len(self._fds)
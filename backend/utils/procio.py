@@ -0,0 +1,136 @@
+import os, time, heapq, asyncio
+from typing import Dict, Any, List, Optional, Tuple
+import psutil
+from ..db import db_write
+from ..replication import log_rows
+from . import procfs
+
+
+class ProcIOSampler:
+    """按进程统计磁盘 I/O：每个 tick 读取 /proc/<pid>/io 的 read_bytes/write_bytes，
+    与上一次的计数做差得到速率，并用堆维护 I/O 速率 Top-K。
+
+    只保存“当前存活进程”的上一轮计数（增量状态），退出的 pid 在下一轮自动丢弃。
+    """
+
+    def __init__(self, top_k: int = 10):
+        self.top_k = top_k
+        self._prev: Dict[int, Tuple[int, int]] = {}
+        self._prev_t: Optional[float] = None
+        self._names: Dict[int, str] = {}
+        self.top: List[Dict[str, Any]] = []
+        self.ts: int = 0
+        self.interval: float = 0.0
+        self.total_read_bps: float = 0.0
+        self.total_write_bps: float = 0.0
+
+    def _read_counters(self) -> Dict[int, Tuple[int, int]]:
+        cur: Dict[int, Tuple[int, int]] = {}
+        if procfs.available():
+            try:
+                entries = os.scandir(procfs.PROC_ROOT)
+            except OSError:
+                return cur
+            with entries:
+                for e in entries:
+                    name = e.name
+                    if not name.isdigit():
+                        continue
+                    kv = procfs.parse_kv(procfs.read_text(f"{procfs.PROC_ROOT}/{name}/io"))
+                    if "read_bytes" in kv:
+                        cur[int(name)] = (kv["read_bytes"], kv.get("write_bytes", 0))
+            return cur
+        # non-Linux: psutil fallback (slower, but same semantics)
+        for p in psutil.process_iter():
+            try:
+                io = p.io_counters()
+                cur[p.pid] = (int(io.read_bytes), int(io.write_bytes))
+            except Exception:
+                pass
+        return cur
+
+    def _name(self, pid: int) -> str:
+        n = self._names.get(pid)
+        if n is None:
+            n = (procfs.read_text(f"{procfs.PROC_ROOT}/{pid}/comm") or "").strip()
+            if not n:
+                try:
+                    n = psutil.Process(pid).name()
+                except Exception:
+                    n = ""
+            self._names[pid] = n
+        return n
+
+    def sample(self) -> List[Dict[str, Any]]:
+        now_t = time.time()
+        cur = self._read_counters()
+        prev, prev_t = self._prev, self._prev_t
+        self._prev, self._prev_t = cur, now_t
+        # forget names of exited processes (pid reuse)
+        self._names = {pid: n for pid, n in self._names.items() if pid in cur}
+        if prev_t is None:
+            return self.top
+        dt = max(0.001, now_t - prev_t)
+        rates = []
+        tot_r = tot_w = 0
+        for pid, (rb, wb) in cur.items():
+            p = prev.get(pid)
+            if p is None:
+                continue
+            dr = rb - p[0]; dw = wb - p[1]
+            if dr < 0 or dw < 0:
+                # counters went backwards: pid was reused, start over
+                continue
+            tot_r += dr; tot_w += dw
+            if dr or dw:
+                rates.append((dr + dw, pid, dr, dw))
+        top = heapq.nlargest(self.top_k, rates)
+        self.top = [
+            {
+                "pid": pid,
+                "name": self._name(pid),
+                "read_bps": dr / dt,
+                "write_bps": dw / dt,
+                "total_bps": tot / dt,
+            }
+            for (tot, pid, dr, dw) in top
+        ]
+        self.ts = int(now_t)
+        self.interval = dt
+        self.total_read_bps = tot_r / dt
+        self.total_write_bps = tot_w / dt
+        return self.top
+
+    def snapshot(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        items = self.top if limit is None else self.top[:max(0, int(limit))]
+        return {
+            "ts": self.ts,
+            "interval": self.interval,
+            "total_read_bps": self.total_read_bps,
+            "total_write_bps": self.total_write_bps,
+            "items": items,
+        }
+
+
+# 全局采样器实例（由 procio_worker 驱动，API 直接读取其结果）
+procio_sampler = ProcIOSampler(top_k=int(os.environ.get("PROCIO_TOP_K", "10")))
+
+
+async def procio_worker():
+    """后台采样：按 SAMPLE_INTERVAL 采集一次并把 Top-K 写入 proc_io_top。"""
+    interval = int(os.environ.get("PROCIO_INTERVAL", os.environ.get("SAMPLE_INTERVAL", "5")))
+    while True:
+        try:
+            top = await asyncio.to_thread(procio_sampler.sample)
+            if top and procio_sampler.ts:
+                ts = procio_sampler.ts
+                rows = [(ts, i, it["pid"], it["name"], it["read_bps"], it["write_bps"]) for i, it in enumerate(top)]
+                async with db_write() as db:
+                    await db.executemany(
+                        "INSERT OR REPLACE INTO proc_io_top(ts,rank,pid,name,read_bps,write_bps) VALUES(?,?,?,?,?,?)", rows,
+                    )
+                    await log_rows(db, "proc_io_top", ("ts", "rank", "pid", "name", "read_bps", "write_bps"), rows)
+                    await db.commit()
+        except Exception:
+            pass
+        await asyncio.sleep(interval)
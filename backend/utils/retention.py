@@ -0,0 +1,369 @@
+import os, time, asyncio
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from ..config import DB_PATH
+from ..db import db_read, db_write, ensure_incremental_vacuum, vacuum_status
+from .. import shards
+from ..replication import log_row
+from .coldstore import COLD_AFTER_DAYS, compact_once
+from .seglog import SEG_DIR
+
+
+def _days(name: str, default: str) -> int:
+    return int(os.environ.get(name, default))
+
+
+# 分层保留策略：(层级, 保留天数, 表)；天数 <= 0 表示永久保留
+# raw 层的 system_samples/net_data 新数据在按天分片中（整天删除文件），这里列出的是主库中的旧行
+TIERS: Tuple[Tuple[str, int, Tuple[str, ...]], ...] = (
+    ("raw", _days("RETENTION_RAW_DAYS", os.environ.get("RETENTION_DAYS", "14")), (
+        "system_samples", "net_data", "metric_samples", "proc_io_top", "cgroup_data", "numa_data",
+        "gpu_detailed_data", "gpu_process_data",
+    )),
+    ("1m", _days("RETENTION_1M_DAYS", "90"), ("rollup_1m",)),
+    ("5m", _days("RETENTION_5M_DAYS", "365"), ("rollup_5m",)),
+    ("1h", _days("RETENTION_1H_DAYS", "730"), ("rollup_1h",)),
+    ("1d", _days("RETENTION_1D_DAYS", "0"), ("rollup_1d",)),
+)
+# 作为下一级汇总来源的表：删除不得越过下一级的水位线，避免未汇总的数据被提前清掉
+_FEEDS = {"raw": "1m", "1m": "5m", "5m": "1h", "1h": "1d"}
+_ROLLUP_SOURCES = {"system_samples", "net_data", "gpu_detailed_data", "rollup_1m", "rollup_5m", "rollup_1h"}
+
+CHUNK_ROWS = int(os.environ.get("RETENTION_DELETE_BATCH", "20000"))
+CHUNK_PAUSE = float(os.environ.get("RETENTION_CHUNK_PAUSE", "0.05"))
+VACUUM_STEP_PAGES = int(os.environ.get("RETENTION_VACUUM_PAGES", "2048"))
+
+# 最近一轮的执行情况（/api/admin/retention 读取）
+retention_stats: Dict[str, Any] = {"runs": 0, "last_run": None, "duration_s": None, "tables": {}, "vacuum": {}, "shards": {}, "cold": {}}
+
+
+async def _delete_chunk(table: str, cutoff: int) -> int:
+    """删除 ts < cutoff 的最早一批（约 CHUNK_ROWS 行，按 ts 边界切分，不依赖 DELETE ... LIMIT）。"""
+    async with db_write() as db:
+        cur = await db.execute(
+            f"DELETE FROM {table} WHERE ts <= (SELECT MAX(ts) FROM (SELECT ts FROM {table} WHERE ts < ? ORDER BY ts LIMIT ?))",
+            (cutoff, CHUNK_ROWS),
+        )
+        await db.commit()
+        return cur.rowcount or 0
+
+
+async def _drop_shards(cutoff: int) -> Dict[str, Any]:
+    async with db_write() as db:
+        dropped, freed = await shards.drop_before(db, cutoff)
+    days = shards.list_days()
+    oldest = shards.day_start(days[0]) if days else None
+    return {
+        "tier": "raw", "cutoff": cutoff, "deleted_days": dropped, "freed_bytes": freed, "oldest_ts": oldest,
+        "backlog_s": max(0, cutoff - oldest - shards.DAY) if oldest is not None else 0,
+    }
+
+
+async def _table_state(table: str) -> Tuple[Optional[int], bool]:
+    """(最早 ts, 是否存在) —— 表不存在时返回 (None, False)。"""
+    async with db_read() as db:
+        try:
+            row = await (await db.execute(f"SELECT MIN(ts) FROM {table}")).fetchone()
+        except Exception:
+            return None, False
+    return (row[0] if row else None), True
+
+
+async def _watermarks() -> Dict[str, int]:
+    async with db_read() as db:
+        try:
+            rows = await (await db.execute("SELECT resolution, watermark FROM rollup_state")).fetchall()
+        except Exception:
+            return {}
+    return {r[0]: int(r[1]) for r in rows}
+
+
+async def run_retention(now: Optional[int] = None) -> Dict[str, Any]:
+    """按层级清理过期数据：逐块删除直至追平，块之间让出事件循环；结束后增量回收空间。"""
+    t0 = time.time()
+    now = int(now or t0)
+    wms = await _watermarks()
+    tables: Dict[str, Any] = {}
+    for tier, days, names in TIERS:
+        if days <= 0:
+            continue
+        cutoff = now - days * 86400
+        feed = wms.get(_FEEDS.get(tier, ""))
+        for table in names:
+            eff = min(cutoff, feed) if (feed is not None and table in _ROLLUP_SOURCES) else cutoff
+            oldest, exists = await _table_state(table)
+            if not exists:
+                continue
+            deleted = chunks = 0
+            while oldest is not None and oldest < eff:
+                n = await _delete_chunk(table, eff)
+                deleted += n
+                chunks += 1
+                if n < CHUNK_ROWS:
+                    break
+                await asyncio.sleep(CHUNK_PAUSE)
+            oldest, _ = await _table_state(table)
+            tables[table] = {
+                "tier": tier, "cutoff": eff, "deleted": deleted, "chunks": chunks, "oldest_ts": oldest,
+                # backlog：最早一条仍早于截止时间的秒数（0 = 已追平）
+                "backlog_s": max(0, eff - oldest) if oldest is not None else 0,
+            }
+        if tier == "raw":
+            # 分片中的原始数据：整天过期即删除文件
+            tables["shards"] = await _drop_shards(min(cutoff, feed) if feed is not None else cutoff)
+    # 过了冷却期的日分片压缩为 Gorilla 块
+    retention_stats["cold"] = await compact_once(now)
+    vac = await incremental_vacuum()
+    retention_stats["runs"] += 1
+    retention_stats["last_run"] = now
+    retention_stats["duration_s"] = round(time.time() - t0, 3)
+    retention_stats["tables"] = tables
+    retention_stats["vacuum"] = vac
+    retention_stats["shards"] = shards.disk_usage()
+    return retention_stats
+
+
+async def incremental_vacuum() -> Dict[str, Any]:
+    """auto_vacuum=INCREMENTAL 下分步归还空闲页，每步之间让出写锁。"""
+    freed = 0
+    async with db_read() as db:
+        mode = (await (await db.execute("PRAGMA auto_vacuum")).fetchone())[0]
+    while mode == 2:
+        async with db_write() as db:
+            free = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+            if not free:
+                break
+            step = min(free, VACUUM_STEP_PAGES)
+            # 该 PRAGMA 每 step 一次释放一页，必须取完结果集
+            await (await db.execute(f"PRAGMA incremental_vacuum({step})")).fetchall()
+            await db.commit()
+            freed += step
+        await asyncio.sleep(CHUNK_PAUSE)
+    async with db_read() as db:
+        page_size = (await (await db.execute("PRAGMA page_size")).fetchone())[0]
+        free = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+    return {
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(mode, str(mode)),
+        "freed_pages": freed, "freelist_pages": free, "page_size": page_size,
+        "db_bytes": os.path.getsize(DB_PATH) if os.path.exists(DB_PATH) else 0,
+        "conversion": dict(vacuum_status),
+    }
+
+
+async def convert_auto_vacuum() -> str:
+    """管理员触发：把旧库切换为 auto_vacuum=INCREMENTAL（完整 VACUUM，期间占用写连接）；进度见 vacuum_status。"""
+    async with db_write() as db:
+        return await ensure_incremental_vacuum(db, DB_PATH, force=True)
+
+
+def policy() -> List[Dict[str, Any]]:
+    return [{"tier": t, "days": d, "tables": list(n)} for t, d, n in TIERS]
+
+
+async def retention_worker():
+    """定期执行分层保留（默认每小时）。"""
+    interval = int(os.environ.get("RETENTION_INTERVAL", "3600"))
+    while True:
+        try:
+            await run_retention()
+        except Exception:
+            pass
+        await asyncio.sleep(interval)
+
+
+# ---------------- 存储预算 ----------------
+# 数据目录（主库 + WAL、分片、段日志）总大小超过 STORAGE_BUDGET 时，依次：checkpoint/回收空闲页 →
+# 提前压缩过去各天的分片 → 从最早一天起逐天删除 raw，再依次删除 1m / 5m / 1h（1d 不动），
+# 每删一天重新计量，降到预算的 BUDGET_LOW_WATER 以下即停止。每层至少保留 BUDGET_MIN_DAYS 天，
+# 作为下一层汇总来源的表不越过下一层的水位线（已汇总过的才删，相当于降采样到下一层）。
+
+def _size(v: str) -> int:
+    """"20G" / "512M" / "1048576" -> 字节。"""
+    v = (v or "0").strip().upper().rstrip("B")
+    mult = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}.get(v[-1:], 1)
+    return int(float(v[:-1] if mult > 1 else v) * mult)
+
+
+STORAGE_BUDGET = _size(os.environ.get("STORAGE_BUDGET", "0"))   # 0 表示不限制
+BUDGET_INTERVAL = int(os.environ.get("BUDGET_INTERVAL", "60"))
+BUDGET_LOW_WATER = float(os.environ.get("BUDGET_LOW_WATER", "0.9"))
+BUDGET_MIN_DAYS = {"raw": _days("BUDGET_MIN_RAW_DAYS", "1"), "1m": _days("BUDGET_MIN_1M_DAYS", "7"),
+                   "5m": _days("BUDGET_MIN_5M_DAYS", "30"), "1h": _days("BUDGET_MIN_1H_DAYS", "90")}
+_ALERT_TITLE = "存储空间超出预算"
+
+budget_stats: Dict[str, Any] = {"budget": STORAGE_BUDGET, "last_check": None, "over": False, "usage": {}, "tiers": {}, "actions": []}
+# 每次检查把各层的历史天数记为 rollup_1m 中的 "storage:<层>" 序列（与段日志的 "hf:" 序列相同，
+# 由汇总任务推进到 5m/1h/1d），重启后仍在，可按时间范围作图，见 /api/admin/storage/history
+STORAGE_PREFIX = "storage:"
+
+
+def _dir_bytes(path: Path) -> int:
+    total = 0
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                if e.is_file(follow_symlinks=False):
+                    total += e.stat().st_size
+    except FileNotFoundError:
+        pass
+    return total
+
+
+def storage_usage() -> Dict[str, int]:
+    """各部分占用字节数（分片目录含 -wal/-shm 与压缩分片）。"""
+    def size(p: str) -> int:
+        try:
+            return os.path.getsize(p)
+        except OSError:
+            return 0
+    out = {"db": size(DB_PATH), "wal": size(f"{DB_PATH}-wal") + size(f"{DB_PATH}-shm"),
+           "shards": _dir_bytes(shards.SHARD_DIR), "segments": _dir_bytes(SEG_DIR)}
+    out["total"] = sum(out.values())
+    return out
+
+
+async def _tier_oldest(tier: str, names: Tuple[str, ...]) -> Optional[int]:
+    vals = []
+    for table in names:
+        oldest, _ = await _table_state(table)
+        if oldest is not None:
+            vals.append(int(oldest))
+    if tier == "raw":
+        days = shards.list_days()
+        if days:
+            vals.append(shards.day_start(days[0]))
+    return min(vals) if vals else None
+
+
+async def tier_history(now: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """各层当前保存的历史：最早时间与天数。"""
+    now = int(now or time.time())
+    out = {}
+    for tier, _days_, names in TIERS:
+        oldest = await _tier_oldest(tier, names)
+        out[tier] = {"oldest_ts": oldest, "history_days": round((now - oldest) / 86400, 2) if oldest is not None else 0}
+    return out
+
+
+def storage_series() -> List[str]:
+    return [STORAGE_PREFIX + tier for tier, _days_, _names in TIERS]
+
+
+async def record_tier_history(tiers: Dict[str, Dict[str, Any]], now: int) -> None:
+    """各层历史天数写入当前分钟的 rollup_1m 桶；同一分钟内多次检查累加合并。"""
+    rows = [(STORAGE_PREFIX + t, now // 60 * 60, h["history_days"]) for t, h in tiers.items()]
+    async with db_write() as db:
+        await db.executemany(
+            "INSERT INTO rollup_1m(series,ts,count,sum,min,max,last) VALUES(?,?,1,?3,?3,?3,?3) "
+            "ON CONFLICT(series,ts) DO UPDATE SET count=count+1, sum=sum+excluded.sum, "
+            "min=min(min,excluded.min), max=max(max,excluded.max), last=excluded.last",
+            rows,
+        )
+        await db.commit()
+
+
+async def _trim_tier(tier: str, names: Tuple[str, ...], cutoff: int, wms: Dict[str, int]) -> int:
+    """删除该层 ts < cutoff 的数据（raw 层含整天分片），返回删除的行数 + 分片天数。"""
+    feed = wms.get(_FEEDS.get(tier, ""))
+    deleted = 0
+    for table in names:
+        eff = cutoff
+        if table in _ROLLUP_SOURCES:
+            if feed is None:
+                continue
+            eff = min(cutoff, feed)
+        oldest, exists = await _table_state(table)
+        while exists and oldest is not None and oldest < eff:
+            n = await _delete_chunk(table, eff)
+            deleted += n
+            if n < CHUNK_ROWS:
+                break
+            await asyncio.sleep(CHUNK_PAUSE)
+    if tier == "raw" and feed is not None:
+        async with db_write() as db:
+            dropped, _freed = await shards.drop_before(db, min(cutoff, feed))
+        deleted += len(dropped)
+    return deleted
+
+
+async def _checkpoint() -> None:
+    async with db_write() as db:
+        await (await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")).fetchall()
+
+
+async def _alert(level: str, message: str) -> None:
+    """同一标题一小时内只记一条。"""
+    async with db_write() as db:
+        row = await (await db.execute(
+            "SELECT id FROM alerts WHERE title=? AND created_at >= datetime('now','-3600 seconds') LIMIT 1", (_ALERT_TITLE,)
+        )).fetchone()
+        if not row:
+            cur = await db.execute("INSERT INTO alerts(level,title,message) VALUES(?,?,?)", (level, _ALERT_TITLE, message))
+            await log_row(db, "alerts", cur.lastrowid)
+            await db.commit()
+
+
+async def enforce_budget(now: Optional[int] = None) -> Dict[str, Any]:
+    """检查数据目录大小，超出预算时按层逐天清理最旧数据。"""
+    now = int(now or time.time())
+    usage = storage_usage()
+    actions: List[Dict[str, Any]] = []
+    budget = STORAGE_BUDGET
+    if budget > 0 and usage["total"] > budget:
+        before = usage["total"]
+        target = int(budget * BUDGET_LOW_WATER)
+        await _checkpoint()
+        await incremental_vacuum()
+        usage = storage_usage()
+        if usage["total"] > target and COLD_AFTER_DAYS > 0:
+            # 不必等冷却期：今天以前的分片都先压缩
+            today = now // shards.DAY * shards.DAY
+            res = await compact_once(today + COLD_AFTER_DAYS * shards.DAY)
+            actions.append({"action": "compact", "days": len(res.get("compacted") or [])})
+            usage = storage_usage()
+        wms = await _watermarks()
+        for tier, _days_, names in TIERS:
+            if usage["total"] <= target or tier not in BUDGET_MIN_DAYS:
+                continue
+            floor = now - BUDGET_MIN_DAYS[tier] * 86400
+            while usage["total"] > target:
+                oldest = await _tier_oldest(tier, names)
+                if oldest is None or oldest >= floor:
+                    break
+                cutoff = min(floor, (oldest // shards.DAY + 1) * shards.DAY)   # 每次最早一天
+                n = await _trim_tier(tier, names, cutoff, wms)
+                await incremental_vacuum()
+                await _checkpoint()   # 删除产生的 WAL 也计入占用
+                usage = storage_usage()
+                actions.append({"action": "trim", "tier": tier, "cutoff": cutoff, "deleted": n, "total_bytes": usage["total"]})
+                if not n:
+                    break   # 受水位线限制，本层无法再删
+        over = usage["total"] > budget
+        trimmed = [a for a in actions if a.get("tier")]
+        if over or trimmed:
+            tiers = sorted({a["tier"] for a in trimmed}, key=[t for t, _, _ in TIERS].index)
+            await _alert(
+                "ERROR" if over else "WARN",
+                f"数据目录 {before >> 20} MiB 超出预算 {budget >> 20} MiB；"
+                + (f"已删除最早的 {'/'.join(tiers)} 数据，" if tiers else "")
+                + f"当前 {usage['total'] >> 20} MiB" + ("，各层已达最少保留天数仍超出" if over else ""),
+            )
+    tiers = await tier_history(now)
+    await record_tier_history(tiers, now)
+    budget_stats.update(
+        budget=budget, last_check=now, over=budget > 0 and usage["total"] > budget, usage=usage, tiers=tiers,
+    )
+    if actions:
+        budget_stats["actions"] = actions
+        budget_stats["last_enforced"] = now
+    return budget_stats
+
+
+async def budget_worker():
+    """STORAGE_BUDGET > 0 时每 BUDGET_INTERVAL 秒检查一次（只统计文件大小，开销很小）。"""
+    while STORAGE_BUDGET > 0:
+        try:
+            await enforce_budget()
+        except Exception:
+            pass
+        await asyncio.sleep(BUDGET_INTERVAL)
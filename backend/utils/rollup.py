@@ -0,0 +1,294 @@
+import os, time, asyncio
+from typing import Dict, Any, List, Optional, Tuple, Iterable, AsyncIterator, Sequence
+from ..db import db_read, db_write
+from .. import shards
+from ..crud.samples import GAUGE_COLUMNS
+from ..crud.net import TOTAL, totals
+from .hotring import hot
+
+
+# 各级汇总：名称 -> 桶宽（秒）；每一级由上一级（第一级由原始数据）增量生成
+RESOLUTIONS: Tuple[Tuple[str, int], ...] = (("1m", 60), ("5m", 300), ("1h", 3600), ("1d", 86400))
+RAW_STEP = int(os.environ.get("SAMPLE_INTERVAL", "5"))
+DEFAULT_POINTS = int(os.environ.get("ROLLUP_DEFAULT_POINTS", "720"))
+ROLLUP_LAG = 15             # 给采样写入留出余量，避免当前分钟被提前封口
+ROLLUP_MAX_BUCKETS = 1440   # 单轮每级最多推进的桶数（首次回填时分批进行）
+
+# 带维度的原始表：前缀 -> (表, 维度列, 数值列)；序列名为 "前缀:维度值:列"，system_samples 的列直接用列名
+KEYED_SOURCES = {
+    "net": ("net_data", "iface", ("rx_kbps", "tx_kbps", "latency_ms")),
+    "gpu": ("gpu_detailed_data", "gpu_index", ("utilization", "temperature", "memory_percent", "power_draw")),
+}
+
+_STEPS = dict(RESOLUTIONS)
+
+
+def pick_resolution(start: int, end: int, points: int = DEFAULT_POINTS) -> Tuple[str, int]:
+    """选择仍能给出至少 points 个点的最粗分辨率；窗口太短时返回 ("raw", 采样间隔)。"""
+    span = max(0, int(end) - int(start))
+    res = ("raw", RAW_STEP)
+    for name, step in RESOLUTIONS:
+        if span // step >= max(1, int(points)):
+            res = (name, step)
+    return res
+
+
+def resolve(start: int, end: int, points: Optional[int] = None, resolution: Optional[str] = None) -> Tuple[str, int]:
+    """接口参数 -> 分辨率：显式 resolution 优先，否则按 points 自动选择。"""
+    if resolution == "raw":
+        return ("raw", RAW_STEP)
+    if resolution in _STEPS:
+        return (resolution, _STEPS[resolution])
+    return pick_resolution(start, end, points or DEFAULT_POINTS)
+
+
+def _merge(acc: Dict[Tuple[str, int], list], key: Tuple[str, int], count: int, total: float, lo: float, hi: float, last: float, last_ts: int) -> None:
+    a = acc.get(key)
+    if a is None:
+        acc[key] = [count, total, lo, hi, last, last_ts]
+        return
+    a[0] += count
+    a[1] += total
+    if lo < a[2]:
+        a[2] = lo
+    if hi > a[3]:
+        a[3] = hi
+    if last_ts >= a[5]:
+        a[4] = last
+        a[5] = last_ts
+
+
+async def _raw_points(db, start: int, end: int, series: Optional[Iterable[str]] = None) -> AsyncIterator[Tuple[str, int, float]]:
+    """读取 [start, end) 的原始点 (series, ts, value)；series=None 表示全部序列。"""
+    want = set(series) if series is not None else None
+    # 累积计数器的 avg/min/max 没有意义，不做汇总（速率按需由 crud/rates.py 计算）
+    sys_cols = [c for c in GAUGE_COLUMNS if want is None or c in want]
+    if sys_cols:
+        async for r in shards.iter_rows(db, "system_samples", ["ts"] + sys_cols, start, end - 1):
+            for c, v in zip(sys_cols, r[1:]):
+                if v is not None:
+                    yield c, r[0], v
+    for prefix, (table, key, cols) in KEYED_SOURCES.items():
+        if want is not None and not any(s.startswith(prefix + ":") for s in want):
+            continue
+        if table in shards.SHARDED_TABLES:
+            rows = shards.iter_rows(db, table, ["ts", key, *cols], start, end - 1)
+        else:
+            rows = _iter_main(db, f"SELECT ts,{key},{','.join(cols)} FROM {table} WHERE ts >= ? AND ts < ?", (start, end))
+        # net:__total__:* 不再有对应的行：按时刻对各网卡求和（旧数据中的 "__total__" 行由 totals() 直接采用）
+        tot = table == "net_data" and (want is None or any(s.startswith(f"{prefix}:{TOTAL}:") for s in want))
+        buf: List[tuple] = []
+        async for r in rows:
+            if tot:
+                if buf and r[0] != buf[-1][0]:
+                    for p in _total_points(prefix, buf, cols, want):
+                        yield p
+                    buf = []
+                buf.append(r)
+            if table == "net_data" and r[1] == TOTAL:
+                continue
+            for c, v in zip(cols, r[2:]):
+                if v is None:
+                    continue
+                name = f"{prefix}:{r[1]}:{c}"
+                if want is None or name in want:
+                    yield name, r[0], v
+        for p in _total_points(prefix, buf, cols, want):
+            yield p
+
+
+def _total_points(prefix: str, rows: List[tuple], cols: Sequence[str], want) -> Iterable[Tuple[str, int, float]]:
+    for t in totals(rows, cols):
+        for c, v in zip(cols, t[1:]):
+            name = f"{prefix}:{TOTAL}:{c}"
+            if v is not None and (want is None or name in want):
+                yield name, t[0], v
+
+
+async def _iter_main(db, sql: str, params: tuple) -> AsyncIterator[tuple]:
+    async with db.execute(sql, params) as cur:
+        async for r in cur:
+            yield r
+
+
+async def get_watermarks(db) -> Dict[str, int]:
+    rows = await (await db.execute("SELECT resolution, watermark FROM rollup_state")).fetchall()
+    return {r[0]: int(r[1]) for r in rows}
+
+
+async def _first_ts(db, level: int) -> Optional[int]:
+    if level > 0:
+        row = await (await db.execute(f"SELECT MIN(ts) FROM rollup_{RESOLUTIONS[level - 1][0]}")).fetchone()
+        return row[0] if row else None
+    firsts = []
+    for table in ["system_samples"] + [src[0] for src in KEYED_SOURCES.values()]:
+        if table in shards.SHARDED_TABLES:
+            first = await shards.min_ts(db, table)
+        else:
+            row = await (await db.execute(f"SELECT MIN(ts) FROM {table}")).fetchone()
+            first = row[0] if row else None
+        if first is not None:
+            firsts.append(int(first))
+    return min(firsts) if firsts else None
+
+
+async def rollup_once(now: Optional[int] = None) -> bool:
+    """把每一级推进到上一级的水位线。返回 True 表示仍有积压（某一级达到了单轮上限）。"""
+    upto = int(now or time.time()) - ROLLUP_LAG
+    backlog = False
+    async with db_read() as db:
+        wms = await get_watermarks(db)
+    for i, (name, step) in enumerate(RESOLUTIONS):
+        src_upto = upto if i == 0 else wms.get(RESOLUTIONS[i - 1][0], 0)
+        wm = wms.get(name)
+        acc: Dict[Tuple[str, int], list] = {}
+        async with db_read() as db:
+            if wm is None:
+                first = await _first_ts(db, i)
+                if first is None:
+                    continue
+                wm = first // step * step
+            end = min(src_upto // step * step, wm + step * ROLLUP_MAX_BUCKETS)
+            if end <= wm:
+                continue
+            if i == 0:
+                async for s, ts, v in _raw_points(db, wm, end):
+                    _merge(acc, (s, ts // step * step), 1, v, v, v, v, ts)
+            else:
+                async with db.execute(
+                    f"SELECT series,ts,count,sum,min,max,last FROM rollup_{RESOLUTIONS[i - 1][0]} WHERE ts >= ? AND ts < ?",
+                    (wm, end),
+                ) as cur:
+                    async for r in cur:
+                        _merge(acc, (r[0], r[1] // step * step), r[2], r[3], r[4], r[5], r[6], r[1])
+        async with db_write() as db:
+            await db.executemany(
+                f"INSERT OR REPLACE INTO rollup_{name}(series,ts,count,sum,min,max,last) VALUES(?,?,?,?,?,?,?)",
+                [(k[0], k[1], a[0], a[1], a[2], a[3], a[4]) for k, a in acc.items()],
+            )
+            await db.execute("INSERT OR REPLACE INTO rollup_state(resolution, watermark) VALUES(?,?)", (name, end))
+            await db.commit()
+        wms[name] = end
+        backlog = backlog or end == wm + step * ROLLUP_MAX_BUCKETS
+    return backlog
+
+
+async def rebuild_range(start: int, end: int, from_level: int = 0) -> int:
+    """补录/导入历史数据后重算 [start, end] 覆盖到的、已封口（水位线之前）的各级桶，返回写入的桶数。
+    自细到粗逐级进行，每批最多 ROLLUP_MAX_BUCKETS 个桶一个写事务；水位线之后的部分由后台任务照常推进。
+    from_level 为起始级别（段日志直接写入 rollup_1m 后从 5m 开始）。源数据只增不减，按 (series, ts) 覆盖写入即可，
+    不删除区间内的旧桶（rollup_1m 中还有不来自原始表的 "hf:" 序列）。"""
+    async with db_read() as db:
+        wms = await get_watermarks(db)
+    total = 0
+    for i, (name, step) in enumerate(RESOLUTIONS):
+        wm = wms.get(name)
+        if wm is None or i < from_level:
+            continue
+        lo, hi = int(start) // step * step, min((int(end) // step + 1) * step, wm)
+        while lo < hi:
+            nxt = min(hi, lo + step * ROLLUP_MAX_BUCKETS)
+            acc: Dict[Tuple[str, int], list] = {}
+            async with db_read() as db:
+                if i == 0:
+                    async for s, ts, v in _raw_points(db, lo, nxt):
+                        _merge(acc, (s, ts // step * step), 1, v, v, v, v, ts)
+                else:
+                    async with db.execute(
+                        f"SELECT series,ts,count,sum,min,max,last FROM rollup_{RESOLUTIONS[i - 1][0]} WHERE ts >= ? AND ts < ?",
+                        (lo, nxt),
+                    ) as cur:
+                        async for r in cur:
+                            _merge(acc, (r[0], r[1] // step * step), r[2], r[3], r[4], r[5], r[6], r[1])
+            async with db_write() as db:
+                await db.executemany(
+                    f"INSERT OR REPLACE INTO rollup_{name}(series,ts,count,sum,min,max,last) VALUES(?,?,?,?,?,?,?)",
+                    [(k[0], k[1], a[0], a[1], a[2], a[3], a[4]) for k, a in acc.items()],
+                )
+                await db.commit()
+            total += len(acc)
+            lo = nxt
+    return total
+
+
+async def _collect(db, level: int, series: List[str], start: int, end: int, step: int, wms: Dict[str, int], acc) -> None:
+    """从第 level 级读取 [start, end)，按 step 归并；超过该级水位线的部分递归取更细一级（最终回落到原始数据）。"""
+    if level < 0:
+        async for s, ts, v in _raw_points(db, start, end, series):
+            _merge(acc, (s, ts // step * step), 1, v, v, v, v, ts)
+        return
+    name = RESOLUTIONS[level][0]
+    hi = max(start, min(end, wms.get(name, start)))
+    if hi > start:
+        marks = ",".join("?" * len(series))
+        async with db.execute(
+            f"SELECT series,ts,count,sum,min,max,last FROM rollup_{name} WHERE series IN ({marks}) AND ts >= ? AND ts < ?",
+            (*series, start, hi),
+        ) as cur:
+            async for r in cur:
+                _merge(acc, (r[0], r[1] // step * step), r[2], r[3], r[4], r[5], r[6], r[1])
+    if end > hi:
+        await _collect(db, level - 1, series, hi, end, step, wms, acc)
+
+
+async def fetch_buckets(db, series: List[str], start: int, end: int, resolution: str) -> Dict[Tuple[str, int], list]:
+    """(series, 桶起点) -> [count, sum, min, max, last, last_ts]。"""
+    step = _STEPS[resolution]
+    level = [n for n, _ in RESOLUTIONS].index(resolution)
+    acc: Dict[Tuple[str, int], list] = {}
+    if series and hot.covers(series, int(start) // step * step):
+        return hot.buckets(series, int(start) // step * step, int(end) + 1, step)
+    if series:
+        wms = await get_watermarks(db)
+        await _collect(db, level, list(series), int(start) // step * step, int(end) + 1, step, wms, acc)
+    return acc
+
+
+async def fetch_rows(db, series: List[str], start: int, end: int, resolution: str,
+                     extremes: bool = False) -> List[Dict[str, Any]]:
+    """按桶返回 [{"ts": 桶起点, 序列: 平均值, ...}]，与原始接口的行格式一致。
+    extremes=True 时每桶两行：桶起点为最小值、桶末秒为最大值（供 minmax 降采样保留尖峰）。"""
+    rows: Dict[int, Dict[str, Any]] = {}
+    last = _STEPS[resolution] - 1
+    for (s, ts), a in (await fetch_buckets(db, series, start, end, resolution)).items():
+        if extremes:
+            rows.setdefault(ts, {"ts": ts})[s] = a[2]
+            rows.setdefault(ts + last, {"ts": ts + last})[s] = a[3]
+        else:
+            rows.setdefault(ts, {"ts": ts})[s] = (a[1] / a[0]) if a[0] else None
+    return [rows[k] for k in sorted(rows)]
+
+
+async def summarize(db, series: List[str], start: int, end: int) -> Dict[str, Dict[str, Any]]:
+    """区间汇总：每个序列的 count/avg/min/max/last（边界误差不超过所选分辨率的一个桶）。"""
+    res, _ = pick_resolution(start, end, points=60)
+    out: Dict[str, Dict[str, Any]] = {}
+    if hot.covers(series, start):
+        # 热层：直接按原始点汇总，没有边界误差
+        acc = {}
+        for (s, _ts), a in hot.buckets(series, int(start), int(end) + 1, max(1, int(end) + 1 - int(start))).items():
+            _merge(acc, (s, 0), *a)
+    elif res == "raw":
+        acc: Dict[Tuple[str, int], list] = {}
+        async for s, ts, v in _raw_points(db, int(start), int(end) + 1, series):
+            _merge(acc, (s, 0), 1, v, v, v, v, ts)
+    else:
+        buckets = await fetch_buckets(db, series, start, end, res)
+        acc = {}
+        for (s, _ts), a in buckets.items():
+            _merge(acc, (s, 0), *a)
+    for (s, _), a in acc.items():
+        out[s] = {"count": a[0], "avg": a[1] / a[0] if a[0] else None, "min": a[2], "max": a[3], "last": a[4]}
+    return out
+
+
+async def rollup_worker():
+    """后台增量维护 rollup_1m/5m/1h/1d；启动时从最早的原始数据分批回填。"""
+    interval = int(os.environ.get("ROLLUP_INTERVAL", "60"))
+    while True:
+        try:
+            while await rollup_once():
+                await asyncio.sleep(0)
+        except Exception:
+            pass
+        await asyncio.sleep(interval)
@@ -0,0 +1,405 @@
+"""
+高频原始采样的追加写段日志：data/segments/<首个时间戳ns>.seg（亚秒级采样不再逐行 INSERT SQLite）。
+
+段文件定长、预分配并整体 mmap：
+- 64 字节头：magic、容量、已写条数、首/末时间戳（ns）、稀疏索引间隔、是否封口；
+- 稀疏时间索引：每 index_every 条记录一个 int64（该条的 ts_ns），查找起点时先在索引上二分；
+- 定宽记录 (ts_ns int64, series_id int64, value float64)，共 24 字节，按时间追加。
+写入方只有 hf_worker：先写记录、再更新头部条数，读取方按条数读，不需要加锁。读取时把记录区 cast 成
+int64/float64 的 memoryview，按 3 的步长取出三列，不复制数据。
+段写满或超过 SEGMENT_MAX_AGE 秒即封口；封口的段按分钟汇总合并进 rollup_1m（序列名 "hf:<名称>"），
+并在 segment_log 中记录（同一事务，重复执行不会重复累加），超过 SEGMENT_RETAIN 秒后删除。
+用户、告警、汇总等仍以 SQLite 为准。
+"""
+import os
+import json
+import mmap
+import time
+import bisect
+import struct
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import psutil
+from ..config import DB_PATH
+from ..db import db_read, db_write
+
+
+SEG_DIR = Path(os.environ.get("SEGMENT_DIR") or (Path(DB_PATH).parent / "segments"))
+SEG_RECORDS = int(os.environ.get("SEGMENT_RECORDS", str(1 << 16)))   # 每段条数（24 B/条）
+SEG_MAX_AGE = int(os.environ.get("SEGMENT_MAX_AGE", "300"))           # 活动段最长写入时间（秒）
+SEG_RETAIN = int(os.environ.get("SEGMENT_RETAIN", "3600"))            # 封口并汇总后保留多久（秒）
+INDEX_EVERY = 256
+HF_PREFIX = "hf:"
+BUCKET = 60
+
+_MAGIC = b"OBSEG1\0\0"
+_HEAD = struct.Struct("<8sqqqqqq")    # magic, capacity, count, first_ts, last_ts, index_every, sealed
+_HEAD_SIZE = 64
+_REC = struct.Struct("<qqd")
+_NS = 1_000_000_000
+
+
+def _layout(capacity: int, every: int) -> Tuple[int, int]:
+    """(记录区起点, 文件大小)；各区域按 8 字节对齐，便于整体 cast。"""
+    rec_off = _HEAD_SIZE + 8 * (-(-capacity // every))
+    return rec_off, rec_off + capacity * _REC.size
+
+
+def seg_path(first_ts_ns: int) -> Path:
+    return SEG_DIR / f"{first_ts_ns:020d}.seg"
+
+
+def list_segments() -> List[Path]:
+    try:
+        return sorted(SEG_DIR.glob("*.seg"))
+    except Exception:
+        return []
+
+
+# ---------------- 序列名 <-> id ----------------
+
+class SeriesRegistry:
+    """序列名与 id 的映射，存于 SEG_DIR/series.json（新序列很少出现，整体重写）。"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._mtime = None
+
+    def _path(self) -> Path:
+        return SEG_DIR / "series.json"
+
+    def _load(self) -> None:
+        try:
+            mtime = self._path().stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._mtime:
+            self._ids = json.loads(self._path().read_text() or "{}")
+            self._mtime = mtime
+
+    def id_of(self, name: str) -> int:
+        self._load()
+        sid = self._ids.get(name)
+        if sid is None:
+            sid = self._ids[name] = max(self._ids.values(), default=0) + 1
+            SEG_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = self._path().with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._ids))
+            os.replace(tmp, self._path())
+            self._mtime = self._path().stat().st_mtime_ns
+        return sid
+
+    def names(self) -> Dict[int, str]:
+        self._load()
+        return {v: k for k, v in self._ids.items()}
+
+
+registry = SeriesRegistry()
+
+
+# ---------------- 段文件 ----------------
+
+class Segment:
+    """一个段文件的 mmap。读取方用 ACCESS_READ 打开；views() 返回的 memoryview 须在 close() 前释放。"""
+
+    def __init__(self, path: Path, writable: bool = False):
+        self.path = path
+        self._f = open(path, "r+b" if writable else "rb")
+        try:
+            self.mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except Exception:
+            self._f.close()
+            raise
+        magic, self.capacity, _, _, _, self.every, _ = _HEAD.unpack_from(self.mm, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"not a segment file: {path}")
+        self.rec_off, _ = _layout(self.capacity, self.every)
+
+    @classmethod
+    def create(cls, first_ts_ns: int, capacity: int = SEG_RECORDS, every: int = INDEX_EVERY) -> "Segment":
+        """预分配整段文件（先写临时文件再改名，读取方不会看到半个头部）。"""
+        SEG_DIR.mkdir(parents=True, exist_ok=True)
+        path = seg_path(first_ts_ns)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.truncate(_layout(capacity, every)[1])
+            f.write(_HEAD.pack(_MAGIC, capacity, 0, first_ts_ns, first_ts_ns, every, 0))
+        os.replace(tmp, path)
+        return cls(path, writable=True)
+
+    def header(self) -> Dict[str, int]:
+        _, cap, count, first, last, every, sealed = _HEAD.unpack_from(self.mm, 0)
+        return {"capacity": cap, "count": count, "first_ts": first, "last_ts": last, "sealed": sealed}
+
+    @property
+    def count(self) -> int:
+        return struct.unpack_from("<q", self.mm, 16)[0]
+
+    @property
+    def sealed(self) -> bool:
+        return bool(struct.unpack_from("<q", self.mm, 48)[0])
+
+    # 写入（仅 SegmentWriter 使用）
+    def append(self, ts_ns: int, sid: int, value: float) -> bool:
+        n = self.count
+        if n >= self.capacity:
+            return False
+        _REC.pack_into(self.mm, self.rec_off + n * _REC.size, ts_ns, sid, value)
+        if n % self.every == 0:
+            struct.pack_into("<q", self.mm, _HEAD_SIZE + 8 * (n // self.every), ts_ns)
+        struct.pack_into("<q", self.mm, 32, ts_ns)       # last_ts
+        struct.pack_into("<q", self.mm, 16, n + 1)       # count 最后更新
+        return True
+
+    def seal(self) -> None:
+        struct.pack_into("<q", self.mm, 48, 1)
+        self.mm.flush()
+
+    # 读取
+    def _lower(self, count: int, ts_ns: int) -> int:
+        """第一条 ts >= ts_ns 的下标：先在稀疏索引上二分定位到块，再在块内二分。
+        同一时刻有多条记录（每次采样写多个序列），可能跨越块边界：取起点严格小于 ts_ns 的最后一块，
+        保证从第一条相等的记录之前开始找。"""
+        blocks = -(-count // self.every)
+        with memoryview(self.mm)[_HEAD_SIZE:_HEAD_SIZE + 8 * blocks] as raw, raw.cast("q") as idx:
+            b = max(0, bisect.bisect_left(idx, ts_ns) - 1)
+        lo, hi = b * self.every, min(count, (b + 1) * self.every)
+        with memoryview(self.mm)[self.rec_off:self.rec_off + count * _REC.size] as raw, raw.cast("q") as q:
+            ts = q[0::3]
+            i = bisect.bisect_left(ts, ts_ns, lo, hi)
+            ts.release()
+        return i
+
+    def views(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> Tuple[memoryview, memoryview, memoryview]:
+        """[start_ns, end_ns] 内记录的三列（ts_ns, series_id, value）零拷贝视图。"""
+        count = self.count
+        a = self._lower(count, start_ns) if start_ns is not None else 0
+        b = self._lower(count, end_ns + 1) if end_ns is not None else count
+        raw = memoryview(self.mm)[self.rec_off + a * _REC.size:self.rec_off + max(a, b) * _REC.size]
+        q, d = raw.cast("q"), raw.cast("d")
+        return q[0::3], q[1::3], d[2::3]
+
+    def close(self) -> None:
+        try:
+            self.mm.close()
+        finally:
+            self._f.close()
+
+
+class SegmentWriter:
+    """追加写：当前活动段写满或超过 SEG_MAX_AGE 即封口并新建下一段。"""
+
+    def __init__(self):
+        self.seg: Optional[Segment] = None
+        self.opened_at = 0.0
+
+    def _open(self, ts_ns: int) -> Segment:
+        if self.seg is None:
+            # 重启后续写最后一个未封口的段
+            for path in reversed(list_segments()):
+                seg = Segment(path, writable=True)
+                if not seg.sealed and seg.count < seg.capacity:
+                    self.seg, self.opened_at = seg, time.time()
+                    break
+                seg.close()
+                break
+        if self.seg is None:
+            self.seg, self.opened_at = Segment.create(ts_ns), time.time()
+        return self.seg
+
+    def append(self, ts_ns: int, sid: int, value: float) -> None:
+        seg = self._open(ts_ns)
+        if not seg.append(ts_ns, sid, value):
+            self.rotate()
+            self._open(ts_ns).append(ts_ns, sid, value)
+
+    def append_many(self, rows: Sequence[Tuple[int, int, float]]) -> None:
+        for ts_ns, sid, value in rows:
+            self.append(ts_ns, sid, value)
+
+    def rotate(self) -> None:
+        if self.seg is not None:
+            self.seg.seal()
+            self.seg.close()
+            self.seg = None
+
+    def maybe_rotate(self) -> None:
+        if self.seg is not None and time.time() - self.opened_at >= SEG_MAX_AGE:
+            self.rotate()
+
+
+def read_points(series: Sequence[str], start: float, end: float) -> Dict[str, List[Tuple[float, float]]]:
+    """按序列名读取 [start, end]（秒）内的原始点：{名称: [(ts 秒, 值)]}。"""
+    wanted = set(series)
+    sids = {sid: name for sid, name in registry.names().items() if name in wanted}
+    out: Dict[str, List[Tuple[float, float]]] = {s: [] for s in series}
+    lo, hi = int(start * _NS), int(end * _NS)
+    for path in list_segments():
+        if int(path.stem) > hi:
+            break
+        try:
+            seg = Segment(path)
+        except Exception:
+            continue
+        try:
+            h = seg.header()
+            if h["count"] == 0 or h["last_ts"] < lo:
+                continue
+            ts, sid, val = seg.views(lo, hi)
+            try:
+                for t, s, v in zip(ts, sid, val):
+                    name = sids.get(s)
+                    if name is not None:
+                        out[name].append((t / _NS, v))
+            finally:
+                for m in (ts, sid, val):
+                    m.release()
+        finally:
+            seg.close()
+    return out
+
+
+# ---------------- 汇总进 rollup ----------------
+
+def _aggregate(path: Path) -> Tuple[Dict[str, int], Dict[Tuple[str, int], list]]:
+    """封口段按 (序列, 分钟) 汇总：[count, sum, min, max, last]。"""
+    names = registry.names()
+    acc: Dict[Tuple[str, int], list] = {}
+    seg = Segment(path)
+    try:
+        h = seg.header()
+        ts, sid, val = seg.views()
+        try:
+            for t, s, v in zip(ts, sid, val):
+                key = (HF_PREFIX + names.get(s, str(s)), t // _NS // BUCKET * BUCKET)
+                a = acc.get(key)
+                if a is None:
+                    acc[key] = [1, v, v, v, v]
+                else:
+                    a[0] += 1
+                    a[1] += v
+                    if v < a[2]:
+                        a[2] = v
+                    if v > a[3]:
+                        a[3] = v
+                    a[4] = v
+        finally:
+            for m in (ts, sid, val):
+                m.release()
+    finally:
+        seg.close()
+    return h, acc
+
+
+async def compact_sealed() -> Dict[str, Any]:
+    """把尚未汇总的封口段并入 rollup_1m，并删除超过保留期的已汇总段。"""
+    from .rollup import rebuild_range
+    done, dropped = [], []
+    async with db_read() as db:
+        merged = {r[0] for r in await (await db.execute("SELECT name FROM segment_log")).fetchall()}
+    now_ns = time.time_ns()
+    for path in list_segments():
+        try:
+            seg = Segment(path)
+            sealed, last = seg.sealed, seg.header()["last_ts"]
+            seg.close()
+        except Exception:
+            continue
+        if not sealed:
+            continue
+        if path.name in merged:
+            if now_ns - last > SEG_RETAIN * _NS:
+                path.unlink(missing_ok=True)
+                dropped.append(path.name)
+            continue
+        h, acc = await asyncio.to_thread(_aggregate, path)
+        async with db_write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                await db.execute(
+                    "INSERT INTO segment_log(name, first_ts, last_ts, records, compacted_at) VALUES(?,?,?,?,?)",
+                    (path.name, h["first_ts"] // _NS, h["last_ts"] // _NS, h["count"], int(time.time())),
+                )
+                # 一个分钟桶可能跨两个段：累加合并（segment_log 保证每段只合并一次）
+                await db.executemany(
+                    "INSERT INTO rollup_1m(series,ts,count,sum,min,max,last) VALUES(?,?,?,?,?,?,?) "
+                    "ON CONFLICT(series,ts) DO UPDATE SET count=count+excluded.count, sum=sum+excluded.sum, "
+                    "min=min(min,excluded.min), max=max(max,excluded.max), last=excluded.last",
+                    [(k[0], k[1], *a) for k, a in sorted(acc.items(), key=lambda kv: kv[0][1])],
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        if acc:
+            # 已越过水位线的上级桶（5m/1h/1d）按新的 1m 数据重算
+            await rebuild_range(h["first_ts"] // _NS, h["last_ts"] // _NS, from_level=1)
+        done.append({"segment": path.name, "records": h["count"], "buckets": len(acc)})
+    if dropped:
+        async with db_write() as db:
+            await db.executemany("DELETE FROM segment_log WHERE name = ?", [(n,) for n in dropped])
+            await db.commit()
+    return {"compacted": done, "dropped": dropped}
+
+
+def segment_stats() -> Dict[str, Any]:
+    segs = []
+    for path in list_segments():
+        try:
+            seg = Segment(path)
+        except Exception:
+            continue
+        try:
+            h = seg.header()
+        finally:
+            seg.close()
+        segs.append({"name": path.name, "count": h["count"], "capacity": h["capacity"], "sealed": bool(h["sealed"]),
+                     "first_ts": h["first_ts"] / _NS, "last_ts": h["last_ts"] / _NS, "bytes": path.stat().st_size})
+    return {"dir": str(SEG_DIR), "series": sorted(registry.names().values()), "segments": segs}
+
+
+# ---------------- 高频采样 ----------------
+
+def _sample(prev: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """一次高频采样：CPU 使用率与磁盘/网卡总吞吐（计数器与上一次的差值）。"""
+    now = time.monotonic()
+    out = [("cpu_percent", float(psutil.cpu_percent(interval=None)))]
+    try:
+        d = psutil.disk_io_counters()
+        n = psutil.net_io_counters()
+        cur = (d.read_bytes + d.write_bytes if d else 0, n.bytes_recv if n else 0, n.bytes_sent if n else 0)
+    except Exception:
+        cur = None
+    last = prev.get("io")
+    if cur and last:
+        dt = max(1e-3, now - last[0])
+        out += [("disk_mb_s", (cur[0] - last[1][0]) / dt / 1048576),
+                ("rx_kbps", (cur[1] - last[1][1]) / dt / 1024), ("tx_kbps", (cur[2] - last[1][2]) / dt / 1024)]
+    prev["io"] = (now, cur) if cur else None
+    return out
+
+
+async def hf_worker():
+    """HF_INTERVAL（秒，可小于 1）> 0 时启用：采样追加到段日志，每分钟封口过期段并汇总进 rollup。"""
+    interval = float(os.environ.get("HF_INTERVAL", "0"))
+    if interval <= 0:
+        return
+    writer = SegmentWriter()
+    prev: Dict[str, Any] = {}
+    sids: Dict[str, int] = {}
+    next_compact = time.monotonic() + BUCKET
+    while True:
+        try:
+            ts_ns = time.time_ns()
+            for name, v in _sample(prev):
+                sid = sids.get(name) or sids.setdefault(name, registry.id_of(name))
+                writer.append(ts_ns, sid, v)
+            if time.monotonic() >= next_compact:
+                next_compact = time.monotonic() + BUCKET
+                writer.maybe_rotate()
+                await compact_sealed()
+        except Exception:
+            pass
+        await asyncio.sleep(interval)
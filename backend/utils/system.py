@@ -178,6 +178,11 @@ def collect_system_snapshot() -> Dict[str, Any]:
         except Exception:
             disk_rate = 0.0
         PREV_DISK_IO = (cur, now_t)
+    # 原始累计计数器（入库后由查询层按任意窗口计算速率）
+    try:
+        interrupts = int(psutil.cpu_stats().interrupts)
+    except Exception:
+        interrupts = None
 
     # gpu averages
     g = _gpu_info(); gs = g.get('gpus') or []
@@ -201,6 +206,9 @@ def collect_system_snapshot() -> Dict[str, Any]:
         "processes": procs,
         "mem_percent": mem_percent,
         "disk_mb_s": disk_rate,
+        "disk_read_bytes": int(dio.read_bytes) if dio else None,
+        "disk_write_bytes": int(dio.write_bytes) if dio else None,
+        "interrupts": interrupts,
         "gpu_util_avg": gpu_util_avg,
         "gpu_temp_avg": gpu_temp_avg
     }
@@ -280,7 +288,14 @@ def collect_network_rates() -> Dict[str, Any]:
 def detect_primary_interface() -> Optional[str]:
     """Best-effort detection of the primary/default route interface name.
     Returns interface name or None if undetermined.
+    Served from the netlink topology cache when it is live; forks `ip route` otherwise.
     """
+    try:
+        from .netlink import topology
+        if topology.source == "netlink":
+            return topology.primary_iface()
+    except Exception:
+        pass
     try:
         import platform as _pf
         sys = _pf.system()
@@ -341,7 +356,14 @@ def detect_primary_interface() -> Optional[str]:
 def storage_detail() -> Dict[str, Any]:
     detail: Dict[str, Any] = {"devices": [], "partitions": []}
     # Best-effort physical devices
-    if platform.system() == "Linux" and shutil.which("lsblk"):
+    if platform.system() == "Linux" and os.path.isdir("/sys/block"):
+        # sysfs 清单缓存（启动时遍历一次，uevent 触发刷新），不再每次请求 fork lsblk
+        try:
+            from .inventory import inventory
+            detail["devices"] = inventory.block_devices()
+        except Exception as e:
+            detail["devices_error"] = str(e)
+    elif platform.system() == "Linux" and shutil.which("lsblk"):
         try:
             out = subprocess.check_output(["lsblk","-J","-o","NAME,PATH,TYPE,SIZE,MODEL,SERIAL,ROTA,TRAN,MOUNTPOINT,FSTYPE,KNAME,PKNAME"], timeout=3).decode()
             data = json.loads(out)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+定点存储基准测试
+生成一个月（默认 5 秒一点）的合成 system_samples，分别按 REAL 和定点整数写入日分片，
+对比分片/冷块文件大小与一天、一周范围扫描耗时。数据写在临时目录，不影响 data/。
+
+用法: python scripts/bench_quantize.py [--days 30] [--interval 5] [--cold-days 3]
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiosqlite
+from pathlib import Path
+from backend import shards
+from backend.utils import coldstore
+
+
+def synth(start: int, days: int, interval: int):
+    """缓慢漂移 + 噪声的典型负载；百分比按 psutil 习惯保留一位小数。"""
+    rnd = random.Random(42)
+    cpu = mem = 30.0
+    for ts in range(start, start + days * shards.DAY, interval):
+        cpu = min(100.0, max(0.0, cpu + rnd.gauss(0, 3)))
+        mem = min(100.0, max(0.0, mem + rnd.gauss(0, 0.2)))
+        util = 50 + 45 * math.sin(ts / 900.0) + rnd.gauss(0, 5)
+        yield (
+            ts, round(cpu, 1), round(cpu / 25, 2), round(cpu / 30, 2), round(cpu / 35, 2),
+            int(mem * 1.6e8), 16 * 10 ** 9, round(mem, 1), 300 + rnd.randint(0, 20), round(abs(rnd.gauss(5, 3)), 2),
+            round(min(100.0, max(0.0, util)), 1), float(round(45 + util / 4)),
+        )
+
+
+def build(days: int, interval: int, start: int) -> None:
+    cols = ("ts", *shards.VALUE_COLS["system_samples"])
+    scales = shards.QUANT_SCALES.get("system_samples", {})
+    idx = [(i, scales[c]) for i, c in enumerate(cols) if c in scales]
+    batch, day = [], None
+    conn = None
+    for row in synth(start, days, interval):
+        d = shards.day_of(row[0])
+        if d != day:
+            if conn:
+                conn.executemany(f"INSERT INTO system_samples({','.join(cols)}) VALUES({','.join('?' * len(cols))})", batch)
+                conn.commit()
+                conn.close()
+            shards._create(d)
+            conn = sqlite3.connect(shards.shard_path(d))
+            batch, day = [], d
+        if idx:
+            row = list(row)
+            for i, sc in idx:
+                row[i] = shards.quantize(row[i], sc)
+        batch.append(row)
+    if conn:
+        conn.executemany(f"INSERT INTO system_samples({','.join(cols)}) VALUES({','.join('?' * len(cols))})", batch)
+        conn.commit()
+        conn.close()
+    for d in shards.list_days():
+        c = sqlite3.connect(shards.shard_path(d))
+        c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        c.close()
+
+
+async def scan(start: int, seconds: int, repeat: int = 3) -> float:
+    best = None
+    async with aiosqlite.connect(":memory:") as db:
+        await db.executescript(shards.SHARD_SCHEMA)   # 主库中的旧表（空）
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            n = 0
+            async for _r in shards.iter_rows(db, "system_samples", ["ts", "cpu_percent", "mem_percent", "gpu_util_avg"], start, start + seconds):
+                n += 1
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+    return best
+
+
+def run_mode(name: str, quantize: bool, args, start: int):
+    shards.SHARD_DIR = Path(tempfile.mkdtemp(prefix=f"bench_{name}_"))
+    shards.QUANT_SCALES = {"system_samples": {"cpu_percent": 10, "mem_percent": 10, "gpu_util_avg": 10, "gpu_temp_avg": 10}} if quantize else {}
+    try:
+        t0 = time.perf_counter()
+        build(args.days, args.interval, start)
+        build_s = time.perf_counter() - t0
+        hot = sum(os.path.getsize(shards.shard_path(d)) for d in shards.list_days())
+        day_s = asyncio.run(scan(start + shards.DAY, shards.DAY))
+        week_s = asyncio.run(scan(start + shards.DAY, 7 * shards.DAY))
+        cold = hot_part = 0
+        for d in shards.list_days()[:args.cold_days]:
+            hot_part += os.path.getsize(shards.shard_path(d))
+            res = coldstore.compact_day(d)
+            os.replace(res["tmp"], shards.cold_path(d))
+            cold += os.path.getsize(shards.cold_path(d))
+        print(f"{name:>6}: 行存 {hot / 2 ** 20:8.2f} MiB ({hot / (args.days * shards.DAY // args.interval):5.1f} B/行)  "
+              f"写入 {build_s:5.1f}s  扫描 1 天 {day_s * 1000:7.1f}ms / 7 天 {week_s * 1000:7.1f}ms  "
+              f"冷块 {args.cold_days} 天 {hot_part / 2 ** 20:.2f} -> {cold / 2 ** 20:.2f} MiB")
+    finally:
+        shutil.rmtree(shards.SHARD_DIR, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="定点整数 vs REAL 存储对比")
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--interval", type=int, default=5)
+    ap.add_argument("--cold-days", type=int, default=3, help="抽取前几天做冷块压缩对比")
+    args = ap.parse_args()
+    start = (int(time.time()) // shards.DAY - args.days - 1) * shards.DAY
+    print(f"{args.days} 天, 每 {args.interval}s 一点, 共 {args.days * shards.DAY // args.interval} 行")
+    run_mode("REAL", False, args, start)
+    run_mode("定点", True, args, start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+测试在线备份：备份包可还原出主库与分片；备份锁在各种结束方式下（正常结束、首块前断开、
+发送响应头失败）都会释放。使用临时目录中的主库与分片，不依赖运行中的服务与 data/app.db。
+"""
+import io
+import sys
+import os
+import asyncio
+import sqlite3
+import tarfile
+import tempfile
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from backend import db as dbmod
+from backend.db import db_write
+from backend.crud.samples import insert_sample
+from backend.utils import backup
+from backend.routers import admin
+from test_shards import sandbox, T0
+
+
+async def _populate(path: str) -> None:
+    await dbmod.init_db(path)
+    for ts in range(T0, T0 + 2 * 86400, 600):
+        async with db_write() as db:
+            await insert_sample(db, ts, {"cpu_percent": 12.5, "mem_used": ts})
+    await dbmod.db_pool.close()
+
+
+def test_backup_restore():
+    """tar.gz 备份中的主库与各天分片完整、可打开，采样行数与源一致"""
+    old = backup.DB_PATH
+    with sandbox() as path:
+        backup.DB_PATH = path
+        try:
+            asyncio.run(_populate(path))
+
+            async def run() -> bytes:
+                return b"".join([c async for c in backup.stream_backup()])
+
+            data = asyncio.run(run())
+        finally:
+            backup.DB_PATH = old
+        with tempfile.TemporaryDirectory() as d, tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as tar:
+            names = sorted(tar.getnames())
+            assert names[0] == "app.db" and [n for n in names if n.startswith("samples/")], names
+            tar.extractall(d)
+            total = 0
+            for name in names:
+                conn = sqlite3.connect(Path(d) / name)
+                try:
+                    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+                    if name.startswith("samples/"):
+                        total += conn.execute("SELECT COUNT(*) FROM system_samples").fetchone()[0]
+                    else:
+                        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+                finally:
+                    conn.close()
+            assert total == 2 * 86400 // 600
+    print("✓ 备份包可还原出主库与分片")
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "GET", "headers": [], "query_string": b"", "client": ("127.0.0.1", 1)})
+
+
+def test_backup_lock_released():
+    """并发的第二个备份返回 409；响应无论如何结束都释放锁，之后可以再次备份"""
+    old = backup.DB_PATH
+    with sandbox() as path:
+        backup.DB_PATH = path
+
+        async def start():
+            return await admin.api_admin_backup(_request(), plain=True, user={"username": "admin"})
+
+        async def run(send, receive):
+            resp = await start()
+            try:
+                await admin.api_admin_backup(_request(), plain=True, user={"username": "admin"})
+                raise AssertionError("second backup should be rejected")
+            except HTTPException as e:
+                assert e.status_code == 409
+            scope = {"type": "http", "asgi": {"spec_version": "2.0"}}
+            try:
+                await resp(scope, receive, send)
+            except Exception:
+                pass            # 发送失败（anyio 可能包成 ExceptionGroup）
+            held = admin._backup_lock.locked()
+            await dbmod.db_pool.close()
+            return held
+
+        async def never_disconnect():
+            await asyncio.sleep(3600)
+
+        async def disconnect_now():
+            return {"type": "http.disconnect"}
+
+        async def broken_send(msg):
+            raise OSError("connection reset")
+
+        async def slow_send(msg):
+            await asyncio.sleep(3600)
+
+        body = []
+
+        async def collect(msg):
+            body.append(msg.get("body", b""))
+
+        try:
+            asyncio.run(_populate(path))
+            assert asyncio.run(run(broken_send, never_disconnect)) is False       # 发送响应头失败
+            assert asyncio.run(run(slow_send, disconnect_now)) is False           # 首块之前断开
+            assert asyncio.run(run(collect, never_disconnect)) is False           # 正常结束
+            assert b"".join(body).startswith(b"SQLite format 3")
+        finally:
+            backup.DB_PATH = old
+    print("✓ 备份锁在正常结束 / 断开 / 发送失败时都会释放")
+
+
+def main():
+    tests = [
+        test_backup_restore,
+        test_backup_lock_released,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
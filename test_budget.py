@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+测试存储预算：超出预算时逐天删除最旧的原始分片、不越过最少保留天数并记告警；
+每次检查把各层历史天数记为 rollup_1m 中的 "storage:<层>" 序列，可经 /api/admin/storage/history 按时间读回。
+使用临时目录中的主库与分片，不依赖运行中的服务与 data/app.db。
+"""
+import sys
+import os
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend import db as dbmod
+from backend import shards
+from backend.db import db_read
+from backend.utils import retention
+from backend.utils.rollup import rollup_once
+from backend.routers import admin
+from test_shards import sandbox, _populate
+
+
+def test_budget_trim_and_history():
+    """超预算时删到最少保留天数为止并告警；各层历史天数作为 storage: 序列写入并可读回"""
+    old = (retention.DB_PATH, retention.SEG_DIR, retention.STORAGE_BUDGET)
+    with sandbox() as path, tempfile.TemporaryDirectory() as seg:
+        retention.DB_PATH, retention.SEG_DIR, retention.STORAGE_BUDGET = path, seg, 1   # 任何占用都超出
+        try:
+            tss = asyncio.run(_populate(path))
+            now = tss[-1]
+
+            async def run():
+                while await rollup_once(now + 3600):       # 删除不越过下一级水位线，先把汇总推进到 now 之后
+                    pass
+                first = dict(await retention.enforce_budget(now))       # 返回的是共享的 budget_stats
+                again = await retention.enforce_budget(now + 5)
+                async with db_read() as db:
+                    alerts = await (await db.execute(
+                        "SELECT level FROM alerts WHERE title=?", (retention._ALERT_TITLE,))).fetchall()
+                    stored = await (await db.execute(
+                        "SELECT series,count,min,max,last FROM rollup_1m WHERE series LIKE 'storage:%' AND ts=?",
+                        (now // 60 * 60,))).fetchall()
+                hist = await admin.api_admin_storage_history(start=now - 3600, end=now + 60, points=None,
+                                                             resolution=None, user={"username": "admin"})
+                await dbmod.db_pool.close()
+                return first, again, alerts, stored, hist
+
+            first, again, alerts, stored, hist = asyncio.run(run())
+        finally:
+            retention.DB_PATH, retention.SEG_DIR, retention.STORAGE_BUDGET = old
+
+        trims = [a for a in first["actions"] if a.get("tier") == "raw"]
+        assert sum(a["deleted"] for a in trims) >= 9, first["actions"]                # 逐天删除最早的分片
+        days = shards.list_days()
+        floor = now - retention.BUDGET_MIN_DAYS["raw"] * 86400
+        assert days and shards.day_start(days[0]) + shards.DAY > floor, days          # 不删到最少保留天数以内
+        assert first["over"] and [a[0] for a in alerts] == ["ERROR"]                 # 一小时内只记一条
+        raw_days = first["tiers"]["raw"]["history_days"]
+        assert raw_days <= retention.BUDGET_MIN_DAYS["raw"] + 1
+
+        by_series = {r[0]: r[1:] for r in stored}
+        assert set(by_series) == set(retention.storage_series())
+        count, lo, hi, last = by_series["storage:raw"]
+        assert count == 2 and lo == again["tiers"]["raw"]["history_days"] and hi == raw_days
+        assert last == again["tiers"]["raw"]["history_days"]
+
+        assert hist["resolution"] == "1m" and hist["series"] == retention.storage_series()
+        row = [r for r in hist["rows"] if r["ts"] == now // 60 * 60]
+        assert row and abs(row[0]["storage:raw"] - (raw_days + last) / 2) < 1e-9
+    print("✓ 超预算清理到最少保留天数，各层历史天数记为 storage: 序列")
+
+
+def main():
+    tests = [
+        test_budget_trim_and_history,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
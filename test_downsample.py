@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+测试服务端降采样：lttb / minmax / avg 各模式的点数上限与极值保留，流式与整体计算一致。不依赖运行中的服务与 data/app.db。
+"""
+import sys
+import os
+import random
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.utils.downsample import downsample, downsample_stream
+
+
+def test_downsample_modes():
+    """各降采样模式的点数上限；minmax 保留全部极值；流式结果与整体计算一致"""
+    rnd = random.Random(3)
+    rows = [{"ts": t, "v": rnd.random() * 10, "w": None if t % 35 == 0 else rnd.random()} for t in range(0, 50000, 5)]
+    rows[1234]["v"], rows[8765]["v"] = 1000.0, -1000.0
+    assert downsample(rows, None) is rows and downsample(rows[:10], 100) == rows[:10]
+    for mode in ("lttb", "minmax", "avg"):
+        out = downsample(rows, 300, mode)
+        assert 3 <= len(out) <= 300, (mode, len(out))
+        assert [r["ts"] for r in out] == sorted(r["ts"] for r in out)
+        if mode == "minmax":
+            assert max(r["v"] for r in out) == 1000.0 and min(r["v"] for r in out) == -1000.0
+        if mode == "lttb":
+            # 多列时按归一化面积之和取点，单列的尖峰必定保留
+            one = downsample(rows, 300, mode, fields=["v"])
+            assert max(r["v"] for r in one) == 1000.0 and min(r["v"] for r in one) == -1000.0
+        stream = asyncio.run(downsample_stream(iter(rows), 300, mode, rows[0]["ts"], rows[-1]["ts"], ["v", "w"]))
+        assert len(stream) <= 300
+        if mode != "lttb":
+            assert stream == out, mode
+    out = downsample(rows, 300, "lttb")
+    assert out[0] is rows[0] and out[-1] is rows[-1]
+    print("✓ 降采样 lttb / minmax / avg 点数与极值")
+
+
+def main():
+    tests = [
+        test_downsample_modes,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+测试内存热层：环形缓冲回绕后的范围查询与汇总；时钟回拨后环里放不下的采样不再由热层回答。
+"""
+import sys
+import os
+import random
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.utils.hotring import Ring, HotTier
+
+
+def test_ring_wraparound():
+    """环形缓冲写满多轮后，范围查询与汇总结果与逐条暴力计算一致"""
+    rnd = random.Random(2)
+    ring = Ring(["a", "b"], 50, ints=["b"])
+    hist = []
+    for i in range(173):
+        ts = 1000 + i * 5
+        a = None if i % 11 == 0 else rnd.random()
+        b = rnd.randint(0, 100)
+        ring.append(ts, {"a": a, "b": b})
+        hist.append((ts, a, b))
+    live = hist[-50:]
+    assert ring.size == 50 and ring.first_ts() == live[0][0] and ring.last_ts() == live[-1][0]
+    assert not ring.append(live[0][0] - 1, {"a": 1.0})           # 早于最后一条的丢弃
+    lo, hi = live[10][0], live[40][0]
+    rows = ring.rows(["a", "b"], lo, hi)
+    assert [(r["ts"], r["a"], r["b"]) for r in rows] == [x for x in live if lo <= x[0] <= hi]
+    assert all(isinstance(r["b"], int) for r in rows)
+    acc = ring.buckets(["a"], lo, hi, 30)
+    for (name, b0), (n, s, mn, mx, _last, _lts) in acc.items():
+        vals = [x[1] for x in live if b0 <= x[0] < b0 + 30 and lo <= x[0] < hi and x[1] is not None]
+        assert name == "a" and n == len(vals) and abs(s - sum(vals)) < 1e-9 and (mn, mx) == (min(vals), max(vals))
+    assert ring.nans["a"] == sum(1 for x in live if x[1] is None)
+    print("✓ 热层环形缓冲回绕后查询 / 汇总正确")
+
+
+def test_clock_step_back():
+    """早于环中最后一条的采样被丢弃时，since 推到其后，覆盖它的查询改读磁盘"""
+    tier = HotTier(seconds=600, interval=5)
+    tier.enabled, tier.since = True, 1000
+    for ts in range(1000, 1300, 5):
+        tier.add_sample(ts, {"cpu_percent": 1.0})
+    assert tier.covers(["cpu_percent"], 1000)
+    tier.add_sample(1295, {"cpu_percent": 9.0})             # 与最后一条同一时刻：覆盖，热层仍完整
+    assert tier.since == 1000 and tier.rows(["cpu_percent"], 1295, 1295)[0]["cpu_percent"] == 9.0
+    tier.add_sample(1102, {"cpu_percent": 5.0})             # 时钟回拨：早于最后一条，环中放不下
+    assert not tier.covers(["cpu_percent"], 1000) and not tier.covers(["cpu_percent"], 1102)
+    assert tier.covers(["cpu_percent"], 1103)
+    assert [r["cpu_percent"] for r in tier.rows(["cpu_percent"], 1100, 1105)] == [1.0, 1.0]
+    tier.add_net(1290, {"eth0": {"rx_kbps": 1.0}})
+    tier.add_net(1280, {"eth0": {"rx_kbps": 1.0}})
+    assert tier.since == 1281
+    tier.add_sample(1050, {"cpu_percent": 5.0})             # 早于 since 的不影响
+    assert tier.since == 1281
+    print("✓ 时钟回拨后热层不再回答缺行的范围")
+
+
+def main():
+    tests = [
+        test_ring_wraparound,
+        test_clock_step_back,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
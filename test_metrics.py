@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+测试 /api/metrics/system 的原始数据路径：system_samples（含冷分片）与旧表 metric_samples 按 ts 归并，
+同一时刻以 system_samples 为准；只输出 fields 中的列；客户端提前断开时释放分片。
+使用临时目录中的主库与分片，不依赖运行中的服务与 data/app.db。
+"""
+import sys
+import os
+import json
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from starlette.requests import Request
+from backend import db as dbmod
+from backend import shards
+from backend.db import init_db, db_write, db_read
+from backend.crud.samples import insert_sample
+from backend.routers import dashboard
+from backend.utils import coldstore
+from test_shards import sandbox, T0
+
+DAYS = 4
+STEP = 3600
+FIELDS = ["ts", "cpu_percent", "mem_percent"]
+
+
+def _system(ts: int) -> dict:
+    i = (ts - T0) // STEP
+    return {"cpu_percent": float(i % 90), "mem_used": 100 + i, "mem_total": 1000}
+
+
+def _legacy(ts: int) -> tuple:
+    return (ts, 99.5, 500, 1000, None if ts % 3600 else 12.0)
+
+
+async def _populate(path: str) -> list:
+    await init_db(path)
+    tss = list(range(T0, T0 + DAYS * shards.DAY, STEP))
+    for ts in tss:
+        async with db_write() as db:
+            await insert_sample(db, ts, _system(ts))
+    async with db_write() as db:
+        await db.execute("CREATE TABLE metric_samples(ts INTEGER, cpu_percent REAL, mem_used INTEGER, "
+                         "mem_total INTEGER, mem_percent REAL)")
+        # 旧表：半点的行只在旧表中，整点的行与 system_samples 重合
+        await db.executemany("INSERT INTO metric_samples VALUES(?,?,?,?,?)",
+                             [_legacy(t) for t in range(T0 - 7200, T0 + DAYS * shards.DAY, 1800)])
+        await db.commit()
+    await coldstore.compact_once(now=tss[-1])
+    await dbmod.db_pool.close()
+    return tss
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "GET", "headers": [], "query_string": b""})
+
+
+async def _call(s: int, e: int, **kw):
+    args = dict(start=s, end=e, date=None, fields=",".join(FIELDS), points=None, resolution="raw",
+                max_points=None, mode=dashboard.DEFAULT_MODE, user={"username": "admin"})
+    args.update(kw)
+    return await dashboard.api_metrics_system(_request(), **args)
+
+
+def _expected(s: int, e: int) -> list:
+    rows = {}
+    for t in range(T0 - 7200, T0 + DAYS * shards.DAY, 1800):
+        if s <= t <= e:
+            _, cpu, used, total, mp = _legacy(t)
+            rows[t] = {"ts": t, "cpu_percent": cpu, "mem_percent": mp if mp is not None else used / total * 100.0}
+    for t in range(T0, T0 + DAYS * shards.DAY, STEP):
+        if s <= t <= e:
+            v = _system(t)
+            rows[t] = {"ts": t, "cpu_percent": v["cpu_percent"], "mem_percent": v["mem_used"] / v["mem_total"] * 100.0}
+    return [rows[t] for t in sorted(rows)]
+
+
+def test_system_merge():
+    """原始窗口：两表归并、同一时刻取 system_samples、mem_percent 补算、只输出所选列"""
+    with sandbox() as path:
+        tss = asyncio.run(_populate(path))
+        assert any(k["cold"] for k in shards.catalog().values())
+        s, e = T0 - 7200, tss[-1]
+
+        async def run():
+            resp = await _call(s, e)
+            body = "".join([c async for c in resp.body_iterator])
+            part = await _call(s + 5400, s + 5400 + 86400)
+            part_body = "".join([c async for c in part.body_iterator])
+            small = await _call(s, e, max_points=40, mode="avg")
+            await dbmod.db_pool.close()
+            return body, part_body, small
+
+        body, part_body, small = asyncio.run(run())
+        out = json.loads(body)
+        assert out["fields"] == FIELDS and out["resolution"] == "raw"
+        assert out["items"] == _expected(s, e)
+        assert json.loads(part_body)["items"] == _expected(s + 5400, s + 5400 + 86400)
+        assert 3 <= len(small["items"]) <= 40 and set(small["items"][0]) <= set(FIELDS)
+    print("✓ system_samples 与旧表 metric_samples 按 ts 归并")
+
+
+def test_stream_disconnect():
+    """读到第一批行后断开：两个游标都关闭，连接上没有残留的 ATTACH"""
+    with sandbox() as path:
+        tss = asyncio.run(_populate(path))
+        old = dashboard._STREAM_BATCH
+        dashboard._STREAM_BATCH = 5
+
+        async def run():
+            resp = await _call(T0 - 7200, tss[-1])
+            it = resp.body_iterator
+            chunks = [await anext(it), await anext(it)]
+            await it.aclose()
+            async with db_read() as db:
+                left = await (await db.execute("PRAGMA database_list")).fetchall()
+            await dbmod.db_pool.close()
+            return chunks, left
+
+        try:
+            chunks, left = asyncio.run(run())
+        finally:
+            dashboard._STREAM_BATCH = old
+        assert chunks[0] == '{"items":[' and chunks[1].count('"ts"') == 5
+        assert [r[1] for r in left] == ["main"]
+    print("✓ 提前断开时释放分片")
+
+
+def main():
+    tests = [
+        test_system_merge,
+        test_stream_disconnect,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试网卡维度表 net_iface：采样行以 iface_id 存放，名称与出现区间只在维度表中存一份；
+按名称读取（含冷分片）、按时间窗列出网卡、汇总行求和与旧 "__total__" 行的处理。
+使用临时目录中的主库与分片，不依赖运行中的服务与 data/app.db。
+"""
+import sys
+import os
+import asyncio
+import sqlite3
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend import db as dbmod
+from backend import shards
+from backend.db import init_db, db_write, db_read
+from backend.crud import net
+from backend.crud.net import TOTAL, insert_net, iter_net, list_ifaces, totals
+from backend.utils import coldstore
+from test_shards import sandbox, T0
+
+DAYS = 4
+STEP = 600
+COLS = ("ts", "rx_kbps", "tx_kbps", "latency_ms")
+
+
+def _ifaces(ts: int) -> dict:
+    i = (ts - T0) // STEP
+    out = {"eth0": {"rx_kbps": float(i % 100), "tx_kbps": 1.5}}
+    if T0 + shards.DAY <= ts < T0 + 2 * shards.DAY:                 # 只在第二天插着
+        out["eth1"] = {"rx_kbps": 10.0, "tx_kbps": float(i % 7)}
+    return out
+
+
+async def _populate(path: str) -> list:
+    await init_db(path)
+    tss = list(range(T0, T0 + DAYS * shards.DAY, STEP))
+    for ts in tss:
+        async with db_write() as db:
+            await insert_net(db, ts, _ifaces(ts), latency_ms=float(ts % 50), primary="eth0")
+            await db.commit()
+    await coldstore.compact_once(now=tss[-1])
+    await dbmod.db_pool.close()
+    return tss
+
+
+def test_iface_dimension():
+    """net_data 只存 iface_id；net_iface 记录出现区间；按名称读回（含冷分片）与汇总一致"""
+    with sandbox() as path:
+        tss = asyncio.run(_populate(path))
+        assert any(k["cold"] for k in shards.catalog().values())
+
+        async def read():
+            async with db_read() as db:
+                ifaces = {r["name"]: r for r in await list_ifaces(db, 0, tss[-1])}
+                first_day = [r["name"] for r in await list_ifaces(db, T0, T0 + 3600)]
+                eth1 = [r async for r in iter_net(db, COLS, tss[0], tss[-1], iface="eth1")]
+                eth0 = [r async for r in iter_net(db, COLS, tss[0], tss[-1], iface="eth0")]
+                tot = [r async for r in iter_net(db, COLS, tss[0], tss[-1])]
+                none = [r async for r in iter_net(db, COLS, tss[0], tss[-1], iface="nosuch")]
+            await dbmod.db_pool.close()
+            return ifaces, first_day, eth1, eth0, tot, none
+
+        ifaces, first_day, eth1, eth0, tot, none = asyncio.run(read())
+        assert set(ifaces) == {"eth0", "eth1"} and first_day == ["eth0"]
+        on = [t for t in tss if "eth1" in _ifaces(t)]
+        assert ifaces["eth1"]["first_seen"] == on[0]
+        assert on[-1] - net.SEEN_REFRESH < ifaces["eth1"]["last_seen"] <= on[-1]      # last_seen 按间隔刷新
+        assert ifaces["eth0"]["first_seen"] == tss[0] and not ifaces["eth0"]["is_virtual"]
+
+        assert [r[0] for r in eth1] == on and all(r[3] is None for r in eth1)         # 时延只记在主网卡上
+        assert eth0 == [(t, _ifaces(t)["eth0"]["rx_kbps"], 1.5, float(t % 50)) for t in tss]
+        want = []
+        for t in tss:
+            m = _ifaces(t)
+            want.append((t, sum(v["rx_kbps"] for v in m.values()), sum(v["tx_kbps"] for v in m.values()), float(t % 50)))
+        assert tot == want and none == []
+
+        # 行存分片里只有 iface_id，没有名称列
+        hot_day = max(d for d, k in shards.catalog().items() if k["hot"])
+        conn = sqlite3.connect(shards.shard_path(hot_day))
+        try:
+            cols = [r[1] for r in conn.execute("PRAGMA table_info(net_data)")]
+        finally:
+            conn.close()
+        assert "iface_id" in cols and "iface" not in cols, cols
+    print("✓ net_iface 维度：按 id 存放、按名称读回（含冷分片）、出现区间与汇总")
+
+
+def test_totals_legacy():
+    """汇总：数值列求和、时延取非空值；旧数据中该时刻的 "__total__" 行直接作为汇总"""
+    cols = ["rx_kbps", "latency_ms"]
+    rows = [
+        (1, "eth0", 1.0, 5.0), (1, "eth1", 2.0, None),
+        (2, TOTAL, 9.0, 7.0), (2, "eth0", 4.0, None),
+        (3, "eth1", None, None),
+    ]
+    assert list(totals(rows, cols)) == [(1, 3.0, 5.0), (2, 9.0, 7.0), (3, None, None)]
+    assert list(totals([], cols)) == []
+    print("✓ 汇总行求和与旧 __total__ 行")
+
+
+def main():
+    tests = [
+        test_iface_dimension,
+        test_totals_legacy,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
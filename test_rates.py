@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+测试计数器列的速率计算：增量的重置与回绕处理、跨桶按时间比例分摊。不依赖运行中的服务与 data/app.db。
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.crud.rates import counter_delta, CounterRates
+
+
+def test_counter_delta():
+    """计数器增量：正常递增、重置、32 位回绕、空值"""
+    assert counter_delta(100, 150) == 50
+    assert counter_delta(5000, 120) == 120                      # 重置：从 0 重新计数
+    assert counter_delta((1 << 32) - 100, 50) == 150            # 32 位回绕
+    assert counter_delta(None, 10) is None and counter_delta(10, None) is None
+    # 跨桶按时间比例分摊，总增量不变；重置计数
+    acc = CounterRates(0, 59, 30, ["x"])
+    for ts, v in ((0, 0), (20, 200), (40, 50), (59, 240)):
+        acc.add(None, ts, [v])
+    rows = acc.rows()
+    assert acc.resets == 1
+    assert abs(sum(r["x"] for r in rows) - (200 + 50 + 190)) < 1e-9
+    print("✓ 计数器增量：递增 / 重置 / 回绕 / 分摊")
+
+
+def main():
+    tests = [
+        test_counter_delta,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+测试变更日志复制：备机重放时的表名与列名校验。使用内存数据库，不依赖运行中的服务与 data/app.db。
+"""
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import aiosqlite
+from backend import replication
+
+
+def test_replication_apply_columns():
+    """复制重放：只写本地表中存在的列，远端日志里的其他列名不会拼进 SQL"""
+    async def run():
+        async with aiosqlite.connect(":memory:") as db:
+            await db.execute("CREATE TABLE alerts(id INTEGER PRIMARY KEY, level TEXT, acknowledged INTEGER)")
+            await replication._apply_one(db, "row", {"t": "alerts", "r": {"id": 1, "level": "WARN", "x) VALUES(0);--": 1}})
+            await replication._apply_one(db, "rows", {"t": "alerts", "c": ["id", "newer", "level"], "v": [[2, 0, "ERROR"]]})
+            await replication._apply_one(db, "row", {"t": "sqlite_master", "r": {"name": "x"}})
+            await replication._apply_one(db, "del", {"t": "alerts", "k": {"id": 1}})
+            return await (await db.execute("SELECT id, level FROM alerts ORDER BY id")).fetchall()
+    replication._local_cols.clear()
+    assert asyncio.run(run()) == [(2, "ERROR")]
+    print("✓ 复制重放列校验")
+
+
+def main():
+    tests = [
+        test_replication_apply_columns,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+测试高频原始采样的段日志：稀疏索引下的范围定位。使用临时目录中的段文件，不依赖运行中的服务与 data/app.db。
+"""
+import sys
+import os
+import bisect
+import tempfile
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.utils import seglog
+
+
+def test_segment_lower_bound():
+    """段日志：同一时刻的多条记录跨越稀疏索引块边界时，范围起点仍落在第一条"""
+    old = seglog.SEG_DIR
+    with tempfile.TemporaryDirectory() as d:
+        seglog.SEG_DIR = Path(d)
+        try:
+            seg = seglog.Segment.create(10**9, capacity=400, every=5)
+            tss, t = [], 10**9
+            for i in range(100):
+                for sid in range(4):
+                    assert seg.append(t, sid, float(i))
+                    tss.append(t)
+                t += 1 + i % 2
+            for q in range(tss[0] - 2, tss[-1] + 2):
+                assert seg._lower(seg.count, q) == bisect.bisect_left(tss, q), q
+            seg.close()
+        finally:
+            seglog.SEG_DIR = old
+    print("✓ 段日志范围定位")
+
+
+def main():
+    tests = [
+        test_segment_lower_bound,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
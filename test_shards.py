@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+测试按天分片的读路径：写入多天采样并压缩为冷分片后，经 iter_rows、fetch_latest、GPUDataManager、
+报表导出读回的数据与写入一致；最新网卡采样只查找必要的分片。使用临时目录中的主库与分片，不依赖运行中的服务与 data/app.db。
+"""
+import sys
+import os
+import csv
+import gzip
+import json
+import asyncio
+import tempfile
+import contextlib
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend import db as dbmod
+from backend import shards
+from backend.db import init_db, db_write, db_read
+from backend.crud.samples import insert_sample
+from backend.crud import net
+from backend.crud.net import TOTAL, insert_net, latest_net
+from backend.crud.gpu_data import GPUDataManager
+from backend.utils import coldstore
+from backend.routers import reports
+from starlette.requests import Request
+
+
+T0 = 1_700_006_400              # 2023-11-15 00:00:00 UTC
+DAYS = 12
+STEP = 3600
+COLS = ["ts", "cpu_percent", "mem_used", "gpu_util_avg", "gpu_temp_avg"]
+
+
+def _values(ts: int) -> dict:
+    i = (ts - T0) // STEP
+    return {"cpu_percent": round(i % 97 * 0.7, 1), "mem_used": 1000 + i, "mem_total": 4096,
+            "gpu_util_avg": round(i % 50 * 1.3, 1), "gpu_temp_avg": 40.0 + i % 7}
+
+
+@contextlib.contextmanager
+def sandbox():
+    """主库、分片目录与连接池都指向临时目录，结束后恢复；网卡 id 缓存随库清空。"""
+    old = (dbmod.db_pool, shards.SHARD_DIR, coldstore.DB_PATH)
+    with tempfile.TemporaryDirectory() as d:
+        path = str(Path(d) / "app.db")
+        dbmod.db_pool = dbmod.DBPool(path)
+        shards.SHARD_DIR = Path(d) / "samples"
+        coldstore.DB_PATH = path
+        shards.forget_layout()
+        net._ids.clear()
+        try:
+            yield path
+        finally:
+            dbmod.db_pool, shards.SHARD_DIR, coldstore.DB_PATH = old
+            shards.forget_layout()
+            net._ids.clear()
+
+
+async def _populate(path: str) -> list:
+    await init_db(path)
+    tss = list(range(T0, T0 + DAYS * shards.DAY, STEP))
+    for ts in tss:
+        async with db_write() as db:
+            await insert_sample(db, ts, _values(ts))
+    await coldstore.compact_once(now=tss[-1])
+    await dbmod.db_pool.close()
+    return tss
+
+
+def _expected(ts: int) -> tuple:
+    v = _values(ts)
+    return (ts, *(v[c] for c in COLS[1:]))
+
+
+def test_read_paths():
+    """多天数据（大部分已压缩为冷分片）经各读路径完整读回"""
+    with sandbox() as path:
+        tss = asyncio.run(_populate(path))
+        cat = shards.catalog()
+        assert len(cat) == DAYS and sum(1 for k in cat.values() if k["cold"]) >= DAYS - coldstore.COLD_AFTER_DAYS - 1
+        assert any(k["hot"] for k in cat.values())
+
+        async def read():
+            async with db_read() as db:
+                asc = [r async for r in shards.iter_rows(db, "system_samples", COLS, tss[0], tss[-1])]
+                desc = [r async for r in shards.iter_rows(db, "system_samples", COLS, tss[0], tss[-1], desc=True)]
+                mid = [r async for r in shards.iter_rows(db, "system_samples", COLS, tss[30], tss[100])]
+                latest = await shards.fetch_latest(db, "system_samples", COLS, limit=30)
+                left = await (await db.execute("PRAGMA database_list")).fetchall()
+            await dbmod.db_pool.close()
+            return asc, desc, mid, latest, left
+
+        asc, desc, mid, latest, left = asyncio.run(read())
+        want = [_expected(ts) for ts in tss]
+        assert asc == want
+        assert desc == want[::-1]
+        assert mid == want[30:101]
+        assert latest == want[::-1][:30]
+        assert [r[1] for r in left] == ["main"]            # 查询结束后没有残留的 ATTACH
+
+        mgr = GPUDataManager(path)
+        rows = mgr.get_gpu_data_by_time_range(tss[0], tss[-1])
+        assert [r["ts"] for r in rows] == tss[::-1]
+        assert all(r["id"] == r["ts"] and r["gpu_util_avg"] == _values(r["ts"])["gpu_util_avg"] for r in rows)
+        assert [r["ts"] for r in mgr.get_latest_gpu_data(5)] == tss[::-1][:5]
+        assert mgr.get_gpu_data_by_id(tss[3])["cpu_percent"] == _values(tss[3])["cpu_percent"]
+        assert mgr.get_gpu_data_by_id(tss[3] + 1) is None
+        stats = mgr.get_gpu_statistics(tss[0], tss[-1])
+        util = [_values(t)["gpu_util_avg"] for t in tss]
+        assert stats["data_points"] == len(tss) and stats["max_utilization"] == max(util)
+        assert abs(stats["avg_utilization"] - sum(util) / len(util)) < 1e-6
+        hits = mgr.search_gpu_data(min_utilization=60, start_time=tss[0], end_time=tss[50], limit=1000)
+        assert [r["ts"] for r in hits] == [t for t in tss[:51] if _values(t)["gpu_util_avg"] >= 60][::-1]
+    print(f"✓ {DAYS} 天分片（含冷分片）经 iter_rows / fetch_latest / GPUDataManager 完整读回")
+
+
+def test_exports():
+    """导出覆盖整个时间范围（含冷分片）：报表 export.csv 与 GPUDataManager 的文件导出"""
+    with sandbox() as path:
+        tss = asyncio.run(_populate(path))
+
+        async def export(fmt: str) -> bytes:
+            req = Request({"type": "http", "method": "GET", "headers": [],
+                           "query_string": f"since={tss[0]}&until={tss[-1]}".encode()})
+            resp = await reports.api_reports_export_csv(req, "gpu", format=fmt, gzip=False, user={"username": "admin"})
+            body = b"".join([c async for c in resp.body_iterator])
+            await dbmod.db_pool.close()
+            return body
+
+        lines = asyncio.run(export("csv")).decode().splitlines()
+        assert lines[0] == "ts,gpu_util_avg,gpu_temp_avg" and len(lines) == len(tss) + 1
+        assert [int(x.split(",")[0]) for x in lines[1:]] == tss
+        nd = [json.loads(x) for x in asyncio.run(export("ndjson")).decode().splitlines()]
+        assert [r["ts"] for r in nd] == tss and nd[7]["gpu_util_avg"] == _values(tss[7])["gpu_util_avg"]
+
+        mgr = GPUDataManager(path)
+        with tempfile.TemporaryDirectory() as d:
+            with open(mgr.export_gpu_data_to_csv(tss[0], tss[-1], str(Path(d) / "g.csv")), newline="") as f:
+                rows = list(csv.DictReader(f))
+            assert [int(r["ts"]) for r in rows] == tss[::-1]
+            with gzip.open(mgr.export_gpu_data_to_json(tss[0], tss[-1], str(Path(d) / "g.json.gz")), "rt") as f:
+                assert [r["ts"] for r in json.load(f)] == tss[::-1]
+    print("✓ 报表导出与 GPU 文件导出覆盖全部分片")
+
+
+def test_latest_net_bounded():
+    """最新网卡采样只查 net_iface 出现区间内的分片；未登记的名称不附加任何分片"""
+    with sandbox() as path:
+        tss = asyncio.run(_populate(path))
+        cols = ("ts", "rx_kbps", "tx_kbps")
+
+        async def write():
+            for ts in tss:
+                ifaces = {"eth0": {"rx_kbps": ts % 1000, "tx_kbps": 1.0}}
+                if ts < tss[30]:
+                    ifaces["eth9"] = {"rx_kbps": 5.0, "tx_kbps": 2.0}     # 第二天后拔掉
+                async with db_write() as db:
+                    await insert_net(db, ts, ifaces)
+            await coldstore.compact_once(now=tss[-1])
+            await dbmod.db_pool.close()
+
+        attached = []
+        orig = shards._attach
+
+        async def counting(db, files, readonly=True):
+            attached.extend(files)
+            await orig(db, files, readonly)
+
+        async def read(iface):
+            attached.clear()
+            async with db_read() as db:
+                row = await latest_net(db, cols, iface)
+            await dbmod.db_pool.close()
+            return row, len(set(attached))
+
+        asyncio.run(write())
+        shards._attach = counting
+        try:
+            assert asyncio.run(read("nosuch")) == (None, 0)
+            row, n = asyncio.run(read("eth9"))
+            assert row == (tss[29], 5.0, 2.0) and n <= 3, (row, n)
+            row, _ = asyncio.run(read("eth0"))
+            assert row == (tss[-1], float(tss[-1] % 1000), 1.0)
+            row, _ = asyncio.run(read(TOTAL))
+            assert row == (tss[-1], float(tss[-1] % 1000), 1.0)
+        finally:
+            shards._attach = orig
+    print("✓ 最新网卡采样按 net_iface 出现区间限定分片")
+
+
+def main():
+    tests = [
+        test_read_paths,
+        test_exports,
+        test_latest_net_bounded,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
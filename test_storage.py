@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+测试存储与查询相关的纯函数：Gorilla 编解码。不依赖运行中的服务与 data/app.db。
+"""
+import sys
+import os
+import math
+import random
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend.utils.gorilla import encode_ts, decode_ts, encode_values, decode_values
+
+
+def test_gorilla_roundtrip():
+    """时间戳（含不等间隔、回退）与数值（含空值、整数、极值）编码后原样解码"""
+    rnd = random.Random(1)
+    ts, t = [], 1_700_000_000
+    for _ in range(2000):
+        t += rnd.choice([5, 5, 5, 4, 6, 60, 0])
+        ts.append(t)
+    ts += [ts[-1] - 3, ts[-1] + (1 << 20)]
+    assert decode_ts(encode_ts(ts), len(ts)) == ts
+    vals = [rnd.random() * 100 for _ in range(1000)] + [None, 0.0, -0.0, 1e308, -1e-308, 42.0, 42.0, None, 7]
+    out = decode_values(encode_values(vals), len(vals))
+    assert len(out) == len(vals)
+    for a, b in zip(vals, out):
+        assert (a is None and b is None) or (a == b and math.copysign(1, a) == math.copysign(1, b))
+    assert decode_ts(encode_ts([]), 0) == [] and decode_values(encode_values([]), 0) == []
+    print("✓ Gorilla 编解码往返一致")
+
+
+
+
+def main():
+    tests = [
+        test_gorilla_roundtrip,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            print(f"✗ 测试 {test.__name__} 失败: {type(e).__name__}: {e}")
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)